@@ -0,0 +1,234 @@
+"""Memory-reservation admission control for generations.
+
+Each generation is charged an estimated memory cost before `llama-cli`
+starts:
+
+- KV cache: `2 (K,V) × layers × kv_heads × head_dim × kv_dtype_bytes` per
+  token × context tokens (prompt + max_tokens). The per-model dimensions
+  come from the `arch` block in `configs/models.yaml`. The context is also
+  passed to `llama-cli -c`, so the allocation matches the estimate.
+- Compute buffers: `admission.overhead_mb`.
+- Weights: `est_ram_gb` when no other generation currently holds the
+  model (the mmap is shared between concurrent runs).
+
+The cost is reserved against the capacity. The capacity is the RAM
+headroom (free minus `free_reserve` from `housekeeper.yaml`) plus the
+memory already held by running `llama-cli` processes, which outstanding
+reservations cover. The housekeeper refreshes it every tick
+(`update_capacity`); without a fresh value it is measured on demand.
+
+A reservation that does not fit waits up to `admission.queue_timeout_s`
+for others to be released. If it still does not fit, it is rejected and
+the API answers 503 with `Retry-After: admission.retry_after_s`. A
+request that cannot fit even on an idle server is rejected immediately.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from . import openmetrics
+from .metrics import metrics
+
+_GB = float(1024 ** 3)
+_MB = float(1024 ** 2)
+
+_decisions = openmetrics.registry.counter("llm_admission_decisions", "Memory admission outcomes per model.", ("model", "result"))
+_reserved_g = openmetrics.registry.gauge("llm_admission_reserved_bytes", "Memory currently reserved by admitted generations.")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a reservation cannot be made.
+
+    Attributes:
+        retry_after_s (int): Suggested client back-off.
+        cost_bytes (int): Estimated cost of the request.
+        available_bytes (int): Capacity left when the request gave up.
+    """
+
+    def __init__(self, message: str, retry_after_s: int, cost_bytes: int = 0, available_bytes: int = 0) -> None:
+        super().__init__(message)
+        self.retry_after_s = int(retry_after_s)
+        self.cost_bytes = int(cost_bytes)
+        self.available_bytes = int(available_bytes)
+
+
+def kv_bytes_per_token(spec: Any, dtype_bytes: int = 2) -> int:
+    """KV-cache bytes per context token: `2 × layers × kv_heads × head_dim × dtype_bytes`."""
+    layers = int(getattr(spec, "n_layers", 0) or 0)
+    kv_heads = int(getattr(spec, "n_kv_heads", 0) or 0)
+    head_dim = int(getattr(spec, "head_dim", 0) or 0)
+    return 2 * layers * kv_heads * head_dim * int(dtype_bytes)
+
+
+def context_tokens(prompt_tokens: int, max_tokens: int, context_max: int, margin: float = 1.25) -> int:
+    """Context to allocate (`llama-cli -c`): prompt with a tokenizer margin plus output, 256-aligned."""
+    want = int(math.ceil(prompt_tokens * max(1.0, margin))) + int(max_tokens) + 64
+    want = int(math.ceil(want / 256.0) * 256)
+    return max(256, min(int(context_max) if context_max else want, want))
+
+
+class AdmissionController:
+    """Byte reservations against RAM headroom.
+
+    Args:
+        clock (Callable[[], float]): Monotonic time source.
+        measure (Callable[[], float] | None): Live capacity in bytes, used when the
+            housekeeper value is missing or stale (default: `_mem_stats` minus the free reserve).
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, measure: Optional[Callable[[], float]] = None) -> None:
+        self._clock = clock
+        self._measure = measure
+        self._cond = threading.Condition()
+        self.cfg: Dict[str, Any] = {}
+        self.hk_cfg: Dict[str, Any] = {}
+        self.enabled = False
+        self.reserved = 0
+        self.active: Dict[int, int] = {}
+        self.waiting = 0
+        self._next_id = 0
+        self._capacity: Optional[float] = None
+        self._capacity_ts = -1e18
+
+    def configure(self, hk_cfg: Dict[str, Any]) -> None:
+        """Apply the `admission` block of `housekeeper.yaml` (and its `free_reserve`)."""
+        self.hk_cfg = hk_cfg or {}
+        self.cfg = dict(self.hk_cfg.get("admission", {}) or {})
+        self.enabled = bool(self.cfg.get("enabled", True))
+
+    def _opt(self, key: str, default: float) -> float:
+        try:
+            return float(self.cfg.get(key, default))
+        except Exception:
+            return default
+
+    def update_capacity(self, headroom_gb: float, worker_gb: float = 0.0) -> None:
+        """Housekeeper feed: headroom plus memory held by running generations (GB)."""
+        with self._cond:
+            self._capacity = (float(headroom_gb) + max(0.0, float(worker_gb))) * _GB
+            self._capacity_ts = self._clock()
+            self._cond.notify_all()
+
+    def _live_capacity(self) -> float:
+        if self._measure is not None:
+            return float(self._measure())
+        from .housekeeper import _free_reserve_gb, _mem_stats
+
+        mem = _mem_stats()
+        return (mem.get("free_gb", 0.0) - _free_reserve_gb(mem, self.hk_cfg)) * _GB
+
+    def capacity(self) -> float:
+        """Bytes available to reservations (fresh housekeeper value or a live measurement)."""
+        stale_s = self._opt("capacity_stale_s", 30.0)
+        if self._capacity is not None and self._clock() - self._capacity_ts <= stale_s:
+            return self._capacity
+        try:
+            cap = self._live_capacity()
+        except Exception:
+            return self._capacity if self._capacity is not None else float("inf")
+        self._capacity, self._capacity_ts = cap, self._clock()
+        return cap
+
+    def estimate(self, spec: Any, prompt_tokens: int, max_tokens: int, registry: Any = None) -> Dict[str, int]:
+        """Estimated memory cost of one generation.
+
+        Returns:
+            Dict[str, int]: `ctx_tokens`, `kv_bytes`, `overhead_bytes`, `weights_bytes`, `total_bytes`.
+        """
+        ctx = context_tokens(prompt_tokens, max_tokens, int(getattr(spec, "context_max", 0) or 0), self._opt("ctx_margin", 1.25))
+        kv = kv_bytes_per_token(spec, int(self._opt("kv_dtype_bytes", 2))) * ctx
+        overhead = int(self._opt("overhead_mb", 256) * _MB)
+        weights = 0
+        try:
+            res = registry.residency() if registry is not None and hasattr(registry, "residency") else {}
+            if int((res.get(getattr(spec, "name", ""), {}) or {}).get("active", 0)) == 0:
+                weights = int(float(getattr(spec, "est_ram_gb", 0) or 0) * _GB)
+        except Exception:
+            weights = 0
+        return {"ctx_tokens": ctx, "kv_bytes": kv, "overhead_bytes": overhead, "weights_bytes": weights, "total_bytes": kv + overhead + weights}
+
+    def check(self, cost_bytes: int, model: str = "") -> None:
+        """Reject immediately when `cost_bytes` cannot fit even with no reservations."""
+        if not self.enabled:
+            return
+        cap = self.capacity()
+        if cost_bytes > cap:
+            _decisions.inc(model=model or "unknown", result="rejected_size")
+            metrics.inc("admission_rejected_total", 1)
+            raise AdmissionRejected(
+                f"insufficient memory for request (needs {cost_bytes / _GB:.2f} GB, capacity {max(0.0, cap) / _GB:.2f} GB)",
+                int(self._opt("retry_after_s", 5)), cost_bytes, int(max(0.0, cap)),
+            )
+
+    @contextmanager
+    def reserve(self, cost_bytes: int, model: str = "", timeout_s: Optional[float] = None) -> Iterator[int]:
+        """Hold a reservation for the duration of the block.
+
+        Raises:
+            AdmissionRejected: When the reservation cannot be made within the timeout.
+        """
+        if not self.enabled or cost_bytes <= 0:
+            yield 0
+            return
+        timeout = self._opt("queue_timeout_s", 10.0) if timeout_s is None else float(timeout_s)
+        deadline = self._clock() + max(0.0, timeout)
+        t0 = time.perf_counter()
+        queued = False
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.reserved + cost_bytes > self.capacity():
+                    # nothing else to wait for: the request is too large on its own
+                    if self.reserved == 0 and cost_bytes > self.capacity():
+                        raise self._reject(model, cost_bytes, "rejected_size")
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        raise self._reject(model, cost_bytes, "rejected_timeout")
+                    queued = True
+                    # capacity also changes with housekeeper ticks: re-check periodically
+                    self._cond.wait(min(remaining, 0.5))
+            finally:
+                self.waiting -= 1
+            self._next_id += 1
+            rid = self._next_id
+            self.active[rid] = int(cost_bytes)
+            self.reserved += int(cost_bytes)
+            _reserved_g.set(float(self.reserved))
+        _decisions.inc(model=model or "unknown", result="queued" if queued else "admitted")
+        metrics.observe_duration("admission_wait", (time.perf_counter() - t0) * 1000.0)
+        try:
+            yield rid
+        finally:
+            with self._cond:
+                self.reserved -= self.active.pop(rid, 0)
+                _reserved_g.set(float(self.reserved))
+                self._cond.notify_all()
+
+    def _reject(self, model: str, cost_bytes: int, result: str) -> AdmissionRejected:
+        _decisions.inc(model=model or "unknown", result=result)
+        metrics.inc("admission_rejected_total", 1)
+        cap = self.capacity()
+        return AdmissionRejected(
+            f"insufficient memory for request (needs {cost_bytes / _GB:.2f} GB, available {max(0.0, cap - self.reserved) / _GB:.2f} GB)",
+            int(self._opt("retry_after_s", 5)), cost_bytes, int(max(0.0, cap - self.reserved)),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        cap = self._capacity
+        return {
+            "enabled": self.enabled,
+            "reserved_gb": round(self.reserved / _GB, 3),
+            "capacity_gb": round(cap / _GB, 3) if cap is not None and math.isfinite(cap) else None,
+            "active": len(self.active),
+            "waiting": self.waiting,
+        }
+
+
+admission = AdmissionController()
@@ -8,15 +8,23 @@ Google-style docstrings.
 """
 
 import json
+import math
 import os
+import threading
 import time
-from typing import Any, Dict, List, Optional
+import weakref
+from typing import Any, Callable, Dict, List, Optional
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 
-from .generation import generate_with_llama_cli, speculative_generate
+from .admission import AdmissionRejected, admission, kv_bytes_per_token
+from .generation import _approx_tokens, estimate_cost, generate_with_llama_cli, speculative_generate
+from .ratelimit import TokenLease, TokenLimitExceeded, client_key
+from .sessions import SessionError, sessions
+from .tools_exec import ToolExecutor, default_handlers, results_prompt
 from .tenancy import require_tenant
 from .messaging_stub import KafkaProducerStub
 from .memory_client import MemoryClient
@@ -26,13 +34,20 @@ from .embeddings import embed_texts
 from .voice import transcribe as voice_transcribe, tts as voice_tts
 from .research import web_search
 from .logging_utils import get_logger
+from .metrics import metrics
 from .agent_planner import compile_nl_to_dsl, validate_graph, save_current_plan
-from .housekeeper import _beacon_ram, _beacon_ssd, _mem_stats, _disk_stats  # type: ignore
+from .housekeeper import _beacon_ram, _beacon_ssd, _free_reserve_gb, _mem_stats, _disk_stats  # type: ignore
+from .cache import caches
+from . import profiler
+from . import tracing
 
 
 class ChatMessage(BaseModel):
     role: str
-    content: Any
+    content: Any = None
+    name: Optional[str] = None
+    tool_calls: Optional[List[Dict[str, Any]]] = None
+    tool_call_id: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
@@ -50,6 +65,7 @@ class ChatRequest(BaseModel):
     act_as: Optional[str] = None
     reasoning: Optional[Dict[str, Any]] = None
     server_tools_execute: Optional[bool] = None
+    session_id: Optional[str] = None
 
 
 class CompletionRequest(BaseModel):
@@ -81,6 +97,252 @@ def _topic_namer(tenant: str, domain: str) -> str:
     return f"llm.{tenant}.{domain}"
 
 
+_sse_open = 0
+_sse_lock = threading.Lock()
+
+
+def _track_stream(gen):
+    """Wrap an SSE generator to maintain the `sse_streams_open` gauge."""
+    global _sse_open
+    with _sse_lock:
+        _sse_open += 1
+        metrics.observe("sse_streams_open", _sse_open)
+    try:
+        yield from gen
+    finally:
+        with _sse_lock:
+            _sse_open -= 1
+            metrics.observe("sse_streams_open", _sse_open)
+
+
+class _StreamGuard:
+    """Releases the per-request resources of a streaming response exactly once.
+
+    The body generator releases them itself (after generation, in a
+    `finally`), but only once iteration has started. Starlette never starts
+    it when the client disconnects first. `abandon` is therefore attached
+    as a BackgroundTask and as a finalizer of the response, and it releases
+    the resources of a body that never started.
+
+    Args:
+        release (Callable[[dict], Any]): Called with the generation result (`{}` when abandoned).
+    """
+
+    def __init__(self, release: Callable[[Dict[str, Any]], Any]) -> None:
+        self._release = release
+        self._lock = threading.Lock()
+        self._state = "pending"  # -> started | abandoned
+
+    def start(self) -> bool:
+        """Claim the resources for the body; False when already abandoned."""
+        with self._lock:
+            if self._state != "pending":
+                return False
+            self._state = "started"
+            return True
+
+    def abandon(self) -> None:
+        with self._lock:
+            if self._state != "pending":
+                return
+            self._state = "abandoned"
+        try:
+            self._release({})
+        except Exception:
+            pass
+
+
+def _sse_response(gen, guard: _StreamGuard, headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """SSE response for `gen` whose guard is released even if the body is never iterated."""
+    resp = StreamingResponse(_track_stream(gen), media_type="text/event-stream", headers=headers, background=BackgroundTask(guard.abandon))
+    # a disconnect can abort sending before the background task runs
+    weakref.finalize(resp, guard.abandon)
+    return resp
+
+
+def _result_payload(request_id: Optional[str], tenant: str, model: str, res: Dict[str, Any], latency_ms: int) -> Dict[str, Any]:
+    """Build the `infer.results.v1` event (InferResultV1 plus generation timings)."""
+    timings = res.get("timings") or {}
+    err = res.get("error")
+    prompt_tokens = int(timings.get("prompt_tokens", 0) or 0)
+    completion_tokens = int(timings.get("completion_tokens", 0) or 0)
+    return {
+        "request_id": request_id or "",
+        "tenant_id": tenant,
+        "model": model,
+        "status": ("timeout" if err and "timeout" in str(err) else "error") if err else "ok",
+        "output": res.get("output", ""),
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        "error": str(err) if err else None,
+        "latency_ms": latency_ms,
+        "timestamp_ms": int(time.time() * 1000),
+        "timings": {k: float(v) for k, v in timings.items()} if timings else None,
+    }
+
+
+def _overloaded(message: str, retry_after: int, status: int = 503) -> JSONResponse:
+    """503 (or 429) in the app's error shape with a `Retry-After` hint."""
+    return JSONResponse({"error": {"code": status, "message": message}}, status_code=status, headers={"Retry-After": str(int(retry_after))})
+
+
+def _admission_precheck(registry, model: str, prompt: str, overrides: Dict[str, Any]) -> Optional[JSONResponse]:
+    """Fast 503 before streaming starts when the request cannot fit in memory at all."""
+    try:
+        cost = estimate_cost(registry, model, prompt, overrides)
+        if cost is not None:
+            admission.check(cost["total_bytes"], model)
+    except AdmissionRejected as e:
+        return _overloaded(str(e), e.retry_after_s)
+    except Exception:
+        pass
+    return None
+
+
+def _token_admit(request: Request, prompt: str, user: Optional[str] = None):
+    """Charge the prompt to the client's token budget.
+
+    Returns:
+        tuple: (`TokenLease` or None, 429/413 response or None).
+    """
+    tl = getattr(request.app.state, "token_limiter", None)
+    if tl is None:
+        return None, None
+    ip = getattr(getattr(request, "client", None), "host", "?")
+    key = client_key(getattr(request.app.state, "rate_limit_key_mode", "ip"), ip, request.headers, user)
+    try:
+        return tl.admit(key, _approx_tokens(prompt)), None
+    except TokenLimitExceeded as e:
+        if e.reason == "prompt_too_large":
+            # retrying cannot help: no Retry-After
+            return None, JSONResponse({"error": {"code": 413, "message": str(e)}}, status_code=413, headers=e.headers)
+        resp = _overloaded(str(e), max(1, math.ceil(e.retry_after_s)), 429)
+        resp.headers.update(e.headers)
+        return None, resp
+
+
+def _token_settle(request: Request, lease: Optional[TokenLease], res: Dict[str, Any]) -> Dict[str, str]:
+    """Reconcile completion tokens; returns the `x-ratelimit-*` headers to send."""
+    if lease is None:
+        return {}
+    tl = request.app.state.token_limiter
+    ran = "output" in res
+    completion = int((res.get("timings") or {}).get("completion_tokens") or 0)
+    if ran and not completion and res.get("output"):
+        completion = _approx_tokens(str(res["output"]))
+    tl.settle(lease, completion, refund_prompt=not ran)
+    return lease.headers
+
+
+# Tools the server can call from the last user message alone (prep mode and forced closed loop)
+_QUERY_TOOLS: Dict[str, Dict[str, Any]] = {"memory.search": {"k": 5}, "research.search": {"top_k": 5}}
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, list):
+        return " ".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return "" if content is None else str(content)
+
+
+def _last_user_text(messages: List[ChatMessage]) -> str:
+    for m in reversed(messages):
+        if (m.role or "").lower() == "user":
+            return _text_of(m.content)
+    return ""
+
+
+def _pending_tool_calls(messages: List[ChatMessage]) -> List[Dict[str, Any]]:
+    """Tool calls of the last assistant turn that have no `tool` result yet."""
+    answered = set()
+    for m in reversed(messages):
+        if m.role == "tool" and m.tool_call_id:
+            answered.add(m.tool_call_id)
+        elif m.role == "assistant":
+            return [c for c in (m.tool_calls or []) if c.get("id") not in answered]
+    return []
+
+
+def _render_messages(messages: List[ChatMessage]) -> List[str]:
+    """Prompt parts of chat messages (tool results and tool calls are labeled)."""
+    parts: List[str] = []
+    for m in messages:
+        if m.role == "tool":
+            label = m.name or m.tool_call_id
+            parts.append(f"[tool {label}] {_text_of(m.content)}" if label else f"[tool] {_text_of(m.content)}")
+        elif m.content is not None:
+            parts.append(_text_of(m.content))
+        if m.tool_calls:
+            calls = ", ".join(f"{(c.get('function') or {}).get('name')}({(c.get('function') or {}).get('arguments', '')})" for c in m.tool_calls)
+            parts.append(f"[tool calls] {calls}")
+    return parts
+
+
+def _session_error(e: SessionError) -> JSONResponse:
+    return JSONResponse({"error": {"code": e.status, "message": str(e)}}, status_code=e.status)
+
+
+def _session_cache(registry, session: Dict[str, Any], prompt: str, overrides: Dict[str, Any]) -> Optional[str]:
+    """Prompt-cache file for a session turn, or None when its KV state is over quota."""
+    spec = registry.get(session.get("model") or "")
+    max_tokens = int(overrides.get("max_tokens") or (registry.cfg.get("gen_defaults", {}) or {}).get("max_tokens", 256))
+    est = kv_bytes_per_token(spec) * (_approx_tokens(prompt) + max_tokens) if spec is not None else 0
+    return sessions.kv_path(session["id"]) if sessions.kv_allowed(est) else None
+
+
+def _session_overflow(registry, session: Dict[str, Any], prompt: str) -> Optional[JSONResponse]:
+    """400 when a session's history plus the new message no longer fits the model's context window."""
+    spec = registry.get(session.get("model") or "")
+    ctx = int(getattr(spec, "context_max", 0) or 0)
+    if not session.get("parts") or ctx <= 0:
+        return None
+    budget = ctx - 16  # same margin as the generation context check
+    if _approx_tokens(prompt) < budget:
+        return None
+    msg = (
+        f"session {session['id']} no longer fits the context window of {session.get('model')} "
+        f"(prompt_tokens={_approx_tokens(prompt)}, budget={budget}); start a new session"
+    )
+    return JSONResponse({"error": {"code": 400, "message": msg}}, status_code=400)
+
+
+def _session_end(session: Optional[Dict[str, Any]], prompt: str, res: Dict[str, Any], cache: Optional[str]) -> None:
+    """Release a session turn; a successful reply is appended to its history."""
+    if session is None:
+        return
+    try:
+        reply = None
+        if isinstance(res, dict) and "error" not in res:
+            # `text` is the generated text alone (session turns); `output` as a fallback
+            reply = res.get("text") if "text" in res else res.get("output")
+        sessions.finish(session, prompt, str(reply) if reply else None, kv_saved=cache is not None)
+    except Exception:
+        pass
+
+
+def _tool_executor(request: Request) -> ToolExecutor:
+    ex = getattr(request.app.state, "tool_executor", None)
+    if ex is None:
+        ex = ToolExecutor.from_config(getattr(request.app.state, "config", {}) or {}, default_handlers(mem_client))
+        request.app.state.tool_executor = ex
+    return ex
+
+
+def _sse_error(res: Dict[str, Any]) -> str:
+    err = {"error": {"code": int(res.get("status", 500)), "message": str(res.get("error"))}}
+    return f"data: {json.dumps(err)}\n\n"
+
+
+def _publish_result(request: Request, tenant: str, model: str, res: Dict[str, Any], latency_ms: int) -> None:
+    if not producer.available():
+        return
+    try:
+        topic = _topic_namer(tenant, "infer.results.v1")
+        rid = getattr(request.state, "request_id", None)
+        payload = json.dumps(_result_payload(rid, tenant, model, res, latency_ms)).encode()
+        producer.produce(topic, key=None, headers={"tenant": tenant}, value=payload)
+    except Exception:
+        pass
+
+
 @router.get("/v1/models")
 def list_models(request: Request):
     """List registered models.
@@ -122,10 +384,7 @@ def info(request: Request):
             mem = _mem_stats()
             disk = _disk_stats(str((__import__("pathlib").Path(pol.get("ssd", {}).get("path", cfg.get("models_root", "."))).resolve())) )
             # free reserve/headroom
-            fr = (cfg.get('housekeeper', {}) or {}).get('free_reserve', {}) or {}
-            min_gb = float(fr.get('min_gb', 8.0)); pct = float(fr.get('pct', 0.10))
-            total_gb = float(mem.get('total_gb', 0.0))
-            free_reserve_gb = max(min_gb, total_gb * pct)
+            free_reserve_gb = _free_reserve_gb(mem, cfg.get('housekeeper', {}) or {})
             headroom_gb = mem.get('free_gb', 0.0) - free_reserve_gb
             ram_b = _beacon_ram(headroom_gb)
             ssd_pol = pol.get('ssd', {}) or {}
@@ -135,6 +394,14 @@ def info(request: Request):
             return 'unknown', 'unknown'
 
     ram_beacon, ssd_beacon = _compute_beacons()
+
+    def _cgroup_summary():
+        try:
+            from . import cgroup
+            return cgroup.summary(cgroup.read())  # live usage and events, not the cached limits
+        except Exception:
+            return {}
+
     hk = {
         "enabled": True,
         "strategy": active,
@@ -143,6 +410,7 @@ def info(request: Request):
         "ssd_watermarks": {"soft_pct": pol.get("ssd", {}).get("soft_pct", 0.75), "hard_pct": pol.get("ssd", {}).get("hard_pct", 0.85)},
         "actions_enabled": bool(pol.get("actions_enabled", False)),
         "beacons": {"ram": ram_beacon, "ssd": ssd_beacon},
+        "cgroup": _cgroup_summary(),
         **({"snapshot": snap} if snap else {}),
     }
     return {
@@ -181,6 +449,10 @@ def info(request: Request):
             "housekeeper_policy": "/admin/housekeeper/policy",
             "housekeeper_strategy": "/admin/housekeeper/strategy",
             "housekeeper_actions": "/admin/housekeeper/actions",
+            "profile": "/admin/profile?seconds=N",
+            "traces": "/admin/traces/{request_id}",
+            "cache": "/admin/cache",
+            "sessions": "/v1/sessions",
             **({
                 "voice_transcribe": "/v1/voice/transcribe",
                 "voice_tts": "/v1/voice/tts",
@@ -275,7 +547,16 @@ def vision_analyze_endpoint(req: VisionAnalyzeRequest, request: Request):
         log.info("vision.analyze", extra={"images": len(imgs), "ocr": req.ocr or "auto", "has_prompt": bool(req.prompt)})
     except Exception:
         pass
+    vcache = caches.get("vision")
+    ckey = json.dumps([imgs, req.prompt, req.tasks, req.ocr or "auto"], sort_keys=True)
+    hit = vcache.get(ckey)
+    if hit is not None:
+        return Response(content=hit, media_type="application/json")
     out = vision_analyze(imgs, prompt=req.prompt, tasks=req.tasks, ocr_mode=req.ocr or "auto")
+    try:
+        vcache.put(ckey, json.dumps(out, ensure_ascii=False).encode("utf-8"))
+    except Exception:
+        pass
     return JSONResponse(out)
 
 
@@ -293,6 +574,28 @@ class EmbeddingsRequest(BaseModel):
     name: Optional[str] = None
 
 
+def _cached_embeddings(texts: List[str], dim: int, profile: str) -> List[List[float]]:
+    """Embed `texts`, serving repeated inputs from the `embeddings` cache."""
+    import array
+
+    ecache = caches.get("embeddings")
+    keys = [f"{profile}|{dim}|{t}" for t in texts]
+    vecs: List[Optional[List[float]]] = []
+    for k in keys:
+        hit = ecache.get(k)
+        vecs.append(array.array("d", hit).tolist() if hit is not None else None)
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        fresh = embed_texts([texts[i] for i in missing], dim=dim)
+        for i, v in zip(missing, fresh):
+            vecs[i] = v
+            try:
+                ecache.put(keys[i], array.array("d", v).tobytes())
+            except Exception:
+                pass
+    return vecs  # type: ignore[return-value]
+
+
 @router.post("/v1/embeddings")
 def embeddings_endpoint(req: EmbeddingsRequest, request: Request):
     """Generate embeddings for one or multiple inputs."""
@@ -305,7 +608,7 @@ def embeddings_endpoint(req: EmbeddingsRequest, request: Request):
         log.info("embeddings.generate", extra={"count": len(texts), "dim": dim, "format": req.encoding_format or "float", "name": req.name or (embeddings_cfg and embeddings_cfg[0].get('name'))})
     except Exception:
         pass
-    vecs = embed_texts([str(t) for t in texts], dim=dim)
+    vecs = _cached_embeddings([str(t) for t in texts], dim, req.name or "")
     if req.encoding_format == "base64":
         import base64, array
         data_items = []
@@ -547,6 +850,102 @@ def housekeeper_actions(req: HousekeeperActionsRequest, request: Request):
     return JSONResponse({"status": "accepted", "strategy": name, "actions_enabled": bool(req.enabled)})
 
 
+@router.get("/admin/profile")
+def admin_profile(seconds: float = 5.0, format: str = "json", hz: float = 200.0):
+    """Profile all Python threads for `seconds` with the wall-clock sampler.
+
+    Args:
+        seconds (float): Sampling duration (capped by `PROFILER_MAX_SECONDS`).
+        format (str): `json` (collapsed + SVG + stats), `collapsed` or `svg`.
+        hz (float): Target sampling rate; the sampler lowers it further to
+            keep its own overhead under 2%.
+    """
+    if not profiler.enabled():
+        raise HTTPException(status_code=404, detail="profiler disabled")
+    secs = min(max(0.05, float(seconds)), profiler.max_seconds())
+    prof = profiler.SamplingProfiler(interval_s=1.0 / max(1.0, min(1000.0, float(hz))))
+    try:
+        stacks = prof.run(secs)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        log.info("admin.profile", extra={"seconds": secs, **prof.stats()})
+    except Exception:
+        pass
+    fmt = (format or "json").lower()
+    if fmt == "collapsed":
+        return PlainTextResponse(profiler.collapsed(stacks))
+    if fmt == "svg":
+        return Response(profiler.flamegraph_svg(stacks), media_type="image/svg+xml")
+    return JSONResponse({
+        "seconds": secs,
+        "stats": prof.stats(),
+        "collapsed": profiler.collapsed(stacks),
+        "svg": profiler.flamegraph_svg(stacks),
+    })
+
+
+@router.get("/admin/traces")
+def admin_traces_list(limit: int = 50):
+    """List request IDs of the most recent traces (newest first)."""
+    ids = tracing.store.ids()[: max(1, min(1000, int(limit)))]
+    return JSONResponse({"request_ids": ids, "capacity": tracing.store.capacity})
+
+
+@router.get("/admin/traces/{request_id}")
+def admin_trace(request_id: str):
+    """Return the spans of a request in OpenTelemetry (OTLP/JSON) form."""
+    tr = tracing.store.get(request_id)
+    if tr is None:
+        raise HTTPException(status_code=404, detail="trace not found")
+    return JSONResponse(tr.to_otlp())
+
+
+@router.get("/admin/cache")
+def admin_cache():
+    """Per-namespace cache budgets, sizes, hit ratios and evictions."""
+    return JSONResponse(caches.stats())
+
+
+class SessionCreateRequest(BaseModel):
+    model: str
+    ttl_s: Optional[float] = None
+
+
+@router.post("/v1/sessions")
+def session_create(req: SessionCreateRequest):
+    """Create a conversation session; pass its `id` as `session_id` in chat requests."""
+    try:
+        return JSONResponse(sessions.create(req.model, req.ttl_s))
+    except SessionError as e:
+        return _session_error(e)
+
+
+@router.get("/v1/sessions")
+def session_list():
+    """Sessions, most recently used first, with stats."""
+    return JSONResponse({"object": "list", "data": sessions.list(), "stats": sessions.stats()})
+
+
+@router.get("/v1/sessions/{session_id}")
+def session_get(session_id: str):
+    try:
+        return JSONResponse(sessions.describe(sessions.get(session_id)))
+    except SessionError as e:
+        return _session_error(e)
+
+
+@router.delete("/v1/sessions/{session_id}")
+def session_delete(session_id: str):
+    """Delete a session with its history and saved KV state."""
+    try:
+        if not sessions.delete(session_id):
+            return _session_error(SessionError(f"session {session_id} not found", 404))
+    except SessionError as e:
+        return _session_error(e)
+    return JSONResponse({"id": session_id, "object": "session", "deleted": True})
+
+
 @router.get("/v1/research/ready")
 def research_ready():
     """Research service readiness (stub)."""
@@ -567,32 +966,57 @@ def completions(req: CompletionRequest, request: Request, x_tenant_id: Optional[
     overrides = {k: v for k, v in dict(temperature=req.temperature, top_p=req.top_p, top_k=req.top_k, max_tokens=req.max_tokens).items() if v is not None}
 
     if not req.stream:
+        lease, limited = _token_admit(request, req.prompt)
+        if limited is not None:
+            return limited
         t0 = time.time()
-        res = generate_with_llama_cli(registry, req.model, req.prompt, overrides=overrides, role="coder", conc=conc)
+        res = {}
+        try:
+            res = generate_with_llama_cli(registry, req.model, req.prompt, overrides=overrides, role="coder", conc=conc)
+        finally:
+            rl_headers = _token_settle(request, lease, res)
         latency_ms = int((time.time() - t0) * 1000)
+        if res.get("status") in (429, 503):
+            resp = _overloaded(str(res.get("error")), int(res.get("retry_after", 5)), int(res["status"]))
+            resp.headers.update(rl_headers)
+            return resp
         # Optionally publish result
-        if producer.available():
-            try:
-                topic = _topic_namer(tenant, "infer.results.v1")
-                payload = json.dumps({"tenant_id": tenant, "model": req.model, "output": res.get("output", ""), "latency_ms": latency_ms}).encode()
-                producer.produce(topic, key=None, headers={"tenant": tenant}, value=payload)
-            except Exception:
-                pass
+        _publish_result(request, tenant, req.model, res, latency_ms)
         # OpenAI-style response
-        return JSONResponse({
-            "id": f"cmpl-{int(time.time()*1000)}",
-            "object": "text_completion",
-            "created": int(time.time()),
-            "model": req.model,
-            "choices": [
-                {"text": res.get("output", ""), "index": 0, "finish_reason": None}
-            ],
-            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
-        })
+        with tracing.span("serialize"):
+            return JSONResponse(headers=rl_headers, content={
+                "id": f"cmpl-{int(time.time()*1000)}",
+                "object": "text_completion",
+                "created": int(time.time()),
+                "model": req.model,
+                "choices": [
+                    {"text": res.get("output", ""), "index": 0, "finish_reason": None}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
 
     # Streaming path: run once and stream the buffer in chunks
+    rejected = _admission_precheck(registry, req.model, req.prompt, overrides)
+    if rejected is not None:
+        return rejected
+    lease, limited = _token_admit(request, req.prompt)
+    if limited is not None:
+        return limited
+
+    guard = _StreamGuard(lambda res: _token_settle(request, lease, res))
+
     def _gen_sse():
-        res = generate_with_llama_cli(registry, req.model, req.prompt, overrides=overrides, role="coder", conc=conc)
+        if not guard.start():
+            return
+        res = {}
+        try:
+            res = generate_with_llama_cli(registry, req.model, req.prompt, overrides=overrides, role="coder", conc=conc)
+        finally:
+            _token_settle(request, lease, res)
+        if res.get("status") in (429, 503):
+            yield _sse_error(res)
+            yield "data: [DONE]\n\n"
+            return
         out = res.get("output", "")
         created = int(time.time())
         model = req.model
@@ -603,15 +1027,15 @@ def completions(req: CompletionRequest, request: Request, x_tenant_id: Optional[
             evt = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model, "choices":[{"index":0, "delta": {"content": delta}, "finish_reason": None}]}
             yield f"data: {json.dumps(evt)}\n\n"
         yield "data: [DONE]\n\n"
-    return StreamingResponse(_gen_sse(), media_type="text/event-stream")
+    return _sse_response(_gen_sse(), guard, lease.headers if lease else None)
 
 
 @router.post("/v1/chat/completions")
 def chat_completions(req: ChatRequest, request: Request, x_tenant_id: Optional[str] = Header(default=None)):
     """OpenAI Chat Completions compatibility.
 
-    Supports tool_choice for `memory.search` and optional closed-loop execution
-    via `server_tools_execute`.
+    Supports tool_choice for `memory.search`, optional closed-loop execution
+    via `server_tools_execute`, and server-side sessions via `session_id`.
     """
     registry, conc, cfg = get_resources(request)
     try:
@@ -621,65 +1045,28 @@ def chat_completions(req: ChatRequest, request: Request, x_tenant_id: Optional[s
 
     # Simple prompt assembly: concatenate user messages
     # Content may be string or parts; flatten simply
-    parts = []
-    for m in req.messages:
-        if isinstance(m.content, list):
-            parts.extend([p.get("text", "") if isinstance(p, dict) else str(p) for p in m.content])
-        else:
-            parts.append(str(m.content))
-    prompt = "\n".join(parts)
-
-    # Function-calling (prep): if an explicit tool_choice=function is provided
-    # we emit a tool_calls response instead of model output. This primes
-    # integration with OpenAI tools/tool_choice without full planning.
+    with tracing.span("prompt_build", messages=len(req.messages)):
+        prompt = "\n".join(_render_messages(req.messages))
+
+    # Function calling. Prep mode: an explicit tool_choice for a query tool
+    # returns `tool_calls` for the client to execute. Closed loop
+    # (`server_tools_execute` or FC_CLOSED_LOOP=1): the server runs the tool
+    # calls of the last assistant turn (or the chosen tool) in parallel and
+    # feeds the results into a follow-up generation in this request.
     tc = req.tool_choice
     chosen_fn = None
     if isinstance(tc, dict) and tc.get("type") == "function":
         f = tc.get("function") or {}
         chosen_fn = f.get("name")
-    # Explicitly support memory.search as a first tool
-    if chosen_fn == "memory.search":
-        # naive args: use the latest user content as the query
-        q = ""
-        for m in reversed(req.messages):
-            if (m.role or "").lower() == "user":
-                if isinstance(m.content, list):
-                    q = " ".join([p.get("text", "") if isinstance(p, dict) else str(p) for p in m.content])
-                else:
-                    q = str(m.content)
-                break
-        # Optional closed-loop execution (feature flag or explicit request)
-        execute = bool(req.server_tools_execute) or os.getenv("FC_CLOSED_LOOP", "0") in ("1","true","on")
-        if execute:
-            try:
-                res = mem_client.search(q, k=5)
-            except Exception:
-                res = []
-            summary_lines = []
-            for r in res[:5]:
-                rid = r.get("id")
-                sc = r.get("score")
-                txt = r.get("text", "")
-                summary_lines.append(f"- {rid} (score {sc}): {txt}")
-            content = "Memory search results:\n" + ("\n".join(summary_lines) if summary_lines else "<no results>")
-            return JSONResponse({
-                "id": f"chatcmpl-{int(time.time()*1000)}",
-                "object": "chat.completion",
-                "created": int(time.time()),
-                "model": req.model,
-                "choices": [{
-                    "index": 0,
-                    "message": {"role": "assistant", "content": content},
-                    "finish_reason": "stop",
-                }],
-                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
-            })
-        else:
-            tool_call = {
-                "id": f"call-{int(time.time()*1000)}",
-                "type": "function",
-                "function": {"name": "memory.search", "arguments": json.dumps({"query": q, "k": 5})},
-            }
+    execute = bool(req.server_tools_execute) or os.getenv("FC_CLOSED_LOOP", "0") in ("1", "true", "on")
+    calls = _pending_tool_calls(req.messages) if execute else []
+    if not calls and chosen_fn in _QUERY_TOOLS:
+        call = {
+            "id": f"call-{int(time.time()*1000)}",
+            "type": "function",
+            "function": {"name": chosen_fn, "arguments": json.dumps({"query": _last_user_text(req.messages), **_QUERY_TOOLS[chosen_fn]})},
+        }
+        if not execute:
             return JSONResponse({
                 "id": f"chatcmpl-{int(time.time()*1000)}",
                 "object": "chat.completion",
@@ -687,11 +1074,18 @@ def chat_completions(req: ChatRequest, request: Request, x_tenant_id: Optional[s
                 "model": req.model,
                 "choices": [{
                     "index": 0,
-                    "message": {"role": "assistant", "tool_calls": [tool_call]},
+                    "message": {"role": "assistant", "tool_calls": [call]},
                     "finish_reason": "tool_calls",
                 }],
                 "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
             })
+        calls = [call]
+    tool_summary = None
+    if calls:
+        with tracing.span("tools", calls=len(calls)):
+            results = _tool_executor(request).run(calls)
+        tool_summary = results_prompt(results)
+        prompt = f"{prompt}\n\n{tool_summary}\n\nAnswer using the tool results above."
 
     # Continue-mode presets
     overrides = {}
@@ -715,32 +1109,89 @@ def chat_completions(req: ChatRequest, request: Request, x_tenant_id: Optional[s
         if v is not None:
             overrides[k] = v
 
+    # Server-side session: the stored history is prepended and its saved KV
+    # state reused, so only the new messages are evaluated (and charged).
+    new_part = prompt
+    session = None
+    cache = None
+    if req.session_id:
+        try:
+            session = sessions.begin(req.session_id, req.model)
+        except SessionError as e:
+            return _session_error(e)
+        prompt = sessions.prompt(session, [new_part])
+        overflow = _session_overflow(registry, session, prompt)
+        if overflow is not None:
+            _session_end(session, prompt, {}, None)
+            return overflow
+        cache = _session_cache(registry, session, prompt, overrides)
+        if cache is not None:
+            overrides["prompt_cache"] = cache
+
     if not req.stream:
+        lease, limited = _token_admit(request, new_part, req.user)
+        if limited is not None:
+            _session_end(session, prompt, {}, cache)
+            return limited
         t0 = time.time()
-        res = generate_with_llama_cli(registry, req.model, prompt, overrides=overrides, role="coder", conc=conc)
+        res = {}
+        try:
+            res = generate_with_llama_cli(registry, req.model, prompt, overrides=overrides, role="coder", conc=conc)
+        finally:
+            rl_headers = _token_settle(request, lease, res)
+            _session_end(session, prompt, res, cache)
         latency_ms = int((time.time() - t0) * 1000)
-        if producer.available():
-            try:
-                topic = _topic_namer(tenant, "infer.results.v1")
-                payload = json.dumps({"tenant_id": tenant, "model": req.model, "output": res.get("output", ""), "latency_ms": latency_ms}).encode()
-                producer.produce(topic, key=None, headers={"tenant": tenant}, value=payload)
-            except Exception:
-                pass
+        if res.get("status") in (429, 503):
+            resp = _overloaded(str(res.get("error")), int(res.get("retry_after", 5)), int(res["status"]))
+            resp.headers.update(rl_headers)
+            return resp
+        # Optionally publish result
+        _publish_result(request, tenant, req.model, res, latency_ms)
         # OpenAI-style chat response
-        return JSONResponse({
-            "id": f"chatcmpl-{int(time.time()*1000)}",
-            "object": "chat.completion",
-            "created": int(time.time()),
-            "model": req.model,
-            "choices": [
-                {"index": 0, "message": {"role": "assistant", "content": res.get("output", "")}, "finish_reason": None}
-            ],
-            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
-        })
+        with tracing.span("serialize"):
+            body = {
+                "id": f"chatcmpl-{int(time.time()*1000)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": req.model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": res.get("text", res.get("output")) or tool_summary or ""}, "finish_reason": "stop" if tool_summary else None}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }
+            if session is not None:
+                body["session_id"] = session["id"]
+            return JSONResponse(headers=rl_headers, content=body)
+
+    rejected = _admission_precheck(registry, req.model, prompt, overrides)
+    if rejected is not None:
+        _session_end(session, prompt, {}, cache)
+        return rejected
+    lease, limited = _token_admit(request, new_part, req.user)
+    if limited is not None:
+        _session_end(session, prompt, {}, cache)
+        return limited
+
+    def _release(res: Dict[str, Any]) -> None:
+        _token_settle(request, lease, res)
+        _session_end(session, prompt, res, cache)
+
+    # releases the lease and the session turn even if the body never starts
+    guard = _StreamGuard(_release)
 
     def _gen_sse():
-        res = generate_with_llama_cli(registry, req.model, prompt, overrides=overrides, role="coder", conc=conc)
-        out = res.get("output", "")
+        if not guard.start():
+            return
+        res = {}
+        try:
+            res = generate_with_llama_cli(registry, req.model, prompt, overrides=overrides, role="coder", conc=conc)
+        finally:
+            _release(res)
+        if res.get("status") in (429, 503):
+            yield _sse_error(res)
+            yield "data: [DONE]\n\n"
+            return
+        out = res.get("text", res.get("output", ""))
         created = int(time.time())
         model = req.model
         cid = f"chatcmpl-{int(time.time()*1000)}"
@@ -758,7 +1209,7 @@ def chat_completions(req: ChatRequest, request: Request, x_tenant_id: Optional[s
             evt = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model, "choices":[{"index":0, "delta": {"content": delta}, "finish_reason": None}]}
             yield f"data: {json.dumps(evt)}\n\n"
         yield "data: [DONE]\n\n"
-    return StreamingResponse(_gen_sse(), media_type="text/event-stream")
+    return _sse_response(_gen_sse(), guard, lease.headers if lease else None)
 
 
 class MemorySearchRequest(BaseModel):
@@ -2,65 +2,142 @@
 
 Provides:
 - `create_app()`: builds the FastAPI app with endpoints, metrics, and housekeeper.
-- Request context middleware: IDs, structured access logs, and rate limiting.
+- Request context middleware: IDs, structured access logs, rate limiting
+  (`ratelimit`, shared across workers) and beacon-driven backpressure
+  (`backpressure.BackpressureGate`).
 
 Google-style docstrings to ease automatic documentation.
 """
 
+import asyncio
+import math
 from typing import Any, Dict
 
 try:
-    from fastapi import FastAPI
-    from fastapi.responses import JSONResponse
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response
 except Exception:  # pragma: no cover - optional dependency at dev time
     FastAPI = None  # type: ignore
+    Request = Any  # type: ignore
     JSONResponse = None  # type: ignore
+    Response = None  # type: ignore
 
 from .config_loader import build_effective_config
 from .registry import ModelRegistry
 from .metrics import metrics
-from .logging_utils import get_logger, new_request_id, set_request_id
-import threading
+from . import openmetrics
+from . import tracing
+from . import timeseries
+from .logging_utils import AccessLogSampler, get_logger, new_request_id, set_request_id
 from .housekeeper import Housekeeper
+from . import ratelimit
+from .backpressure import BackpressureGate, parse_priority, set_priority
 
 
-class _RateLimiter:
-    """Simple per-client IP token bucket.
+UNMATCHED_ROUTE = "__unmatched__"
+
+_http_requests = openmetrics.registry.counter("http_requests", "HTTP requests by route template and status.", ("method", "route", "status"))
+_http_errors = openmetrics.registry.counter("http_errors", "HTTP 5xx responses by route template.", ("method", "route"))
+_http_duration = openmetrics.registry.histogram("http_request_duration_seconds", "HTTP request latency; exemplars carry X-Request-Id.", ("method", "route"))
+_http_inflight = openmetrics.registry.gauge("http_inflight_requests", "Requests currently being served, by route template.", ("route",))
+_http_rate_limited = openmetrics.registry.counter("http_rate_limited", "Requests rejected by the rate limiter.", ("method", "route"))
+openmetrics.registry.add_collector(openmetrics.flat_collector(metrics.snapshot))
+
+
+_ROUTE_CACHE: Dict[Any, str] = {}
+_ROUTE_CACHE_MAX = 2048
+
+
+def _match_route(routes, scope) -> str:
+    """Match `scope` against `routes` (descending into included routers)."""
+    from starlette.routing import Match
+    label = UNMATCHED_ROUTE
+    for r in routes:
+        path = getattr(r, "path", None)
+        if path is None:
+            # included/mounted routers: search their own routes
+            sub = getattr(r, "routes", None) or getattr(getattr(r, "original_router", None), "routes", None)
+            if sub:
+                found = _match_route(sub, scope)
+                if found != UNMATCHED_ROUTE:
+                    return found
+            continue
+        m, _ = r.matches(scope)
+        if m == Match.FULL:
+            return path
+        if m == Match.PARTIAL and label == UNMATCHED_ROUTE:
+            label = path
+    return label
+
+
+def _route_label(request) -> str:
+    """Return the route template for `request` (bounded label cardinality).
+
+    Uses the route resolved by the router when present; otherwise matches the
+    app routes (e.g. before routing or for rejected requests), memoized per
+    method and path in a bounded cache. Paths that match no route collapse
+    into a single `__unmatched__` label.
+    """
+    try:
+        route = request.scope.get("route")
+        path = getattr(route, "path", None)
+        if path:
+            return path
+        key = (request.scope.get("method"), request.scope.get("path"))
+        label = _ROUTE_CACHE.get(key)
+        if label is not None:
+            return label
+        label = _match_route(request.app.router.routes, request.scope)
+        if len(_ROUTE_CACHE) >= _ROUTE_CACHE_MAX:
+            _ROUTE_CACHE.clear()
+        _ROUTE_CACHE[key] = label
+        return label
+    except Exception:
+        pass
+    return UNMATCHED_ROUTE
+
+
+def _record_request(backend, method: str, route: str, status: int, dur_ms: float, rid: str = "") -> None:
+    """Record per-request counters and durations (flat and labeled).
 
     Args:
-        rps (float): Tokens per second (allowed average).
-        burst (int): Maximum accumulated burst.
+        backend: Flat metrics backend (`Metrics` or `ShardedMetrics`).
+        method (str): HTTP method.
+        route (str): Route template label.
+        status (int): Response status code.
+        dur_ms (float): Request duration in milliseconds.
+        rid (str): Request ID used as histogram exemplar.
     """
+    backend.inc("requests_total", 1)
+    backend.inc(f"requests_total:{method} {route}", 1)
+    try:
+        is_error = int(status) >= 500
+    except Exception:
+        is_error = False
+    if is_error:
+        backend.inc("errors_total", 1)
+        backend.inc(f"errors_total:{method} {route}", 1)
+    backend.observe_duration("http_request", dur_ms)
+    backend.observe_duration(f"http_request:{method} {route}", dur_ms)
+    try:
+        _http_requests.inc(method=method, route=route, status=str(status))
+        if is_error:
+            _http_errors.inc(method=method, route=route)
+        _http_duration.observe(dur_ms / 1000.0, exemplar=rid, method=method, route=route)
+    except Exception:
+        pass
 
-    def __init__(self, rps: float, burst: int) -> None:
-        self.rps = max(0.0, float(rps))
-        self.burst = max(1, int(burst))
-        self._lock = threading.Lock()
-        self._buckets: dict[str, tuple[float, float]] = {}  # key -> (tokens, last_ts)
 
-    def allow(self, key: str, now: float) -> bool:
-        """Consume 1 token and return True if allowed.
+def _wants_openmetrics(request) -> bool:
+    fmt = (request.query_params.get("format") or "").lower()
+    if fmt in ("openmetrics", "prometheus", "text"):
+        return True
+    if fmt == "json":
+        return False
+    accept = (request.headers.get("accept") or "").lower()
+    return "application/openmetrics-text" in accept or accept.startswith("text/plain")
 
-        Args:
-            key (str): Client identifier (e.g., IP).
-            now (float): Current timestamp.
 
-        Returns:
-            bool: True if the request is allowed, False if rate limited.
-        """
-        if self.rps <= 0:
-            return True
-        with self._lock:
-            tokens, last = self._buckets.get(key, (self.burst, now))
-            # refill
-            elapsed = max(0.0, now - last)
-            tokens = min(self.burst, tokens + elapsed * self.rps)
-            if tokens < 1.0:
-                self._buckets[key] = (tokens, now)
-                return False
-            tokens -= 1.0
-            self._buckets[key] = (tokens, now)
-            return True
 try:
     from .api import router as api_router
 except Exception:
@@ -83,91 +160,146 @@ def create_app() -> Any:
 
     app = FastAPI(title="LLM-server", version="0.1.0")
     log = get_logger("llm-server")
+    access_log = AccessLogSampler.from_env()
+    app.state.access_log = access_log  # type: ignore[attr-defined]
+    bp_gate = BackpressureGate()
+    app.state.backpressure = bp_gate  # type: ignore[attr-defined]
+    limiter = ratelimit.from_env()
+    rl_key_mode = ratelimit.key_mode()
+    app.state.rate_limiter = limiter  # type: ignore[attr-defined]
+    app.state.rate_limit_key_mode = rl_key_mode  # type: ignore[attr-defined]
+    app.state.token_limiter = ratelimit.token_limiter_from_env()  # type: ignore[attr-defined]
 
     # Request ID + structured access logs
     @app.middleware("http")
     async def request_context(request, call_next):  # type: ignore[no-redef]
-        # Basic rate limiting per-client (optional via env)
-        import os as _os
-        _rl_enabled = _os.getenv("RATE_LIMIT_ENABLED", "1") in ("1", "true", "on")
-        if _rl_enabled:
-            try:
-                rps = float(_os.getenv("RATE_LIMIT_RPS", "20"))
-                burst = int(_os.getenv("RATE_LIMIT_BURST", "40"))
-            except Exception:
-                rps, burst = 20.0, 40
-            limiter = getattr(app.state, "_limiter", None)
-            if limiter is None or getattr(limiter, "rps", None) != rps or getattr(limiter, "burst", None) != burst:
-                limiter = _RateLimiter(rps=rps, burst=burst)
-                app.state._limiter = limiter  # type: ignore[attr-defined]
-            client = getattr(request, "client", None)
-            ip = getattr(client, "host", "?")
-            now = __import__("time").time()
-            key = f"{ip}"
-            if not limiter.allow(key, now):
-                metrics.inc("rate_limited_total", 1)
-                metrics.inc(f"rate_limited_total:{request.method} {request.url.path}", 1)
-                try:
-                    log.info("rate_limit", extra={"ip": ip, "method": request.method, "path": request.url.path, "rps": limiter.rps, "burst": limiter.burst})
-                except Exception:
-                    pass
-                return JSONResponse({"error": {"code": 429, "message": "rate limit exceeded"}}, status_code=429)
         # Incoming header support
         try:
             incoming = request.headers.get("x-request-id") or request.headers.get("X-Request-Id")
         except Exception:
             incoming = None
         rid = incoming or new_request_id()
+        trace = tracing.start_trace(rid, **{"http.method": request.method, "http.target": request.url.path})
+        # Per-client rate limiting (settings read once at startup)
+        if limiter is not None:
+            with tracing.span("rate_limit"):
+                client = getattr(request, "client", None)
+                ip = getattr(client, "host", "?")
+                try:
+                    key = ratelimit.client_key(rl_key_mode, ip, request.headers)
+                except Exception:
+                    key = f"ip:{ip}"
+                allowed, rl_left, rl_retry = limiter.take(key, __import__("time").time())
+            if not allowed:
+                route_label = _route_label(request)
+                metrics.inc("rate_limited_total", 1)
+                metrics.inc(f"rate_limited_total:{request.method} {route_label}", 1)
+                _http_rate_limited.inc(method=request.method, route=route_label)
+                try:
+                    first, summary = access_log.rate_limited(ip, route_label)
+                    if first:
+                        log.info("rate_limit", extra={"ip": ip, "method": request.method, "path": request.url.path, "rps": limiter.rps, "burst": limiter.burst})
+                    if summary:
+                        log.info("rate_limit.summary", extra=summary)
+                except Exception:
+                    pass
+                tracing.finish_trace(trace, **{"http.status_code": 429})
+                return JSONResponse(
+                    {"error": {"code": 429, "message": "rate limit exceeded"}},
+                    status_code=429,
+                    headers={
+                        "Retry-After": str(max(1, math.ceil(rl_retry))),
+                        "x-ratelimit-limit-requests": str(limiter.burst),
+                        "x-ratelimit-remaining-requests": "0",
+                    },
+                )
+        # Beacon backpressure: delay low-priority work when hot, shed when critical
+        try:
+            policy = getattr(app.state, "housekeeper_policy", {}) or {}
+            snap = getattr(app.state, "housekeeper_snapshot", None)
+            bp_gate.update(bp_gate.beacon_from(snap), policy)
+            priority = parse_priority(request.headers.get("x-priority"), request.headers.get("x-batch"))
+            set_priority(priority)
+            action, retry_after = bp_gate.decide(request.url.path, priority, policy)
+            if action == "delay":
+                max_delay, poll = bp_gate.delay_settings(policy)
+                waited = 0.0
+                with tracing.span("backpressure_delay", priority=priority):
+                    while action == "delay" and waited < max_delay:
+                        await asyncio.sleep(poll)
+                        waited += poll
+                        bp_gate.update(bp_gate.beacon_from(getattr(app.state, "housekeeper_snapshot", None)), policy)
+                        action, retry_after = bp_gate.decide(request.url.path, priority, policy)
+                bp_gate.record("delayed" if action == "admit" else "shed_hot")
+                if action != "admit":
+                    action = "reject"
+            elif action == "reject":
+                bp_gate.record("shed_critical")
+        except Exception:
+            action, retry_after = "admit", 0.0
+        if action == "reject":
+            tracing.finish_trace(trace, **{"http.status_code": 503})
+            return JSONResponse(
+                {"error": {"code": 503, "message": f"server under resource pressure ({bp_gate.level})"}},
+                status_code=503,
+                headers={"Retry-After": str(max(1, int(round(retry_after))))},
+            )
         setattr(request.state, "request_id", rid)
         set_request_id(rid)
         start = __import__("time").time()
         status = 500
+        inflight = _http_inflight.labels(_route_label(request))
+        inflight.inc()
         try:
             response = await call_next(request)
             status = getattr(response, "status_code", 200)
             # Propagate X-Request-Id on response
             try:
                 response.headers["X-Request-Id"] = rid
+                if limiter is not None:
+                    response.headers["x-ratelimit-limit-requests"] = str(limiter.burst)
+                    response.headers["x-ratelimit-remaining-requests"] = str(max(0, int(rl_left)))
+                st = tracing.server_timing(trace, (__import__("time").time() - start) * 1000.0)
+                if st:
+                    response.headers["Server-Timing"] = st
             except Exception:
                 pass
             return response
         except Exception as e:  # pragma: no cover
             raise
         finally:
+            inflight.dec()
             dur = (__import__("time").time() - start) * 1000.0
-            # Route label (template if available)
-            route_path = None
-            try:
-                route = request.scope.get("route")
-                route_path = getattr(route, "path", None)
-            except Exception:
-                route_path = None
-            path_label = route_path or request.url.path
+            # Route label (template if available, bounded otherwise)
+            path_label = _route_label(request)
             method = getattr(request, "method", "").upper() or "?"
-            key_overall = "http_request"
-            key_route = f"http_request:{method} {path_label}"
-
-            metrics.inc("requests_total", 1)
-            metrics.inc(f"requests_total:{method} {path_label}", 1)
+            _record_request(metrics, method, path_label, status, dur, rid)
+            tracing.finish_trace(trace, **{"http.route": path_label, "http.status_code": int(status)})
             try:
-                if int(status) >= 500:
-                    metrics.inc("errors_total", 1)
-                    metrics.inc(f"errors_total:{method} {path_label}", 1)
+                traced = (request.headers.get("traceparent") or "").strip().endswith("-01")
+                keep, reason, rate = access_log.decide(path_label, int(status), dur, rid, traced)
+                metrics.inc("access_log_lines_total" if keep else "access_log_skipped_total", 1)
+                if reason in ("sampled", "skipped"):
+                    metrics.observe(f"access_log_sample_rate:{path_label}", rate)
+                if keep:
+                    log.info(
+                        "request",
+                        extra={
+                            "method": request.method,
+                            "path": request.url.path,
+                            "route": path_label,
+                            "dur_ms": round(dur, 2),
+                            "request_id": rid,
+                            "status": status,
+                            "sample_rate": round(rate, 6),
+                            "log_reason": reason,
+                        },
+                    )
+                summary = access_log.flush_rate_limited()
+                if summary:
+                    log.info("rate_limit.summary", extra=summary)
             except Exception:
                 pass
-            metrics.observe_duration(key_overall, dur)
-            metrics.observe_duration(key_route, dur)
-            log.info(
-                "request",
-                extra={
-                    "method": request.method,
-                    "path": request.url.path,
-                    "route": path_label,
-                    "dur_ms": round(dur, 2),
-                    "request_id": rid,
-                    "status": status,
-                },
-            )
             # Clear context var
             set_request_id(None)
 
@@ -190,9 +322,31 @@ def create_app() -> Any:
         return registry.readiness_report()
 
     @app.get("/metrics")
-    def metrics_endpoint():
+    def metrics_endpoint(request: Request):
+        """Flat JSON metrics, or OpenMetrics text when negotiated.
+
+        OpenMetrics is served for `Accept: application/openmetrics-text`
+        (Prometheus scrapes), `Accept: text/plain` or `?format=openmetrics`.
+        """
+        if _wants_openmetrics(request):
+            return Response(openmetrics.registry.render(), media_type=openmetrics.CONTENT_TYPE)
         return JSONResponse(metrics.snapshot())
 
+    @app.get("/metrics/history")
+    def metrics_history(name: str = "", range: str = "1h"):
+        """Downsampled history of a tracked metric as compact arrays.
+
+        Args:
+            name (str): Tracked metric (omit to list available names).
+            range (str): Window such as `15m`, `1h`, `24h` (default `1h`).
+        """
+        if not name:
+            return JSONResponse({"names": timeseries.history.names()})
+        out = timeseries.history.query(name, timeseries.parse_range(range))
+        if out is None:
+            return JSONResponse({"error": {"code": 404, "message": f"metric {name} not tracked"}}, status_code=404)
+        return JSONResponse(out)
+
     # API endpoints
     if api_router is not None:
         app.include_router(api_router)
@@ -207,6 +361,7 @@ def create_app() -> Any:
         import os as _os
         from contextlib import asynccontextmanager
         hk_cfg = cfg.get("housekeeper", {}) or {}
+        timeseries.configure_from(hk_cfg)
         strategies = hk_cfg.get("strategies", {}) or {}
         default_strategy = hk_cfg.get("default_strategy", "balanced")
         active_name = _os.getenv("HOUSEKEEPER_STRATEGY", default_strategy)
@@ -219,6 +374,21 @@ def create_app() -> Any:
         disk_path = str((__import__("pathlib").Path(policy.get("ssd", {}).get("path", cfg.get("models_root", "."))).resolve()))
         app.state.housekeeper_strategy = active_name  # type: ignore[attr-defined]
         app.state.housekeeper_policy = policy  # type: ignore[attr-defined]
+        try:
+            from .cache import caches
+            caches.apply_policy(policy)
+        except Exception:
+            pass
+        try:
+            from .admission import admission
+            admission.configure(hk_cfg)
+        except Exception:
+            pass
+        try:
+            from .sessions import sessions
+            sessions.apply_policy(policy)
+        except Exception:
+            pass
         if metrics_always_on:
             hk = Housekeeper(app, interval_s=interval_s, disk_path=disk_path)
             app.state._housekeeper = hk  # type: ignore[attr-defined]
@@ -232,9 +402,23 @@ def create_app() -> Any:
                     hk_obj.start()
             except Exception:
                 pass
+            loop_mon = None
+            if _os.getenv("LOOP_MONITOR_ENABLED", "1") in ("1", "true", "on"):
+                try:
+                    from .loop_monitor import LoopMonitor
+                    loop_mon = LoopMonitor()
+                    loop_mon.start()
+                    _app.state.loop_monitor = loop_mon  # type: ignore[attr-defined]
+                except Exception:
+                    loop_mon = None
             try:
                 yield
             finally:
+                if loop_mon is not None:
+                    try:
+                        await loop_mon.stop()
+                    except Exception:
+                        pass
                 try:
                     hk_obj = getattr(_app.state, "_housekeeper", None)
                     if hk_obj:
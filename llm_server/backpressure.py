@@ -0,0 +1,140 @@
+"""Beacon-driven admission and load shedding for HTTP requests.
+
+The app middleware asks `BackpressureGate.decide` before dispatching a
+request. The level comes from the housekeeper beacons (worst of RAM and
+SSD; the RAM beacon already includes PSI memory stalls) and the strategy's
+`backpressure` block:
+
+- `hot` (with `enable_soft`): low-priority and batch requests are delayed.
+  The middleware re-checks every `poll_s` for up to `hot_max_delay_s`
+  (default 2 s). If the level has not recovered by then, the request gets
+  503. Normal and high priority requests pass.
+- `critical` (with `enable_hard`): every request except health, metrics,
+  admin, `/info` and read-only discovery (`/v1/models`) gets a fast 503.
+
+Nothing is delayed or shed unless the strategy has `actions_enabled`, the
+same switch that gates the housekeeper's evictions and RAM actions.
+
+Both answers carry `Retry-After` (the strategy's `cooldown_s`). A level is
+entered immediately but left only after the beacons stayed below it for
+`cooldown_s`, so shedding does not flap with every housekeeper tick.
+
+Priority comes from the `X-Priority` header: `high`, `normal` (default),
+`low`, `batch`, or 0-9 where ≤ 3 counts as low. `X-Batch: 1` marks batch
+traffic. The parsed priority is also kept for the rest of the request
+(`current_priority()`), so the per-role queues can serve and shed by it.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import openmetrics
+from .metrics import metrics
+
+_LEVELS = ("ok", "warn", "hot", "critical")
+# Paths never shed: probes, telemetry and operator endpoints
+_EXEMPT_PREFIXES = ("/healthz", "/readyz", "/metrics", "/admin", "/info", "/docs", "/openapi.json")
+# Read-only discovery still answers when critical (hot delays still apply)
+_DISCOVERY_PATHS = ("/v1/models",)
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("request_priority", default="normal")
+
+_events = openmetrics.registry.counter("llm_backpressure_events", "Requests delayed or shed by beacon backpressure.", ("level", "action"))
+
+
+def exempt(path: str) -> bool:
+    """Health, metrics, admin and readiness endpoints bypass backpressure."""
+    return path.startswith(_EXEMPT_PREFIXES) or path.endswith("/ready")
+
+
+def parse_priority(value: Optional[str], batch: Optional[str] = None) -> str:
+    """Normalize `X-Priority`/`X-Batch` into `high|normal|low|batch`."""
+    if batch and batch.strip().lower() in ("1", "true", "yes", "on"):
+        return "batch"
+    v = (value or "").strip().lower()
+    if v in ("high", "normal", "low", "batch"):
+        return v
+    if v.isdigit():
+        n = int(v)
+        return "low" if n <= 3 else ("high" if n >= 7 else "normal")
+    return "normal"
+
+
+def set_priority(priority: str) -> None:
+    """Remember the current request's priority (middleware)."""
+    _priority.set(priority)
+
+
+def current_priority() -> str:
+    """Priority of the request being served (`normal` outside a request)."""
+    return _priority.get()
+
+
+class BackpressureGate:
+    """Level tracking with cooldown plus per-request decisions.
+
+    Args:
+        clock (Callable[[], float]): Monotonic time source.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self.level = "ok"
+        self._below_since: Optional[float] = None
+
+    def update(self, beacon: str, policy: Dict[str, Any]) -> str:
+        """Follow `beacon` upward at once and downward after `cooldown_s`."""
+        bp = policy.get("backpressure", {}) or {}
+        cooldown = float(bp.get("cooldown_s", 5))
+        b = beacon if beacon in _LEVELS else "ok"
+        now = self._clock()
+        if _LEVELS.index(b) >= _LEVELS.index(self.level):
+            self.level = b
+            self._below_since = None
+        else:
+            if self._below_since is None:
+                self._below_since = now
+            if now - self._below_since >= cooldown:
+                self.level = b
+                self._below_since = None
+        return self.level
+
+    @staticmethod
+    def beacon_from(snapshot: Optional[Dict[str, Any]]) -> str:
+        """Worst of the RAM and SSD beacons in a housekeeper snapshot (`ok` without one)."""
+        if not snapshot:
+            return "ok"
+        beacons = [(snapshot.get("ram", {}) or {}).get("beacon"), (snapshot.get("ssd", {}) or {}).get("beacon")]
+        return max((b for b in beacons if b in _LEVELS), key=_LEVELS.index, default="ok")
+
+    def decide(self, path: str, priority: str, policy: Dict[str, Any]) -> Tuple[str, float]:
+        """Decide for one request at the current level.
+
+        Returns:
+            Tuple[str, float]: (`admit` | `delay` | `reject`, retry-after seconds).
+        """
+        bp = policy.get("backpressure", {}) or {}
+        retry = float(bp.get("cooldown_s", 5))
+        if not bool(policy.get("actions_enabled", False)) or exempt(path):
+            return "admit", 0.0
+        if self.level == "critical" and bool(bp.get("enable_hard", True)) and not path.startswith(_DISCOVERY_PATHS):
+            return "reject", retry
+        if self.level == "hot" and bool(bp.get("enable_soft", True)) and priority in ("low", "batch"):
+            return "delay", retry
+        return "admit", 0.0
+
+    def record(self, action: str) -> None:
+        metrics.inc("backpressure_events_total", 1)
+        metrics.inc(f"backpressure_events_total:{action}", 1)
+        _events.inc(level=self.level, action=action)
+
+    @staticmethod
+    def delay_settings(policy: Dict[str, Any]) -> Tuple[float, float]:
+        """(max delay, poll interval) for `hot` delays."""
+        bp = policy.get("backpressure", {}) or {}
+        return float(bp.get("hot_max_delay_s", 2.0)), max(0.05, float(bp.get("poll_s", 0.25)))
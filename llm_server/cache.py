@@ -0,0 +1,501 @@
+"""Tiered RAM → SSD caches with W-TinyLFU admission.
+
+Each namespace (`prompt`, `embeddings`, `vision`, ...) is a `TieredCache`:
+
+- RAM tier: byte-accounted W-TinyLFU. New entries land in a small LRU
+  window (1% of the budget); entries leaving the window compete with the
+  LRU victim of the main segmented LRU (probation/protected) and are only
+  admitted when a count-min sketch estimates they are used more often.
+- SSD tier: byte-accounted LRU of files under the namespace directory that
+  receives everything the RAM tier evicts or rejects. Disk hits are promoted
+  back to RAM.
+
+Values are `bytes`; callers serialize. Budgets come from the `cache` block
+of the active housekeeper strategy and shrink while RAM/SSD beacons are
+hot or critical (`CacheManager.apply_policy`, called each housekeeper
+tick).
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import openmetrics
+from .metrics import metrics
+
+_requests = openmetrics.registry.counter("llm_cache_requests", "Cache lookups by result (hit_ram, hit_disk, miss).", ("namespace", "result"))
+_evictions = openmetrics.registry.counter("llm_cache_evictions", "Entries evicted per tier (ram evictions spill to disk).", ("namespace", "tier"))
+_bytes = openmetrics.registry.gauge("llm_cache_bytes", "Bytes held per tier.", ("namespace", "tier"))
+_budget = openmetrics.registry.gauge("llm_cache_budget_bytes", "Current byte budget per tier.", ("namespace", "tier"))
+
+DEFAULT_NAMESPACES: Dict[str, Dict[str, float]] = {
+    "prompt": {"ram_mb": 256, "ssd_gb": 4},
+    "embeddings": {"ram_mb": 256, "ssd_gb": 2},
+    "vision": {"ram_mb": 128, "ssd_gb": 2},
+}
+DEFAULT_SHRINK = {"ok": 1.0, "warn": 1.0, "hot": 0.5, "critical": 0.25}
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class CountMinSketch:
+    """4-row count-min sketch with 4-bit saturating counters and aging.
+
+    After `sample_size` increments every counter is halved, so the sketch
+    tracks recent frequency (TinyLFU "reset").
+
+    Args:
+        width (int): Counters per row (rounded up to a power of two).
+        sample_size (int | None): Increments between halvings (default 10×width).
+    """
+
+    DEPTH = 4
+
+    def __init__(self, width: int = 1 << 14, sample_size: Optional[int] = None) -> None:
+        w = 1
+        while w < max(16, int(width)):
+            w <<= 1
+        self.width = w
+        self._mask = w - 1
+        self._rows = [array("B", bytes(w)) for _ in range(self.DEPTH)]
+        self.sample_size = int(sample_size or 10 * w)
+        self._adds = 0
+
+    def _indexes(self, h: bytes) -> List[int]:
+        a = int.from_bytes(h[:8], "little")
+        b = int.from_bytes(h[8:16], "little") | 1
+        return [(a + i * b) & self._mask for i in range(self.DEPTH)]
+
+    def increment(self, h: bytes) -> None:
+        idx = self._indexes(h)
+        cur = min(self._rows[i][j] for i, j in enumerate(idx))
+        if cur < 15:
+            # conservative update: only raise the minimal counters
+            for i, j in enumerate(idx):
+                if self._rows[i][j] == cur:
+                    self._rows[i][j] = cur + 1
+        self._adds += 1
+        if self._adds >= self.sample_size:
+            self._age()
+
+    def estimate(self, h: bytes) -> int:
+        return min(self._rows[i][j] for i, j in enumerate(self._indexes(h)))
+
+    def _age(self) -> None:
+        for row in self._rows:
+            for j in range(self.width):
+                if row[j]:
+                    row[j] >>= 1
+        self._adds //= 2
+
+
+class _RamTier:
+    """Byte-accounted W-TinyLFU (window LRU + segmented main LRU)."""
+
+    def __init__(self, capacity: int, sketch: CountMinSketch, window_pct: float = 0.01, protected_pct: float = 0.8) -> None:
+        self.sketch = sketch
+        self.window_pct = window_pct
+        self.protected_pct = protected_pct
+        self.window: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self.probation: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self.protected: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self.window_bytes = 0
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.resize(capacity)
+
+    def resize(self, capacity: int) -> List[Tuple[bytes, bytes]]:
+        self.capacity = max(0, int(capacity))
+        self.window_cap = max(1, int(self.capacity * self.window_pct)) if self.capacity else 0
+        self.main_cap = self.capacity - self.window_cap
+        self.protected_cap = int(self.main_cap * self.protected_pct)
+        return self._shrink()
+
+    @property
+    def bytes(self) -> int:
+        return self.window_bytes + self.probation_bytes + self.protected_bytes
+
+    def __len__(self) -> int:
+        return len(self.window) + len(self.probation) + len(self.protected)
+
+    def get(self, h: bytes) -> Optional[bytes]:
+        v = self.window.get(h)
+        if v is not None:
+            self.window.move_to_end(h)
+            return v
+        v = self.protected.get(h)
+        if v is not None:
+            self.protected.move_to_end(h)
+            return v
+        v = self.probation.pop(h, None)
+        if v is None:
+            return None
+        self.probation_bytes -= len(v)
+        self.protected[h] = v
+        self.protected_bytes += len(v)
+        while self.protected_bytes > self.protected_cap and self.protected:
+            k, dv = self.protected.popitem(last=False)
+            self.protected_bytes -= len(dv)
+            self.probation[k] = dv
+            self.probation_bytes += len(dv)
+        return v
+
+    def remove(self, h: bytes) -> None:
+        for seg, attr in ((self.window, "window_bytes"), (self.probation, "probation_bytes"), (self.protected, "protected_bytes")):
+            v = seg.pop(h, None)
+            if v is not None:
+                setattr(self, attr, getattr(self, attr) - len(v))
+
+    def put(self, h: bytes, value: bytes) -> List[Tuple[bytes, bytes]]:
+        """Insert `value`; returns entries evicted or rejected by admission."""
+        self.remove(h)
+        if len(value) > self.main_cap:
+            return [(h, value)]
+        self.window[h] = value
+        self.window_bytes += len(value)
+        out: List[Tuple[bytes, bytes]] = []
+        while self.window_bytes > self.window_cap and self.window:
+            k, v = self.window.popitem(last=False)
+            self.window_bytes -= len(v)
+            out.extend(self._admit(k, v))
+        return out
+
+    def _admit(self, h: bytes, value: bytes) -> List[Tuple[bytes, bytes]]:
+        out: List[Tuple[bytes, bytes]] = []
+        freq = self.sketch.estimate(h)
+        while self.probation_bytes + self.protected_bytes + len(value) > self.main_cap:
+            seg = self.probation if self.probation else self.protected
+            if not seg:
+                return out + [(h, value)]
+            victim_h = next(iter(seg))
+            if freq <= self.sketch.estimate(victim_h):
+                # candidate loses against the victim: reject it
+                return out + [(h, value)]
+            vv = seg.pop(victim_h)
+            if seg is self.probation:
+                self.probation_bytes -= len(vv)
+            else:
+                self.protected_bytes -= len(vv)
+            out.append((victim_h, vv))
+        self.probation[h] = value
+        self.probation_bytes += len(value)
+        return out
+
+    def _shrink(self) -> List[Tuple[bytes, bytes]]:
+        out: List[Tuple[bytes, bytes]] = []
+        for seg, attr in ((self.window, "window_bytes"), (self.probation, "probation_bytes"), (self.protected, "protected_bytes")):
+            while self.bytes > self.capacity and seg:
+                k, v = seg.popitem(last=False)
+                setattr(self, attr, getattr(self, attr) - len(v))
+                out.append((k, v))
+        # keep the window within its share after a resize
+        while self.window_bytes > self.window_cap and self.window:
+            k, v = self.window.popitem(last=False)
+            self.window_bytes -= len(v)
+            out.extend(self._admit(k, v))
+        return out
+
+    def clear(self) -> int:
+        n = len(self)
+        self.window.clear()
+        self.probation.clear()
+        self.protected.clear()
+        self.window_bytes = self.probation_bytes = self.protected_bytes = 0
+        return n
+
+
+class _DiskTier:
+    """Byte-accounted LRU of files under `root` (one file per key digest)."""
+
+    def __init__(self, root: Optional[str], capacity: int) -> None:
+        self.root = root
+        self.capacity = max(0, int(capacity))
+        self.index: "OrderedDict[bytes, int]" = OrderedDict()
+        self.bytes = 0
+        if root:
+            self._load()
+
+    def _path(self, h: bytes) -> str:
+        x = h.hex()
+        return os.path.join(self.root or "", x[:2], x)
+
+    def _load(self) -> None:
+        found: List[Tuple[float, bytes, int]] = []
+        try:
+            for sub in os.scandir(self.root or ""):
+                if not sub.is_dir():
+                    continue
+                for de in os.scandir(sub.path):
+                    try:
+                        if de.name.endswith(".tmp"):
+                            os.remove(de.path)
+                            continue
+                        st = de.stat()
+                        found.append((st.st_mtime, bytes.fromhex(de.name), int(st.st_size)))
+                    except (OSError, ValueError):
+                        continue
+        except OSError:
+            return
+        for _, h, size in sorted(found):
+            self.index[h] = size
+            self.bytes += size
+
+    def get(self, h: bytes) -> Optional[bytes]:
+        if h not in self.index:
+            return None
+        try:
+            with open(self._path(h), "rb") as fh:
+                data = fh.read()
+        except OSError:
+            self.bytes -= self.index.pop(h, 0)
+            return None
+        self.index.move_to_end(h)
+        return data
+
+    def put(self, h: bytes, value: bytes) -> int:
+        """Store `value`; returns the number of entries evicted to make room."""
+        if not self.root or len(value) > self.capacity:
+            return 0
+        self.remove(h)
+        path = self._path(h)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            return 0
+        self.index[h] = len(value)
+        self.bytes += len(value)
+        return self._shrink()
+
+    def remove(self, h: bytes) -> None:
+        size = self.index.pop(h, None)
+        if size is None:
+            return
+        self.bytes -= size
+        try:
+            os.remove(self._path(h))
+        except OSError:
+            pass
+
+    def resize(self, capacity: int) -> int:
+        self.capacity = max(0, int(capacity))
+        return self._shrink()
+
+    def _shrink(self) -> int:
+        n = 0
+        while self.bytes > self.capacity and self.index:
+            self.remove(next(iter(self.index)))
+            n += 1
+        return n
+
+
+class TieredCache:
+    """One cache namespace with a RAM tier spilling into an SSD tier.
+
+    Args:
+        name (str): Namespace (metric label, directory name).
+        ram_bytes (int): RAM budget.
+        disk_bytes (int): SSD budget (0 disables the tier).
+        disk_dir (str | None): Directory for the SSD tier.
+        sketch_width (int): Count-min sketch width.
+    """
+
+    def __init__(self, name: str, ram_bytes: int, disk_bytes: int = 0, disk_dir: Optional[str] = None, sketch_width: int = 1 << 14) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self.sketch = CountMinSketch(sketch_width)
+        self.ram = _RamTier(ram_bytes, self.sketch)
+        self.disk = _DiskTier(disk_dir if disk_bytes > 0 else None, disk_bytes)
+        self.base_ram_bytes = int(ram_bytes)
+        self.base_disk_bytes = int(disk_bytes)
+        self.hits_ram = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions_ram = 0
+        self.evictions_disk = 0
+        self._publish_budget()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Look up `key` (RAM, then SSD with promotion)."""
+        h = _digest(key)
+        with self._lock:
+            self.sketch.increment(h)
+            v = self.ram.get(h)
+            if v is not None:
+                self.hits_ram += 1
+                result = "hit_ram"
+            else:
+                v = self.disk.get(h)
+                if v is not None:
+                    self.hits_disk += 1
+                    result = "hit_disk"
+                    self.disk.remove(h)
+                    self._spill(self.ram.put(h, v))
+                else:
+                    self.misses += 1
+                    result = "miss"
+        _requests.inc(namespace=self.name, result=result)
+        metrics.inc(f"cache_{'misses' if result == 'miss' else 'hits'}_total:{self.name}", 1)
+        return v
+
+    def put(self, key: str, value: bytes) -> None:
+        """Insert `value` under `key` (subject to W-TinyLFU admission)."""
+        h = _digest(key)
+        with self._lock:
+            self.sketch.increment(h)
+            self.disk.remove(h)
+            self._spill(self.ram.put(h, bytes(value)))
+        self._publish_bytes()
+
+    def _spill(self, evicted: List[Tuple[bytes, bytes]]) -> None:
+        if not evicted:
+            return
+        self.evictions_ram += len(evicted)
+        _evictions.inc(len(evicted), namespace=self.name, tier="ram")
+        n = 0
+        for h, v in evicted:
+            n += self.disk.put(h, v)
+        if n:
+            self.evictions_disk += n
+            _evictions.inc(n, namespace=self.name, tier="disk")
+
+    def resize(self, ram_bytes: int, disk_bytes: int) -> None:
+        """Apply new budgets, evicting down to them."""
+        with self._lock:
+            if ram_bytes != self.ram.capacity:
+                self._spill(self.ram.resize(ram_bytes))
+            if disk_bytes != self.disk.capacity:
+                n = self.disk.resize(disk_bytes)
+                if n:
+                    self.evictions_disk += n
+                    _evictions.inc(n, namespace=self.name, tier="disk")
+        self._publish_budget()
+        self._publish_bytes()
+
+    def drop_ram(self) -> int:
+        """Drop the RAM tier (entries are not spilled); returns entries dropped."""
+        with self._lock:
+            n = self.ram.clear()
+        self._publish_bytes()
+        return n
+
+    def _publish_bytes(self) -> None:
+        _bytes.set(float(self.ram.bytes), namespace=self.name, tier="ram")
+        _bytes.set(float(self.disk.bytes), namespace=self.name, tier="disk")
+
+    def _publish_budget(self) -> None:
+        _budget.set(float(self.ram.capacity), namespace=self.name, tier="ram")
+        _budget.set(float(self.disk.capacity), namespace=self.name, tier="disk")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits_ram + self.hits_disk + self.misses
+            return {
+                "ram_bytes": self.ram.bytes,
+                "ram_budget": self.ram.capacity,
+                "ram_entries": len(self.ram),
+                "disk_bytes": self.disk.bytes,
+                "disk_budget": self.disk.capacity,
+                "disk_entries": len(self.disk.index),
+                "hits_ram": self.hits_ram,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits_ram + self.hits_disk) / lookups, 4) if lookups else 0.0,
+                "evictions_ram": self.evictions_ram,
+                "evictions_disk": self.evictions_disk,
+            }
+
+
+class CacheManager:
+    """Registry of cache namespaces sized from the housekeeper policy.
+
+    Policy block (per strategy in `housekeeper.yaml`)::
+
+        cache:
+          dir: runtime/cache
+          namespaces: {embeddings: {ram_mb: 256, ssd_gb: 2}, ...}
+          shrink: {hot: 0.5, critical: 0.25}
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ns: Dict[str, TieredCache] = {}
+        self.dir = str(Path("runtime") / "cache")
+        self.factors = {"ram": 1.0, "ssd": 1.0}
+
+    def get(self, name: str) -> TieredCache:
+        """Return namespace `name`, creating it with default budgets if needed."""
+        c = self._ns.get(name)
+        if c is not None:
+            return c
+        with self._lock:
+            c = self._ns.get(name)
+            if c is None:
+                spec = DEFAULT_NAMESPACES.get(name, {"ram_mb": 64, "ssd_gb": 0})
+                c = self._create(name, spec)
+            return c
+
+    def _create(self, name: str, spec: Dict[str, float]) -> TieredCache:
+        ram = int(float(spec.get("ram_mb", 64)) * 1024 ** 2)
+        disk = int(float(spec.get("ssd_gb", 0)) * 1024 ** 3)
+        c = TieredCache(name, int(ram * self.factors["ram"]), int(disk * self.factors["ssd"]), os.path.join(self.dir, name))
+        c.base_ram_bytes, c.base_disk_bytes = ram, disk
+        self._ns[name] = c
+        return c
+
+    def names(self) -> List[str]:
+        return sorted(self._ns)
+
+    def apply_policy(self, policy: Dict[str, object], ram_beacon: str = "ok", ssd_beacon: str = "ok") -> Dict[str, float]:
+        """Size namespaces from `policy['cache']`, scaled down on hot beacons.
+
+        Returns:
+            Dict[str, float]: Applied `ram`/`ssd` budget factors.
+        """
+        cfg = (policy or {}).get("cache") or {}
+        if not isinstance(cfg, dict):
+            cfg = {}
+        shrink = dict(DEFAULT_SHRINK)
+        shrink.update(cfg.get("shrink") or {})  # type: ignore[arg-type]
+        ram_f = float(shrink.get(ram_beacon, 1.0))
+        ssd_f = float(shrink.get(ssd_beacon, 1.0))
+        specs = dict(DEFAULT_NAMESPACES)
+        specs.update(cfg.get("namespaces") or {})  # type: ignore[arg-type]
+        with self._lock:
+            self.factors = {"ram": ram_f, "ssd": ssd_f}
+            if cfg.get("dir"):
+                self.dir = str(cfg.get("dir"))
+            for name, spec in specs.items():
+                c = self._ns.get(name)
+                if c is None:
+                    self._create(name, spec)
+                    continue
+                c.base_ram_bytes = int(float(spec.get("ram_mb", 64)) * 1024 ** 2)
+                c.base_disk_bytes = int(float(spec.get("ssd_gb", 0)) * 1024 ** 3)
+            items = list(self._ns.values())
+        for c in items:
+            c.resize(int(c.base_ram_bytes * ram_f), int(c.base_disk_bytes * ssd_f))
+        return dict(self.factors)
+
+    def drop_ram(self) -> int:
+        """Drop every RAM tier; returns the number of entries dropped."""
+        return sum(c.drop_ram() for c in list(self._ns.values()))
+
+    def stats(self) -> Dict[str, object]:
+        return {"factors": dict(self.factors), "namespaces": {n: c.stats() for n, c in sorted(self._ns.items())}}
+
+
+caches = CacheManager()
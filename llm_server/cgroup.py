@@ -0,0 +1,263 @@
+"""Container-aware resource limits (cgroup v2, with a v1 fallback).
+
+Inside a container `psutil.virtual_memory()` and `os.cpu_count()` describe
+the host. The cgroup OOM killer acts at `memory.max`, however, and CPU time
+is capped by `cpu.max`. This module reads the effective limits of the
+server's own cgroup:
+
+- memory: `memory.max` (minimum over ancestors), `memory.high`,
+  `memory.current`, `memory.events` (`high`, `max`, `oom`, `oom_kill`) and
+  the `memory.stat` breakdown (`anon`, `file`, `file_mapped`,
+  `active_file`, `inactive_file`, `shmem`, ...);
+- cpu: `cpu.max` quota/period (minimum over ancestors) and the cpuset
+  affinity of the process.
+
+`memory_view()` turns these into the numbers the housekeeper uses. The
+total is the limit and "used" is the working set (`current` minus
+`inactive_file`, which the kernel reclaims first), so available is
+`limit - working set`. `cpu_limit()` is the number of CPUs the quota
+allows.
+
+Paths are injectable for tests: `CGROUP_ROOT` (default `/sys/fs/cgroup`)
+and `CGROUP_PROC_SELF` (default `/proc/self/cgroup`).
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+_UNLIMITED_V1 = 1 << 60  # v1 reports ~2^63 rounded down to the page size
+
+
+def cgroup_root() -> str:
+    return os.getenv("CGROUP_ROOT", "/sys/fs/cgroup")
+
+
+def _proc_self() -> str:
+    return os.getenv("CGROUP_PROC_SELF", "/proc/self/cgroup")
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="ascii") as fh:
+            return fh.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(path: str) -> Optional[int]:
+    v = _read(path)
+    if v is None or v == "max":
+        return None
+    try:
+        return int(v)
+    except ValueError:
+        return None
+
+
+def _read_kv(path: str) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    data = _read(path)
+    if not data:
+        return out
+    for line in data.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            try:
+                out[parts[0]] = int(parts[1])
+            except ValueError:
+                continue
+    return out
+
+
+def _membership(proc_self: Optional[str] = None) -> Tuple[Optional[str], Dict[str, str]]:
+    """Parse `/proc/self/cgroup` into (v2 path, v1 controller → path)."""
+    v2: Optional[str] = None
+    v1: Dict[str, str] = {}
+    data = _read(proc_self or _proc_self()) or ""
+    for line in data.splitlines():
+        parts = line.split(":", 2)
+        if len(parts) != 3:
+            continue
+        _, ctrls, path = parts
+        if ctrls == "":
+            v2 = path
+        else:
+            for c in ctrls.split(","):
+                v1[c] = path
+    return v2, v1
+
+
+def _ancestors(root: str, rel: str) -> List[str]:
+    """Cgroup dir for `rel` and its parents up to `root` (existing dirs only)."""
+    out: List[str] = []
+    rel = (rel or "/").strip("/")
+    parts = rel.split("/") if rel else []
+    for i in range(len(parts), -1, -1):
+        d = os.path.join(root, *parts[:i]) if i else root
+        if os.path.isdir(d):
+            out.append(d)
+    return out
+
+
+def _min_limit(values: List[Optional[int]]) -> Optional[int]:
+    vals = [v for v in values if v is not None and 0 < v < _UNLIMITED_V1]
+    return min(vals) if vals else None
+
+
+def _cpu_max(path: str) -> Optional[float]:
+    data = _read(path)
+    if not data:
+        return None
+    parts = data.split()
+    if len(parts) != 2 or parts[0] == "max":
+        return None
+    try:
+        quota, period = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def _affinity() -> Optional[int]:
+    try:
+        return len(os.sched_getaffinity(0))
+    except Exception:
+        return None
+
+
+def read(root: Optional[str] = None, proc_self: Optional[str] = None) -> Dict[str, Any]:
+    """Detect the cgroup of this process and read its limits and usage.
+
+    Returns:
+        dict: `version` (`2`, `1` or None), `path`, `memory` (`max_bytes`,
+        `high_bytes`, `current_bytes`, `events`, `stat`) and `cpu`
+        (`quota_cpus`, `cpuset_cpus`). Missing values are None.
+    """
+    root = root or cgroup_root()
+    v2_rel, v1 = _membership(proc_self)
+    info: Dict[str, Any] = {"version": None, "path": None, "memory": {}, "cpu": {"cpuset_cpus": _affinity()}}
+    if v2_rel is not None and os.path.exists(os.path.join(root, "cgroup.controllers")):
+        dirs = _ancestors(root, v2_rel)
+        own = dirs[0] if dirs else root
+        info["version"] = 2
+        info["path"] = own
+        info["memory"] = {
+            "max_bytes": _min_limit([_read_int(os.path.join(d, "memory.max")) for d in dirs]),
+            "high_bytes": _min_limit([_read_int(os.path.join(d, "memory.high")) for d in dirs]),
+            "current_bytes": _read_int(os.path.join(own, "memory.current")),
+            "events": _read_kv(os.path.join(own, "memory.events")),
+            "stat": _read_kv(os.path.join(own, "memory.stat")),
+        }
+        quotas = [_cpu_max(os.path.join(d, "cpu.max")) for d in dirs]
+        quotas = [q for q in quotas if q is not None]
+        info["cpu"]["quota_cpus"] = min(quotas) if quotas else None
+        return info
+    mem_rel = v1.get("memory")
+    if mem_rel is not None:
+        base = os.path.join(root, "memory")
+        dirs = _ancestors(base, mem_rel) or []
+        own = dirs[0] if dirs else base
+        stat = _read_kv(os.path.join(own, "memory.stat"))
+        info["version"] = 1
+        info["path"] = own
+        info["memory"] = {
+            "max_bytes": _min_limit([_read_int(os.path.join(d, "memory.limit_in_bytes")) for d in dirs]),
+            "high_bytes": None,
+            "current_bytes": _read_int(os.path.join(own, "memory.usage_in_bytes")),
+            "events": {"oom_kill": stat.get("oom_kill", 0)} if "oom_kill" in stat else {},
+            "stat": {"anon": stat.get("total_rss", stat.get("rss", 0)), "file": stat.get("total_cache", stat.get("cache", 0)),
+                     "inactive_file": stat.get("total_inactive_file", stat.get("inactive_file", 0)),
+                     "active_file": stat.get("total_active_file", stat.get("active_file", 0)),
+                     "file_mapped": stat.get("total_mapped_file", stat.get("mapped_file", 0))},
+        }
+        cpu_rel = v1.get("cpu", v1.get("cpuacct"))
+        if cpu_rel is not None:
+            cpu_base = os.path.join(root, "cpu")
+            quota = _read_int(os.path.join(cpu_base, cpu_rel.lstrip("/"), "cpu.cfs_quota_us"))
+            period = _read_int(os.path.join(cpu_base, cpu_rel.lstrip("/"), "cpu.cfs_period_us"))
+            info["cpu"]["quota_cpus"] = quota / period if quota and quota > 0 and period else None
+    return info
+
+
+def memory_view(info: Dict[str, Any], host_total: float, host_avail: float) -> Optional[Dict[str, float]]:
+    """Effective memory (bytes) when a cgroup limit is tighter than the host.
+
+    Args:
+        info (dict): Result of `read()`.
+        host_total (float): Host total memory in bytes.
+        host_avail (float): Host available memory in bytes.
+
+    Returns:
+        dict | None: `total`, `available`, `working_set`, `limit` in bytes, or
+        None when there is no binding cgroup limit.
+    """
+    mem = info.get("memory", {}) or {}
+    limit = mem.get("max_bytes")
+    high = mem.get("high_bytes")
+    if high is not None and (limit is None or high < limit):
+        limit = high  # memory.high throttles (and reclaims) before memory.max
+    current = mem.get("current_bytes")
+    if limit is None or current is None or (host_total > 0 and limit >= host_total):
+        return None
+    inactive = float((mem.get("stat", {}) or {}).get("inactive_file", 0))
+    working = max(0.0, float(current) - inactive)
+    avail = max(0.0, float(limit) - working)
+    if host_avail > 0:
+        avail = min(avail, host_avail)
+    return {"total": float(limit), "available": avail, "working_set": working, "limit": float(limit)}
+
+
+def cpu_limit(info: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """CPUs usable by this process (quota rounded up, bounded by the cpuset)."""
+    info = info if info is not None else limits()
+    cpu = info.get("cpu", {}) or {}
+    cands = []
+    if cpu.get("quota_cpus"):
+        cands.append(max(1, int(math.ceil(float(cpu["quota_cpus"]) - 1e-9))))
+    if cpu.get("cpuset_cpus"):
+        cands.append(int(cpu["cpuset_cpus"]))
+    return min(cands) if cands else None
+
+
+_cached: Optional[Dict[str, Any]] = None
+
+
+def limits(refresh: bool = False) -> Dict[str, Any]:
+    """Cached `read()` result (limits rarely change); `refresh=True` re-reads."""
+    global _cached
+    if _cached is None or refresh:
+        try:
+            _cached = read()
+        except Exception:
+            _cached = {"version": None, "path": None, "memory": {}, "cpu": {}}
+    return _cached
+
+
+def summary(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Compact, JSON-friendly view for `/info` and the housekeeper snapshot."""
+    mem = info.get("memory", {}) or {}
+    stat = mem.get("stat", {}) or {}
+    gb = float(1024 ** 3)
+
+    def _gb(v: Optional[float]) -> Optional[float]:
+        return round(float(v) / gb, 3) if v is not None else None
+
+    return {
+        "version": info.get("version"),
+        "path": info.get("path"),
+        "memory_max_gb": _gb(mem.get("max_bytes")),
+        "memory_high_gb": _gb(mem.get("high_bytes")),
+        "memory_current_gb": _gb(mem.get("current_bytes")),
+        "page_cache_gb": _gb(stat.get("file")) if "file" in stat else None,
+        "anon_gb": _gb(stat.get("anon")) if "anon" in stat else None,
+        "inactive_file_gb": _gb(stat.get("inactive_file")) if "inactive_file" in stat else None,
+        "events": dict(mem.get("events", {}) or {}),
+        "cpu_quota": (info.get("cpu", {}) or {}).get("quota_cpus"),
+        "cpuset_cpus": (info.get("cpu", {}) or {}).get("cpuset_cpus"),
+        "cpu_limit": cpu_limit(info),
+    }
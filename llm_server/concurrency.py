@@ -1,37 +1,288 @@
+"""Per-role concurrency gates with CoDel-style queue management.
+
+Each role has a gate with a (scalable) slot limit. Waiters are served by
+priority (`high`, `normal`, `low`, `batch`), then in arrival order.
+
+Queue delay is managed like CoDel. Each request's sojourn time (time spent
+waiting for a slot, or the head waiter's age while nothing is dequeued) is
+compared to the role's `target_ms`. Once it has stayed above the target for
+`interval_ms`, the gate enters a shedding state. It sheds one waiter
+immediately, then the next after `interval / sqrt(count)`, and so on. Each
+shed waiter is the lowest-priority one, newest first. Shedding stops as
+soon as a sojourn falls below the target. A shed waiter raises
+`QueueShed`, and the API answers it with 503 (or the configured status)
+plus `Retry-After`.
+
+Targets come from the `queue` block of `configs/limits.yaml`: `default`
+plus per-role overrides.
+
+Google-style docstrings for automatic documentation.
+"""
+
 from __future__ import annotations
 
+import math
 import threading
+import time
 from contextlib import contextmanager
-from typing import Dict
+from typing import Any, Callable, Dict, List, Optional
 
+from . import openmetrics
 from .config_loader import build_effective_config
+from .metrics import metrics
+
+PRIORITY_RANK = {"high": 0, "normal": 1, "low": 2, "batch": 3}
+
+_shed = openmetrics.registry.counter("llm_queue_shed", "Requests shed by CoDel queue management.", ("role", "model", "priority"))
+
+
+class QueueShed(Exception):
+    """Raised in a waiter shed by queue management.
+
+    Attributes:
+        role (str): Role whose queue shed the request.
+        sojourn_ms (float): Time the request had waited.
+        retry_after_s (int): Suggested client back-off.
+        status (int): HTTP status to answer with (503 or 429).
+    """
+
+    def __init__(self, role: str, sojourn_ms: float, retry_after_s: int, status: int = 503) -> None:
+        super().__init__(f"request shed: queue delay for role '{role}' above target ({sojourn_ms:.0f} ms waited)")
+        self.role = role
+        self.sojourn_ms = sojourn_ms
+        self.retry_after_s = int(retry_after_s)
+        self.status = int(status)
+
+
+class _Waiter:
+    __slots__ = ("t", "rank", "seq", "priority", "shed")
+
+    def __init__(self, t: float, priority: str, seq: int) -> None:
+        self.t = t
+        self.priority = priority
+        self.rank = PRIORITY_RANK.get(priority, 1)
+        self.seq = seq
+        self.shed = False
+
+
+class _RoleGate:
+    """Counting gate whose limit can change while requests hold slots.
+
+    Lowering the limit never interrupts running work: new acquirers wait
+    until enough holders have released.
+
+    Args:
+        limit (int): Slots (0 = unlimited).
+        role (str): Role name (metrics/errors).
+        queue_cfg (dict | None): `target_ms`, `interval_ms`, `retry_after_s`, `status`;
+            a missing or zero target disables shedding.
+        clock (Callable[[], float]): Monotonic time source.
+    """
+
+    def __init__(self, limit: int, role: str = "", queue_cfg: Optional[Dict[str, Any]] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.limit = limit  # 0 = unlimited
+        self.role = role
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._clock = clock
+        self._queue: List[_Waiter] = []
+        self._seq = 0
+        q = queue_cfg or {}
+        self.target_s = max(0.0, float(q.get("target_ms", 0))) / 1000.0
+        self.interval_s = max(0.001, float(q.get("interval_ms", 100)) / 1000.0)
+        self.retry_after_s = int(q.get("retry_after_s", max(1, math.ceil(self.target_s))))
+        self.status = int(q.get("status", 503))
+        # CoDel state
+        self._first_above: Optional[float] = None
+        self.dropping = False
+        self._drop_count = 0
+        self._drop_next = 0.0
+        self.shed_total = 0
+        self.last_sojourn_ms = 0.0
+
+    def _head(self) -> Optional[_Waiter]:
+        return min(self._queue, key=lambda w: (w.rank, w.seq)) if self._queue else None
+
+    def _codel(self, now: float, sojourn: float) -> None:
+        if self.target_s <= 0:
+            return
+        if sojourn < self.target_s:
+            self._first_above = None
+            self.dropping = False
+            self._drop_count = 0
+            return
+        if self._first_above is None:
+            self._first_above = now + self.interval_s
+        elif not self.dropping and now >= self._first_above:
+            self.dropping = True
+            self._drop_next = now
+
+    def _maybe_shed(self, now: float) -> None:
+        if not self.dropping or now < self._drop_next:
+            return
+        # nothing to gain from shedding the only request that will get the next slot
+        if len(self._queue) <= 1 and self.limit > 0 and self.active < self.limit:
+            return
+        victims = [w for w in self._queue if not w.shed]
+        if not victims:
+            return
+        victim = max(victims, key=lambda w: (w.rank, w.seq))  # lowest priority, newest
+        victim.shed = True
+        self._queue.remove(victim)
+        self._drop_count += 1
+        self._drop_next = now + self.interval_s / math.sqrt(self._drop_count)
+        self._cond.notify_all()
+
+    def acquire(self, priority: str = "normal", model: str = "") -> float:
+        """Wait for a slot; returns the sojourn time in seconds.
+
+        Raises:
+            QueueShed: When queue management sheds this waiter.
+        """
+        poll = min(1.0, max(0.02, self.target_s / 4.0)) if self.target_s > 0 else None
+        with self._cond:
+            now = self._clock()
+            self._seq += 1
+            w = _Waiter(now, priority, self._seq)
+            self._queue.append(w)
+            self.waiting += 1
+            try:
+                while True:
+                    if w.shed:
+                        self.shed_total += 1
+                        sojourn_ms = (self._clock() - w.t) * 1000.0
+                        metrics.inc(f"queue_shed_total:{self.role}", 1)
+                        _shed.inc(role=self.role, model=model or "unknown", priority=priority)
+                        raise QueueShed(self.role, sojourn_ms, self.retry_after_s, self.status)
+                    if (self.limit <= 0 or self.active < self.limit) and self._head() is w:
+                        break
+                    now = self._clock()
+                    head = self._head()
+                    if head is not None:
+                        # the head's age stands in for sojourn while nothing dequeues
+                        self._codel(now, now - head.t)
+                        self._maybe_shed(now)
+                    if not w.shed:
+                        self._cond.wait(poll)
+            finally:
+                self.waiting -= 1
+                if w in self._queue:
+                    self._queue.remove(w)
+                    self._cond.notify_all()
+            now = self._clock()
+            sojourn = now - w.t
+            self._codel(now, sojourn)
+            self.last_sojourn_ms = sojourn * 1000.0
+            self.active += 1
+            return sojourn
+
+    def release(self) -> None:
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def set_limit(self, limit: int) -> None:
+        with self._cond:
+            self.limit = max(0, int(limit))
+            self._cond.notify_all()
 
 
 class ConcurrencyManager:
     def __init__(self) -> None:
         cfg = build_effective_config()
+        limits = cfg.get("limits", {}) or {}
         # Priority: profile.concurrency > limits.concurrency
-        limits_cc = (cfg.get("limits", {}) or {}).get("concurrency", {})
+        limits_cc = limits.get("concurrency", {})
         prof_cc = cfg.get("concurrency", {}) or {}
         merged: Dict[str, int] = dict(limits_cc)
         merged.update({k: int(v) for k, v in prof_cc.items()})
         self._limits: Dict[str, int] = {k: (v if v > 0 else 0) for k, v in merged.items()}
-        self._locks: Dict[str, threading.Semaphore] = {
-            role: threading.Semaphore(max(1, limit)) if limit > 0 else threading.Semaphore(2**31 - 1)
-            for role, limit in self._limits.items()
-        }
+        self._queue_cfg: Dict[str, Dict[str, Any]] = dict(limits.get("queue", {}) or {})
+        self._locks: Dict[str, _RoleGate] = {role: self._new_gate(role, limit) for role, limit in self._limits.items()}
+        # Limit scaling per source (e.g. "ram", "thermal"); applied as a product
+        self.factors: Dict[str, float] = {}
+        self.factor = 1.0
+
+    def queue_config(self, role: str) -> Dict[str, Any]:
+        """CoDel settings for `role` (`queue.default` merged with `queue.<role>`)."""
+        out = dict(self._queue_cfg.get("default", {}) or {})
+        out.update(self._queue_cfg.get(role, {}) or {})
+        return out
+
+    def _new_gate(self, role: str, limit: int) -> _RoleGate:
+        return _RoleGate(limit, role=role, queue_cfg=self.queue_config(role))
 
     def limit_for(self, role: str) -> int:
+        """Configured (unscaled) limit for `role`."""
         return int(self._limits.get(role, 1))
 
+    def effective_limit(self, role: str) -> int:
+        """Current limit for `role` after scaling (0 = unlimited)."""
+        return self._gate(role).limit
+
+    def _gate(self, role: str) -> _RoleGate:
+        gate = self._locks.get(role)
+        if gate is None:
+            gate = self._locks.setdefault(role, self._new_gate(role, self._scaled(self.limit_for(role))))
+        return gate
+
+    def _scaled(self, base: int) -> int:
+        if base <= 0:
+            return 0
+        return max(1, int(base * self.factor))
+
+    def scale(self, factor: float, source: str = "ram") -> Dict[str, int]:
+        """Scale every role limit by `factor` on behalf of `source`.
+
+        Factors from different sources multiply; each limit is floored and
+        keeps at least 1 slot. Unlimited roles (limit 0) stay unlimited.
+        `scale(1.0, source)` removes that source's reduction.
+
+        Returns:
+            Dict[str, int]: Effective limits per role.
+        """
+        self.factors[source] = max(0.0, min(1.0, float(factor)))
+        f = 1.0
+        for v in self.factors.values():
+            f *= v
+        self.factor = f
+        for role, gate in list(self._locks.items()):
+            gate.set_limit(self._scaled(self.limit_for(role)))
+        return {r: g.limit for r, g in self._locks.items()}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Limit, active, waiting and queue-management state per role."""
+        return {
+            r: {
+                "limit": g.limit,
+                "configured": self.limit_for(r),
+                "active": g.active,
+                "waiting": g.waiting,
+                "shedding": g.dropping,
+                "shed_total": g.shed_total,
+                "last_sojourn_ms": round(g.last_sojourn_ms, 1),
+            }
+            for r, g in self._locks.items()
+        }
+
     @contextmanager
-    def acquire(self, role: str):
-        sem = self._locks.get(role)
-        if sem is None:
-            sem = self._locks.setdefault(role, threading.Semaphore(self.limit_for(role)))
-        sem.acquire()
+    def acquire(self, role: str, priority: Optional[str] = None, model: str = ""):
+        """Hold a slot of `role`; `priority` defaults to the request's `X-Priority`.
+
+        Raises:
+            QueueShed: When queue management sheds the request.
+        """
+        if priority is None:
+            from .backpressure import current_priority
+            priority = current_priority()
+        gate = self._gate(role)
+        sojourn = gate.acquire(priority, model)
+        try:
+            metrics.observe_duration(f"queue_sojourn:{role}", sojourn * 1000.0)
+        except Exception:
+            pass
         try:
             yield
         finally:
-            sem.release()
-
+            gate.release()
@@ -0,0 +1,320 @@
+"""Incremental LRU index of files under the SSD eviction directories.
+
+The housekeeper used to walk every eviction directory, stat every file and
+sort the whole list on each tick under SSD pressure. `EvictionIndex` builds
+a min-heap of `(mtime, dir, name, size)` once (in time-sliced steps) and
+keeps it current cheaply:
+
+- Each refresh stats only the directories. A directory whose mtime changed
+  (files created, deleted or renamed in it) is re-listed; only names not
+  seen before are stat'ed.
+- Files modified in place do not change their directory mtime, so entries
+  are re-stat'ed lazily when they reach the top of the heap and pushed back
+  when they turned out to be newer.
+
+Stale heap entries are skipped on pop and the heap is compacted when they
+outnumber live ones. Directories starting with `.` are not indexed.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+# (mtime, directory, file name, size); the directory string is shared per dir
+Entry = Tuple[float, str, str, int]
+
+
+class EvictionIndex:
+    """Oldest-first file index over a set of root directories.
+
+    Args:
+        roots (Iterable[str]): Directories to index recursively.
+        clock (Callable[[], float]): Monotonic time source for time budgets.
+    """
+
+    def __init__(self, roots: Iterable[str] = (), clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self.roots: Tuple[str, ...] = ()
+        self._reset()
+        self.set_roots(roots)
+
+    def _reset(self) -> None:
+        self._heap: List[Entry] = []
+        self._files: Dict[str, Dict[str, Entry]] = {}
+        self._subdirs: Dict[str, Set[str]] = {}
+        self._dir_mtime: Dict[str, int] = {}
+        self._pending: Deque[str] = deque()
+        self._check: List[str] = []
+        self._cursor = 0
+        self.total_bytes = 0
+        self.file_count = 0
+        self.scans = 0
+
+    def set_roots(self, roots: Iterable[str]) -> None:
+        """Change the indexed roots (the index is rebuilt when they differ)."""
+        new = tuple(dict.fromkeys(os.path.abspath(r) for r in roots))
+        if new == self.roots:
+            return
+        self.roots = new
+        self._reset()
+        self._pending.extend(self.roots)
+
+    @property
+    def ready(self) -> bool:
+        """Whether the initial build has completed (no directory left to scan)."""
+        return not self._pending
+
+    def __len__(self) -> int:
+        return self.file_count
+
+    # -- directory scanning -------------------------------------------------
+
+    def _scan_dir(self, d: str) -> None:
+        try:
+            mtime_ns = os.stat(d).st_mtime_ns
+            it = os.scandir(d)
+        except OSError:
+            self._drop_dir(d)
+            return
+        self.scans += 1
+        old = self._files.get(d, {})
+        new: Dict[str, Entry] = {}
+        subs: Set[str] = set()
+        with it:
+            for de in it:
+                try:
+                    if de.is_dir(follow_symlinks=False):
+                        if not de.name.startswith("."):
+                            subs.add(de.path)
+                        continue
+                    prev = old.get(de.name)
+                    if prev is not None:
+                        # unchanged name: trust the entry, re-stat lazily on pop
+                        new[de.name] = prev
+                        continue
+                    if not de.is_file(follow_symlinks=False):
+                        continue
+                    st = de.stat(follow_symlinks=False)
+                    e: Entry = (st.st_mtime, d, de.name, int(st.st_size))
+                    new[de.name] = e
+                    heapq.heappush(self._heap, e)
+                    self.total_bytes += e[3]
+                    self.file_count += 1
+                except OSError:
+                    continue
+        for name, e in old.items():
+            if name not in new:
+                self.total_bytes -= e[3]
+                self.file_count -= 1
+        self._files[d] = new
+        self._dir_mtime[d] = mtime_ns
+        prev_subs = self._subdirs.get(d, set())
+        for s in prev_subs - subs:
+            self._drop_dir(s)
+        for s in subs - prev_subs:
+            self._pending.append(s)
+        self._subdirs[d] = subs
+
+    def _drop_dir(self, d: str) -> None:
+        for e in self._files.pop(d, {}).values():
+            self.total_bytes -= e[3]
+            self.file_count -= 1
+        self._dir_mtime.pop(d, None)
+        for s in self._subdirs.pop(d, set()):
+            self._drop_dir(s)
+
+    def refresh(self, budget_s: float = 0.5) -> bool:
+        """Bring the index up to date within a time budget.
+
+        Pending directories (initial build, new subdirectories) are scanned
+        first, then known directories are checked for mtime changes,
+        resuming where the previous call stopped.
+
+        Args:
+            budget_s (float): Wall-time budget for this call.
+
+        Returns:
+            bool: True when every directory was checked within the budget.
+        """
+        deadline = self._clock() + max(0.0, budget_s)
+        for r in self.roots:
+            if r not in self._dir_mtime and r not in self._pending and os.path.isdir(r):
+                self._pending.append(r)
+        while self._pending:
+            if self._clock() >= deadline:
+                return False
+            self._scan_dir(self._pending.popleft())
+        if self._cursor == 0:
+            self._check = list(self._dir_mtime)
+        while self._cursor < len(self._check):
+            if self._clock() >= deadline:
+                return False
+            d = self._check[self._cursor]
+            self._cursor += 1
+            known = self._dir_mtime.get(d)
+            if known is None:
+                continue
+            try:
+                changed = os.stat(d).st_mtime_ns != known
+            except OSError:
+                self._drop_dir(d)
+                continue
+            if changed:
+                self._scan_dir(d)
+        self._cursor = 0
+        # scans may have queued new subdirectories
+        while self._pending and self._clock() < deadline:
+            self._scan_dir(self._pending.popleft())
+        self._maybe_compact()
+        return not self._pending
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 2 * self.file_count + 1024:
+            self._heap = [e for files in self._files.values() for e in files.values()]
+            heapq.heapify(self._heap)
+
+    # -- selection ----------------------------------------------------------
+
+    def _valid(self, e: Entry) -> bool:
+        files = self._files.get(e[1])
+        return files is not None and files.get(e[2]) is e
+
+    def _forget(self, e: Entry) -> None:
+        files = self._files.get(e[1])
+        if files is not None and files.get(e[2]) is e:
+            del files[e[2]]
+            self.total_bytes -= e[3]
+            self.file_count -= 1
+
+    def _readd(self, e: Entry) -> None:
+        files = self._files.get(e[1])
+        if files is None or e[2] in files:
+            return
+        files[e[2]] = e
+        heapq.heappush(self._heap, e)
+        self.total_bytes += e[3]
+        self.file_count += 1
+
+    def pop_oldest(self, target_bytes: int, max_files: int = 0, deadline: Optional[float] = None) -> List[Entry]:
+        """Remove and return the oldest files until `target_bytes` is covered.
+
+        Each candidate is re-stat'ed: vanished files are dropped and files
+        modified since indexing are re-queued at their new position.
+
+        Args:
+            target_bytes (int): Bytes to cover.
+            max_files (int): Stop after this many files (0 = unbounded).
+            deadline (float | None): Clock value after which selection stops.
+
+        Returns:
+            List[Entry]: Selected entries, oldest first (no longer indexed).
+        """
+        out: List[Entry] = []
+        total = 0
+        while self._heap and total < target_bytes:
+            if max_files and len(out) >= max_files:
+                break
+            if deadline is not None and self._clock() >= deadline:
+                break
+            e = heapq.heappop(self._heap)
+            if not self._valid(e):
+                continue
+            try:
+                st = os.stat(os.path.join(e[1], e[2]))
+            except OSError:
+                self._forget(e)
+                continue
+            if st.st_mtime != e[0] or int(st.st_size) != e[3]:
+                self._forget(e)
+                self._readd((st.st_mtime, e[1], e[2], int(st.st_size)))
+                continue
+            self._forget(e)
+            out.append(e)
+            total += e[3]
+        return out
+
+    def plan(self, target_bytes: int, deadline: Optional[float] = None) -> Tuple[List[str], int]:
+        """Select the oldest files covering `target_bytes` without removing them.
+
+        Returns:
+            Tuple[List[str], int]: (file paths, total bytes).
+        """
+        chosen = self.pop_oldest(target_bytes, deadline=deadline)
+        for e in chosen:
+            self._readd(e)
+        return [os.path.join(e[1], e[2]) for e in chosen], sum(e[3] for e in chosen)
+
+    def evict(self, target_bytes: int, budget_s: float = 1.0, chunk_files: int = 256, pause_s: float = 0.005, remove: Callable[[str], None] = os.remove) -> Tuple[int, int]:
+        """Delete the oldest files in time-sliced chunks.
+
+        Args:
+            target_bytes (int): Bytes to free.
+            budget_s (float): Wall-time budget for the whole call.
+            chunk_files (int): Files deleted per chunk.
+            pause_s (float): Sleep between chunks to yield disk bandwidth.
+            remove (Callable[[str], None]): Deletion function.
+
+        Returns:
+            Tuple[int, int]: (files deleted, bytes freed).
+        """
+        deadline = self._clock() + max(0.0, budget_s)
+        files = 0
+        freed = 0
+        while freed < target_bytes and self._clock() < deadline:
+            chunk = self.pop_oldest(target_bytes - freed, max_files=max(1, chunk_files), deadline=deadline)
+            if not chunk:
+                break
+            for e in chunk:
+                try:
+                    remove(os.path.join(e[1], e[2]))
+                    files += 1
+                    freed += e[3]
+                except FileNotFoundError:
+                    continue
+                except OSError:
+                    self._readd(e)
+            if pause_s > 0 and freed < target_bytes:
+                time.sleep(pause_s)
+        return files, freed
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "files": self.file_count,
+            "bytes": self.total_bytes,
+            "dirs": len(self._dir_mtime),
+            "pending_dirs": len(self._pending),
+            "heap": len(self._heap),
+            "ready": self.ready,
+        }
+
+
+def lower_thread_priority(nice: int) -> bool:
+    """Raise the niceness of the calling thread (Linux: per-thread).
+
+    With the CFQ/BFQ I/O schedulers the I/O priority of a thread without an
+    explicit ioprio follows its CPU nice value, so this also de-prioritizes
+    its disk I/O.
+
+    Args:
+        nice (int): Increment to apply (0 = no-op).
+
+    Returns:
+        bool: True when the priority was changed.
+    """
+    if nice <= 0 or not hasattr(os, "setpriority"):
+        return False
+    try:
+        import threading
+
+        tid = threading.get_native_id()
+        cur = os.getpriority(os.PRIO_PROCESS, tid)
+        os.setpriority(os.PRIO_PROCESS, tid, min(19, cur + int(nice)))
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,131 @@
+"""SSD usage forecasting for proactive eviction.
+
+`DiskForecaster` keeps the recent `ssd_free_gb` samples (a bounded window)
+and fits a least-squares line through them. From the fit it derives:
+
+- `write_rate_mb_s`: net fill rate (positive = free space shrinking);
+- `time_to_soft_s` / `time_to_hard_s`: time until the strategy's
+  `ssd.soft_pct` / `ssd.hard_pct` watermarks are reached at that rate.
+
+Bytes freed by our own eviction are added back (`note_evicted`), so the
+rate reflects what writers produce rather than writes minus eviction.
+
+`proactive_bytes` turns the forecast into a rate-matched per-tick eviction
+target. It starts once the soft watermark is within `ssd.forecast_lead_s`
+(default 600 s) or already crossed. The target is the bytes written per
+tick (the time since the previous tick, which PSI wakes can shorten)
+times `ssd.forecast_rate_factor` (default 1.2), capped by
+`ssd.forecast_max_evict_per_tick_gb` (default 4 × `max_evict_per_tick_gb`).
+Fits with an R² below `ssd.forecast_min_r2` (default 0.6) are not acted
+on, so one write burst in an otherwise noisy window deletes nothing.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+_GB = float(1024 ** 3)
+
+
+class DiskForecaster:
+    """Linear trend over recent free-space samples.
+
+    Args:
+        window_s (float): Sample age kept for the fit.
+        min_samples (int): Samples needed before a forecast is produced.
+        clock (Callable[[], float]): Monotonic time source.
+    """
+
+    def __init__(self, window_s: float = 300.0, min_samples: int = 4, clock: Callable[[], float] = time.monotonic) -> None:
+        self.window_s = float(window_s)
+        self.min_samples = max(2, int(min_samples))
+        self._clock = clock
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=4096)
+        self._evicted_gb = 0.0
+        self.total_gb = 0.0
+        self.free_gb = 0.0
+        self.last: Dict[str, Any] = {}
+
+    def note_evicted(self, freed_bytes: int) -> None:
+        """Account for bytes freed by eviction (kept out of the write rate)."""
+        self._evicted_gb += max(0, int(freed_bytes)) / _GB
+
+    def add(self, free_gb: float, total_gb: float, ts: Optional[float] = None) -> None:
+        """Record one sample (free/total in GB)."""
+        now = self._clock() if ts is None else ts
+        self.total_gb = float(total_gb)
+        self.free_gb = float(free_gb)
+        # free space as it would be without our own eviction
+        self._samples.append((now, float(free_gb) - self._evicted_gb))
+        while self._samples and now - self._samples[0][0] > self.window_s:
+            self._samples.popleft()
+
+    def slope_gb_s(self) -> Optional[Tuple[float, float]]:
+        """Least-squares slope of free GB over time and the fit's R²."""
+        n = len(self._samples)
+        if n < self.min_samples:
+            return None
+        t0 = self._samples[0][0]
+        xs = [t - t0 for t, _ in self._samples]
+        ys = [v for _, v in self._samples]
+        mx = sum(xs) / n
+        my = sum(ys) / n
+        sxx = sum((x - mx) ** 2 for x in xs)
+        if sxx <= 0:
+            return None
+        sxy = sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+        syy = sum((y - my) ** 2 for y in ys)
+        slope = sxy / sxx
+        r2 = (sxy * sxy) / (sxx * syy) if syy > 0 else 1.0
+        return slope, r2
+
+    def estimate(self, soft_pct: float, hard_pct: float) -> Dict[str, Any]:
+        """Write rate and time to the soft/hard watermarks.
+
+        Returns:
+            dict: `write_rate_mb_s`, `r2`, `time_to_soft_s`, `time_to_hard_s`
+            (0 when already past, None when not filling or not enough samples),
+            `samples`.
+        """
+        fit = self.slope_gb_s()
+        out: Dict[str, Any] = {"write_rate_mb_s": None, "r2": None, "time_to_soft_s": None, "time_to_hard_s": None, "samples": len(self._samples)}
+        if fit is None or self.total_gb <= 0:
+            self.last = out
+            return out
+        slope, r2 = fit
+        rate = -slope  # GB/s filling
+        out["write_rate_mb_s"] = round(rate * 1024.0, 3)
+        out["r2"] = round(r2, 3)
+        for key, pct in (("time_to_soft_s", soft_pct), ("time_to_hard_s", hard_pct)):
+            free_at = self.total_gb * (1.0 - float(pct))
+            margin = self.free_gb - free_at
+            if margin <= 0:
+                out[key] = 0.0
+            elif rate > 0:
+                out[key] = round(margin / rate, 1)
+        self.last = out
+        return out
+
+    def proactive_bytes(self, elapsed_s: float, ssd_pol: Dict[str, Any]) -> int:
+        """Rate-matched eviction target for a tick covering `elapsed_s` seconds (0 when no action is needed)."""
+        est = self.last
+        rate_mb = est.get("write_rate_mb_s")
+        tts = est.get("time_to_soft_s")
+        if rate_mb is None or rate_mb <= 0 or tts is None:
+            return 0
+        if float(est.get("r2") or 0.0) < float(ssd_pol.get("forecast_min_r2", 0.6)):
+            return 0  # the trend does not explain the samples
+        lead = float(ssd_pol.get("forecast_lead_s", 600))
+        if tts > lead:
+            return 0
+        factor = float(ssd_pol.get("forecast_rate_factor", 1.2))
+        cap_gb = float(ssd_pol.get("forecast_max_evict_per_tick_gb", 4.0 * float(ssd_pol.get("max_evict_per_tick_gb", 1.0))))
+        want = rate_mb * 1024 * 1024 * max(0.0, float(elapsed_s)) * factor
+        if not math.isfinite(want):
+            return 0
+        return int(min(want, cap_gb * _GB))
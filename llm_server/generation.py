@@ -1,13 +1,43 @@
 from __future__ import annotations
 
 import json
+import re
 import shlex
 import subprocess
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from typing import Dict, Optional
 
 from .registry import ModelRegistry
-from .concurrency import ConcurrencyManager
+from .concurrency import ConcurrencyManager, QueueShed
+from .metrics import metrics
+from . import openmetrics
+from . import thermal
+from . import tracing
+from .admission import AdmissionRejected, admission
+
+_gen_phase = openmetrics.registry.histogram(
+    "llm_generation_phase_seconds",
+    "Generation phase durations (queue_wait, load, prompt_eval, decode, ttft, total).",
+    ("model", "role", "phase"),
+)
+_gen_tps = openmetrics.registry.histogram(
+    "llm_generation_tokens_per_second",
+    "Prompt evaluation and decode throughput.",
+    ("model", "role", "stage"),
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500, 1000, 2000, 5000),
+)
+_gen_tokens = openmetrics.registry.counter("llm_generation_tokens", "Tokens processed by generation.", ("model", "role", "kind"))
+
+# llama.cpp timing lines (`llama_perf_context_print:` and older `llama_print_timings:`)
+_RE_LOAD = re.compile(r"load time\s*=\s*([\d.]+)\s*ms")
+_RE_PROMPT = re.compile(r"prompt eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*(?:tokens|runs)")
+_RE_EVAL = re.compile(r"(?<!prompt )eval time\s*=\s*([\d.]+)\s*ms\s*/\s*(\d+)\s*(?:tokens|runs)")
+_RE_TOTAL = re.compile(r"total time\s*=\s*([\d.]+)\s*ms")
+
+
+_END_OF_TEXT = " [end of text]\n"
 
 
 def merge_params(defaults: Dict[str, object], overrides: Optional[Dict[str, object]] = None) -> Dict[str, object]:
@@ -39,6 +69,17 @@ def build_llama_cli_args(model_path: Path, prompt: str, params: Dict[str, object
     seed = params.get("seed")
     if seed is not None:
         args += ["-s", str(int(seed))]
+    threads = params.get("threads")
+    if threads is not None:
+        args += ["-t", str(int(threads))]
+    ctx_size = params.get("ctx_size")
+    if ctx_size is not None:
+        args += ["-c", str(int(ctx_size))]
+    prompt_cache = params.get("prompt_cache")
+    if prompt_cache:
+        # reuse and save the evaluated state, including the generated tokens (sessions);
+        # stdout then carries only the generated text
+        args += ["--prompt-cache", str(prompt_cache), "--prompt-cache-all", "--no-display-prompt"]
     return args
 
 
@@ -59,6 +100,108 @@ def _enforce_context(spec_ctx: int, prompt: str, params: Dict[str, object]) -> D
     return {"ok": True, "params": params}
 
 
+def parse_llama_timings(text: str) -> Dict[str, float]:
+    """Parse llama.cpp performance lines into timing fields.
+
+    Args:
+        text (str): Combined stdout/stderr of a llama.cpp run.
+
+    Returns:
+        Dict[str, float]: Any of `load_ms`, `prompt_eval_ms`, `prompt_tokens`,
+        `prompt_tps`, `eval_ms`, `completion_tokens`, `decode_tps`,
+        `backend_total_ms` found in the output.
+    """
+    out: Dict[str, float] = {}
+    m = _RE_LOAD.search(text)
+    if m:
+        out["load_ms"] = float(m.group(1))
+    m = _RE_PROMPT.search(text)
+    if m:
+        ms, n = float(m.group(1)), int(m.group(2))
+        out["prompt_eval_ms"] = ms
+        out["prompt_tokens"] = n
+        if ms > 0:
+            out["prompt_tps"] = n * 1000.0 / ms
+    m = _RE_EVAL.search(text)
+    if m:
+        ms, n = float(m.group(1)), int(m.group(2))
+        out["eval_ms"] = ms
+        out["completion_tokens"] = n
+        if ms > 0:
+            out["decode_tps"] = n * 1000.0 / ms
+    m = _RE_TOTAL.search(text)
+    if m:
+        out["backend_total_ms"] = float(m.group(1))
+    return out
+
+
+def _derive_ttft(t: Dict[str, float]) -> Optional[float]:
+    """Time-to-first-token: queue wait + load + prompt eval + one decode step."""
+    if "prompt_eval_ms" not in t:
+        return None
+    step = 0.0
+    if t.get("completion_tokens"):
+        step = t.get("eval_ms", 0.0) / max(1.0, t["completion_tokens"])
+    return t.get("queue_wait_ms", 0.0) + t.get("load_ms", 0.0) + t["prompt_eval_ms"] + step
+
+
+def record_generation_metrics(model: str, role: str, timings: Dict[str, float]) -> None:
+    """Record generation timings per model and role (flat and labeled)."""
+    phases = {
+        "queue_wait": timings.get("queue_wait_ms"),
+        "load": timings.get("load_ms"),
+        "prompt_eval": timings.get("prompt_eval_ms"),
+        "decode": timings.get("eval_ms"),
+        "ttft": timings.get("ttft_ms"),
+        "total": timings.get("total_ms"),
+    }
+    try:
+        for phase, ms in phases.items():
+            if ms is None:
+                continue
+            metrics.observe_duration(f"gen_{phase}:{model} {role}", ms)
+            _gen_phase.observe(ms / 1000.0, model=model, role=role, phase=phase)
+        for stage, key in (("prompt", "prompt_tps"), ("decode", "decode_tps")):
+            v = timings.get(key)
+            if v is not None:
+                metrics.observe(f"gen_{stage}_tps:{model} {role}", v)
+                _gen_tps.observe(v, model=model, role=role, stage=stage)
+        for kind, key in (("prompt", "prompt_tokens"), ("completion", "completion_tokens")):
+            n = timings.get(key)
+            if n:
+                _gen_tokens.inc(n, model=model, role=role, kind=kind)
+    except Exception:
+        pass
+
+
+def _rejected(e: AdmissionRejected) -> Dict[str, object]:
+    """Generation result for a failed memory reservation (API answers 503 + Retry-After)."""
+    return {"error": str(e), "status": 503, "retry_after": e.retry_after_s}
+
+
+def _shed(e: QueueShed) -> Dict[str, object]:
+    """Generation result for a request shed from its role queue (API answers 503/429 + Retry-After)."""
+    return {"error": str(e), "status": e.status, "retry_after": e.retry_after_s}
+
+
+def _in_use(registry: ModelRegistry, model_name: str):
+    fn = getattr(registry, "in_use", None)
+    return fn(model_name) if fn is not None else nullcontext()
+
+
+def estimate_cost(registry: ModelRegistry, model_name: str, prompt: str, overrides: Optional[Dict[str, object]] = None) -> Optional[Dict[str, int]]:
+    """Admission cost of a generation (None when the model or prompt is not servable)."""
+    spec = registry.get(model_name)
+    if not spec or not spec.path.exists():
+        return None
+    params = merge_params(registry.cfg.get("gen_defaults", {}), overrides)
+    ctx_check = _enforce_context(spec.context_max, prompt, params)
+    if "error" in ctx_check:
+        return None
+    params = ctx_check.get("params", params)
+    return admission.estimate(spec, _approx_tokens(prompt), int(params.get("max_tokens", 256)), registry)
+
+
 def generate_with_llama_cli(
     registry: ModelRegistry,
     model_name: str,
@@ -79,6 +222,18 @@ def generate_with_llama_cli(
     if "error" in ctx_check:
         return ctx_check
     params = ctx_check.get("params", params)
+    # Memory admission: KV cache for the allocated context + buffers (+ weights if cold)
+    cost = admission.estimate(spec, _approx_tokens(prompt), int(params.get("max_tokens", 256)), registry)
+    if cost["kv_bytes"] > 0:
+        params = dict(params, ctx_size=cost["ctx_tokens"])
+    try:
+        admission.check(cost["total_bytes"], model_name)
+    except AdmissionRejected as e:
+        return _rejected(e)
+    # Thermal throttling reduces decode threads
+    threads = thermal.decode_threads(int(params["threads"]) if params.get("threads") else None)
+    if threads is not None:
+        params = dict(params, threads=threads)
     cmd = [str(registry.cfg.get("processes", {}).get("llm_server", ""))]  # not used; kept for future
     # Use llama.cpp built CLI directly
     llama_cli = str((Path(__file__).resolve().parents[1] / "vendor" / "llama.cpp" / "build" / "bin" / "llama-cli"))
@@ -86,18 +241,60 @@ def generate_with_llama_cli(
 
     def _run() -> Dict[str, object]:
         try:
+            if params.get("prompt_cache"):
+                # session turn: keep the generated text (stdout) apart from the logs
+                proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout_s or 60, check=True)
+                text = proc.stdout.decode("utf-8", errors="ignore")
+                if text.endswith(_END_OF_TEXT):
+                    text = text[: -len(_END_OF_TEXT)]
+                out = text + proc.stderr.decode("utf-8", errors="ignore")
+                return {"model": model_name, "prompt": prompt, "output": out, "text": text, "params": params}
             out = subprocess.check_output(cmd, stderr=subprocess.STDOUT, timeout=timeout_s or 60).decode("utf-8", errors="ignore")
             return {"model": model_name, "prompt": prompt, "output": out, "params": params}
         except subprocess.TimeoutExpired:
             return {"error": "generation timeout"}
         except subprocess.CalledProcessError as e:
-            return {"error": f"llama-cli failed: {e.output.decode('utf-8', errors='ignore')[:200]}"}
+            detail = ((e.output or b"") + (e.stderr or b"")).decode("utf-8", errors="ignore")
+            return {"error": f"llama-cli failed: {detail[:200]}"}
 
-    if conc is None:
-        return _run()
-    # Respect per-role concurrency
-    with conc.acquire(role):
-        return _run()
+    t_enq = time.perf_counter()
+    try:
+        if conc is None:
+            with admission.reserve(cost["total_bytes"], model_name):
+                t_start = time.perf_counter()
+                with _in_use(registry, model_name), tracing.span("backend", model=model_name, role=role):
+                    res = _run()
+        else:
+            # Respect per-role concurrency, then wait for the memory reservation
+            qspan = tracing.begin_span("queue_wait", role=role)
+            try:
+                with conc.acquire(role, model=model_name):
+                    try:
+                        with admission.reserve(cost["total_bytes"], model_name):
+                            tracing.end_span(qspan)
+                            t_start = time.perf_counter()
+                            with _in_use(registry, model_name), tracing.span("backend", model=model_name, role=role):
+                                res = _run()
+                    except AdmissionRejected:
+                        tracing.end_span(qspan)
+                        raise
+            except QueueShed:
+                tracing.end_span(qspan)
+                raise
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except QueueShed as e:
+        return _shed(e)
+    t_end = time.perf_counter()
+    timings: Dict[str, float] = {"queue_wait_ms": (t_start - t_enq) * 1000.0, "total_ms": (t_end - t_enq) * 1000.0}
+    if "output" in res:
+        timings.update(parse_llama_timings(str(res["output"])))
+    ttft = _derive_ttft(timings)
+    if ttft is not None:
+        timings["ttft_ms"] = ttft
+    res["timings"] = timings
+    record_generation_metrics(model_name, role, timings)
+    return res
 
 
 def speculative_generate(
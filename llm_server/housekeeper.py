@@ -2,9 +2,16 @@ from __future__ import annotations
 """Housekeeping routines for RAM/SSD.
 
 Includes:
-- Sampling RAM and SSD (free/total, pressure, process and children RSS).
-- Computing RAM/SSD health beacons for logs and `/info`.
-- Optional per-tick soft-eviction planning and execution (gated by `actions_enabled`).
+- Sampling RAM (bounded by the cgroup limit in containers, see `cgroup`) and
+  SSD (free/total, pressure) and per-model PSS/RSS of the
+  server and its `llama-cli` children (`procmem.ProcMemSampler`).
+- Computing RAM/SSD health beacons for logs and `/info`; the RAM beacon also
+  escalates on PSI memory stalls (`psi.PsiMonitor`), and PSI triggers wake
+  the loop early.
+- Optional per-tick soft-eviction planning and execution (gated by `actions_enabled`),
+  driven by an incremental `EvictionIndex` instead of a full walk per tick.
+  A `forecast.DiskForecaster` trend over `ssd_free_gb` starts rate-matched
+  eviction before the soft watermark is reached.
 
 Google-style docstrings to ease automatic documentation.
 """
@@ -12,7 +19,7 @@ Google-style docstrings to ease automatic documentation.
 import os
 import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Optional
 
 try:
     import psutil  # type: ignore
@@ -23,10 +30,15 @@ import shutil
 
 
 def _mem_stats() -> Dict[str, float]:
-    """Get system memory metrics.
+    """Get memory metrics, bounded by the cgroup limit when one applies.
+
+    In a container with a memory limit below host RAM, `total` is the limit
+    and `available` is the limit minus the cgroup working set (see
+    `cgroup.memory_view`).
 
     Returns:
-        Dict[str, float]: `free_gb`, `total_gb`, `used_gb`, `pressure` (0..1).
+        Dict[str, float]: `free_gb`, `total_gb`, `used_gb`, `pressure` (0..1),
+        `cgroup_limited` (1.0 when the cgroup limit is in effect).
     """
     total = 0.0
     avail = 0.0
@@ -38,6 +50,14 @@ def _mem_stats() -> Dict[str, float]:
     except Exception:
         total = 0.0
         avail = 0.0
+    limited = 0.0
+    try:
+        from . import cgroup
+        view = cgroup.memory_view(cgroup.read(), total, avail)
+        if view is not None:
+            total, avail, limited = view["total"], view["available"], 1.0
+    except Exception:
+        pass
     free_gb = avail / (1024 ** 3)
     total_gb = total / (1024 ** 3)
     used_gb = (total - avail) / (1024 ** 3) if total > 0 else 0.0
@@ -45,7 +65,21 @@ def _mem_stats() -> Dict[str, float]:
     if total > 0:
         used = total - avail
         pressure = max(0.0, min(1.0, used / total))
-    return {"free_gb": free_gb, "total_gb": total_gb, "used_gb": used_gb, "pressure": pressure}
+    return {"free_gb": free_gb, "total_gb": total_gb, "used_gb": used_gb, "pressure": pressure, "cgroup_limited": limited}
+
+
+def _free_reserve_gb(mem: Dict[str, float], hk_cfg: Dict[str, object]) -> float:
+    """RAM kept free: `max(free_reserve.min_gb, total * pct)` on a host.
+
+    Under a cgroup limit there is nothing else to leave room for, and the
+    host-sized `min_gb` could exceed the limit, so `free_reserve.cgroup_pct`
+    (default 0.05) of the limit is reserved instead.
+    """
+    fr = (hk_cfg.get('free_reserve', {}) if isinstance(hk_cfg, dict) else {}) or {}
+    total_gb = float(mem.get('total_gb', 0.0))
+    if mem.get('cgroup_limited'):
+        return total_gb * float(fr.get('cgroup_pct', 0.05))
+    return max(float(fr.get('min_gb', 8.0)), total_gb * float(fr.get('pct', 0.10)))
 
 
 def _disk_stats(path: str) -> Dict[str, float]:
@@ -125,60 +159,28 @@ def _beacon_ssd(pressure: float, free_gb: float, soft_pct: float, hard_pct: floa
     return "ok"
 
 
-def _list_files_by_oldest(paths: List[str]) -> List[Tuple[str, int, float]]:
-    """List files under `paths` ordered by ascending age (oldest first).
-
-    Args:
-        paths (List[str]): Base paths to walk.
-
-    Returns:
-        List[Tuple[str,int,float]]: Tuples (path, size_bytes, mtime).
-    """
-    out: List[Tuple[str, int, float]] = []
-    import os
-    from pathlib import Path
-    for base in paths:
-        try:
-            p = Path(base)
-            if not p.exists():
-                continue
-            for root, dirs, files in os.walk(p, topdown=True):
-                # skip hidden dirs and git
-                dirs[:] = [d for d in dirs if not d.startswith('.') and d != '.git']
-                for fn in files:
-                    try:
-                        fp = Path(root) / fn
-                        st = fp.stat()
-                        out.append((str(fp), int(st.st_size), float(st.st_mtime)))
-                    except Exception:
-                        continue
-        except Exception:
-            continue
-    out.sort(key=lambda x: x[2])
-    return out
+def _admission_stats() -> Dict[str, object]:
+    try:
+        from .admission import admission
+        return admission.stats()
+    except Exception:
+        return {}
 
 
-def _plan_ssd_eviction(paths: List[str], target_bytes: int) -> Tuple[List[str], int]:
-    """Plan a list of files to delete (LRU) up to `target_bytes`.
+def _session_stats() -> Dict[str, object]:
+    try:
+        from .sessions import sessions
+        return sessions.stats()
+    except Exception:
+        return {}
 
-    Args:
-        paths (List[str]): Candidate directories (scanned recursively).
-        target_bytes (int): Budget of bytes to free.
 
-    Returns:
-        Tuple[List[str], int]: (selected file paths, estimated bytes).
-    """
-    if target_bytes <= 0:
-        return [], 0
-    files = _list_files_by_oldest(paths)
-    chosen: List[str] = []
-    total = 0
-    for fp, sz, _ in files:
-        chosen.append(fp)
-        total += sz
-        if total >= target_bytes:
-            break
-    return chosen, total
+def _cache_stats() -> Dict[str, object]:
+    try:
+        from .cache import caches
+        return caches.stats()
+    except Exception:
+        return {}
 
 
 class Housekeeper:
@@ -197,7 +199,65 @@ class Housekeeper:
         self.interval_s = max(1.0, float(interval_s))
         self.disk_path = disk_path
         self._stop = threading.Event()
+        # Set by stop() and PSI triggers to run the next tick immediately
+        self._wake = threading.Event()
         self._thread: Optional[threading.Thread] = None
+        self._evict_index = None
+        from .psi import PsiMonitor
+        self._psi = PsiMonitor(**self._psi_source())
+        self._psi_triggers: Optional[list] = None
+        from .forecast import DiskForecaster
+        self._forecast = DiskForecaster()
+        self._procmem = None
+        try:
+            from .procmem import ProcMemSampler, available
+            if available():
+                self._procmem = ProcMemSampler(model_names=self._model_paths)
+        except Exception:
+            self._procmem = None
+        from .ram_actions import RamPressureController
+        self._ram_ctl = RamPressureController()
+
+    def _model_paths(self) -> Dict[str, str]:
+        """Map configured GGUF paths to model names (process attribution)."""
+        reg = getattr(self.app.state, 'registry', None)
+        try:
+            return {str(spec.path): spec.name for spec in reg.list()} if reg is not None else {}
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _psi_source() -> Dict[str, str]:
+        """Use the cgroup's own pressure files when a cgroup v2 limit applies."""
+        try:
+            from . import cgroup
+            info = cgroup.limits()
+            path = info.get('path')
+            if info.get('version') == 2 and path and (info.get('memory', {}) or {}).get('max_bytes') is not None \
+                    and os.path.exists(os.path.join(path, 'memory.pressure')):
+                return {'root': path, 'suffix': '.pressure'}
+        except Exception:
+            pass
+        return {}
+
+    def _start_psi_triggers(self, psi_cfg: Dict[str, object]) -> None:
+        """Register the strategy's PSI triggers once (`psi.triggers`); failures are recorded."""
+        from .psi import PsiTrigger
+        self._psi_triggers = []
+        if not self._psi.available or psi_cfg.get('enabled', True) is False:
+            return
+        for spec in psi_cfg.get('triggers', []) or []:
+            try:
+                trig = PsiTrigger(
+                    str(spec.get('resource', 'memory')), str(spec.get('kind', 'some')),
+                    int(float(spec.get('stall_ms', 300)) * 1000), int(float(spec.get('window_ms', 2000)) * 1000),
+                    on_event=lambda _res: self._wake.set(),
+                    root=self._psi.root, suffix=self._psi.suffix,
+                )
+                trig.start()
+                self._psi_triggers.append(trig)
+            except Exception:
+                continue
 
     def start(self) -> None:
         """Start the housekeeping thread (idempotent)."""
@@ -210,6 +270,12 @@ class Housekeeper:
     def stop(self) -> None:
         """Stop the housekeeping thread with a short join."""
         self._stop.set()
+        self._wake.set()
+        for trig in self._psi_triggers or []:
+            try:
+                trig.stop()
+            except Exception:
+                pass
         if self._thread and self._thread.is_alive():
             try:
                 self._thread.join(timeout=2.0)
@@ -220,8 +286,19 @@ class Housekeeper:
         """Main loop of the housekeeper (runs on its thread)."""
         from .metrics import metrics
         from .logging_utils import get_logger
+        from .evict_index import EvictionIndex, lower_thread_priority
         log = get_logger("llm-server")
+        # Background work: lower CPU (and, by inheritance, I/O) priority
+        try:
+            lower_thread_priority(int(os.getenv("HOUSEKEEPER_NICE", "10")))
+        except Exception:
+            pass
+        last_tick: Optional[float] = None
         while not self._stop.is_set():
+            # PSI triggers wake the loop early: per-tick targets use the real elapsed time
+            tick_start = time.monotonic()
+            tick_s = self.interval_s if last_tick is None else min(self.interval_s, tick_start - last_tick)
+            last_tick = tick_start
             try:
                 mem = _mem_stats()
                 disk = _disk_stats(self.disk_path)
@@ -230,35 +307,76 @@ class Housekeeper:
                 metrics.observe("ram_total_gb", mem.get("total_gb", 0.0))
                 metrics.observe("ram_used_gb", mem.get("used_gb", 0.0))
                 metrics.observe("ram_pressure", mem.get("pressure", 0.0))
-                # LLM-server RSS (self + children)
+                # Container limits (cgroup): usage, page cache and OOM events
+                cgroup_snap: Dict[str, object] = {}
+                try:
+                    from . import cgroup
+                    cgroup_snap = cgroup.summary(cgroup.read())
+                    for key in ('memory_max_gb', 'memory_current_gb', 'page_cache_gb'):
+                        if cgroup_snap.get(key) is not None:
+                            metrics.observe(f'cgroup_{key}', float(cgroup_snap[key]))
+                    events = cgroup_snap.get('events') or {}
+                    if 'oom_kill' in events:
+                        metrics.observe('cgroup_oom_kills', float(events['oom_kill']))
+                    if 'high' in events:
+                        metrics.observe('cgroup_memory_high_events', float(events['high']))
+                except Exception:
+                    pass
+                # Pressure stall information (stall time, not free bytes)
+                try:
+                    self._psi.sample()
+                    self._psi.publish()
+                    if self._psi_triggers is None:
+                        pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                        self._start_psi_triggers(pol.get('psi', {}) or {})
+                except Exception:
+                    pass
+                # LLM-server memory (self + llama-cli children): PSS per model
+                # from smaps_rollup, psutil RSS walk when /proc lacks it
                 llm_rss_gb = 0.0
+                llm_pss_gb: Optional[float] = None
+                per_model: Dict[str, Dict[str, float]] = {}
                 try:
-                    if psutil is not None:
+                    if self._procmem is not None:
+                        per_model = self._procmem.sample()
+                        self._procmem.publish(per_model)
+                        tot = self._procmem.totals(per_model)
+                        llm_rss_gb = tot["rss"] / (1024 ** 3)
+                        llm_pss_gb = tot["pss"] / (1024 ** 3)
+                        metrics.observe("llm_pss_gb", llm_pss_gb)
+                    elif psutil is not None:
                         proc = psutil.Process(os.getpid())  # type: ignore
                         procs = [proc] + proc.children(recursive=True)
                         llm_rss_gb = sum(getattr(p.memory_info(), 'rss', 0) for p in procs) / (1024 ** 3)
-                        metrics.observe("llm_rss_gb", llm_rss_gb)
+                    metrics.observe("llm_rss_gb", llm_rss_gb)
                 except Exception:
                     pass
-                # OS+apps (approx)
-                os_apps_gb = max(0.0, mem.get("used_gb", 0.0) - llm_rss_gb)
+                # OS+apps: PSS does not double-count the shared GGUF mappings
+                llm_gb = llm_pss_gb if llm_pss_gb is not None else llm_rss_gb
+                os_apps_gb = max(0.0, mem.get("used_gb", 0.0) - llm_gb)
                 metrics.observe("os_apps_rss_gb", os_apps_gb)
                 # Free reserve and headroom
                 try:
                     cfg = getattr(self.app.state, 'config', {}) or {}
-                    hk_cfg = cfg.get('housekeeper', {}) or {}
-                    fr = hk_cfg.get('free_reserve', {}) or {}
-                    min_gb = float(fr.get('min_gb', 8.0))
-                    pct = float(fr.get('pct', 0.10))
-                    total_gb = float(mem.get('total_gb', 0.0))
-                    free_reserve_gb = max(min_gb, total_gb * pct)
+                    free_reserve_gb = _free_reserve_gb(mem, cfg.get('housekeeper', {}) or {})
                 except Exception:
                     free_reserve_gb = 8.0
                 headroom_gb = mem.get("free_gb", 0.0) - free_reserve_gb
                 metrics.observe("ram_free_reserve_gb", free_reserve_gb)
                 metrics.observe("ram_headroom_gb", headroom_gb)
+                # Admission capacity: headroom plus what running generations already hold
+                try:
+                    from .admission import admission
+                    worker_gb = sum(m.get('pss', 0.0) for owner, m in per_model.items() if owner != 'server') / (1024 ** 3)
+                    admission.update_capacity(headroom_gb, worker_gb)
+                except Exception:
+                    pass
                 metrics.observe("ssd_free_gb", disk.get("free_gb", 0.0))
                 metrics.observe("ssd_pressure", disk.get("pressure", 0.0))
+                try:
+                    self._forecast.add(disk.get("free_gb", 0.0), disk.get("total_gb", 0.0))
+                except Exception:
+                    pass
                 metrics.inc("housekeeper_ticks_total", 1)
                 # Compute beacons based on policy
                 try:
@@ -270,16 +388,33 @@ class Housekeeper:
                 except Exception:
                     ram_beacon = _beacon_ram(headroom_gb)
                     ssd_beacon = _beacon_ssd(disk.get('pressure', 0.0), disk.get('free_gb', 0.0), 0.75, 0.85)
+                # Memory stalls escalate the RAM beacon before free memory runs out
+                try:
+                    from .psi import worst
+                    pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                    self._psi.evaluate(pol.get('psi', {}) or {})
+                    ram_beacon = worst(ram_beacon, self._psi.beacons.get('memory', 'ok'))
+                except Exception:
+                    pass
 
                 # Optionally plan and perform SSD soft-eviction per tick (actions gated)
                 evict_plan_bytes = 0
                 evict_done_bytes = 0
-                evict_candidates: List[str] = []
+                evict_files = 0
+                evict_reason = None
+                forecast: Dict[str, object] = {}
                 try:
                     pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
                     actions_enabled = bool(pol.get('actions_enabled', False))
                     ssd_pol = pol.get('ssd', {}) or {}
                     soft_pct = float(ssd_pol.get('soft_pct', 0.75))
+                    # Trend over recent free-space samples: write rate, time to watermarks
+                    forecast = self._forecast.estimate(soft_pct, float(ssd_pol.get('hard_pct', 0.85)))
+                    if forecast.get('write_rate_mb_s') is not None:
+                        metrics.observe('ssd_write_rate_mb_s', float(forecast['write_rate_mb_s']))
+                    for key in ('time_to_soft_s', 'time_to_hard_s'):
+                        if forecast.get(key) is not None:
+                            metrics.observe(f'ssd_{key}', float(forecast[key]))
                     max_evict_gb = float(ssd_pol.get('max_evict_per_tick_gb', 1.0))
                     # if above soft watermark, plan evictions up to target
                     # compute required bytes to reach soft watermark
@@ -293,6 +428,13 @@ class Housekeeper:
                         deficit_gb = 0.0
                     target_gb = min(max_evict_gb, max(0.0, deficit_gb))
                     target_bytes = int(target_gb * (1024 ** 3))
+                    if target_bytes > 0:
+                        evict_reason = 'watermark'
+                    # Start before the soft watermark and keep pace with the write rate
+                    proactive_bytes = self._forecast.proactive_bytes(tick_s, ssd_pol)
+                    if proactive_bytes > target_bytes:
+                        target_bytes = proactive_bytes
+                        evict_reason = 'forecast'
                     # Candidate dirs default: logs, runtime/agents, models_root/cache if exists
                     from pathlib import Path
                     cfg = getattr(self.app.state, 'config', {}) or {}
@@ -311,30 +453,99 @@ class Housekeeper:
                         evict_dirs = [d for d in evict_dirs if not (d in seen or seen.add(d))]
                     else:
                         evict_dirs = default_dirs
-                    # Plan
-                    if target_bytes > 0 and disk.get('pressure', 0.0) >= soft_pct:
-                        candidates, planned_bytes = _plan_ssd_eviction(evict_dirs, target_bytes)
-                        evict_plan_bytes = planned_bytes
-                        evict_candidates = candidates
-                        if actions_enabled and candidates:
-                            freed = 0
-                            import os
-                            for fp in candidates:
-                                try:
-                                    sz = os.path.getsize(fp)
-                                except Exception:
-                                    sz = 0
-                                try:
-                                    os.remove(fp)
-                                    freed += sz
-                                except Exception:
-                                    continue
+                    # Keep the eviction index current (directory stats only once built)
+                    if self._evict_index is None:
+                        self._evict_index = EvictionIndex(evict_dirs)
+                    idx = self._evict_index
+                    idx.set_roots(evict_dirs)
+                    t_idx = time.perf_counter()
+                    idx.refresh(float(ssd_pol.get('index_time_budget_s', 0.5)))
+                    metrics.observe_duration('evict_index_refresh', (time.perf_counter() - t_idx) * 1000.0)
+                    metrics.observe('evict_index_files', float(idx.file_count))
+                    metrics.observe('evict_index_gb', idx.total_bytes / (1024 ** 3))
+                    # Plan / execute in time-sliced chunks
+                    if target_bytes > 0 and (disk.get('pressure', 0.0) >= soft_pct or evict_reason == 'forecast'):
+                        budget_s = float(ssd_pol.get('evict_time_budget_s', 1.0))
+                        if actions_enabled and idx.ready:
+                            files, freed = idx.evict(target_bytes, budget_s=budget_s, chunk_files=int(ssd_pol.get('evict_chunk_files', 256)))
+                            evict_plan_bytes = freed
                             evict_done_bytes = freed
+                            evict_files = files
+                            self._forecast.note_evicted(freed)
                             try:
-                                metrics.inc('cache_evictions_total', len(candidates))
+                                metrics.inc('cache_evictions_total', files)
+                                if evict_reason == 'forecast':
+                                    metrics.inc('evict_forecast_bytes_total', freed)
                                 metrics.observe('last_evict_bytes', float(freed))
                             except Exception:
                                 pass
+                        else:
+                            candidates, planned_bytes = idx.plan(target_bytes, deadline=time.monotonic() + budget_s)
+                            evict_plan_bytes = planned_bytes
+                            evict_files = len(candidates)
+                except Exception:
+                    pass
+
+                # Graduated RAM actions (concurrency, caches, idle models)
+                try:
+                    from .cache import caches
+                    pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                    self._ram_ctl.step(
+                        float(mem.get('pressure', 0.0)), ram_beacon, pol,
+                        conc=getattr(self.app.state, 'concurrency', None),
+                        registry=getattr(self.app.state, 'registry', None),
+                        caches=caches,
+                    )
+                except Exception:
+                    pass
+
+                # PSI admission: memory/io stalls scale role concurrency (source "psi")
+                try:
+                    pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                    psi_factor = self._psi.admission_factor(pol.get('psi', {}) or {})
+                    metrics.observe('psi_admission_factor', psi_factor)
+                    conc = getattr(self.app.state, 'concurrency', None)
+                    if conc is not None and hasattr(conc, 'scale') and abs(getattr(conc, 'factors', {}).get('psi', 1.0) - psi_factor) > 1e-9:
+                        conc.scale(psi_factor, source='psi')
+                except Exception:
+                    pass
+
+                # Thermal throttling: smoothed factor scales decode threads and admission
+                thermal_snap: Dict[str, object] = {}
+                try:
+                    from .thermal import governor
+                    pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                    factor = governor.update(pol.get('thermal', {}) or {})
+                    thermal_snap = governor.snapshot()
+                    if governor.temp_c is not None:
+                        metrics.observe('thermal_temp_c', float(governor.temp_c))
+                    metrics.observe('thermal_throttle_factor', factor)
+                    conc = getattr(self.app.state, 'concurrency', None)
+                    if conc is not None and hasattr(conc, 'scale') and abs(getattr(conc, 'factors', {}).get('thermal', 1.0) - factor) > 1e-9:
+                        conc.scale(factor, source='thermal')
+                except Exception:
+                    pass
+
+                # Cache budgets follow the policy and shrink on hot beacons
+                try:
+                    from .cache import caches
+                    pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                    caches.apply_policy(pol, ram_beacon, ssd_beacon)
+                except Exception:
+                    pass
+
+                # Sessions: TTL expiry and KV quotas; KV state goes first when the SSD is hot
+                try:
+                    from .sessions import sessions
+                    pol = getattr(self.app.state, 'housekeeper_policy', {}) or {}
+                    sessions.apply_policy(pol, ssd_beacon)
+                except Exception:
+                    pass
+
+                # Feed the fixed-memory history (trend queries via /metrics/history)
+                try:
+                    from .timeseries import history
+                    history.sample(metrics.snapshot())
                 except Exception:
                     pass
 
@@ -350,18 +561,34 @@ class Housekeeper:
                             'headroom_gb': headroom_gb,
                             'pressure': mem.get('pressure', 0.0),
                             'beacon': ram_beacon,
+                            'llm_rss_gb': llm_rss_gb,
+                            'llm_pss_gb': llm_pss_gb,
+                        },
+                        'processes': {
+                            owner: {k: (round(v / (1024 ** 3), 3) if k != 'procs' else int(v)) for k, v in m.items()}
+                            for owner, m in per_model.items()
                         },
                         'ssd': {
                             'total_gb': disk.get('total_gb', 0.0),
                             'free_gb': disk.get('free_gb', 0.0),
                             'pressure': disk.get('pressure', 0.0),
                             'beacon': ssd_beacon,
+                            'forecast': forecast,
                         },
                         'eviction': {
+                            'reason': evict_reason,
                             'planned_bytes': evict_plan_bytes,
                             'done_bytes': evict_done_bytes,
-                            'planned_files': len(evict_candidates),
+                            'planned_files': evict_files,
+                            'index': self._evict_index.stats() if self._evict_index is not None else {},
                         },
+                        'cache': _cache_stats(),
+                        'sessions': _session_stats(),
+                        'ram_actions': self._ram_ctl.snapshot(),
+                        'thermal': thermal_snap,
+                        'cgroup': cgroup_snap,
+                        'admission': _admission_stats(),
+                        'psi': {**self._psi.snapshot(), 'triggers': [t.snapshot() for t in self._psi_triggers or []]},
                     }
                     setattr(self.app.state, 'housekeeper_snapshot', snap)
                 except Exception:
@@ -371,6 +598,7 @@ class Housekeeper:
                         "ram_total_gb": round(mem.get("total_gb", 0.0), 2),
                         "ram_used_gb": round(mem.get("used_gb", 0.0), 2),
                         "llm_rss_gb": round(llm_rss_gb, 2),
+                        "llm_pss_gb": round(llm_pss_gb, 2) if llm_pss_gb is not None else None,
                         "os_apps_rss_gb": round(os_apps_gb, 2),
                         "ram_free_gb": round(mem.get("free_gb", 0.0), 2),
                         "ram_free_reserve_gb": round(free_reserve_gb, 2),
@@ -378,7 +606,10 @@ class Housekeeper:
                         "ram_pressure": round(mem.get("pressure", 0.0), 3),
                         "ssd_free_gb": round(disk.get("free_gb", 0.0), 2),
                         "ssd_pressure": round(disk.get("pressure", 0.0), 3),
+                        "ssd_write_rate_mb_s": forecast.get("write_rate_mb_s"),
+                        "ssd_time_to_soft_s": forecast.get("time_to_soft_s"),
                         "ram_beacon": ram_beacon,
+                        "psi_beacon": self._psi.beacon if self._psi.available else None,
                         "ssd_beacon": ssd_beacon,
                         "evict_planned_mb": round(evict_plan_bytes / (1024 ** 2), 2) if evict_plan_bytes else 0.0,
                         "evict_done_mb": round(evict_done_bytes / (1024 ** 2), 2) if evict_done_bytes else 0.0,
@@ -387,4 +618,5 @@ class Housekeeper:
                     pass
             except Exception:
                 pass
-            self._stop.wait(self.interval_s)
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
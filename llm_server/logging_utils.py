@@ -1,32 +1,400 @@
+"""Structured JSON logging.
+
+By default the root logger gets a single `AsyncLogHandler`: `emit` only
+enqueues the record on a bounded queue, and a background writer thread
+formats records in batches, writes them to stdout and the optional log file
+with one write per batch, and rotates/gzips the file off the request path.
+
+Env:
+- `LOG_ASYNC` (default `1`): use the async pipeline (`0` = synchronous handlers).
+- `LOG_QUEUE_SIZE` (default `10000`): queued records before the overflow policy applies.
+- `LOG_QUEUE_POLICY` (default `drop_new`): `drop_new`, `drop_old` or `block`.
+- `LOG_BATCH_SIZE` (default `256`) / `LOG_FLUSH_INTERVAL_MS` (default `200`).
+- `LOG_FILE`, `LOG_TO_FILE`, `LOG_DIR`, `LOG_MAX_BYTES`, `LOG_BACKUP_COUNT`: file output.
+- `LOG_COMPRESS` (default `1`): gzip rotated files.
+
+Access logs go through `AccessLogSampler` (see its docstring for the
+`LOG_SAMPLE_*` variables): errors, slow and trace-sampled requests are
+always logged, fast successes are head-sampled, and `rate_limit` events are
+folded into periodic `rate_limit.summary` lines.
+
+Google-style docstrings for automatic documentation.
+"""
+
+import atexit
+import gzip
 import json
 import logging
 import os
+import queue
+import shutil
 import sys
+import threading
 import time
 import uuid
+import zlib
 from logging.handlers import RotatingFileHandler
 from contextvars import ContextVar
-from typing import Any, Dict, Optional
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+# Attributes every LogRecord has; anything else came from `extra=`.
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "extra"}
 
 
 class JsonFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
         payload: Dict[str, Any] = {
             "level": record.levelname.lower(),
-            "ts": getattr(record, "ts", time.time()),
+            "ts": getattr(record, "ts", record.created),
             "message": record.getMessage(),
             "logger": record.name,
         }
         if hasattr(record, "extra") and isinstance(record.extra, dict):
             payload.update(record.extra)
+        for k, v in record.__dict__.items():
+            if k not in _RESERVED and k not in payload:
+                payload[k] = v
         # Attach request_id from context when available
-        rid = get_request_id()
-        if rid and "request_id" not in payload:
-            payload["request_id"] = rid
-        return json.dumps(payload, ensure_ascii=False)
+        if "request_id" not in payload:
+            rid = get_request_id()
+            if rid:
+                payload["request_id"] = rid
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class _RotatingFile:
+    """Append-only file sink with size-based rotation and gzip of rotated files.
+
+    Args:
+        path (str): Log file path.
+        max_bytes (int): Rotate when the file would exceed this size (0 = never).
+        backup_count (int): Rotated files kept (`path.1[.gz]` ... `path.N[.gz]`).
+        compress (bool): Gzip rotated files in a background thread.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 10485760, backup_count: int = 5, compress: bool = True) -> None:
+        self.path = os.path.abspath(path)
+        self.max_bytes = max(0, int(max_bytes))
+        self.backup_count = max(0, int(backup_count))
+        self.compress = compress
+        self._fh: Optional[IO[bytes]] = None
+        self._size = 0
+        self._gz_threads: List[threading.Thread] = []
+
+    def _open(self) -> IO[bytes]:
+        if self._fh is None:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._fh = open(self.path, "ab")
+            self._size = self._fh.tell()
+        return self._fh
+
+    def write(self, data: bytes) -> None:
+        fh = self._open()
+        if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self.rotate()
+            fh = self._open()
+        fh.write(data)
+        fh.flush()
+        self._size += len(data)
+
+    def _name(self, i: int) -> str:
+        base = f"{self.path}.{i}"
+        return base + ".gz" if self.compress else base
+
+    def rotate(self) -> None:
+        """Close the current file and shift backups (compression runs off-thread)."""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._size = 0
+        # wait for a previous compression so backup names are settled
+        for t in self._gz_threads:
+            t.join()
+        self._gz_threads = []
+        if self.backup_count <= 0:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src, dst = self._name(i), self._name(i + 1)
+            if os.path.exists(src):
+                os.replace(src, dst)
+        if not os.path.exists(self.path):
+            return
+        if not self.compress:
+            os.replace(self.path, self._name(1))
+            return
+        pending = f"{self.path}.1.pending"
+        os.replace(self.path, pending)
+        t = threading.Thread(target=_gzip_file, args=(pending, self._name(1)), name="log-gzip", daemon=True)
+        self._gz_threads.append(t)
+        t.start()
+
+    def close(self) -> None:
+        for t in self._gz_threads:
+            t.join()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+def _gzip_file(src: str, dst: str) -> None:
+    try:
+        with open(src, "rb") as fi, gzip.open(dst + ".tmp", "wb", compresslevel=6) as fo:
+            shutil.copyfileobj(fi, fo, 1 << 20)
+        os.replace(dst + ".tmp", dst)
+        os.remove(src)
+    except Exception:
+        pass
+
+
+class AsyncLogHandler(logging.Handler):
+    """Queue-backed handler that formats and writes records on a writer thread.
+
+    The calling thread only snapshots the record (message, context request
+    ID) and enqueues it. The writer drains up to `batch_size` records or
+    waits `flush_interval_s`, then issues one write per sink.
+
+    Args:
+        stream (IO | None): Text stream sink; None writes to the current `sys.stdout`.
+        to_stream (bool): Whether to write to the stream sink at all.
+        file (_RotatingFile | None): File sink.
+        maxsize (int): Queue bound.
+        policy (str): Overflow policy: `drop_new`, `drop_old` or `block`.
+        batch_size (int): Max records per write.
+        flush_interval_s (float): Max time a record waits before being written.
+    """
+
+    def __init__(self, stream: Optional[IO[str]] = None, file: Optional[_RotatingFile] = None, to_stream: bool = True, maxsize: int = 10000, policy: str = "drop_new", batch_size: int = 256, flush_interval_s: float = 0.2) -> None:
+        super().__init__()
+        self.stream = stream
+        self.to_stream = to_stream
+        self.file = file
+        self.policy = policy if policy in ("drop_new", "drop_old", "block") else "drop_new"
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.001, float(flush_interval_s))
+        self.dropped = 0
+        self.written = 0
+        self._q: "queue.Queue[Optional[logging.LogRecord]]" = queue.Queue(maxsize=max(1, int(maxsize)))
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord) -> None:  # type: ignore[override]
+        if self._closed:
+            return
+        try:
+            # Resolve lazily-evaluated state on the calling thread
+            record.msg = record.getMessage()
+            record.args = None
+            if "request_id" not in record.__dict__:
+                rid = get_request_id()
+                if rid:
+                    record.request_id = rid
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+        except Exception:
+            self.handleError(record)
+            return
+        self._idle.clear()
+        if self.policy == "block":
+            self._q.put(record)
+            return
+        try:
+            self._q.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+        if self.policy == "drop_old":
+            try:
+                self._q.get_nowait()
+                self._q.put_nowait(record)
+            except (queue.Empty, queue.Full):
+                pass
+        self._drop()
+
+    def _drop(self) -> None:
+        self.dropped += 1
+        try:
+            from .metrics import metrics
+
+            metrics.inc("log_records_dropped_total", 1)
+        except Exception:
+            pass
+
+    def _format_batch(self, batch: List[logging.LogRecord]) -> str:
+        lines = []
+        for rec in batch:
+            try:
+                lines.append(self.format(rec))
+            except Exception:
+                self.dropped += 1
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        text = self._format_batch(batch)
+        if not text:
+            return
+        if self.to_stream:
+            try:
+                out = self.stream or sys.stdout
+                out.write(text)
+                out.flush()
+            except Exception:
+                pass
+        if self.file is not None:
+            try:
+                self.file.write(text.encode("utf-8"))
+            except Exception:
+                pass
+        self.written += len(batch)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[logging.LogRecord] = []
+            try:
+                item = self._q.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                self._idle.set()
+                continue
+            deadline = time.monotonic() + self.flush_interval_s
+            while True:
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    # brief wait to coalesce small bursts, bounded by the interval
+                    wait = min(0.005, deadline - time.monotonic())
+                    if wait <= 0:
+                        break
+                    try:
+                        item = self._q.get(timeout=wait)
+                    except queue.Empty:
+                        break
+            if batch:
+                self._write(batch)
+                try:
+                    from .metrics import metrics
+
+                    metrics.observe("log_queue_depth", float(self._q.qsize()))
+                except Exception:
+                    pass
+            if self._q.empty():
+                self._idle.set()
+
+    def flush(self, timeout: float = 5.0) -> None:  # type: ignore[override]
+        """Block until queued records are written (or `timeout` elapses)."""
+        deadline = time.monotonic() + timeout
+        while not self._closed and time.monotonic() < deadline:
+            if self._idle.wait(0.01) and self._q.empty():
+                return
+
+    def queue_depth(self) -> int:
+        return self._q.qsize()
+
+    def close(self) -> None:  # type: ignore[override]
+        if not self._closed:
+            self._closed = True
+            try:
+                self._q.put(None, timeout=1.0)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=5.0)
+            if self.file is not None:
+                self.file.close()
+        super().close()
+
+
+_SETUP_LOCK = threading.Lock()
+_SETUP_DONE = False
+_ASYNC: Optional[AsyncLogHandler] = None
+
+
+def _log_file_path() -> Optional[str]:
+    log_file = os.getenv("LOG_FILE")
+    log_to_file = os.getenv("LOG_TO_FILE", "0") == "1" or bool(log_file)
+    if not log_to_file:
+        return None
+    if not log_file:
+        log_dir = os.getenv("LOG_DIR", "logs")
+        os.makedirs(log_dir, exist_ok=True)
+        log_file = os.path.join(log_dir, "llm-server.jsonl")
+    return log_file
+
+
+def async_handler() -> Optional[AsyncLogHandler]:
+    """Return the root async handler (None when logging is synchronous)."""
+    return _ASYNC
+
+
+def log_stats() -> Dict[str, float]:
+    """Queue depth, written and dropped record counts of the async pipeline."""
+    h = _ASYNC
+    if h is None:
+        return {}
+    return {"queue_depth": float(h.queue_depth()), "written": float(h.written), "dropped": float(h.dropped)}
 
 
 def setup_root(level: int = logging.INFO) -> None:
+    """Configure the root logger once per process (later calls are no-ops)."""
+    global _SETUP_DONE, _ASYNC
+    if _SETUP_DONE:
+        return
+    with _SETUP_LOCK:
+        if _SETUP_DONE:
+            return
+        if os.getenv("LOG_ASYNC", "1") in ("1", "true", "on"):
+            root = logging.getLogger()
+            root.setLevel(level)
+            path = _log_file_path()
+            sink = None
+            if path:
+                sink = _RotatingFile(path, _env_int("LOG_MAX_BYTES", 10485760), _env_int("LOG_BACKUP_COUNT", 5), os.getenv("LOG_COMPRESS", "1") in ("1", "true", "on"))
+            try:
+                interval = float(os.getenv("LOG_FLUSH_INTERVAL_MS", "200")) / 1000.0
+            except Exception:
+                interval = 0.2
+            h = AsyncLogHandler(
+                file=sink,
+                maxsize=_env_int("LOG_QUEUE_SIZE", 10000),
+                policy=os.getenv("LOG_QUEUE_POLICY", "drop_new"),
+                batch_size=_env_int("LOG_BATCH_SIZE", 256),
+                flush_interval_s=interval,
+            )
+            h.setFormatter(JsonFormatter())
+            root.addHandler(h)
+            _ASYNC = h
+            atexit.register(h.close)
+        else:
+            _setup_sync(level)
+        _SETUP_DONE = True
+
+
+def _setup_sync(level: int) -> None:
     root = logging.getLogger()
     root.setLevel(level)
     # Ensure stream handler
@@ -35,13 +403,8 @@ def setup_root(level: int = logging.INFO) -> None:
         h.setFormatter(JsonFormatter())
         root.addHandler(h)
     # Optional file logging
-    log_file = os.getenv("LOG_FILE")
-    log_to_file = os.getenv("LOG_TO_FILE", "0") == "1" or bool(log_file)
-    if log_to_file:
-        if not log_file:
-            log_dir = os.getenv("LOG_DIR", "logs")
-            os.makedirs(log_dir, exist_ok=True)
-            log_file = os.path.join(log_dir, "llm-server.jsonl")
+    log_file = _log_file_path()
+    if log_file:
         # Avoid duplicate handlers to the same file
         if not any(isinstance(h, RotatingFileHandler) and getattr(h, 'baseFilename', None) == os.path.abspath(log_file) for h in root.handlers):
             fh = RotatingFileHandler(log_file, maxBytes=int(os.getenv("LOG_MAX_BYTES", "10485760")), backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")))
@@ -49,6 +412,192 @@ def setup_root(level: int = logging.INFO) -> None:
             root.addHandler(fh)
 
 
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class _RouteStats:
+    __slots__ = ("sketch", "slow_ms", "refresh_at", "win_start", "win_count", "rps", "rate")
+
+    def __init__(self, window_s: float) -> None:
+        from .sketch import WindowedSketch
+
+        self.sketch = WindowedSketch(window_s=window_s)
+        self.slow_ms = float("inf")
+        self.refresh_at = 0.0
+        self.win_start = 0.0
+        self.win_count = 0
+        self.rps = 0.0
+        self.rate = 1.0
+
+
+class AccessLogSampler:
+    """Decide which access-log lines to emit and summarize rate-limit events.
+
+    Per route, request latency feeds a windowed sketch and request rate is
+    measured over 1 s windows (EWMA). A request is always logged when it
+    failed (status >= 400), is slower than the route p95, or carries a
+    sampled trace (`traceparent` flag `01`). Other requests are head-sampled
+    by request ID hash at the route rate `min(base_rate, target_per_s / rps)`.
+    Logged lines carry `sample_rate` (1.0 for always-logged ones) so counts
+    can be reconstructed as the sum of `1 / sample_rate`.
+
+    Rejected (`429`) requests are not logged one by one: the first per client
+    in each summary window is logged, the rest are counted and emitted as a
+    `rate_limit.summary` line every `summary_s` seconds. At most
+    `max_clients` clients are tracked per window; events from further clients
+    are not logged individually and are counted as `overflow` in the summary.
+
+    Args:
+        base_rate (float): Head-sampling rate for fast successes (env `LOG_SAMPLE_RATE`, default 1).
+        target_per_s (float): Per-route budget of sampled lines per second, 0 = off (env `LOG_SAMPLE_TARGET_PER_S`).
+        slow_quantile (float): Latency quantile above which requests count as slow (env `LOG_SAMPLE_SLOW_Q`, default 0.95).
+        min_samples (int): Requests observed on a route before sampling applies.
+        summary_s (float): Rate-limit summary period (env `LOG_RATE_LIMIT_SUMMARY_S`, default 10).
+        max_routes (int): Routes tracked before new ones share an overflow entry.
+        max_clients (int): Rate-limited clients tracked per summary window.
+        clock (Callable | None): Time source (tests).
+    """
+
+    def __init__(self, base_rate: float = 1.0, target_per_s: float = 0.0, slow_quantile: float = 0.95, min_samples: int = 50, summary_s: float = 10.0, max_routes: int = 256, max_clients: int = 1024, clock: Any = None) -> None:
+        self.base_rate = min(1.0, max(0.0, float(base_rate)))
+        self.target_per_s = max(0.0, float(target_per_s))
+        self.slow_quantile = min(0.999, max(0.5, float(slow_quantile)))
+        self.min_samples = max(1, int(min_samples))
+        self.summary_s = max(0.1, float(summary_s))
+        self.max_routes = max(1, int(max_routes))
+        self.max_clients = max(1, int(max_clients))
+        self._clock = clock or time.monotonic
+        self._lock = threading.Lock()
+        self._routes: Dict[str, _RouteStats] = {}
+        self._rl_start = self._clock()
+        self._rl_counts: Dict[Tuple[str, str], int] = {}
+        self._rl_clients: Dict[str, int] = {}
+        self._rl_overflow = 0
+        self._rl_total = 0
+
+    @classmethod
+    def from_env(cls) -> "AccessLogSampler":
+        return cls(
+            base_rate=_env_float("LOG_SAMPLE_RATE", 1.0),
+            target_per_s=_env_float("LOG_SAMPLE_TARGET_PER_S", 0.0),
+            slow_quantile=_env_float("LOG_SAMPLE_SLOW_Q", 0.95),
+            summary_s=_env_float("LOG_RATE_LIMIT_SUMMARY_S", 10.0),
+        )
+
+    def _stats(self, route: str) -> _RouteStats:
+        st = self._routes.get(route)
+        if st is None:
+            if len(self._routes) >= self.max_routes:
+                route = "__overflow__"
+                st = self._routes.get(route)
+            if st is None:
+                st = self._routes[route] = _RouteStats(60.0)
+        return st
+
+    def decide(self, route: str, status: int, dur_ms: float, request_id: str = "", trace_sampled: bool = False) -> Tuple[bool, str, float]:
+        """Record one request and decide whether to log it.
+
+        Returns:
+            Tuple[bool, str, float]: (log it, reason, sample rate applied).
+            Reasons: `error`, `slow`, `trace`, `warmup`, `sampled`, `skipped`.
+        """
+        now = self._clock()
+        with self._lock:
+            st = self._stats(route)
+            st.sketch.add(dur_ms)
+            st.win_count += 1
+            if now - st.win_start >= 1.0:
+                elapsed = now - st.win_start if st.win_start else 1.0
+                inst = st.win_count / max(elapsed, 1.0)
+                st.rps = inst if st.rps == 0.0 else 0.7 * st.rps + 0.3 * inst
+                st.win_start = now
+                st.win_count = 0
+                rate = self.base_rate
+                if self.target_per_s > 0 and st.rps > 0:
+                    rate = min(rate, self.target_per_s / st.rps)
+                st.rate = max(0.0, min(1.0, rate))
+            if now >= st.refresh_at:
+                # p95 is refreshed once per second, not merged per request
+                win = st.sketch.window()
+                st.slow_ms = win.quantile(self.slow_quantile) if win.count >= self.min_samples else float("inf")
+                st.refresh_at = now + 1.0
+            warm = st.sketch.total.count <= self.min_samples
+            rate = st.rate
+            slow_ms = st.slow_ms
+        if status >= 400:
+            return True, "error", 1.0
+        if trace_sampled:
+            return True, "trace", 1.0
+        if warm:
+            return True, "warmup", 1.0
+        if dur_ms > slow_ms:
+            return True, "slow", 1.0
+        if rate >= 1.0:
+            return True, "sampled", 1.0
+        if rate <= 0.0:
+            return False, "skipped", 0.0
+        h = zlib.crc32((request_id or str(now)).encode("utf-8")) / 4294967296.0
+        return (h < rate), ("sampled" if h < rate else "skipped"), rate
+
+    def route_rates(self) -> Dict[str, float]:
+        """Current head-sampling rate per route."""
+        with self._lock:
+            return {r: st.rate for r, st in self._routes.items()}
+
+    def rate_limited(self, client: str, route: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Count a rejected request.
+
+        Returns:
+            Tuple[bool, dict | None]: whether to log this event individually
+            (first for this client in the window), and a summary payload when
+            the window has elapsed.
+        """
+        now = self._clock()
+        with self._lock:
+            summary = self._rl_summary(now)
+            self._rl_total += 1
+            seen = self._rl_clients.get(client)
+            if seen is None and len(self._rl_clients) >= self.max_clients:
+                self._rl_overflow += 1
+                return False, summary
+            first = seen is None
+            self._rl_clients[client] = (seen or 0) + 1
+            key = (client, route)
+            if key in self._rl_counts or len(self._rl_counts) < self.max_clients:
+                self._rl_counts[key] = self._rl_counts.get(key, 0) + 1
+        return first, summary
+
+    def flush_rate_limited(self) -> Optional[Dict[str, Any]]:
+        """Return the pending rate-limit summary if its window has elapsed."""
+        now = self._clock()
+        with self._lock:
+            return self._rl_summary(now)
+
+    def _rl_summary(self, now: float) -> Optional[Dict[str, Any]]:
+        if now - self._rl_start < self.summary_s:
+            return None
+        out = None
+        if self._rl_total:
+            top = sorted(self._rl_counts.items(), key=lambda kv: kv[1], reverse=True)[:10]
+            out = {
+                "count": self._rl_total,
+                "clients": len(self._rl_clients),
+                "overflow": self._rl_overflow,
+                "window_s": round(now - self._rl_start, 3),
+                "top": [{"client": c, "route": r, "count": n} for (c, r), n in top],
+            }
+        self._rl_start = now
+        self._rl_counts = {}
+        self._rl_clients = {}
+        self._rl_overflow = 0
+        self._rl_total = 0
+        return out
+
+
 def get_logger(name: str) -> logging.Logger:
     setup_root()
     return logging.getLogger(name)
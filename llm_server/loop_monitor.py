@@ -0,0 +1,151 @@
+"""Event-loop lag and threadpool saturation instrumentation.
+
+`LoopMonitor` runs a probe task on the server event loop that measures how
+late `asyncio.sleep` wakes up (event-loop lag) and samples the anyio worker
+threadpool used for sync handlers (active/queued/size). A watchdog thread
+checks the probe heartbeat and, when the loop is stalled past a threshold,
+logs the stack of the event-loop thread so the blocking call is visible.
+
+Gauges are published to `metrics` (`event_loop_lag_ms`,
+`event_loop_lag_max_ms`, `threadpool_active`, `threadpool_queued`,
+`threadpool_size`), and stalls count into `event_loop_stalls_total`.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def threadpool_stats() -> dict:
+    """Return anyio default threadpool stats (call from the event loop)."""
+    try:
+        import anyio.to_thread  # type: ignore
+
+        lim = anyio.to_thread.current_default_thread_limiter()
+        return {
+            "size": float(lim.total_tokens),
+            "active": float(lim.borrowed_tokens),
+            "queued": float(lim.statistics().tasks_waiting),
+        }
+    except Exception:
+        return {}
+
+
+class LoopMonitor:
+    """Probe task plus watchdog thread for the running event loop.
+
+    Args:
+        interval_s (float): Probe interval (env `LOOP_PROBE_INTERVAL_S`).
+        stall_ms (float): Lag that triggers a stack dump (env `LOOP_LAG_WARN_MS`).
+        dump_cooldown_s (float): Minimum time between two stack dumps.
+        on_stall (Callable | None): Hook `(lag_ms, stack_text)`; logs by default.
+    """
+
+    def __init__(self, interval_s: Optional[float] = None, stall_ms: Optional[float] = None, dump_cooldown_s: float = 30.0, on_stall: Optional[Callable[[float, str], None]] = None) -> None:
+        self.interval_s = max(0.01, interval_s if interval_s is not None else _env_float("LOOP_PROBE_INTERVAL_S", 0.25))
+        self.stall_ms = max(1.0, stall_ms if stall_ms is not None else _env_float("LOOP_LAG_WARN_MS", 500.0))
+        self.dump_cooldown_s = float(dump_cooldown_s)
+        self.on_stall = on_stall or self._log_stall
+        self.lag_ms = 0.0
+        self.lag_max_ms = 0.0
+        self._beat = time.monotonic()
+        self._loop_tid: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._last_dump = 0.0
+
+    def start(self) -> None:
+        """Start the probe on the running loop and the watchdog thread."""
+        loop = asyncio.get_running_loop()
+        self._loop_tid = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = loop.create_task(self._probe())
+        t = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog = t
+        t.start()
+
+    async def stop(self) -> None:
+        """Stop the probe task and the watchdog."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+
+    async def _probe(self) -> None:
+        from .metrics import metrics
+        loop = asyncio.get_running_loop()
+        window_start = loop.time()
+        while not self._stop.is_set():
+            t0 = loop.time()
+            await asyncio.sleep(self.interval_s)
+            now = loop.time()
+            lag = max(0.0, (now - t0 - self.interval_s) * 1000.0)
+            self._beat = time.monotonic()
+            self.lag_ms = lag
+            # max over ~10 s windows
+            if now - window_start > 10.0:
+                window_start = now
+                self.lag_max_ms = lag
+            else:
+                self.lag_max_ms = max(self.lag_max_ms, lag)
+            try:
+                metrics.observe("event_loop_lag_ms", lag)
+                metrics.observe("event_loop_lag_max_ms", self.lag_max_ms)
+                metrics.observe_duration("event_loop_lag", lag)
+                for k, v in threadpool_stats().items():
+                    metrics.observe(f"threadpool_{k}", v)
+            except Exception:
+                pass
+
+    def _watch(self) -> None:
+        from .metrics import metrics
+        stalled = False
+        while not self._stop.wait(self.interval_s):
+            behind_ms = (time.monotonic() - self._beat) * 1000.0 - self.interval_s * 1000.0
+            if behind_ms < self.stall_ms:
+                stalled = False
+                continue
+            if stalled:
+                continue
+            stalled = True
+            try:
+                metrics.inc("event_loop_stalls_total", 1)
+            except Exception:
+                pass
+            now = time.monotonic()
+            if now - self._last_dump < self.dump_cooldown_s:
+                continue
+            self._last_dump = now
+            frame = sys._current_frames().get(self._loop_tid or -1)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            try:
+                self.on_stall(behind_ms, stack)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _log_stall(lag_ms: float, stack: str) -> None:
+        from .logging_utils import get_logger
+        get_logger("llm-server").warning("event_loop.stall", extra={"lag_ms": round(lag_ms, 1), "stack": stack})
@@ -1,6 +1,7 @@
 import os
 import sys
 from .app import create_app
+from . import ratelimit
 from .bootstrap import ensure_llama_built
 
 
@@ -20,7 +21,12 @@ def main() -> int:
 
             cfg = app.state.config  # type: ignore[attr-defined]
             port = int(os.getenv("PORT_LLM_SERVER", cfg["ports"]["llm_server"]))
-            uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
+            workers = ratelimit.workers()
+            if workers > 1:
+                # each worker builds its own app; rate limits are shared via ratelimit.SharedBuckets
+                uvicorn.run("llm_server.app:create_app", factory=True, host="0.0.0.0", port=port, log_level="info", workers=workers)
+            else:
+                uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
             return 0
         except Exception as e:  # pragma: no cover - uvicorn optional
             print(f"Failed to start uvicorn: {e}")
@@ -1,15 +1,28 @@
 """Lightweight embedded metrics for the server.
 
-Exposes counters, simple gauges (observe), and sliding windows of durations
-for percentiles (p50/p95/p99). Intended for consumption via `/metrics` and
-not meant to replace Prometheus.
+Exposes counters, simple gauges (observe), and quantile sketches of durations
+for percentiles (p50/p95/p99), both over a sliding window and cumulative.
+Intended for consumption via `/metrics` and not meant to replace Prometheus.
+
+Two interchangeable backends are available (`METRICS_BACKEND`):
+- `sharded` (default): per-thread shards merged at scrape time; the request
+  path never takes a shared lock.
+- `locked`: a single lock around every update (the original container).
 
 Google-style docstrings for automatic documentation.
 """
 
+import os
 import threading
 from time import time
-from typing import Dict
+from typing import Dict, List, Tuple
+
+from .sketch import WindowedSketch
+
+# Sliding window used for the `{name}_pXX_ms` keys
+WINDOW_S = 60.0
+WINDOW_SLICES = 6
+_QS = (0.50, 0.95, 0.99)
 
 
 class Metrics:
@@ -18,7 +31,7 @@ class Metrics:
     Main methods:
       - inc: increment counters.
       - observe: record the latest value of a gauge.
-      - observe_duration: accumulate durations for percentiles.
+      - observe_duration: record a duration into a quantile sketch.
       - snapshot: export all metrics into a dict.
     """
 
@@ -29,7 +42,7 @@ class Metrics:
             "errors_total": 0,
         }
         self._timings: Dict[str, float] = {}
-        self._durations_ms: Dict[str, list[float]] = {}
+        self._durations_ms: Dict[str, WindowedSketch] = {}
 
     def inc(self, key: str, by: int = 1) -> None:
         """Increment the counter `key` by `by` (default 1)."""
@@ -44,6 +57,9 @@ class Metrics:
     def snapshot(self) -> Dict[str, float]:
         """Return a snapshot of counters, gauges, and percentiles.
 
+        Sketches are copied under the lock (bounded size) and quantiles are
+        computed outside of it, so scrapes never stall request-path updates.
+
         Returns:
             Dict[str, float]: Flattened metrics ready for serialization.
         """
@@ -51,36 +67,144 @@ class Metrics:
             data: Dict[str, float] = {}
             data.update(self._counters)
             data.update({f"timing_{k}": v for k, v in self._timings.items()})
-            # percentiles for known timers
-            for name, arr in self._durations_ms.items():
-                if not arr:
-                    continue
-                xs = sorted(arr)
-                def pct(p: float) -> float:
-                    if not xs:
-                        return 0.0
-                    i = max(0, min(len(xs)-1, int(round(p * (len(xs)-1)))))
-                    return xs[i]
-                data[f"{name}_p50_ms"] = pct(0.50)
-                data[f"{name}_p95_ms"] = pct(0.95)
-                data[f"{name}_p99_ms"] = pct(0.99)
-            data["ts"] = time()
-            return data
-
-    def observe_duration(self, key: str, value_ms: float, max_keep: int = 512) -> None:
-        """Accumulate a duration in ms under `key` keeping a window of `max_keep`.
+            sketches = {k: sk.copy() for k, sk in self._durations_ms.items()}
+        for name, sk in sketches.items():
+            _export_sketch(data, name, sk)
+        data["ts"] = time()
+        return data
+
+    def observe_duration(self, key: str, value_ms: float) -> None:
+        """Record a duration in ms under `key`.
 
         Args:
             key (str): Logical name of the duration metric.
             value_ms (float): Duration in milliseconds.
-            max_keep (int): Max samples retained (window). Defaults to 512.
         """
         with self._lock:
-            arr = self._durations_ms.setdefault(key, [])
-            arr.append(float(value_ms))
-            if len(arr) > max_keep:
-                # keep recent window
-                self._durations_ms[key] = arr[-max_keep:]
+            sk = self._durations_ms.get(key)
+            if sk is None:
+                sk = self._durations_ms[key] = WindowedSketch(WINDOW_S, WINDOW_SLICES)
+            sk.add(value_ms)
+
+
+def _export_sketch(data: Dict[str, float], name: str, sk: WindowedSketch) -> None:
+    """Flatten windowed (`{name}_pXX_ms`) and cumulative views into `data`."""
+    win = sk.window()
+    if win.count:
+        p50, p95, p99 = win.quantiles(_QS)
+        data[f"{name}_p50_ms"] = p50
+        data[f"{name}_p95_ms"] = p95
+        data[f"{name}_p99_ms"] = p99
+    tot = sk.total
+    if tot.count:
+        c50, c95, c99 = tot.quantiles(_QS)
+        data[f"{name}_cum_p50_ms"] = c50
+        data[f"{name}_cum_p95_ms"] = c95
+        data[f"{name}_cum_p99_ms"] = c99
+        data[f"{name}_count"] = tot.count
+        data[f"{name}_sum_ms"] = tot.sum
+
+
+class _Shard:
+    """Per-thread slice of counters and duration sketches."""
+
+    __slots__ = ("counters", "durations")
+
+    def __init__(self) -> None:
+        self.counters: Dict[str, int] = {}
+        self.durations: Dict[str, WindowedSketch] = {}
+
+
+class ShardedMetrics(Metrics):
+    """Metrics backend with per-thread shards aggregated at scrape time.
+
+    Each thread writes to its own `_Shard` (asyncio tasks on the event loop
+    share the loop thread's shard, which is safe since updates never await),
+    so `inc` and `observe_duration` take no shared lock. Only the owning
+    thread mutates a shard; `snapshot` copies shard dicts (atomic under the
+    GIL) and merges them. Shards of threads that exited are folded into a
+    retired shard so the shard list stays bounded by live threads.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, _Shard]] = []
+        self._retired = _Shard()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            sh = _Shard()
+            self._local.shard = sh
+            with self._lock:
+                self._shards.append((threading.current_thread(), sh))
+            return sh
+
+    def inc(self, key: str, by: int = 1) -> None:
+        """Increment the counter `key` by `by` (default 1)."""
+        c = self._shard().counters
+        c[key] = c.get(key, 0) + by
+
+    def observe(self, key: str, value: float) -> None:
+        """Record the current value of a gauge identified by `key`."""
+        # single dict store: atomic under the GIL, last writer wins
+        self._timings[key] = value
+
+    def observe_duration(self, key: str, value_ms: float) -> None:
+        """Record a duration in ms under `key` in the caller's shard."""
+        d = self._shard().durations
+        sk = d.get(key)
+        if sk is None:
+            sk = d[key] = WindowedSketch(WINDOW_S, WINDOW_SLICES)
+        sk.add(value_ms)
+
+    def _fold_retired(self) -> None:
+        # caller holds self._lock
+        live = []
+        for th, sh in self._shards:
+            if th.is_alive():
+                live.append((th, sh))
+                continue
+            _merge_shard(self._retired, sh.counters.copy(), {k: v.copy() for k, v in list(sh.durations.items())})
+        self._shards = live
+
+    def snapshot(self) -> Dict[str, float]:
+        """Merge all shards and return counters, gauges, and percentiles."""
+        with self._lock:
+            self._fold_retired()
+            shards = [sh for _, sh in self._shards]
+            agg = _Shard()
+            _merge_shard(agg, self._retired.counters, self._retired.durations)
+        for sh in shards:
+            _merge_shard(agg, sh.counters.copy(), {k: v.copy() for k, v in list(sh.durations.items())})
+        data: Dict[str, float] = dict(self._counters)
+        data.update(agg.counters)
+        data.update({f"timing_{k}": v for k, v in self._timings.copy().items()})
+        for name, sk in agg.durations.items():
+            _export_sketch(data, name, sk)
+        data["ts"] = time()
+        return data
+
+
+def _merge_shard(dst: _Shard, counters: Dict[str, int], durations: Dict[str, WindowedSketch]) -> None:
+    for k, v in counters.items():
+        dst.counters[k] = dst.counters.get(k, 0) + v
+    for k, sk in durations.items():
+        cur = dst.durations.get(k)
+        if cur is None:
+            dst.durations[k] = sk.copy()
+        else:
+            cur.merge(sk)
+
+
+def make_metrics(backend: str = "") -> Metrics:
+    """Build the metrics backend named by `backend` or `METRICS_BACKEND`."""
+    name = (backend or os.getenv("METRICS_BACKEND", "sharded")).lower()
+    if name in ("locked", "lock", "simple"):
+        return Metrics()
+    return ShardedMetrics()
 
 
-metrics = Metrics()
+metrics = make_metrics()
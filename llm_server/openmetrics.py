@@ -0,0 +1,409 @@
+"""Labeled metrics registry with OpenMetrics text exposition.
+
+Provides counters, gauges and histograms keyed by label sets, a hard
+per-metric cardinality cap (extra label sets fold into an `__overflow__`
+series), and histogram exemplars that link buckets to `X-Request-Id`.
+
+The flat JSON view from `metrics.Metrics` remains available; this registry
+backs the Prometheus/OpenMetrics scrape format of `/metrics`.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from threading import get_ident
+from time import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+OVERFLOW = "__overflow__"
+# distinct folded label sets tracked per metric (the overflow count saturates here)
+OVERFLOW_TRACK = 4096
+# OpenMetrics caps an exemplar's label names plus values at 128 UTF-8 characters
+EXEMPLAR_MAX_CHARS = 128
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_NAME_RE = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _default_max_series() -> int:
+    try:
+        return max(1, int(os.getenv("METRICS_MAX_SERIES", "200")))
+    except Exception:
+        return 200
+
+
+def sanitize_name(name: str) -> str:
+    """Turn an arbitrary key into a valid metric name."""
+    out = _NAME_RE.sub("_", name)
+    if not out or out[0].isdigit():
+        out = "_" + out
+    return out
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_le(v: float) -> str:
+    """Canonical float form for bucket bounds (`le="1.0"`, never `le="1"`)."""
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v))
+
+
+def _fmt_value(v: float) -> str:
+    if isinstance(v, int):
+        return str(v)
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if v == int(v) and abs(v) < 1e15:
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Family:
+    """Base class for a metric family keyed by label values."""
+
+    kind = "unknown"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), max_series: Optional[int] = None) -> None:
+        self.name = sanitize_name(name)
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.max_series = int(max_series) if max_series is not None else _default_max_series()
+        self.overflowed = 0
+        self._overflow_seen: set = set()
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self) -> object:  # pragma: no cover - abstract
+        raise NotImplementedError
+
+    def labels(self, *values: str, **kv: str):
+        """Return the child series for a label set (creating it if allowed).
+
+        Once `max_series` label sets exist, new label sets are folded into a
+        single series whose label values are all `__overflow__`. `overflowed`
+        counts distinct folded label sets (up to `OVERFLOW_TRACK`).
+        """
+        if kv:
+            values = tuple(str(kv.get(n, "")) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        with self._lock:
+            child = self._children.get(values)
+            if child is not None:
+                return child
+            if len(self._children) >= self.max_series:
+                if len(self._overflow_seen) < OVERFLOW_TRACK and values not in self._overflow_seen:
+                    self._overflow_seen.add(values)
+                    self.overflowed = len(self._overflow_seen)
+                values = tuple(OVERFLOW for _ in self.labelnames)
+                child = self._children.get(values)
+                if child is not None:
+                    return child
+            child = self._new_child()
+            self._children[values] = child
+            return child
+
+    def _items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> List[str]:  # pragma: no cover - abstract
+        raise NotImplementedError
+
+
+class _CounterChild:
+    """Counter series with per-thread cells (no shared lock on `inc`)."""
+
+    __slots__ = ("_lock", "_cells", "created")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._cells: Dict[int, List[float]] = {}
+        self.created = time()
+
+    def inc(self, by: float = 1.0) -> None:
+        if by < 0:
+            raise ValueError("counters can only increase")
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            cell = self._cell()
+        cell[0] += by
+
+    def _cell(self) -> List[float]:
+        with self._lock:
+            return self._cells.setdefault(get_ident(), [0.0])
+
+    @property
+    def value(self) -> float:
+        return sum(c[0] for c in list(self._cells.values()))
+
+
+class Counter(_Family):
+    """Monotonic counter family; samples are exposed as `<name>_total`."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), max_series: Optional[int] = None) -> None:
+        if name.endswith("_total"):
+            name = name[: -len("_total")]
+        super().__init__(name, help, labelnames, max_series)
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, by: float = 1.0, **labels: str) -> None:
+        """Increment the series selected by `labels`."""
+        self.labels(**labels).inc(by)  # type: ignore[attr-defined]
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in self._items():
+            lab = _fmt_labels(self.labelnames, values)
+            lines.append(f"{self.name}_total{lab} {_fmt_value(child.value)}")  # type: ignore[attr-defined]
+            lines.append(f"{self.name}_created{lab} {_fmt_value(child.created)}")  # type: ignore[attr-defined]
+        return lines
+
+
+class _GaugeChild:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def inc(self, by: float = 1.0) -> None:
+        with self._lock:
+            self.value += by
+
+    def dec(self, by: float = 1.0) -> None:
+        with self._lock:
+            self.value -= by
+
+
+class Gauge(_Family):
+    """Gauge family (set/inc/dec)."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the series selected by `labels` to `value`."""
+        self.labels(**labels).set(value)  # type: ignore[attr-defined]
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(self.labelnames, values)} {_fmt_value(child.value)}" for values, child in self._items()]  # type: ignore[attr-defined]
+
+
+class _HistogramChild:
+    """Histogram series with per-thread bucket cells merged on read."""
+
+    __slots__ = ("_lock", "bounds", "_cells", "exemplars", "created")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        # thread id -> [bucket counts..., sum, count]
+        self._cells: Dict[int, List[float]] = {}
+        self.exemplars: List[Optional[Tuple[str, float, float]]] = [None] * (len(bounds) + 1)
+        self.created = time()
+
+    def observe(self, value: float, exemplar: Optional[str] = None) -> None:
+        v = float(value)
+        i = 0
+        bounds = self.bounds
+        n = len(bounds)
+        while i < n and v > bounds[i]:
+            i += 1
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            with self._lock:
+                cell = self._cells.setdefault(get_ident(), [0] * (n + 1) + [0.0, 0])
+        cell[i] += 1
+        cell[n + 1] += v
+        cell[n + 2] += 1
+        if exemplar:
+            # single list store: atomic under the GIL, latest wins
+            self.exemplars[i] = (exemplar, v, time())
+
+    def totals(self) -> Tuple[List[int], float, int]:
+        """Return merged (bucket counts, sum, count) across cells."""
+        n = len(self.bounds)
+        counts = [0] * (n + 1)
+        total, count = 0.0, 0
+        for cell in list(self._cells.values()):
+            cell = list(cell)
+            for j in range(n + 1):
+                counts[j] += cell[j]
+            total += cell[n + 1]
+            count += cell[n + 2]
+        return counts, total, count
+
+
+class Histogram(_Family):
+    """Histogram family with fixed buckets and per-bucket exemplars.
+
+    Args:
+        buckets (Sequence[float]): Upper bounds (the `+Inf` bucket is implicit).
+        exemplar_label (str): Label name used for exemplars (default `trace_id`).
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: Optional[int] = None, exemplar_label: str = "trace_id") -> None:
+        super().__init__(name, help, labelnames, max_series)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        self.exemplar_label = exemplar_label
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, exemplar: Optional[str] = None, **labels: str) -> None:
+        """Observe `value` for `labels`, optionally tagging its bucket with `exemplar`."""
+        if exemplar:
+            # client-supplied request ids may be arbitrarily long
+            exemplar = str(exemplar)[: max(1, EXEMPLAR_MAX_CHARS - len(self.exemplar_label))]
+        self.labels(**labels).observe(value, exemplar)  # type: ignore[attr-defined]
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in self._items():
+            counts, total, count = child.totals()  # type: ignore[attr-defined]
+            exemplars = list(child.exemplars)  # type: ignore[attr-defined]
+            created = child.created  # type: ignore[attr-defined]
+            acc = 0
+            for i, c in enumerate(counts):
+                acc += c
+                le = _fmt_le(self.buckets[i]) if i < len(self.buckets) else "+Inf"
+                line = f"{self.name}_bucket{_fmt_labels(self.labelnames, values, ('le', le))} {acc}"
+                ex = exemplars[i]
+                if ex is not None:
+                    line += f' # {{{self.exemplar_label}="{_escape(ex[0])}"}} {_fmt_value(ex[1])} {_fmt_value(ex[2])}'
+                lines.append(line)
+            lab = _fmt_labels(self.labelnames, values)
+            lines.append(f"{self.name}_count{lab} {count}")
+            lines.append(f"{self.name}_sum{lab} {_fmt_value(total)}")
+            lines.append(f"{self.name}_created{lab} {_fmt_value(created)}")
+        return lines
+
+
+class Registry:
+    """Collection of metric families rendered together.
+
+    Families are get-or-create by name, so modules can declare the metrics
+    they use at import time without coordinating. `add_collector` registers
+    callbacks that return extra pre-rendered families (used to bridge the
+    flat `Metrics` gauges).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._families: Dict[str, _Family] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        key = sanitize_name(name[: -len("_total")] if cls is Counter and name.endswith("_total") else name)
+        with self._lock:
+            fam = self._families.get(key)
+            if fam is None:
+                fam = cls(name, *args, **kwargs)
+                self._families[key] = fam
+            elif not isinstance(fam, cls):
+                raise ValueError(f"metric {key} already registered as {fam.kind}")
+            return fam
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = (), **kwargs) -> Counter:
+        """Get or create a counter family."""
+        return self._get_or_create(Counter, name, help, labelnames, **kwargs)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), **kwargs) -> Gauge:
+        """Get or create a gauge family."""
+        return self._get_or_create(Gauge, name, help, labelnames, **kwargs)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        """Get or create a histogram family."""
+        return self._get_or_create(Histogram, name, help, labelnames, **kwargs)
+
+    def add_collector(self, fn: Callable[[], List[str]]) -> None:
+        """Register a callback returning extra exposition lines."""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self) -> str:
+        """Render all families in OpenMetrics text format (ends with `# EOF`)."""
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors)
+        out: List[str] = []
+        overflow: List[Tuple[str, int]] = []
+        for fam in families:
+            out.append(f"# TYPE {fam.name} {fam.kind}")
+            if fam.help:
+                out.append(f"# HELP {fam.name} {_escape(fam.help)}")
+            out.extend(fam.render())
+            if fam.overflowed:
+                overflow.append((fam.name, fam.overflowed))
+        out.append("# TYPE metrics_label_overflow counter")
+        out.append("# HELP metrics_label_overflow Label sets folded into the overflow series by the cardinality cap.")
+        for name, n in overflow:
+            out.append(f'metrics_label_overflow_total{{metric="{name}"}} {n}')
+        for fn in collectors:
+            try:
+                out.extend(fn())
+            except Exception:
+                continue
+        out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+
+def flat_collector(snapshot: Callable[[], Dict[str, float]], prefix: str = "llm_") -> Callable[[], List[str]]:
+    """Bridge a flat `Metrics.snapshot()` into OpenMetrics lines.
+
+    Gauges (`timing_*`) become gauges and plain counters become counters.
+    Keys carrying labels in their name (`name:labels`) and percentile keys
+    are skipped; their labeled equivalents live in the registry.
+    """
+
+    def _collect() -> List[str]:
+        data = snapshot()
+        lines: List[str] = []
+        for key, val in sorted(data.items()):
+            if ":" in key or key == "ts" or not isinstance(val, (int, float)):
+                continue
+            if key.startswith("timing_"):
+                name = sanitize_name(prefix + key[len("timing_"):])
+                lines += [f"# TYPE {name} gauge", f"{name} {_fmt_value(val)}"]
+            elif key.endswith("_total"):
+                name = sanitize_name(prefix + key[: -len("_total")])
+                lines += [f"# TYPE {name} counter", f"{name}_total {_fmt_value(val)}"]
+        return lines
+
+    return _collect
+
+
+registry = Registry()
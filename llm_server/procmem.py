@@ -0,0 +1,268 @@
+"""Per-model process memory accounting from `/proc` (PSS via smaps_rollup).
+
+RSS double-counts pages shared between processes; several `llama-cli`
+processes mapping the same GGUF file each report the full mapping. PSS
+splits shared pages between their users, so summing PSS over the worker
+processes gives their real footprint.
+
+`ProcMemSampler` tracks the server and its descendants:
+
+- Children are discovered through `/proc/<pid>/task/<tid>/children`. When
+  that file is unavailable, the sampler falls back to a full `/proc/*/stat`
+  scan, at most every `rescan_s`.
+- The pid set, with start times and model attribution (`-m/--model` in the
+  cmdline), is cached between ticks. Only new pids have their cmdline read.
+- Each tick reads `smaps_rollup`: Rss, Pss, Pss_Anon, Pss_File,
+  Pss_Shmem, Swap and SwapPss.
+
+Per model it reports RSS, PSS, file-backed PSS (weights) and anonymous PSS.
+Anonymous PSS is used as the KV-cache/compute-buffer estimate.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import openmetrics
+from .metrics import metrics
+
+_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Pss_Anon": "pss_anon",
+    "Pss_File": "pss_file",
+    "Pss_Shmem": "pss_shmem",
+    "Swap": "swap",
+    "SwapPss": "swap_pss",
+}
+_KINDS = tuple(_FIELDS.values())
+
+_proc_bytes = openmetrics.registry.gauge("llm_process_memory_bytes", "Server/llama-cli memory per model from smaps_rollup.", ("model", "kind"))
+
+
+def available(proc_root: str = "/proc") -> bool:
+    """Whether `smaps_rollup` can be read (Linux ≥ 4.14)."""
+    return os.path.exists(os.path.join(proc_root, "self", "smaps_rollup"))
+
+
+def read_smaps_rollup(pid: int, proc_root: str = "/proc") -> Optional[Dict[str, int]]:
+    """Parse `/proc/<pid>/smaps_rollup` into bytes per field (None if gone)."""
+    out: Dict[str, int] = {k: 0 for k in _KINDS}
+    try:
+        with open(os.path.join(proc_root, str(pid), "smaps_rollup"), "rb") as fh:
+            data = fh.read().decode("ascii", "replace")
+    except OSError:
+        return None
+    for line in data.splitlines():
+        key, _, rest = line.partition(":")
+        name = _FIELDS.get(key)
+        if name is None:
+            continue
+        parts = rest.split()
+        if parts:
+            try:
+                out[name] = int(parts[0]) * 1024
+            except ValueError:
+                pass
+    return out
+
+
+def _stat(pid: int, proc_root: str) -> Optional[Tuple[int, int]]:
+    """Return (ppid, starttime) from `/proc/<pid>/stat`."""
+    try:
+        with open(os.path.join(proc_root, str(pid), "stat"), "rb") as fh:
+            data = fh.read().decode("ascii", "replace")
+    except OSError:
+        return None
+    # comm may contain spaces/parentheses: split after the last ')'
+    rest = data[data.rfind(")") + 2:].split()
+    try:
+        return int(rest[1]), int(rest[19])
+    except (IndexError, ValueError):
+        return None
+
+
+def _cmdline(pid: int, proc_root: str) -> List[str]:
+    try:
+        with open(os.path.join(proc_root, str(pid), "cmdline"), "rb") as fh:
+            return [a.decode("utf-8", "replace") for a in fh.read().split(b"\0") if a]
+    except OSError:
+        return []
+
+
+def model_from_cmdline(argv: List[str]) -> Optional[str]:
+    """Model path passed with `-m`/`--model` (or `--model=...`)."""
+    for i, a in enumerate(argv):
+        if a in ("-m", "--model") and i + 1 < len(argv):
+            return argv[i + 1]
+        if a.startswith("--model="):
+            return a.split("=", 1)[1]
+    return None
+
+
+class ProcMemSampler:
+    """Cached descendant tracking plus PSS sampling.
+
+    Args:
+        root_pid (int): Process whose subtree is sampled (default: self).
+        proc_root (str): procfs mount (tests inject a fake tree).
+        model_names (Callable[[], Dict[str, str]] | None): Returns `model path → name`
+            for attribution; unknown paths fall back to the file stem.
+        rescan_s (float): Minimum interval between full `/proc` scans in fallback mode.
+        clock (Callable[[], float]): Monotonic time source.
+    """
+
+    def __init__(self, root_pid: Optional[int] = None, proc_root: str = "/proc", model_names: Optional[Callable[[], Dict[str, str]]] = None, rescan_s: float = 30.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.root_pid = int(root_pid or os.getpid())
+        self.proc_root = proc_root
+        self.model_names = model_names
+        self.rescan_s = float(rescan_s)
+        self._clock = clock
+        # pid -> (starttime, owner label)
+        self._pids: Dict[int, Tuple[int, str]] = {}
+        self._last_scan = -1e18
+        self._scanned: List[int] = []
+        self._published: set = set()
+        self.cmdline_reads = 0
+
+    def _children(self, pid: int) -> Optional[List[int]]:
+        task_dir = os.path.join(self.proc_root, str(pid), "task")
+        try:
+            tids = os.listdir(task_dir)
+        except OSError:
+            return []
+        kids: List[int] = []
+        found_file = False
+        for tid in tids:
+            try:
+                with open(os.path.join(task_dir, tid, "children"), "rb") as fh:
+                    found_file = True
+                    kids.extend(int(x) for x in fh.read().split())
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError):
+                continue
+        return kids if found_file else None
+
+    def _scan_all(self) -> Dict[int, List[int]]:
+        tree: Dict[int, List[int]] = {}
+        try:
+            entries = os.listdir(self.proc_root)
+        except OSError:
+            return tree
+        for e in entries:
+            if not e.isdigit():
+                continue
+            st = _stat(int(e), self.proc_root)
+            if st is not None:
+                tree.setdefault(st[0], []).append(int(e))
+        return tree
+
+    def descendants(self) -> List[int]:
+        """Root pid plus all descendants (children files, else a throttled full scan)."""
+        out: List[int] = [self.root_pid]
+        stack = [self.root_pid]
+        tree: Optional[Dict[int, List[int]]] = None
+        while stack:
+            pid = stack.pop()
+            kids = self._children(pid)
+            if kids is None:
+                if tree is None:
+                    now = self._clock()
+                    if now - self._last_scan < self.rescan_s:
+                        # keep the last scanned set between full scans
+                        return list(self._scanned) or out
+                    self._last_scan = now
+                    tree = self._scan_all()
+                kids = tree.get(pid, [])
+            for k in kids:
+                out.append(k)
+                stack.append(k)
+        if tree is not None:
+            self._scanned = list(out)
+        return out
+
+    def _label(self, pid: int) -> str:
+        if pid == self.root_pid:
+            return "server"
+        self.cmdline_reads += 1
+        path = model_from_cmdline(_cmdline(pid, self.proc_root))
+        if not path:
+            return "other"
+        names = {}
+        if self.model_names is not None:
+            try:
+                names = self.model_names() or {}
+            except Exception:
+                names = {}
+        name = names.get(path) or names.get(os.path.abspath(path))
+        if name:
+            return name
+        base = os.path.basename(path)
+        return base[:-5] if base.endswith(".gguf") else base
+
+    def sample(self) -> Dict[str, Dict[str, float]]:
+        """Sample memory of the tracked processes, aggregated per owner.
+
+        Returns:
+            Dict[str, Dict[str, float]]: `owner → {rss, pss, pss_anon, pss_file,
+            pss_shmem, swap, swap_pss, kv, procs}` in bytes. The owner is
+            `server`, a model name, or `other`.
+        """
+        live: Dict[int, Tuple[int, str]] = {}
+        for pid in self.descendants():
+            st = _stat(pid, self.proc_root)
+            if st is None:
+                continue
+            cached = self._pids.get(pid)
+            if cached is not None and cached[0] == st[1]:
+                live[pid] = cached
+            else:
+                live[pid] = (st[1], self._label(pid))
+        self._pids = live
+        out: Dict[str, Dict[str, float]] = {}
+        for pid, (_, owner) in live.items():
+            mem = read_smaps_rollup(pid, self.proc_root)
+            if mem is None:
+                continue
+            agg = out.setdefault(owner, {k: 0.0 for k in _KINDS + ("kv", "procs")})
+            for k in _KINDS:
+                agg[k] += mem[k]
+            agg["kv"] += mem["pss_anon"]
+            agg["procs"] += 1
+        return out
+
+    @staticmethod
+    def totals(per_owner: Dict[str, Dict[str, float]], owners: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Sum per-owner figures (optionally a subset of owners)."""
+        keep = set(owners) if owners is not None else None
+        tot = {k: 0.0 for k in _KINDS + ("kv", "procs")}
+        for owner, m in per_owner.items():
+            if keep is not None and owner not in keep:
+                continue
+            for k in tot:
+                tot[k] += m.get(k, 0.0)
+        return tot
+
+    def publish(self, per_owner: Dict[str, Dict[str, float]]) -> None:
+        """Export a `sample()` result as flat and labeled metrics.
+
+        Owners seen on an earlier tick but gone now are reset to zero so
+        their series do not keep the last value.
+        """
+        gb = float(1024 ** 3)
+        for owner in self._published - set(per_owner):
+            for kind in ("rss", "pss", "pss_file", "kv", "swap"):
+                _proc_bytes.set(0.0, model=owner, kind=kind)
+            metrics.observe(f"model_pss_gb:{owner}", 0.0)
+        for owner, m in per_owner.items():
+            for kind in ("rss", "pss", "pss_file", "kv", "swap"):
+                _proc_bytes.set(m.get(kind, 0.0), model=owner, kind=kind)
+            metrics.observe(f"model_rss_gb:{owner}", m.get("rss", 0.0) / gb)
+            metrics.observe(f"model_pss_gb:{owner}", m.get("pss", 0.0) / gb)
+            metrics.observe(f"model_kv_gb:{owner}", m.get("kv", 0.0) / gb)
+        self._published = set(per_owner)
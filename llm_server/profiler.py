@@ -0,0 +1,196 @@
+"""Built-in wall-clock sampling profiler.
+
+Samples the stacks of every Python thread (request workers, event loop,
+housekeeper) through `sys._current_frames()` and aggregates them into
+collapsed stacks (`thread;outer;...;inner count`), the input format of
+flamegraph tools. A self-contained SVG flamegraph renderer is included.
+
+Overhead is bounded: the sampler measures the cost of each sample and
+stretches the sampling interval so that sampling time stays below
+`max_overhead` (2% by default) of wall time. Only one profile runs at a time.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+import zlib
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+_ACTIVE = threading.Lock()
+TRUNCATED = "…"  # root-side marker for stacks deeper than max_depth
+
+
+def max_seconds() -> float:
+    """Upper bound for a single profile (env `PROFILER_MAX_SECONDS`, default 60)."""
+    try:
+        return max(0.1, float(os.getenv("PROFILER_MAX_SECONDS", "60")))
+    except Exception:
+        return 60.0
+
+
+def enabled() -> bool:
+    """Whether `/admin/profile` is enabled (env `PROFILER_ENABLED`, default on)."""
+    return os.getenv("PROFILER_ENABLED", "1") in ("1", "true", "on")
+
+
+class ProfilerBusy(RuntimeError):
+    """Raised when another profile is already running."""
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)})"
+
+
+class SamplingProfiler:
+    """Wall-clock sampler over all threads.
+
+    Args:
+        interval_s (float): Target interval between samples (default 5 ms).
+        max_overhead (float): Max fraction of wall time spent sampling.
+        max_depth (int): Stack frames kept per sample (innermost; deeper outer frames collapse into `…`).
+    """
+
+    def __init__(self, interval_s: float = 0.005, max_overhead: float = 0.02, max_depth: int = 96) -> None:
+        self.interval_s = max(0.001, float(interval_s))
+        self.max_overhead = min(0.5, max(0.001, float(max_overhead)))
+        self.max_depth = max(4, int(max_depth))
+        self.samples = 0
+        self.sample_time_s = 0.0
+        self.wall_s = 0.0
+
+    def _sample(self, stacks: Dict[str, int], names: Dict[int, str], own: int) -> None:
+        for tid, frame in sys._current_frames().items():
+            if tid == own:
+                continue
+            # walk from the leaf, where the time is spent; deep stacks lose their outermost frames
+            parts: List[str] = []
+            f: Optional[object] = frame
+            while f is not None and len(parts) < self.max_depth:
+                parts.append(_frame_label(f.f_code))  # type: ignore[attr-defined]
+                f = f.f_back  # type: ignore[attr-defined]
+            if f is not None:
+                parts.append(TRUNCATED)
+            parts.reverse()
+            key = ";".join([names.get(tid, f"thread-{tid}")] + parts)
+            stacks[key] = stacks.get(key, 0) + 1
+
+    def run(self, seconds: float) -> Dict[str, int]:
+        """Sample for `seconds` on the calling thread and return collapsed stacks.
+
+        Raises:
+            ProfilerBusy: If another profile is in progress.
+        """
+        if not _ACTIVE.acquire(blocking=False):
+            raise ProfilerBusy("a profile is already running")
+        try:
+            stacks: Dict[str, int] = {}
+            own = threading.get_ident()
+            names: Dict[int, str] = {}
+            t0 = time.perf_counter()
+            deadline = t0 + max(0.0, float(seconds))
+            refresh = 0.0
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now >= refresh:
+                    names = {t.ident: t.name for t in threading.enumerate() if t.ident is not None}
+                    refresh = now + 1.0
+                s0 = time.perf_counter()
+                self._sample(stacks, names, own)
+                cost = time.perf_counter() - s0
+                self.samples += 1
+                self.sample_time_s += cost
+                # stretch the interval so cost/(interval) <= max_overhead
+                wait = max(self.interval_s, cost / self.max_overhead)
+                time.sleep(max(0.0, min(wait, deadline - time.perf_counter())))
+            self.wall_s = time.perf_counter() - t0
+            return stacks
+        finally:
+            _ACTIVE.release()
+
+    def stats(self) -> Dict[str, float]:
+        """Sampling statistics of the last run (samples, overhead ratio)."""
+        return {
+            "samples": self.samples,
+            "wall_s": round(self.wall_s, 4),
+            "sample_time_s": round(self.sample_time_s, 6),
+            "overhead": round(self.sample_time_s / self.wall_s, 5) if self.wall_s > 0 else 0.0,
+        }
+
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    """Render stacks in collapsed format (one `stack count` per line)."""
+    return "".join(f"{k} {v}\n" for k, v in sorted(stacks.items()))
+
+
+def _color(name: str) -> str:
+    h = zlib.crc32(name.encode("utf-8"))
+    return f"rgb({205 + h % 50},{80 + (h >> 8) % 120},{30 + (h >> 16) % 40})"
+
+
+def flamegraph_svg(stacks: Dict[str, int], title: str = "LLM-server profile", width: int = 1200, row_h: int = 16) -> str:
+    """Render collapsed stacks as a standalone SVG flamegraph.
+
+    Args:
+        stacks (Dict[str, int]): Collapsed stacks with sample counts.
+        title (str): Title drawn on top.
+        width (int): Image width in pixels.
+        row_h (int): Height of one stack level in pixels.
+
+    Returns:
+        str: SVG document (hover a frame for its name and sample count).
+    """
+    # Build a call tree: node = [count, children]
+    root: List = [0, {}]
+    for stack, n in stacks.items():
+        root[0] += n
+        node = root
+        for part in stack.split(";"):
+            child = node[1].get(part)
+            if child is None:
+                child = node[1][part] = [0, {}]
+            child[0] += n
+            node = child
+    total = max(1, root[0])
+    rects: List[Tuple[float, int, float, str, int]] = []
+    depth_max = 0
+
+    def walk(node: List, x: float, depth: int) -> None:
+        nonlocal depth_max
+        depth_max = max(depth_max, depth)
+        for name, child in sorted(node[1].items()):
+            w = child[0] / total * width
+            if w >= 0.3:
+                rects.append((x, depth, w, name, child[0]))
+                walk(child, x, depth + 1)
+            x += w
+
+    walk(root, 0.0, 0)
+    top = 24
+    height = top + (depth_max + 1) * row_h + 4
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<rect width="{width}" height="{height}" fill="#fafafa"/>',
+        f'<text x="4" y="16">{escape(title)} ({total} samples)</text>',
+    ]
+    for x, depth, w, name, n in rects:
+        # flamegraph: roots at the bottom
+        y = height - 4 - (depth + 1) * row_h
+        label = escape(name)
+        pct = 100.0 * n / total
+        out.append(f'<g><title>{label} ({n} samples, {pct:.2f}%)</title>'
+                   f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_h - 1}" fill="{_color(name)}" rx="1"/>')
+        chars = int(w / 7)
+        if chars >= 3:
+            text = name if len(name) <= chars else name[: max(1, chars - 2)] + ".."
+            out.append(f'<text x="{x + 2:.1f}" y="{y + row_h - 4}">{escape(text)}</text>')
+        out.append("</g>")
+    out.append("</svg>")
+    return "\n".join(out)
@@ -0,0 +1,293 @@
+"""Linux pressure stall information (PSI) for early backpressure.
+
+Free-memory watermarks react late. Once `MemAvailable` is low, the kernel
+is already reclaiming the page cache behind the GGUF mmaps. PSI reports the
+share of wall time that tasks were stalled on memory, I/O or CPU. It rises
+as soon as reclaim or refaults start to cost time.
+
+`PsiMonitor` reads `/proc/pressure/{memory,io,cpu}` (root configurable
+with env `PSI_ROOT`), or the `{memory,io,cpu}.pressure` files of the
+server's cgroup v2 directory when running under a cgroup limit. For every `some`/`full` line it reports
+`avg10/avg60/avg300` and a per-tick stall percentage computed from the
+`total` counter. The maximum of the tick rate and `avg10` is compared
+against `[warn, hot, critical]` thresholds from the strategy `psi` block.
+This gives a beacon per resource and an overall PSI beacon:
+
+- memory → combined (worst-of) with the headroom-based RAM beacon;
+- memory and io → admission factor (`psi.admission_factors`) applied to
+  role concurrency (source `psi`);
+- cpu → reported only unless thresholds are configured.
+
+`PsiTrigger` registers a kernel trigger (e.g. `some 300000 2000000`) and
+waits for `POLLPRI` on a thread. Each event calls back into the
+housekeeper, so a stall burst is handled without waiting for the next
+tick. Triggers need write access to the pressure file. Without
+CAP_SYS_RESOURCE, the window must be a multiple of 2 s. A trigger that
+cannot be registered is recorded with its error. When PSI itself is
+missing, the monitor reports unavailable and the beacons stay `ok`.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from . import openmetrics
+from .metrics import metrics
+
+RESOURCES = ("memory", "io", "cpu")
+_LEVELS = ("ok", "warn", "hot", "critical")
+
+# [warn, hot, critical] stall percentages; None = not evaluated
+DEFAULT_THRESHOLDS: Dict[str, Optional[List[float]]] = {
+    "memory_some": [5.0, 10.0, 25.0],
+    "memory_full": [2.0, 5.0, 15.0],
+    "io_some": None,
+    "io_full": [10.0, 25.0, 50.0],
+    "cpu_some": None,
+    "cpu_full": None,
+}
+DEFAULT_ADMISSION = {"ok": 1.0, "warn": 1.0, "hot": 0.5, "critical": 0.25}
+
+_pressure = openmetrics.registry.gauge("llm_psi_pressure_pct", "PSI stall percentage by resource, kind (some/full) and window.", ("resource", "kind", "window"))
+_trigger_events = openmetrics.registry.counter("llm_psi_trigger_events", "PSI trigger notifications.", ("resource",))
+
+
+def psi_root() -> str:
+    return os.getenv("PSI_ROOT", "/proc/pressure")
+
+
+def read_pressure(resource: str, root: Optional[str] = None, suffix: str = "") -> Optional[Dict[str, Dict[str, float]]]:
+    """Parse one pressure file.
+
+    Args:
+        resource (str): `memory`, `io` or `cpu`.
+        root (str | None): Directory holding the pressure files.
+        suffix (str): File suffix (`.pressure` for cgroup v2 directories).
+
+    Returns:
+        dict | None: `{"some": {"avg10", "avg60", "avg300", "total"}, "full": {...}}`
+        (`total` in microseconds), or None when PSI is unavailable.
+    """
+    try:
+        with open(os.path.join(root or psi_root(), resource + suffix), "r", encoding="ascii") as fh:
+            data = fh.read()
+    except OSError:
+        return None
+    out: Dict[str, Dict[str, float]] = {}
+    for line in data.splitlines():
+        parts = line.split()
+        if not parts or parts[0] not in ("some", "full"):
+            continue
+        vals: Dict[str, float] = {}
+        for kv in parts[1:]:
+            k, _, v = kv.partition("=")
+            try:
+                vals[k] = float(v)
+            except ValueError:
+                continue
+        out[parts[0]] = vals
+    return out or None
+
+
+def level_for(pct: float, thresholds: Optional[List[float]]) -> str:
+    """Map a stall percentage onto `ok|warn|hot|critical`."""
+    if not thresholds:
+        return "ok"
+    level = "ok"
+    for name, limit in zip(_LEVELS[1:], thresholds):
+        if limit is not None and pct >= float(limit):
+            level = name
+    return level
+
+
+def worst(*beacons: str) -> str:
+    """Most severe of the given beacons (unknown values count as ok)."""
+    return max(beacons, key=lambda b: _LEVELS.index(b) if b in _LEVELS else 0) if beacons else "ok"
+
+
+class PsiMonitor:
+    """Periodic PSI sampler with stall-based beacons.
+
+    Args:
+        root (str | None): Pressure directory (default `PSI_ROOT` or `/proc/pressure`).
+        clock (Callable[[], float]): Monotonic time source.
+        suffix (str): File suffix; `.pressure` reads a cgroup v2 directory.
+    """
+
+    def __init__(self, root: Optional[str] = None, clock: Callable[[], float] = time.monotonic, suffix: str = "") -> None:
+        self.root = root
+        self.suffix = suffix
+        self._clock = clock
+        self.available = False
+        self.values: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self.stall_pct: Dict[str, float] = {}
+        self.beacons: Dict[str, str] = {r: "ok" for r in RESOURCES}
+        self.beacon = "ok"
+        self._prev: Dict[str, float] = {}
+        self._prev_t: Optional[float] = None
+
+    def sample(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Read all pressure files and update the per-tick stall percentages."""
+        now = self._clock()
+        dt = None if self._prev_t is None else max(1e-6, now - self._prev_t)
+        self._prev_t = now
+        values: Dict[str, Dict[str, Dict[str, float]]] = {}
+        stall: Dict[str, float] = {}
+        for res in RESOURCES:
+            v = read_pressure(res, self.root, self.suffix)
+            if v is None:
+                continue
+            values[res] = v
+            for kind, fields in v.items():
+                key = f"{res}_{kind}"
+                total = fields.get("total")
+                prev = self._prev.get(key)
+                if total is not None:
+                    self._prev[key] = total
+                if dt is not None and total is not None and prev is not None and total >= prev:
+                    tick = min(100.0, (total - prev) / (dt * 1e6) * 100.0)
+                else:
+                    tick = fields.get("avg10", 0.0)
+                fields["tick"] = tick
+                stall[key] = max(tick, fields.get("avg10", 0.0))
+        self.values = values
+        self.stall_pct = stall
+        self.available = bool(values)
+        return values
+
+    def evaluate(self, cfg: Optional[Dict[str, Any]] = None) -> str:
+        """Derive per-resource beacons and the overall PSI beacon.
+
+        Args:
+            cfg (dict | None): Strategy `psi` block (`thresholds`, `enabled`).
+
+        Returns:
+            str: Worst beacon over the evaluated resources.
+        """
+        cfg = cfg or {}
+        if not self.available or cfg.get("enabled", True) is False:
+            self.beacons = {r: "ok" for r in RESOURCES}
+            self.beacon = "ok"
+            return self.beacon
+        th = dict(DEFAULT_THRESHOLDS)
+        th.update(cfg.get("thresholds", {}) or {})
+        beacons: Dict[str, str] = {}
+        for res in RESOURCES:
+            beacons[res] = worst(*(level_for(self.stall_pct.get(f"{res}_{k}", 0.0), th.get(f"{res}_{k}")) for k in ("some", "full")))
+        self.beacons = beacons
+        self.beacon = worst(*beacons.values())
+        return self.beacon
+
+    def admission_factor(self, cfg: Optional[Dict[str, Any]] = None) -> float:
+        """Concurrency factor for the current memory/io stall beacon."""
+        cfg = cfg or {}
+        factors = dict(DEFAULT_ADMISSION)
+        factors.update(cfg.get("admission_factors", {}) or {})
+        level = worst(self.beacons.get("memory", "ok"), self.beacons.get("io", "ok"))
+        return max(0.0, min(1.0, float(factors.get(level, 1.0))))
+
+    def publish(self) -> None:
+        """Export the last sample as labeled gauges and flat `psi_*` metrics."""
+        metrics.observe("psi_available", 1.0 if self.available else 0.0)
+        for res, v in self.values.items():
+            for kind, fields in v.items():
+                for window in ("avg10", "avg60", "avg300", "tick"):
+                    if window in fields:
+                        _pressure.set(fields[window], resource=res, kind=kind, window=window)
+                metrics.observe(f"psi_{res}_{kind}_pct", self.stall_pct.get(f"{res}_{kind}", 0.0))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "source": (self.root or psi_root()) + ("/*" + self.suffix if self.suffix else ""),
+            "beacon": self.beacon,
+            "beacons": dict(self.beacons),
+            "stall_pct": {k: round(v, 3) for k, v in self.stall_pct.items()},
+            "avg": {res: {kind: {w: f.get(w) for w in ("avg10", "avg60", "avg300")} for kind, f in v.items()} for res, v in self.values.items()},
+        }
+
+
+class PsiTrigger:
+    """Kernel PSI trigger waited on by a daemon thread.
+
+    Args:
+        resource (str): `memory`, `io` or `cpu`.
+        kind (str): `some` or `full`.
+        stall_us (int): Stall time within the window that fires the trigger.
+        window_us (int): Tracking window (kernel: 500ms..10s; multiples of 2s when unprivileged).
+        on_event (Callable[[str], None]): Called with the resource on each event.
+        root (str | None): Pressure directory.
+        suffix (str): File suffix (`.pressure` for cgroup v2 directories).
+    """
+
+    def __init__(self, resource: str, kind: str, stall_us: int, window_us: int, on_event: Callable[[str], None], root: Optional[str] = None, suffix: str = "") -> None:
+        self.resource = resource
+        self.spec = f"{kind} {int(stall_us)} {int(window_us)}"
+        self.on_event = on_event
+        self.root = root
+        self.suffix = suffix
+        self.events = 0
+        self.error: Optional[str] = None
+        self._fd: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Register the trigger; returns False (with `error` set) when unsupported."""
+        try:
+            fd = os.open(os.path.join(self.root or psi_root(), self.resource + self.suffix), os.O_RDWR | os.O_NONBLOCK)
+        except OSError as e:
+            self.error = str(e)
+            return False
+        try:
+            os.write(fd, self.spec.encode("ascii") + b"\0")
+        except OSError as e:
+            os.close(fd)
+            self.error = str(e)
+            return False
+        self._fd = fd
+        t = threading.Thread(target=self._run, name=f"psi-{self.resource}", daemon=True)
+        self._thread = t
+        t.start()
+        return True
+
+    def _run(self) -> None:
+        poller = select.poll()
+        poller.register(self._fd, select.POLLPRI)
+        while not self._stop.is_set():
+            try:
+                ready = poller.poll(1000)
+            except OSError:
+                break
+            for _, ev in ready:
+                if ev & select.POLLERR:
+                    self.error = "trigger closed by kernel"
+                    self._stop.set()
+                    break
+                if ev & select.POLLPRI:
+                    self.events += 1
+                    _trigger_events.inc(resource=self.resource)
+                    try:
+                        self.on_event(self.resource)
+                    except Exception:
+                        pass
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"resource": self.resource, "spec": self.spec, "events": self.events, "active": self._fd is not None, "error": self.error}
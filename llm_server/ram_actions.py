@@ -0,0 +1,148 @@
+"""Graduated RAM-pressure actions for the housekeeper.
+
+Levels are derived from the RAM watermarks of the active strategy
+(`ram.soft_pct`/`ram.hard_pct` of used/total) and the RAM beacon
+(`hot` counts as soft, `critical` as hard):
+
+- soft: scale role concurrency down (`ram.soft_concurrency_factor`, default
+  0.5) and drop the RAM tier of the caches.
+- hard: scale concurrency further (`ram.hard_concurrency_factor`, default
+  0.25) and unload the least-recently-used idle model, one per cooldown.
+
+Leaving a level requires pressure below the watermark minus
+`ram.hysteresis_pct` (default 0.03) and a cooled-down beacon. Every
+transition and repeated action waits `backpressure.cooldown_s`. Actions
+are executed only with `actions_enabled` and the matching
+`backpressure.enable_soft`/`enable_hard`; otherwise they are recorded as
+planned. Recent actions appear in the housekeeper snapshot.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from . import openmetrics
+from .metrics import metrics
+
+LEVELS = ("normal", "soft", "hard")
+
+_actions = openmetrics.registry.counter("llm_ram_actions", "RAM-pressure actions by kind (executed or planned).", ("action", "executed"))
+
+
+class RamPressureController:
+    """Hysteresis/cooldown state machine driving RAM-pressure actions.
+
+    Args:
+        clock (Callable[[], float]): Monotonic time source.
+        history (int): Recent actions kept for the snapshot.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, history: int = 20) -> None:
+        self._clock = clock
+        self.level = "normal"
+        self.factor = 1.0
+        self._last_change = -1e18
+        self._last_unload = -1e18
+        self.actions: Deque[Dict[str, Any]] = deque(maxlen=max(1, history))
+
+    @staticmethod
+    def _policy(policy: Dict[str, Any]) -> Dict[str, float]:
+        ram = policy.get("ram", {}) or {}
+        bp = policy.get("backpressure", {}) or {}
+        return {
+            "soft": float(ram.get("soft_pct", 0.80)),
+            "hard": float(ram.get("hard_pct", 0.90)),
+            "hyst": float(ram.get("hysteresis_pct", 0.03)),
+            "soft_factor": float(ram.get("soft_concurrency_factor", 0.5)),
+            "hard_factor": float(ram.get("hard_concurrency_factor", 0.25)),
+            "cooldown": float(bp.get("cooldown_s", 5)),
+        }
+
+    def target_level(self, pressure: float, beacon: str, policy: Dict[str, Any]) -> str:
+        """Level implied by `pressure`/`beacon`, with hysteresis around the current one."""
+        p = self._policy(policy)
+        if pressure >= p["hard"] or beacon == "critical":
+            return "hard"
+        soft_now = pressure >= p["soft"] or beacon == "hot"
+        if self.level == "hard":
+            if pressure >= p["hard"] - p["hyst"]:
+                return "hard"
+            return "soft" if soft_now or pressure >= p["soft"] - p["hyst"] else "normal"
+        if soft_now:
+            return "soft"
+        if self.level == "soft" and pressure >= p["soft"] - p["hyst"]:
+            return "soft"
+        return "normal"
+
+    def _record(self, action: str, detail: Dict[str, Any], executed: bool) -> Dict[str, Any]:
+        item = {"ts": time.time(), "level": self.level, "action": action, "executed": executed, **detail}
+        self.actions.append(item)
+        _actions.inc(action=action, executed="true" if executed else "false")
+        if executed:
+            metrics.inc(f"ram_actions_total:{action}", 1)
+        return item
+
+    def step(self, pressure: float, beacon: str, policy: Dict[str, Any], conc: Any = None, registry: Any = None, caches: Any = None) -> List[Dict[str, Any]]:
+        """Evaluate one housekeeper tick and perform (or plan) actions.
+
+        Args:
+            pressure (float): RAM used/total (0..1).
+            beacon (str): RAM beacon (`ok|warn|hot|critical`).
+            policy (dict): Active housekeeper strategy.
+            conc: `ConcurrencyManager` (scaled via `scale`).
+            registry: `ModelRegistry` (residency via `lru_idle`/`unload`).
+            caches: `CacheManager` (RAM tiers dropped via `drop_ram`).
+
+        Returns:
+            List[dict]: Actions recorded during this tick.
+        """
+        p = self._policy(policy)
+        bp = policy.get("backpressure", {}) or {}
+        actions_on = bool(policy.get("actions_enabled", False))
+        allow = {"soft": actions_on and bool(bp.get("enable_soft", True)), "hard": actions_on and bool(bp.get("enable_hard", True))}
+        now = self._clock()
+        out: List[Dict[str, Any]] = []
+        target = self.target_level(pressure, beacon, policy)
+        cooled = now - self._last_change >= p["cooldown"]
+        changed = False
+        if target != self.level and cooled:
+            prev, self.level = self.level, target
+            self._last_change = now
+            changed = True
+            if LEVELS.index(target) > LEVELS.index(prev):
+                gate = allow[target]
+                dropped = caches.drop_ram() if (gate and caches is not None) else 0
+                out.append(self._record("cache_drop", {"from_level": prev, "entries": dropped}, gate))
+        planned = {"normal": 1.0, "soft": p["soft_factor"], "hard": p["hard_factor"]}[self.level]
+        want = planned if (self.level == "normal" or allow[self.level]) else 1.0
+        if abs(want - self.factor) > 1e-9:
+            self.factor = want
+            out.append(self._record("concurrency_scale", {"factor": want}, True))
+        elif changed and abs(planned - want) > 1e-9:
+            out.append(self._record("concurrency_scale", {"factor": planned}, False))
+        # keep a (re)created ConcurrencyManager in line with the current factor
+        if conc is not None and abs(getattr(conc, "factors", {}).get("ram", 1.0) - self.factor) > 1e-9:
+            try:
+                conc.scale(self.factor, source="ram")
+            except Exception:
+                pass
+        if self.level == "hard" and registry is not None and now - self._last_unload >= p["cooldown"]:
+            name = registry.lru_idle() if hasattr(registry, "lru_idle") else None
+            if name:
+                self._last_unload = now
+                done = bool(allow["hard"] and registry.unload(name))
+                out.append(self._record("model_unload", {"model": name}, done))
+        try:
+            metrics.observe("ram_pressure_level", float(LEVELS.index(self.level)))
+            metrics.observe("concurrency_factor", self.factor)
+        except Exception:
+            pass
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        last: Optional[Dict[str, Any]] = self.actions[-1] if self.actions else None
+        return {"level": self.level, "concurrency_factor": self.factor, "last_action": last, "recent": list(self.actions)}
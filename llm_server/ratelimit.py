@@ -0,0 +1,537 @@
+"""Request rate limiting shared across worker processes.
+
+Token buckets (`rps` refill, `burst` capacity) keyed by client. The key is
+chosen by `RATE_LIMIT_KEY`:
+
+- `ip` (default): the client address.
+- `api_key`: `Authorization: Bearer …` or `X-API-Key`, hashed and never stored in clear.
+- `user`: `X-User` / `X-User-Id`.
+
+The last two fall back to the IP when the header is missing.
+
+Two engines are available:
+
+- `SharedBuckets`: a fixed-size, open-addressed hash table in a
+  memory-mapped file (`RATE_LIMIT_SHM`). Every uvicorn worker maps the same
+  file, and updates are serialized with `fcntl.flock`, so the configured
+  limit holds for the whole server instead of per worker. A bucket that
+  has been idle long enough to refill completely is equivalent to a new
+  one, so its slot is reused in place (idle GC). When a probe window is
+  full of live buckets, the least recently used one is taken over.
+- `LocalBuckets`: a per-process dict bounded by `RATE_LIMIT_MAX_KEYS`, with
+  periodic idle sweeps and LRU eviction.
+
+`RATE_LIMIT_BACKEND` picks `shared` or `local`. The default, `auto`, uses
+the shared table when the server runs several workers (`WEB_CONCURRENCY >
+1`) or `RATE_LIMIT_SHM` is set. A single process keeps its buckets in
+memory, so a restart starts clean. If the shared file cannot be mapped,
+the local engine is used.
+
+`TokenLimiter` budgets generation work rather than requests. It charges
+prompt tokens at admission and completion tokens once the generation
+ends, and it also caps concurrent generations per client
+(`RATE_LIMIT_TPM`, `RATE_LIMIT_CONCURRENT`). Its decisions and the
+remaining budget are reported in `x-ratelimit-*` headers.
+
+The settings are read once by `from_env()` / `token_limiter_from_env()`
+when the app is created.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+try:
+    import fcntl
+except Exception:  # pragma: no cover - non-POSIX
+    fcntl = None  # type: ignore
+
+from . import openmetrics
+from .metrics import metrics
+
+_MAGIC = b"LLMRL001"
+_HEADER = struct.Struct("<8sIIdd")  # magic, slots, probe, rps, burst
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<Qdd")  # key hash (0 = empty), tokens, last refill ts
+
+_token_decisions = openmetrics.registry.counter("llm_token_limit_decisions", "Token rate-limit outcomes.", ("result",))
+_tokens_charged = openmetrics.registry.counter("llm_token_limit_charged", "Tokens charged to client budgets.", ("kind",))
+
+
+def _hash(key: str) -> int:
+    h = int.from_bytes(hashlib.blake2b(key.encode("utf-8", "replace"), digest_size=8).digest(), "little")
+    return h or 1
+
+
+def client_key(mode: str, ip: str, headers: Mapping[str, str], user: Optional[str] = None) -> str:
+    """Bucket key for a request according to `mode` (`ip`, `api_key` or `user`).
+
+    `user` (the OpenAI request field) is used in `user` mode when no header names one.
+    """
+    if mode == "api_key":
+        token = headers.get("x-api-key") or ""
+        auth = headers.get("authorization") or ""
+        if not token and auth.lower().startswith("bearer "):
+            token = auth[7:].strip()
+        if token:
+            return "key:" + hashlib.blake2b(token.encode("utf-8", "replace"), digest_size=12).hexdigest()
+    elif mode == "user":
+        user = headers.get("x-user") or headers.get("x-user-id") or user
+        if user:
+            return "user:" + user.strip()[:128]
+    return f"ip:{ip}"
+
+
+def _refill(tokens: float, last: float, now: float, rps: float, burst: float) -> float:
+    return min(burst, tokens + max(0.0, now - last) * rps)
+
+
+def _idle(tokens: float, last: float, now: float, rps: float, burst: float) -> bool:
+    """A bucket that has refilled completely is indistinguishable from a new one."""
+    return _refill(tokens, last, now, rps, burst) >= burst
+
+
+class LocalBuckets:
+    """Per-process token buckets with a bounded, idle-collected table.
+
+    Args:
+        rps (float): Tokens per second (allowed average).
+        burst (int): Maximum accumulated burst.
+        max_keys (int): Table bound; the least recently used key is evicted beyond it.
+    """
+
+    backend = "local"
+
+    def __init__(self, rps: float, burst: int, max_keys: int = 65536) -> None:
+        self.rps = max(0.0, float(rps))
+        self.burst = max(1, int(burst))
+        self.max_keys = max(1, int(max_keys))
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._ops = 0
+
+    def _sweep(self, now: float) -> None:
+        # oldest first: stop at the first bucket that is still refilling
+        while self._buckets:
+            k, (tokens, last) = next(iter(self._buckets.items()))
+            if not _idle(tokens, last, now, self.rps, self.burst):
+                break
+            del self._buckets[k]
+
+    def take(self, key: str, now: float, cost: float = 1.0, force: bool = False) -> Tuple[bool, float, float]:
+        """Charge `cost` tokens to `key`.
+
+        Args:
+            key (str): Client key.
+            now (float): Current timestamp.
+            cost (float): Tokens to charge.
+            force (bool): Charge even without enough tokens. The balance may go
+                negative, down to `-burst`, and later requests then wait for the debt.
+
+        Returns:
+            Tuple[bool, float, float]: (allowed, tokens left, seconds until `cost` is available).
+        """
+        if self.rps <= 0:
+            return True, float(self.burst), 0.0
+        with self._lock:
+            self._ops += 1
+            if self._ops % 1024 == 0:
+                self._sweep(now)
+            tokens, last = self._buckets.pop(key, (float(self.burst), now))
+            tokens = _refill(tokens, last, now, self.rps, self.burst)
+            allowed = force or tokens >= cost
+            if allowed:
+                tokens = min(float(self.burst), max(-float(self.burst), tokens - cost))
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                metrics.inc("rate_limit_evictions_total", 1)
+        return allowed, tokens, 0.0 if allowed else (cost - tokens) / self.rps
+
+    def allow(self, key: str, now: float) -> bool:
+        """Consume 1 token and return True if allowed."""
+        return self.take(key, now)[0]
+
+    def stats(self, now: float) -> dict:
+        with self._lock:
+            live = sum(1 for tokens, last in self._buckets.values() if not _idle(tokens, last, now, self.rps, self.burst))
+            return {"backend": self.backend, "keys": len(self._buckets), "live": live, "capacity": self.max_keys}
+
+
+class SharedBuckets:
+    """Token buckets in a memory-mapped table shared by all workers.
+
+    Args:
+        path (str): Backing file (created and sized on first use).
+        rps (float): Tokens per second (allowed average).
+        burst (int): Maximum accumulated burst.
+        slots (int): Table size (bounded memory: 24 bytes per slot).
+        probe (int): Slots inspected per lookup before evicting the LRU one.
+
+    Raises:
+        OSError: When the file cannot be created or mapped.
+    """
+
+    backend = "shared"
+
+    def __init__(self, path: str, rps: float, burst: int, slots: int = 65536, probe: int = 16) -> None:
+        self.path = path
+        self.rps = max(0.0, float(rps))
+        self.burst = max(1, int(burst))
+        self.slots = max(16, int(slots))
+        self.probe = max(1, min(int(probe), self.slots))
+        self._lock = threading.Lock()  # flock does not exclude threads sharing the descriptor
+        size = _HEADER_SIZE + self.slots * _SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            self._flock(True)
+            try:
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)
+                self._mm = mmap.mmap(self._fd, size)
+                if _HEADER.unpack_from(self._mm, 0) != (_MAGIC, self.slots, self.probe, self.rps, float(self.burst)):
+                    # new file or different settings: start from empty buckets
+                    self._mm[: size] = bytes(size)
+                    _HEADER.pack_into(self._mm, 0, _MAGIC, self.slots, self.probe, self.rps, float(self.burst))
+            finally:
+                self._flock(False)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+    def _flock(self, on: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if on else fcntl.LOCK_UN)
+
+    def _find(self, h: int, now: float) -> Tuple[int, bool]:
+        """Slot offset for hash `h` and whether it already holds that key."""
+        mm = self._mm
+        start = h % self.slots
+        reuse = -1
+        lru_off, lru_ts = -1, float("inf")
+        for i in range(self.probe):
+            off = _HEADER_SIZE + ((start + i) % self.slots) * _SLOT.size
+            k, tokens, last = _SLOT.unpack_from(mm, off)
+            if k == h:
+                return off, True
+            if k == 0:
+                # slots are never emptied, so the key cannot sit past an empty one
+                return (reuse if reuse >= 0 else off), False
+            if reuse < 0 and _idle(tokens, last, now, self.rps, self.burst):
+                reuse = off
+            if last < lru_ts:
+                lru_off, lru_ts = off, last
+        if reuse >= 0:
+            return reuse, False
+        metrics.inc("rate_limit_evictions_total", 1)
+        return lru_off, False
+
+    def take(self, key: str, now: float, cost: float = 1.0, force: bool = False) -> Tuple[bool, float, float]:
+        """Charge `cost` tokens to `key` (see `LocalBuckets.take`)."""
+        if self.rps <= 0:
+            return True, float(self.burst), 0.0
+        h = _hash(key)
+        with self._lock:
+            self._flock(True)
+            try:
+                off, found = self._find(h, now)
+                if found:
+                    _, tokens, last = _SLOT.unpack_from(self._mm, off)
+                    tokens = _refill(tokens, last, now, self.rps, self.burst)
+                else:
+                    tokens = float(self.burst)
+                allowed = force or tokens >= cost
+                if allowed:
+                    tokens = min(float(self.burst), max(-float(self.burst), tokens - cost))
+                _SLOT.pack_into(self._mm, off, h, tokens, now)
+            finally:
+                self._flock(False)
+        return allowed, tokens, 0.0 if allowed else (cost - tokens) / self.rps
+
+    def allow(self, key: str, now: float) -> bool:
+        """Consume 1 token and return True if allowed."""
+        return self.take(key, now)[0]
+
+    def stats(self, now: float) -> dict:
+        used = live = 0
+        with self._lock:
+            for i in range(self.slots):
+                k, tokens, last = _SLOT.unpack_from(self._mm, _HEADER_SIZE + i * _SLOT.size)
+                if k:
+                    used += 1
+                    live += not _idle(tokens, last, now, self.rps, self.burst)
+        return {"backend": self.backend, "keys": used, "live": live, "capacity": self.slots, "path": self.path}
+
+    def close(self) -> None:
+        try:
+            self._mm.close()
+        finally:
+            os.close(self._fd)
+
+
+def workers() -> int:
+    """Worker processes the server runs with (`WEB_CONCURRENCY`, default 1)."""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def default_path() -> str:
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"llm-server-ratelimit-{uid}.bin")
+
+
+def from_env() -> Optional[object]:
+    """Build the limiter from `RATE_LIMIT_*` env vars (None when disabled).
+
+    Env:
+        RATE_LIMIT_ENABLED (`1`), RATE_LIMIT_RPS (20), RATE_LIMIT_BURST (40),
+        RATE_LIMIT_BACKEND (`auto` | `shared` | `local`), RATE_LIMIT_SHM (backing file),
+        RATE_LIMIT_SLOTS (65536), RATE_LIMIT_MAX_KEYS (65536).
+    """
+    if os.getenv("RATE_LIMIT_ENABLED", "1") not in ("1", "true", "on"):
+        return None
+    try:
+        rps = float(os.getenv("RATE_LIMIT_RPS", "20"))
+        burst = int(os.getenv("RATE_LIMIT_BURST", "40"))
+    except Exception:
+        rps, burst = 20.0, 40
+    try:
+        slots = int(os.getenv("RATE_LIMIT_SLOTS", "65536"))
+        max_keys = int(os.getenv("RATE_LIMIT_MAX_KEYS", "65536"))
+    except Exception:
+        slots, max_keys = 65536, 65536
+    return _engine(rps, burst, "", slots, max_keys)
+
+
+def _engine(rps: float, burst: int, suffix: str, slots: int = 65536, max_keys: int = 65536) -> object:
+    backend = os.getenv("RATE_LIMIT_BACKEND", "auto").strip().lower()
+    if backend == "auto":
+        backend = "shared" if workers() > 1 or os.getenv("RATE_LIMIT_SHM") else "local"
+    if backend == "shared" and fcntl is not None:
+        try:
+            return SharedBuckets((os.getenv("RATE_LIMIT_SHM") or default_path()) + suffix, rps, burst, slots=slots)
+        except Exception:
+            pass
+    return LocalBuckets(rps, burst, max_keys=max_keys)
+
+
+def key_mode() -> str:
+    """`RATE_LIMIT_KEY` normalized to `ip`, `api_key` or `user`."""
+    mode = os.getenv("RATE_LIMIT_KEY", "ip").strip().lower().replace("-", "_")
+    return mode if mode in ("ip", "api_key", "user") else "ip"
+
+
+class TokenLimitExceeded(Exception):
+    """Raised when a client is out of token budget or generation slots.
+
+    Attributes:
+        reason (str): `tokens`, `prompt_too_large` or `concurrency`.
+        retry_after_s (float): When the request would fit (0 for `prompt_too_large`, which never fits).
+        headers (dict): `x-ratelimit-*` headers at the time of the decision.
+    """
+
+    def __init__(self, message: str, reason: str, retry_after_s: float, headers: Dict[str, str]) -> None:
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after_s = float(retry_after_s)
+        self.headers = headers
+
+
+class TokenLease:
+    """An admitted generation: prompt tokens charged, one generation slot held."""
+
+    __slots__ = ("key", "prompt_tokens", "completion_tokens", "headers", "settled")
+
+    def __init__(self, key: str, prompt_tokens: int, headers: Dict[str, str]) -> None:
+        self.key = key
+        self.prompt_tokens = int(prompt_tokens)
+        self.completion_tokens = 0
+        self.headers = headers
+        self.settled = False
+
+
+class TokenLimiter:
+    """Per-client token throughput and concurrent-generation limits.
+
+    Prompt tokens are charged when a generation is admitted. Completion
+    tokens are charged when it finishes (`settle`), even past the balance,
+    so a large answer delays that client's next requests instead of being
+    free. The budget refills at `tpm / 60` tokens per second up to `burst`.
+
+    The token buckets use the same engine as the request limiter, so they
+    are shared across workers. The concurrent-generation cap is counted per
+    process; with several workers each enforces `ceil(cap / workers)`.
+
+    Args:
+        tpm (float): Tokens per minute per client (0 disables the token budget).
+        burst (int | None): Bucket capacity (default: one minute of tokens).
+        max_concurrent (int): Generations in flight per client (0 = unlimited).
+        max_wait_s (float): Queue up to this long for budget or a slot before rejecting.
+        engine (object | None): Bucket engine (default: `LocalBuckets`).
+        clock (Callable[[], float]): Wall-clock time source.
+        sleep (Callable[[float], None]): Sleep used while queued for tokens.
+    """
+
+    def __init__(
+        self,
+        tpm: float,
+        burst: Optional[int] = None,
+        max_concurrent: int = 0,
+        max_wait_s: float = 0.0,
+        engine: Optional[object] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.tpm = max(0.0, float(tpm))
+        self.rate = self.tpm / 60.0
+        self.burst = max(1, int(burst if burst else self.tpm or 1))
+        self.max_concurrent = max(0, int(max_concurrent))
+        self.max_wait_s = max(0.0, float(max_wait_s))
+        self._buckets = engine if engine is not None else LocalBuckets(self.rate, self.burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._cond = threading.Condition()
+        self._inflight: Dict[str, int] = {}
+
+    def _headers(self, key: str, tokens: float, inflight: int) -> Dict[str, str]:
+        h: Dict[str, str] = {}
+        if self.tpm > 0:
+            reset = (self.burst - tokens) / self.rate if self.rate > 0 else 0.0
+            h["x-ratelimit-limit-tokens"] = str(int(self.tpm))
+            h["x-ratelimit-remaining-tokens"] = str(max(0, int(tokens)))
+            h["x-ratelimit-reset-tokens"] = f"{max(0.0, reset):.1f}s"
+        if self.max_concurrent > 0:
+            h["x-ratelimit-limit-concurrent"] = str(self.max_concurrent)
+            h["x-ratelimit-remaining-concurrent"] = str(max(0, self.max_concurrent - inflight))
+        return h
+
+    def _balance(self, key: str) -> float:
+        if self.tpm <= 0:
+            return 0.0
+        return self._buckets.take(key, self._clock(), 0.0)[1]
+
+    def _reject(self, message: str, reason: str, retry: float, key: str, tokens: float) -> TokenLimitExceeded:
+        metrics.inc("token_limited_total", 1)
+        metrics.inc(f"token_limited_total:{reason}", 1)
+        _token_decisions.inc(result=reason)
+        return TokenLimitExceeded(message, reason, retry, self._headers(key, tokens, self._inflight.get(key, 0)))
+
+    def admit(self, key: str, prompt_tokens: int) -> TokenLease:
+        """Charge `prompt_tokens` to `key` and take a generation slot.
+
+        Raises:
+            TokenLimitExceeded: When the budget or slots do not free up within `max_wait_s`.
+        """
+        deadline = self._clock() + self.max_wait_s
+        if self.tpm > 0 and prompt_tokens > self.burst:
+            raise self._reject(
+                f"prompt of {prompt_tokens} tokens exceeds the token budget ({self.burst})",
+                "prompt_too_large", 0.0, key, self._balance(key),
+            )
+        cap = self.max_concurrent
+        if cap > 0:
+            cap = max(1, -(-cap // workers()))
+            with self._cond:
+                while self._inflight.get(key, 0) >= cap:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        raise self._reject(
+                            f"too many concurrent generations (limit {self.max_concurrent})",
+                            "concurrency", 1.0, key, self._balance(key),
+                        )
+                    self._cond.wait(min(remaining, 0.5))
+                self._inflight[key] = self._inflight.get(key, 0) + 1
+        try:
+            tokens = 0.0
+            if self.tpm > 0:
+                while True:
+                    ok, tokens, retry = self._buckets.take(key, self._clock(), float(prompt_tokens))
+                    if ok:
+                        break
+                    if self._clock() + retry > deadline:
+                        raise self._reject(
+                            f"token rate limit exceeded ({int(self.tpm)} tokens/min)",
+                            "tokens", retry, key, tokens,
+                        )
+                    self._sleep(retry)
+                _tokens_charged.inc(prompt_tokens, kind="prompt")
+        except Exception:
+            self._release(key)
+            raise
+        _token_decisions.inc(result="admitted")
+        return TokenLease(key, prompt_tokens, self._headers(key, tokens, self._inflight.get(key, 0)))
+
+    def settle(self, lease: TokenLease, completion_tokens: int, refund_prompt: bool = False) -> None:
+        """Charge the completion tokens of a finished generation and free its slot.
+
+        Args:
+            lease (TokenLease): Lease returned by `admit`.
+            completion_tokens (int): Tokens generated.
+            refund_prompt (bool): Return the prompt charge (the generation never ran).
+        """
+        if lease.settled:
+            return
+        lease.settled = True
+        lease.completion_tokens = int(completion_tokens)
+        try:
+            if self.tpm > 0:
+                cost = float(completion_tokens) - (lease.prompt_tokens if refund_prompt else 0)
+                if cost:
+                    self._buckets.take(lease.key, self._clock(), cost, force=True)
+                if completion_tokens > 0:
+                    _tokens_charged.inc(completion_tokens, kind="completion")
+        finally:
+            self._release(lease.key)
+        lease.headers = self.headers(lease.key)
+
+    def headers(self, key: str) -> Dict[str, str]:
+        """Current `x-ratelimit-*` headers for `key`."""
+        with self._cond:
+            inflight = self._inflight.get(key, 0)
+        return self._headers(key, self._balance(key), inflight)
+
+    def _release(self, key: str) -> None:
+        if self.max_concurrent <= 0:
+            return
+        with self._cond:
+            n = self._inflight.get(key, 0) - 1
+            if n > 0:
+                self._inflight[key] = n
+            else:
+                self._inflight.pop(key, None)
+            self._cond.notify_all()
+
+
+def token_limiter_from_env() -> Optional[TokenLimiter]:
+    """Build the token limiter from env (None when neither limit is set).
+
+    Env:
+        RATE_LIMIT_TPM (0 = off), RATE_LIMIT_TOKEN_BURST (default: TPM),
+        RATE_LIMIT_CONCURRENT (0 = off), RATE_LIMIT_TOKEN_WAIT_S (0 = reject at once).
+    """
+    if os.getenv("RATE_LIMIT_ENABLED", "1") not in ("1", "true", "on"):
+        return None
+    try:
+        tpm = float(os.getenv("RATE_LIMIT_TPM", "0"))
+        burst = int(os.getenv("RATE_LIMIT_TOKEN_BURST", "0")) or None
+        conc = int(os.getenv("RATE_LIMIT_CONCURRENT", "0"))
+        wait = float(os.getenv("RATE_LIMIT_TOKEN_WAIT_S", "0"))
+    except Exception:
+        return None
+    if tpm <= 0 and conc <= 0:
+        return None
+    burst_n = int(burst or tpm or 1)
+    engine = _engine(tpm / 60.0, burst_n, ".tokens") if tpm > 0 else None
+    return TokenLimiter(tpm, burst_n, max_concurrent=conc, max_wait_s=wait, engine=engine)
@@ -1,6 +1,10 @@
 from __future__ import annotations
 
+import os
 import shutil
+import threading
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional
@@ -16,6 +20,10 @@ class ModelSpec:
     path: Path
     context_max: int
     est_ram_gb: float
+    # Architecture dims for the KV-cache estimate (0 = unknown)
+    n_layers: int = 0
+    n_kv_heads: int = 0
+    head_dim: int = 0
 
 
 class ModelRegistry:
@@ -26,6 +34,10 @@ class ModelRegistry:
         self.models_cfg = self.cfg.get("models", [])
         self._by_name: Dict[str, ModelSpec] = {}
         self._llama_ok = False
+        # Residency: models whose weights were mapped by a recent generation
+        self._res_lock = threading.Lock()
+        self._active: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
 
     def refresh(self) -> None:
         # ensure llama.cpp exists
@@ -43,7 +55,11 @@ class ModelRegistry:
             if not file:
                 continue
             path = (self.models_root / file).resolve()
-            by_name[name] = ModelSpec(name=name, path=path, context_max=ctx, est_ram_gb=ram)
+            arch = m.get("arch", {}) or {}
+            by_name[name] = ModelSpec(
+                name=name, path=path, context_max=ctx, est_ram_gb=ram,
+                n_layers=int(arch.get("layers", 0)), n_kv_heads=int(arch.get("kv_heads", 0)), head_dim=int(arch.get("head_dim", 0)),
+            )
         self._by_name = by_name
 
     def get(self, name: str) -> Optional[ModelSpec]:
@@ -79,3 +95,54 @@ class ModelRegistry:
             "ready": self.ready(),
         }
 
+    @contextmanager
+    def in_use(self, name: str):
+        """Mark `name` as active (and resident) for the duration of a generation."""
+        with self._res_lock:
+            self._active[name] = self._active.get(name, 0) + 1
+            self._last_used[name] = time.time()
+        try:
+            yield
+        finally:
+            with self._res_lock:
+                self._active[name] = max(0, self._active.get(name, 1) - 1)
+                self._last_used[name] = time.time()
+
+    def residency(self) -> Dict[str, Dict[str, object]]:
+        """Resident models with active generation count and last use time."""
+        with self._res_lock:
+            return {n: {"active": self._active.get(n, 0), "last_used": t, "est_ram_gb": getattr(self.get(n), "est_ram_gb", 0.0)} for n, t in self._last_used.items()}
+
+    def lru_idle(self) -> Optional[str]:
+        """Least-recently-used resident model with no active generation."""
+        with self._res_lock:
+            idle = [(t, n) for n, t in self._last_used.items() if not self._active.get(n)]
+        return min(idle)[1] if idle else None
+
+    def unload(self, name: str) -> bool:
+        """Release the memory held by an idle model.
+
+        Generations run `llama-cli` per request, so an idle model has no
+        process; its weights stay in the page cache through the GGUF
+        mapping. This drops those pages (`POSIX_FADV_DONTNEED`) and forgets
+        the model as resident.
+
+        Returns:
+            bool: True when the model was idle and released.
+        """
+        with self._res_lock:
+            if self._active.get(name) or name not in self._last_used:
+                return False
+            self._last_used.pop(name, None)
+            self._active.pop(name, None)
+        spec = self.get(name)
+        if spec is not None and hasattr(os, "posix_fadvise"):
+            try:
+                fd = os.open(str(spec.path), os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                finally:
+                    os.close(fd)
+            except OSError:
+                pass
+        return True
@@ -0,0 +1,435 @@
+"""Server-side conversation sessions with persisted KV state.
+
+A session keeps a conversation's rendered history on the server, so a client
+only sends the new messages of each turn. Each session lives in its own
+directory under `sessions.dir`:
+
+- `session.json`: model, timestamps, TTL and the transcript as `parts`
+  whose plain concatenation is exactly the text the backend evaluated: each
+  turn appends its new prompt text and then the generated reply, with no
+  separator before the reply. The prompt of turn N+1 is therefore the
+  prompt of turn N followed directly by its reply, then `"\n"` and the new
+  messages.
+- `kv.bin`: the `llama-cli --prompt-cache` state of the last turn, saved with
+  `--prompt-cache-all` so it also covers the generated reply. The next turn
+  reloads it and only evaluates the tokens after the longest common prefix,
+  i.e. just the new message (up to re-tokenization at the boundary).
+
+The transcript is never trimmed. Once it no longer fits the model's context
+window, the API answers 400 and the client starts a new session.
+
+Only one turn per session runs at a time (`begin`/`finish`). A second
+concurrent turn gets `409`, because both would rewrite the same KV file.
+Every `begin` must be paired with exactly one `finish`; the API guarantees
+this for streams whose body is never iterated as well.
+
+`SESSIONS_DIR` overrides `sessions.dir`. Budgets come from the strategy
+`sessions` block of `configs/housekeeper.yaml` and are applied every
+housekeeper tick (`apply_policy`):
+
+- `ttl_s`: idle sessions older than this are removed with their files.
+- `max_sessions`: creating a session beyond this removes the least recently
+  used idle session.
+- `max_session_gb`: a turn whose estimated KV state is larger runs without a
+  prompt cache, and any stale `kv.bin` is dropped.
+- `max_total_gb`: KV files of idle sessions are dropped least recently used
+  first until the total fits. The history stays, so the next turn of such a
+  session re-evaluates its prompt once and saves the state again.
+- `shrink`: factor applied to `max_total_gb` per SSD beacon (defaults: hot
+  0.5, critical 0), so KV state goes first when the disk fills.
+
+Metrics: `sessions_active`, `sessions_kv_gb`, `sessions_expired_total`,
+`sessions_kv_dropped_total`, `session_turns_total` and
+`llm_session_turns{kv}` (`kv` is `hit` when a saved state was reused).
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import openmetrics
+from .metrics import metrics
+
+_GB = float(1024 ** 3)
+
+DEFAULT_SHRINK = {"ok": 1.0, "warn": 1.0, "hot": 0.5, "critical": 0.0}
+
+_ID_RE = re.compile(r"^sess-[0-9a-f]{32}$")
+
+_turns = openmetrics.registry.counter("llm_session_turns", "Session turns by whether a saved KV state was reused.", ("kv",))
+_kv_bytes_g = openmetrics.registry.gauge("llm_session_kv_bytes", "Bytes of saved session KV state on SSD.")
+
+
+class SessionError(Exception):
+    """Raised for unknown, busy or mismatched sessions.
+
+    Attributes:
+        status (int): HTTP status for the API (404, 409 or 400).
+    """
+
+    def __init__(self, message: str, status: int = 404) -> None:
+        super().__init__(message)
+        self.status = int(status)
+
+
+class SessionStore:
+    """Directory-backed session registry with TTLs and SSD quotas.
+
+    Args:
+        root (str): Directory holding one subdirectory per session.
+        ttl_s (float): Idle time after which a session expires.
+        max_sessions (int): Maximum number of sessions kept.
+        max_session_bytes (int): Largest KV state saved for one session.
+        max_total_bytes (int): Budget for all KV files (before beacon shrink).
+        clock (Callable[[], float]): Wall clock, injectable for tests.
+    """
+
+    def __init__(
+        self,
+        root: str = "runtime/sessions",
+        ttl_s: float = 86400.0,
+        max_sessions: int = 256,
+        max_session_bytes: int = int(16 * _GB),
+        max_total_bytes: int = int(64 * _GB),
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.root = str(root)
+        self.ttl_s = float(ttl_s)
+        self.max_sessions = int(max_sessions)
+        self.max_session_bytes = int(max_session_bytes)
+        self.max_total_bytes = int(max_total_bytes)
+        self.factor = 1.0
+        self.clock = clock
+        self.expired_total = 0
+        self.kv_dropped_total = 0
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._busy: Dict[str, str] = {}  # session -> token of the turn holding it
+        self._loaded = False
+
+    # --- files -----------------------------------------------------------------
+
+    def _dir(self, sid: str) -> Path:
+        return Path(self.root) / sid
+
+    def kv_path(self, sid: str) -> str:
+        """Path of the session's `--prompt-cache` file."""
+        return str(self._dir(sid) / "kv.bin")
+
+    def _kv_size(self, sid: str) -> int:
+        try:
+            return os.path.getsize(self.kv_path(sid))
+        except OSError:
+            return 0
+
+    def _write(self, rec: Dict[str, Any]) -> None:
+        d = self._dir(rec["id"])
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / "session.json.tmp"
+        tmp.write_text(json.dumps(rec, ensure_ascii=False))
+        os.replace(tmp, d / "session.json")
+
+    def _read(self, sid: str) -> Dict[str, Any]:
+        try:
+            return json.loads((self._dir(sid) / "session.json").read_text())
+        except Exception:
+            raise SessionError(f"session {sid} not found", 404)
+
+    def _remove(self, sid: str) -> None:
+        self._meta.pop(sid, None)
+        self._busy.pop(sid, None)
+        shutil.rmtree(self._dir(sid), ignore_errors=True)
+
+    def _drop_kv(self, sid: str) -> int:
+        size = self._kv_size(sid)
+        try:
+            os.remove(self.kv_path(sid))
+        except OSError:
+            return 0
+        m = self._meta.get(sid)
+        if m is not None:
+            m["kv_bytes"] = 0
+        self.kv_dropped_total += 1
+        return size
+
+    def _load(self) -> None:
+        """Index sessions already on disk (they survive restarts)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            entries = list(Path(self.root).iterdir())
+        except OSError:
+            return
+        for d in entries:
+            if not _ID_RE.match(d.name):
+                continue
+            try:
+                rec = json.loads((d / "session.json").read_text())
+            except Exception:
+                shutil.rmtree(d, ignore_errors=True)
+                continue
+            self._meta[d.name] = self._summary(rec)
+
+    def _summary(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "last_used": float(rec.get("last_used", 0.0)),
+            "ttl_s": float(rec.get("ttl_s") or self.ttl_s),
+            "kv_bytes": self._kv_size(rec["id"]),
+        }
+
+    # --- policy ----------------------------------------------------------------
+
+    def apply_policy(self, policy: Dict[str, Any], ssd_beacon: str = "ok") -> Dict[str, Any]:
+        """Apply the strategy `sessions` block, shrink on a hot SSD beacon, then sweep.
+
+        Returns:
+            Dict[str, Any]: What the sweep removed (see `sweep`).
+        """
+        cfg = (policy or {}).get("sessions") or {}
+        if not isinstance(cfg, dict):
+            cfg = {}
+        shrink = dict(DEFAULT_SHRINK)
+        shrink.update(cfg.get("shrink") or {})
+        with self._lock:
+            root = os.getenv("SESSIONS_DIR") or cfg.get("dir")
+            if root and str(root) != self.root:
+                self.root = str(root)
+                self._meta.clear()
+                self._loaded = False
+            self.ttl_s = float(cfg.get("ttl_s", self.ttl_s))
+            self.max_sessions = int(cfg.get("max_sessions", self.max_sessions))
+            if "max_session_gb" in cfg:
+                self.max_session_bytes = int(float(cfg["max_session_gb"]) * _GB)
+            if "max_total_gb" in cfg:
+                self.max_total_bytes = int(float(cfg["max_total_gb"]) * _GB)
+            self.factor = float(shrink.get(ssd_beacon, 1.0))
+        return self.sweep()
+
+    def kv_budget(self) -> int:
+        """Total KV bytes allowed under the current beacon."""
+        return int(self.max_total_bytes * self.factor)
+
+    def kv_allowed(self, est_bytes: int) -> bool:
+        """Whether a turn with `est_bytes` of KV state may save it."""
+        budget = min(self.max_session_bytes, self.kv_budget())
+        return budget > 0 and int(est_bytes) <= budget
+
+    # --- lifecycle -------------------------------------------------------------
+
+    def create(self, model: str, ttl_s: Optional[float] = None) -> Dict[str, Any]:
+        """Create an empty session bound to `model`."""
+        now = self.clock()
+        sid = f"sess-{secrets.token_hex(16)}"
+        rec = {"id": sid, "model": model, "created": now, "last_used": now, "ttl_s": float(ttl_s or self.ttl_s), "turns": 0, "parts": []}
+        with self._lock:
+            self._load()
+            self._expire(now)
+            while len(self._meta) >= max(1, self.max_sessions):
+                idle = [s for s in self._meta if s not in self._busy]
+                if not idle:
+                    raise SessionError("too many active sessions", 503)
+                self._remove(min(idle, key=lambda s: self._meta[s]["last_used"]))
+                metrics.inc("sessions_evicted_total", 1)
+            self._write(rec)
+            self._meta[sid] = self._summary(rec)
+            self._gauges()
+        return self.describe(rec)
+
+    def describe(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a session record (without the history)."""
+        sid = rec["id"]
+        ttl = float(rec.get("ttl_s") or self.ttl_s)
+        return {
+            "id": sid,
+            "object": "session",
+            "model": rec.get("model"),
+            "created": int(rec.get("created", 0)),
+            "last_used": int(rec.get("last_used", 0)),
+            "expires_at": int(float(rec.get("last_used", 0)) + ttl),
+            "turns": int(rec.get("turns", 0)),
+            "history_chars": sum(len(p) for p in rec.get("parts") or []),
+            "kv_bytes": self._kv_size(sid),
+        }
+
+    def get(self, sid: str) -> Dict[str, Any]:
+        """Full session record; raises `SessionError` (404) when unknown or expired."""
+        if not _ID_RE.match(str(sid)):
+            raise SessionError(f"session {sid} not found", 404)
+        with self._lock:
+            self._load()
+            self._expire(self.clock())
+            if sid not in self._meta:
+                raise SessionError(f"session {sid} not found", 404)
+            return self._read(sid)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._load()
+            self._expire(self.clock())
+            ids = sorted(self._meta, key=lambda s: -self._meta[s]["last_used"])
+            out = []
+            for sid in ids:
+                try:
+                    out.append(self.describe(self._read(sid)))
+                except SessionError:
+                    self._meta.pop(sid, None)
+            return out
+
+    def delete(self, sid: str) -> bool:
+        if not _ID_RE.match(str(sid)):
+            return False
+        with self._lock:
+            self._load()
+            if sid not in self._meta:
+                return False
+            if sid in self._busy:
+                raise SessionError(f"session {sid} has a turn in progress", 409)
+            self._remove(sid)
+            self._gauges()
+            return True
+
+    # --- turns -----------------------------------------------------------------
+
+    def begin(self, sid: str, model: str) -> Dict[str, Any]:
+        """Claim the session for one turn and return its record.
+
+        Raises:
+            SessionError: 404 unknown/expired, 409 turn in progress, 400 model mismatch.
+        """
+        rec = self.get(sid)
+        if rec.get("model") and model and rec["model"] != model:
+            raise SessionError(f"session {sid} belongs to model {rec['model']}", 400)
+        with self._lock:
+            if sid in self._busy:
+                raise SessionError(f"session {sid} has a turn in progress", 409)
+            token = secrets.token_hex(8)
+            self._busy[sid] = token
+        rec["_turn"] = token
+        rec["kv_hit"] = self._kv_size(sid) > 0
+        return rec
+
+    def finish(self, rec: Dict[str, Any], prompt: Optional[str] = None, reply: Optional[str] = None, kv_saved: bool = False) -> None:
+        """Release the turn; record `prompt` + `reply` when it succeeded.
+
+        Args:
+            rec (dict): Record returned by `begin`.
+            prompt (str | None): Prompt the turn evaluated (from `prompt`).
+            reply (str | None): Generated text; None leaves the history unchanged.
+            kv_saved (bool): Whether the turn ran with the session prompt cache.
+        """
+        sid = rec["id"]
+        with self._lock:
+            if self._busy.get(sid) != rec.get("_turn"):
+                return  # already finished, or the session was removed
+            try:
+                if sid not in self._meta:
+                    return  # deleted or expired meanwhile
+                history = "".join(rec.get("parts") or [])
+                if reply and prompt is not None and prompt.startswith(history):
+                    rec = {k: v for k, v in rec.items() if k not in ("kv_hit", "_turn")}
+                    # no separator: the parts concatenate to the evaluated sequence
+                    rec["parts"] = list(rec.get("parts") or []) + [prompt[len(history):], reply]
+                    rec["turns"] = int(rec.get("turns", 0)) + 1
+                    rec["last_used"] = self.clock()
+                    self._write(rec)
+                    self._meta[sid]["last_used"] = rec["last_used"]
+                    if not kv_saved:
+                        self._drop_kv(sid)  # the saved state no longer matches the history
+                    try:
+                        _turns.inc(kv="hit" if kv_saved and rec.get("kv_hit") else "miss")
+                        metrics.inc("session_turns_total", 1)
+                    except Exception:
+                        pass
+                self._meta[sid]["kv_bytes"] = self._kv_size(sid)
+                if self._meta[sid]["kv_bytes"] > self.max_session_bytes:
+                    self._drop_kv(sid)
+            finally:
+                self._busy.pop(sid, None)
+        self.sweep()
+
+    @staticmethod
+    def prompt(rec: Dict[str, Any], new_parts: List[str]) -> str:
+        """Prompt of the next turn: the transcript, `"\n"`, then `new_parts` (newline-joined)."""
+        history = "".join(rec.get("parts") or [])
+        new = "\n".join(new_parts)
+        return f"{history}\n{new}" if history else new
+
+    # --- housekeeping ----------------------------------------------------------
+
+    def _expire(self, now: float) -> int:
+        gone = [s for s, m in self._meta.items() if s not in self._busy and now - m["last_used"] > m["ttl_s"]]
+        for sid in gone:
+            self._remove(sid)
+        self.expired_total += len(gone)
+        if gone:
+            metrics.inc("sessions_expired_total", len(gone))
+        return len(gone)
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Remove expired sessions and drop idle KV files (LRU) over the budget.
+
+        Returns:
+            Dict[str, Any]: `expired`, `kv_dropped`, `kv_freed_bytes`.
+        """
+        now = self.clock() if now is None else now
+        dropped = 0
+        freed = 0
+        with self._lock:
+            self._load()
+            expired = self._expire(now)
+            total = sum(m["kv_bytes"] for m in self._meta.values())
+            budget = self.kv_budget()
+            if total > budget:
+                idle = sorted((s for s, m in self._meta.items() if m["kv_bytes"] > 0 and s not in self._busy), key=lambda s: self._meta[s]["last_used"])
+                for sid in idle:
+                    if total <= budget:
+                        break
+                    size = self._drop_kv(sid)
+                    total -= size
+                    freed += size
+                    dropped += 1
+                if dropped:
+                    metrics.inc("sessions_kv_dropped_total", dropped)
+            self._gauges()
+        return {"expired": expired, "kv_dropped": dropped, "kv_freed_bytes": freed}
+
+    def _gauges(self) -> None:
+        try:
+            kv = sum(m["kv_bytes"] for m in self._meta.values())
+            metrics.observe("sessions_active", float(len(self._meta)))
+            metrics.observe("sessions_kv_gb", round(kv / _GB, 3))
+            _kv_bytes_g.set(float(kv))
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            kv = sum(m["kv_bytes"] for m in self._meta.values())
+            return {
+                "dir": self.root,
+                "sessions": len(self._meta),
+                "busy": len(self._busy),
+                "kv_bytes": kv,
+                "kv_budget_bytes": self.kv_budget(),
+                "factor": self.factor,
+                "ttl_s": self.ttl_s,
+                "max_sessions": self.max_sessions,
+                "max_session_bytes": self.max_session_bytes,
+                "expired_total": self.expired_total,
+                "kv_dropped_total": self.kv_dropped_total,
+            }
+
+
+sessions = SessionStore(os.getenv("SESSIONS_DIR", "runtime/sessions"))
@@ -0,0 +1,221 @@
+"""Mergeable, fixed-memory quantile sketches for latency metrics.
+
+Provides:
+- `DDSketch`: log-bucketed sketch with a relative-accuracy guarantee,
+  O(1) insert and bounded bucket count.
+- `WindowedSketch`: cumulative sketch plus a sliding window made of
+  rotating time slices, merged on read.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import math
+from time import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class DDSketch:
+    """Quantile sketch with relative error `alpha` (DDSketch).
+
+    Values are mapped to logarithmic buckets of ratio `gamma=(1+a)/(1-a)`, so
+    any quantile estimate is within `alpha` relative error of the true value.
+    When more than `max_bins` buckets are populated, the lowest buckets are
+    collapsed together, which keeps memory fixed and only degrades accuracy
+    on the low tail (latency percentiles of interest live on the high tail).
+
+    Args:
+        alpha (float): Relative accuracy (default 1%).
+        max_bins (int): Maximum number of populated buckets.
+        min_value (float): Values at or below this go to the zero bucket.
+    """
+
+    __slots__ = ("alpha", "max_bins", "min_value", "_gamma", "_inv_log_gamma", "_bins", "_zero", "count", "sum", "min", "max")
+
+    def __init__(self, alpha: float = 0.01, max_bins: int = 1024, min_value: float = 1e-3) -> None:
+        self.alpha = float(alpha)
+        self.max_bins = max(16, int(max_bins))
+        self.min_value = float(min_value)
+        self._gamma = (1.0 + self.alpha) / (1.0 - self.alpha)
+        self._inv_log_gamma = 1.0 / math.log(self._gamma)
+        self._bins: Dict[int, int] = {}
+        self._zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float) -> None:
+        """Insert one observation (O(1) amortized)."""
+        v = float(value)
+        self.count += 1
+        self.sum += v
+        if v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+        if v <= self.min_value:
+            self._zero += 1
+            return
+        k = math.ceil(math.log(v) * self._inv_log_gamma)
+        bins = self._bins
+        bins[k] = bins.get(k, 0) + 1
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        keys = sorted(self._bins)
+        excess = len(keys) - self.max_bins
+        if excess <= 0:
+            return
+        target = keys[excess]
+        moved = 0
+        for k in keys[:excess]:
+            moved += self._bins.pop(k)
+        self._bins[target] = self._bins.get(target, 0) + moved
+
+    def merge(self, other: "DDSketch") -> None:
+        """Merge `other` into this sketch (both must share `alpha`)."""
+        if other.count == 0:
+            return
+        if abs(other.alpha - self.alpha) > 1e-12:
+            raise ValueError("cannot merge sketches with different alpha")
+        bins = self._bins
+        for k, c in other._bins.items():
+            bins[k] = bins.get(k, 0) + c
+        self._zero += other._zero
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def copy(self) -> "DDSketch":
+        """Return an independent copy of this sketch."""
+        out = DDSketch(self.alpha, self.max_bins, self.min_value)
+        out._bins = dict(self._bins)
+        out._zero = self._zero
+        out.count = self.count
+        out.sum = self.sum
+        out.min = self.min
+        out.max = self.max
+        return out
+
+    def clear(self) -> None:
+        """Drop all observations."""
+        self._bins.clear()
+        self._zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _value(self, key: int) -> float:
+        return 2.0 * self._gamma ** key / (self._gamma + 1.0)
+
+    def quantiles(self, qs: Iterable[float]) -> List[float]:
+        """Estimate several quantiles in a single pass over the buckets.
+
+        Args:
+            qs (Iterable[float]): Quantiles in [0, 1].
+
+        Returns:
+            List[float]: Estimates in the same order as `qs` (0.0 when empty).
+        """
+        qs = list(qs)
+        if self.count == 0:
+            return [0.0 for _ in qs]
+        order = sorted(range(len(qs)), key=lambda i: qs[i])
+        out = [0.0] * len(qs)
+        keys = sorted(self._bins)
+        seen = self._zero
+        ki = 0
+        for i in order:
+            q = min(1.0, max(0.0, float(qs[i])))
+            rank = q * (self.count - 1)
+            if rank < self._zero:
+                out[i] = max(0.0, self.min)
+                continue
+            while seen <= rank and ki < len(keys):
+                seen += self._bins[keys[ki]]
+                ki += 1
+            k = keys[ki - 1]
+            # clamp to observed extremes for exactness at the edges
+            out[i] = min(self.max, max(self.min, self._value(k)))
+        return out
+
+    def quantile(self, q: float) -> float:
+        """Estimate a single quantile `q` in [0, 1]."""
+        return self.quantiles([q])[0]
+
+
+class WindowedSketch:
+    """Cumulative plus sliding-window quantile views for a single series.
+
+    The window is `slices` ring slots of `slice_s` seconds each. A slot is
+    reset lazily when its time slice comes around again, and window reads
+    merge the slots that are still inside the window.
+
+    Args:
+        window_s (float): Sliding window length in seconds.
+        slices (int): Number of ring slots composing the window.
+        alpha (float): Relative accuracy passed to each `DDSketch`.
+        clock (Callable[[], float] | None): Time source (injectable for tests).
+    """
+
+    __slots__ = ("slice_s", "slices", "alpha", "_clock", "total", "_ring", "_epochs")
+
+    def __init__(self, window_s: float = 60.0, slices: int = 6, alpha: float = 0.01, clock: Optional[Callable[[], float]] = None) -> None:
+        self.slices = max(1, int(slices))
+        self.slice_s = max(0.001, float(window_s) / self.slices)
+        self.alpha = float(alpha)
+        self._clock = clock or time
+        self.total = DDSketch(alpha)
+        self._ring = [DDSketch(alpha) for _ in range(self.slices)]
+        self._epochs = [-1] * self.slices
+
+    def add(self, value: float) -> None:
+        """Record `value` in both the cumulative and the windowed views."""
+        self.total.add(value)
+        epoch = int(self._clock() // self.slice_s)
+        idx = epoch % self.slices
+        if self._epochs[idx] != epoch:
+            self._ring[idx].clear()
+            self._epochs[idx] = epoch
+        self._ring[idx].add(value)
+
+    def window(self) -> DDSketch:
+        """Return a merged copy of the slots still inside the window."""
+        epoch = int(self._clock() // self.slice_s)
+        out = DDSketch(self.alpha)
+        for e, sk in zip(self._epochs, self._ring):
+            if e >= 0 and epoch - e < self.slices:
+                out.merge(sk)
+        return out
+
+    def copy(self) -> "WindowedSketch":
+        """Return an independent copy (used to read outside of locks)."""
+        out = WindowedSketch.__new__(WindowedSketch)
+        out.slice_s = self.slice_s
+        out.slices = self.slices
+        out.alpha = self.alpha
+        out._clock = self._clock
+        out.total = self.total.copy()
+        out._ring = [sk.copy() for sk in self._ring]
+        out._epochs = list(self._epochs)
+        return out
+
+    def merge(self, other: "WindowedSketch") -> None:
+        """Merge `other` (same window geometry) into this series."""
+        self.total.merge(other.total)
+        for i in range(self.slices):
+            oe = other._epochs[i]
+            if oe < 0:
+                continue
+            if self._epochs[i] == oe:
+                self._ring[i].merge(other._ring[i])
+            elif oe > self._epochs[i]:
+                self._ring[i] = other._ring[i].copy()
+                self._epochs[i] = oe
@@ -0,0 +1,205 @@
+"""Thermal-aware throttling.
+
+Reads temperatures from `/sys/class/thermal/thermal_zone*/temp` and
+`/sys/class/hwmon/hwmon*/temp*_input` (millidegrees Celsius) under an
+injectable sysfs root (env `THERMAL_SYSFS_ROOT`, default `/`).
+
+`ThermalGovernor` turns the hottest CPU-ish sensor into a throttle factor
+(1 = full speed). Throttling starts `band_c` degrees below the strategy's
+`thermal.target_c` and reaches `min_factor` at the target. The factor moves
+toward that value at most `1 / ramp_full_seconds` per second, so decode
+threads and admission are reduced smoothly and ramp back the same way.
+
+The factor scales `llama-cli -t` (see `decode_threads`) and, through the
+housekeeper, role concurrency limits (source `thermal`).
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+import time
+from typing import Callable, Dict, Optional
+
+# Sensor names that describe the CPU package/cores (preferred when present)
+_CPU_HINTS = ("x86_pkg_temp", "coretemp", "k10temp", "zenpower", "cpu", "soc", "package", "tctl", "tdie")
+
+
+def sysfs_root() -> str:
+    return os.getenv("THERMAL_SYSFS_ROOT", "/")
+
+
+def _read_milli(path: str) -> Optional[float]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            v = float(fh.read().strip())
+    except (OSError, ValueError):
+        return None
+    # values are millidegrees; ignore bogus readings
+    c = v / 1000.0
+    return c if -40.0 < c < 150.0 else None
+
+
+def _read_text(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return fh.read().strip()
+    except OSError:
+        return ""
+
+
+def read_temps(root: Optional[str] = None) -> Dict[str, float]:
+    """Read all thermal zone and hwmon temperatures.
+
+    Args:
+        root (str | None): Filesystem root containing `sys/class/...`.
+
+    Returns:
+        Dict[str, float]: `sensor name → °C` (e.g. `zone0:x86_pkg_temp`, `coretemp:Package id 0`).
+    """
+    base = os.path.join(root or sysfs_root(), "sys", "class")
+    out: Dict[str, float] = {}
+    for zone in sorted(glob.glob(os.path.join(base, "thermal", "thermal_zone*"))):
+        c = _read_milli(os.path.join(zone, "temp"))
+        if c is not None:
+            kind = _read_text(os.path.join(zone, "type")) or "zone"
+            out[f"{os.path.basename(zone).replace('thermal_', '')}:{kind}"] = c
+    for hw in sorted(glob.glob(os.path.join(base, "hwmon", "hwmon*"))):
+        name = _read_text(os.path.join(hw, "name")) or os.path.basename(hw)
+        for inp in sorted(glob.glob(os.path.join(hw, "temp*_input"))):
+            c = _read_milli(inp)
+            if c is None:
+                continue
+            label = _read_text(inp.replace("_input", "_label")) or os.path.basename(inp).replace("_input", "")
+            out[f"{name}:{label}"] = c
+    return out
+
+
+def cpu_temp(temps: Dict[str, float]) -> Optional[float]:
+    """Hottest CPU sensor, or the hottest sensor when none looks like a CPU."""
+    if not temps:
+        return None
+    cpu = [v for k, v in temps.items() if any(h in k.lower() for h in _CPU_HINTS)]
+    return max(cpu) if cpu else max(temps.values())
+
+
+class ThermalGovernor:
+    """Smoothed throttle factor from temperature.
+
+    Args:
+        root (str | None): Sysfs root for `read_temps`.
+        clock (Callable[[], float]): Monotonic time source.
+    """
+
+    def __init__(self, root: Optional[str] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.root = root
+        self._clock = clock
+        self.factor = 1.0
+        self.temp_c: Optional[float] = None
+        self.target_factor = 1.0
+        self._last: Optional[float] = None
+
+    @staticmethod
+    def desired(temp_c: Optional[float], cfg: Dict[str, float]) -> float:
+        """Throttle factor implied by `temp_c` (no smoothing)."""
+        if temp_c is None:
+            return 1.0
+        target = float(cfg.get("target_c", 85))
+        band = max(0.1, float(cfg.get("band_c", 10)))
+        floor = min(1.0, max(0.05, float(cfg.get("min_factor", 0.25))))
+        start = target - band
+        if temp_c <= start:
+            return 1.0
+        if temp_c >= target:
+            return floor
+        return 1.0 - (1.0 - floor) * (temp_c - start) / band
+
+    def update(self, cfg: Optional[Dict[str, float]] = None, temp_c: Optional[float] = None) -> float:
+        """Sample temperature (unless given) and step the factor toward its target.
+
+        Args:
+            cfg (dict | None): Strategy `thermal` block (`target_c`, `ramp_full_seconds`, ...).
+            temp_c (float | None): Temperature override (tests); read from sysfs otherwise.
+
+        Returns:
+            float: Current throttle factor.
+        """
+        cfg = cfg or {}
+        if cfg.get("enabled", True) is False:
+            self.factor = self.target_factor = 1.0
+            return self.factor
+        if temp_c is None:
+            temp_c = cpu_temp(read_temps(self.root))
+        self.temp_c = temp_c
+        self.target_factor = self.desired(temp_c, cfg)
+        now = self._clock()
+        dt = 0.0 if self._last is None else max(0.0, now - self._last)
+        self._last = now
+        ramp = max(0.1, float(cfg.get("ramp_full_seconds", 4)))
+        step = dt / ramp
+        if self.target_factor < self.factor:
+            self.factor = max(self.target_factor, self.factor - step)
+        else:
+            self.factor = min(self.target_factor, self.factor + step)
+        return self.factor
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        return {"temp_c": self.temp_c, "throttle_factor": round(self.factor, 4), "target_factor": round(self.target_factor, 4)}
+
+
+def base_threads() -> int:
+    """Configured decode threads (env `LLAMA_THREADS`, default: physical cores like llama.cpp).
+
+    The default is capped by the cgroup CPU quota/cpuset (`cgroup.cpu_limit`),
+    so containers do not oversubscribe their CPU share.
+    """
+    try:
+        n = int(os.getenv("LLAMA_THREADS", "0"))
+    except Exception:
+        n = 0
+    if n > 0:
+        return n
+    try:
+        import psutil  # type: ignore
+
+        n = int(psutil.cpu_count(logical=False) or 0)
+    except Exception:
+        n = 0
+    n = n or os.cpu_count() or 1
+    try:
+        from . import cgroup
+
+        cap = cgroup.cpu_limit()
+        if cap:
+            n = min(n, cap)
+    except Exception:
+        pass
+    return max(1, n)
+
+
+def _cpu_capped() -> bool:
+    """Whether the cgroup allows fewer CPUs than the host has."""
+    try:
+        from . import cgroup
+
+        cap = cgroup.cpu_limit()
+        return bool(cap) and cap < (os.cpu_count() or cap)
+    except Exception:
+        return False
+
+
+def decode_threads(base: Optional[int] = None) -> Optional[int]:
+    """Thread count for a generation scaled by the throttle factor.
+
+    Returns None when neither throttling, `LLAMA_THREADS` nor a cgroup CPU
+    cap applies, so llama.cpp keeps its own default.
+    """
+    if governor.factor >= 1.0 and not base and not os.getenv("LLAMA_THREADS") and not _cpu_capped():
+        return None
+    b = base if base and base > 0 else base_threads()
+    return max(1, int(round(b * governor.factor)))
+
+
+governor = ThermalGovernor()
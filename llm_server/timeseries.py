@@ -0,0 +1,201 @@
+"""Fixed-memory metric history with multi-resolution rollups.
+
+Each tracked series keeps one ring per resolution tier (e.g. 5 s buckets
+for 1 h, 1 min buckets for 24 h) stored in `array` buffers, so memory is
+fixed at construction. Gauges roll up to avg/min/max per bucket; counters
+roll up to the delta per bucket (and a per-second rate on read).
+
+The housekeeper feeds `history` once per tick from `metrics.snapshot()`;
+`/metrics/history?name=&range=` serves compact arrays.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from array import array
+from time import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (bucket step seconds, retention seconds)
+DEFAULT_TIERS: Tuple[Tuple[int, int], ...] = ((5, 3600), (60, 86400))
+
+DEFAULT_GAUGES = (
+    "ram_free_gb",
+    "ram_used_gb",
+    "ram_pressure",
+    "ram_headroom_gb",
+    "llm_rss_gb",
+    "ssd_free_gb",
+    "ssd_pressure",
+)
+DEFAULT_COUNTERS = (
+    "requests_total",
+    "errors_total",
+    "rate_limited_total",
+    "housekeeper_ticks_total",
+    "cache_evictions_total",
+)
+
+
+class _Tier:
+    __slots__ = ("step", "slots", "epochs", "sum", "count", "min", "max")
+
+    def __init__(self, step: int, retention_s: int) -> None:
+        self.step = max(1, int(step))
+        self.slots = max(1, int(retention_s) // self.step)
+        self.epochs = array("q", [-1]) * self.slots
+        self.sum = array("d", [0.0]) * self.slots
+        self.count = array("l", [0]) * self.slots
+        self.min = array("d", [0.0]) * self.slots
+        self.max = array("d", [0.0]) * self.slots
+
+    def add(self, ts: float, value: float) -> None:
+        b = int(ts // self.step)
+        i = b % self.slots
+        if self.epochs[i] != b:
+            self.epochs[i] = b
+            self.sum[i] = value
+            self.count[i] = 1
+            self.min[i] = value
+            self.max[i] = value
+            return
+        self.sum[i] += value
+        self.count[i] += 1
+        if value < self.min[i]:
+            self.min[i] = value
+        if value > self.max[i]:
+            self.max[i] = value
+
+
+class Series:
+    """One metric history across all tiers.
+
+    Args:
+        name (str): Metric name.
+        kind (str): `gauge` (avg/min/max) or `counter` (delta per bucket).
+        tiers (Sequence[Tuple[int,int]]): (step_s, retention_s) per tier.
+    """
+
+    def __init__(self, name: str, kind: str = "gauge", tiers: Sequence[Tuple[int, int]] = DEFAULT_TIERS) -> None:
+        self.name = name
+        self.kind = kind
+        self.tiers = [_Tier(s, r) for s, r in sorted(tiers)]
+        self._last: Optional[float] = None
+
+    def add(self, ts: float, value: float) -> None:
+        v = float(value)
+        if self.kind == "counter":
+            prev, self._last = self._last, v
+            if prev is None:
+                return
+            # counter resets count from zero
+            v = v - prev if v >= prev else v
+        for t in self.tiers:
+            t.add(ts, v)
+
+    def query(self, range_s: float, now: Optional[float] = None) -> Dict[str, object]:
+        """Return bucketed values covering the last `range_s` seconds.
+
+        Picks the finest tier whose retention covers `range_s`. Missing
+        buckets are `None`.
+        """
+        now = time() if now is None else now
+        tier = next((t for t in self.tiers if t.step * t.slots >= range_s), self.tiers[-1])
+        n = max(1, min(tier.slots, int(math.ceil(range_s / tier.step))))
+        last_b = int(now // tier.step)
+        first_b = last_b - n + 1
+        out: Dict[str, object] = {"name": self.name, "kind": self.kind, "step": tier.step, "start": first_b * tier.step}
+        if self.kind == "counter":
+            delta: List[Optional[float]] = []
+            for b in range(first_b, last_b + 1):
+                i = b % tier.slots
+                delta.append(tier.sum[i] if tier.epochs[i] == b else None)
+            out["delta"] = delta
+            out["rate"] = [None if d is None else d / tier.step for d in delta]
+            return out
+        avg: List[Optional[float]] = []
+        mn: List[Optional[float]] = []
+        mx: List[Optional[float]] = []
+        for b in range(first_b, last_b + 1):
+            i = b % tier.slots
+            if tier.epochs[i] == b and tier.count[i]:
+                avg.append(tier.sum[i] / tier.count[i])
+                mn.append(tier.min[i])
+                mx.append(tier.max[i])
+            else:
+                avg.append(None)
+                mn.append(None)
+                mx.append(None)
+        out.update({"avg": avg, "min": mn, "max": mx})
+        return out
+
+
+class MetricsHistory:
+    """Set of tracked series fed from flat metric snapshots."""
+
+    def __init__(self, gauges: Iterable[str] = DEFAULT_GAUGES, counters: Iterable[str] = DEFAULT_COUNTERS, tiers: Sequence[Tuple[int, int]] = DEFAULT_TIERS) -> None:
+        self._lock = threading.Lock()
+        self._series: Dict[str, Series] = {}
+        self.configure(gauges, counters, tiers)
+
+    def configure(self, gauges: Iterable[str], counters: Iterable[str], tiers: Sequence[Tuple[int, int]] = DEFAULT_TIERS) -> None:
+        """(Re)define tracked series; existing series with the same tiers are kept."""
+        tiers = tuple((int(s), int(r)) for s, r in tiers) or DEFAULT_TIERS
+        with self._lock:
+            new: Dict[str, Series] = {}
+            for kind, names in (("gauge", gauges), ("counter", counters)):
+                for n in names:
+                    cur = self._series.get(n)
+                    if cur is not None and cur.kind == kind and [(t.step, t.step * t.slots) for t in cur.tiers] == sorted(tiers):
+                        new[n] = cur
+                    else:
+                        new[n] = Series(n, kind, tiers)
+            self._series = new
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._series)
+
+    def sample(self, snapshot: Dict[str, float], ts: Optional[float] = None) -> None:
+        """Record tracked values from a `Metrics.snapshot()` dict."""
+        ts = time() if ts is None else ts
+        with self._lock:
+            for name, s in self._series.items():
+                v = snapshot.get(f"timing_{name}") if s.kind == "gauge" else snapshot.get(name)
+                if v is None and s.kind == "gauge":
+                    v = snapshot.get(name)
+                if isinstance(v, (int, float)):
+                    s.add(ts, v)
+
+    def query(self, name: str, range_s: float, now: Optional[float] = None) -> Optional[Dict[str, object]]:
+        with self._lock:
+            s = self._series.get(name)
+            return s.query(range_s, now) if s is not None else None
+
+
+_RANGE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+
+
+def parse_range(text: str, default_s: float = 3600.0) -> float:
+    """Parse `90`, `30s`, `15m`, `1h`, `1d` into seconds."""
+    m = _RANGE_RE.match(text or "")
+    if not m:
+        return default_s
+    mult = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[m.group(2)]
+    return max(1.0, float(m.group(1)) * mult)
+
+
+def configure_from(hk_cfg: Dict[str, object]) -> None:
+    """Apply the optional `history` block of `housekeeper.yaml` to `history`."""
+    h = (hk_cfg or {}).get("history") or {}
+    if not isinstance(h, dict) or not h:
+        return
+    tiers = [tuple(t) for t in (h.get("tiers") or DEFAULT_TIERS)]  # type: ignore[union-attr]
+    history.configure(h.get("gauges") or DEFAULT_GAUGES, h.get("counters") or DEFAULT_COUNTERS, tiers)  # type: ignore[arg-type]
+
+
+history = MetricsHistory()
@@ -0,0 +1,208 @@
+"""Server-side execution of tool calls for the chat closed loop.
+
+One assistant turn can ask for several tool calls. `ToolExecutor.run`
+submits all of them to a shared, bounded thread pool and collects each
+result within its tool's timeout (`limits.tools.timeouts_s`, with
+`default` as the fallback). Total latency is therefore about the slowest
+call rather than the sum. A call that times out or raises still yields a
+result with `ok: false`, so the follow-up generation sees which tools
+failed. A timed-out call keeps running in the pool until it returns;
+Python threads cannot be cancelled.
+
+Built-in tools (`default_handlers`): `memory.search`, `research.search`,
+`embeddings.generate` and `vision.analyze`.
+
+Metrics per tool: `tool_latency:<name>` (duration), `tool_calls_total:<name>`
+and `tool_errors_total:<name>`, plus `llm_tool_duration_seconds{tool,outcome}`.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List, Optional
+
+from . import openmetrics
+from . import tracing
+from .metrics import metrics
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+DEFAULT_TIMEOUTS_S = {"default": 10.0, "memory.search": 5.0, "research.search": 10.0, "embeddings.generate": 5.0, "vision.analyze": 60.0}
+
+_tool_duration = openmetrics.registry.histogram("llm_tool_duration_seconds", "Server-side tool call latency.", ("tool", "outcome"))
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _shared_pool(max_workers: int) -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="tool")
+        return _pool
+
+
+def default_handlers(mem_client: Any) -> Dict[str, Handler]:
+    """Handlers for the server tools listed by `schemas.tool_list()`."""
+    from .embeddings import embed_texts
+    from .research import web_search
+    from .vision import analyze as vision_analyze
+
+    def memory_search(args: Dict[str, Any]) -> Any:
+        return {"results": mem_client.search(str(args["query"]), k=int(args.get("k", 5)), filters=args.get("filters"))}
+
+    def research_search(args: Dict[str, Any]) -> Any:
+        return web_search(str(args["query"]), top_k=int(args.get("top_k", 5)), site=args.get("site"))
+
+    def embeddings_generate(args: Dict[str, Any]) -> Any:
+        inp = args.get("input", [])
+        texts = [inp] if isinstance(inp, str) else [str(t) for t in inp]
+        vecs = embed_texts(texts, dim=int(args.get("dimensions", 256)))
+        return {"object": "list", "data": [{"object": "embedding", "index": i, "embedding": v} for i, v in enumerate(vecs)]}
+
+    def vision_analyze_tool(args: Dict[str, Any]) -> Any:
+        return vision_analyze(list(args.get("images") or []), prompt=args.get("prompt"), tasks=args.get("tasks"), ocr_mode=args.get("ocr", "auto"))
+
+    return {
+        "memory.search": memory_search,
+        "research.search": research_search,
+        "embeddings.generate": embeddings_generate,
+        "vision.analyze": vision_analyze_tool,
+    }
+
+
+def _parse_arguments(raw: Any) -> Dict[str, Any]:
+    if isinstance(raw, dict):
+        return raw
+    if not raw:
+        return {}
+    args = json.loads(raw)
+    if not isinstance(args, dict):
+        raise ValueError("tool arguments must be a JSON object")
+    return args
+
+
+def render_result(name: str, result: Any, max_chars: int = 4000) -> str:
+    """Compact JSON of a tool result for the follow-up prompt (embeddings are summarized)."""
+    if name == "embeddings.generate" and isinstance(result, dict):
+        data = result.get("data") or []
+        result = {"vectors": len(data), "dimensions": len(data[0].get("embedding", [])) if data else 0}
+    text = json.dumps(result, ensure_ascii=False, default=str)
+    return text if len(text) <= max_chars else text[: max_chars - 14] + "...(truncated)"
+
+
+class ToolExecutor:
+    """Runs a batch of OpenAI-style tool calls concurrently.
+
+    Args:
+        handlers (Dict[str, Handler]): Tool name → callable taking the parsed arguments.
+        timeouts_s (Dict[str, float] | None): Per-tool timeouts, `default` as fallback.
+        max_workers (int): Size of the shared tool pool (first executor wins).
+        max_result_chars (int): Truncation of each rendered result.
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Handler],
+        timeouts_s: Optional[Dict[str, float]] = None,
+        max_workers: int = 8,
+        max_result_chars: int = 4000,
+    ) -> None:
+        self.handlers = dict(handlers)
+        self.timeouts_s = dict(DEFAULT_TIMEOUTS_S)
+        self.timeouts_s.update({k: float(v) for k, v in (timeouts_s or {}).items()})
+        self.max_workers = max_workers
+        self.max_result_chars = int(max_result_chars)
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any], handlers: Dict[str, Handler]) -> "ToolExecutor":
+        """Build from the `tools` block of `configs/limits.yaml`."""
+        t = ((cfg.get("limits", {}) or {}).get("tools", {}) or {})
+        return cls(handlers, t.get("timeouts_s"), int(t.get("max_workers", 8)), int(t.get("max_result_chars", 4000)))
+
+    def timeout_for(self, name: str) -> float:
+        return float(self.timeouts_s.get(name, self.timeouts_s.get("default", 10.0)))
+
+    def _call(self, name: str, handler: Handler, args: Dict[str, Any]) -> Any:
+        with tracing.span(f"tool.{name}"):
+            return handler(args)
+
+    def run(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute `calls` in parallel.
+
+        Args:
+            calls (List[dict]): `{"id", "type": "function", "function": {"name", "arguments"}}`.
+
+        Returns:
+            List[dict]: Per call, in input order: `tool_call_id`, `name`, `ok`,
+            `content` (rendered result or error), `latency_ms`.
+        """
+        pool = _shared_pool(self.max_workers)
+        pending: List[Dict[str, Any]] = []
+        for i, call in enumerate(calls):
+            fn = call.get("function") or {}
+            name = str(fn.get("name") or "")
+            entry: Dict[str, Any] = {"tool_call_id": call.get("id") or f"call-{i}", "name": name, "ok": False, "content": "", "latency_ms": 0.0}
+            handler = self.handlers.get(name)
+            try:
+                if handler is None:
+                    raise KeyError(f"unknown tool '{name}'")
+                args = _parse_arguments(fn.get("arguments"))
+            except Exception as e:
+                entry["content"] = f"error: {e}"
+                # client-chosen names never become metric keys; only registered tools get their own series
+                self._record(name if handler is not None else "unknown", "invalid", 0.0)
+                pending.append(entry)
+                continue
+            entry["_t0"] = time.perf_counter()
+            entry["_deadline"] = entry["_t0"] + self.timeout_for(name)
+            # run in a copy of the request context so tool spans join the request trace
+            entry["_future"] = pool.submit(contextvars.copy_context().run, self._call, name, handler, args)
+            pending.append(entry)
+        for entry in pending:
+            fut: Optional[Future] = entry.pop("_future", None)
+            if fut is None:
+                continue
+            t0 = entry.pop("_t0")
+            deadline = entry.pop("_deadline")
+            try:
+                result = fut.result(timeout=max(0.0, deadline - time.perf_counter()))
+                entry["ok"] = True
+                entry["content"] = render_result(entry["name"], result, self.max_result_chars)
+                outcome = "ok"
+            except FutureTimeout:
+                entry["content"] = f"error: timed out after {self.timeout_for(entry['name']):g}s"
+                outcome = "timeout"
+            except Exception as e:
+                entry["content"] = f"error: {e}"
+                outcome = "error"
+            entry["latency_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+            self._record(entry["name"], outcome, entry["latency_ms"])
+        return pending
+
+    @staticmethod
+    def _record(name: str, outcome: str, latency_ms: float) -> None:
+        try:
+            metrics.inc(f"tool_calls_total:{name}", 1)
+            if outcome != "ok":
+                metrics.inc(f"tool_errors_total:{name}", 1)
+            metrics.observe_duration(f"tool_latency:{name}", latency_ms)
+            _tool_duration.observe(latency_ms / 1000.0, tool=name, outcome=outcome)
+        except Exception:
+            pass
+
+
+def results_prompt(results: List[Dict[str, Any]]) -> str:
+    """Tool results as a prompt section for the follow-up generation."""
+    lines = ["Tool results:"]
+    for r in results:
+        lines.append(f"[{r['name']} {r['tool_call_id']}] {r['content']}")
+    return "\n".join(lines)
@@ -0,0 +1,275 @@
+"""Lightweight per-request tracing.
+
+Spans are recorded into the trace bound to the current context (the
+middleware starts one per request, keyed by `X-Request-Id`). Finished
+traces are kept in an in-process ring buffer, queryable at
+`/admin/traces/{request_id}`, and optionally appended to a JSONL file in
+OpenTelemetry (OTLP/JSON) form. A `Server-Timing` header summarizes the
+spans for clients.
+
+Env:
+- `TRACING_ENABLED` (default `1`): record spans.
+- `TRACE_BUFFER_SIZE` (default `512`): traces kept in memory.
+- `TRACE_FILE`: optional JSONL export path (one OTLP/JSON document per trace).
+  Traces are serialized and appended by a background writer (the batched
+  `AsyncLogHandler` used for logs), never on the request path.
+
+Google-style docstrings for automatic documentation.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+SERVICE_NAME = "llm-server"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def enabled() -> bool:
+    """Whether tracing is enabled (env `TRACING_ENABLED`)."""
+    return os.getenv("TRACING_ENABLED", "1") in ("1", "true", "on")
+
+
+def _trace_id_for(request_id: str) -> str:
+    rid = (request_id or "").lower()
+    if len(rid) == 32 and all(c in "0123456789abcdef" for c in rid):
+        return rid
+    if 0 < len(rid) < 32 and all(c in "0123456789abcdef" for c in rid):
+        return rid.rjust(32, "0")
+    return hashlib.md5(rid.encode("utf-8")).hexdigest()
+
+
+class Span:
+    """A timed operation inside a trace."""
+
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {})
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.trace_id = _trace_id_for(request_id)
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finished(self) -> List[Span]:
+        with self._lock:
+            return [s for s in self.spans if s.end_ns]
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Export as an OTLP/JSON `resourceSpans` document."""
+        spans = []
+        for s in self.finished():
+            item: Dict[str, Any] = {
+                "traceId": self.trace_id,
+                "spanId": s.span_id,
+                "name": s.name,
+                "kind": 2 if s.parent_id is None else 1,  # SERVER for the root, INTERNAL otherwise
+                "startTimeUnixNano": str(s.start_ns),
+                "endTimeUnixNano": str(s.end_ns),
+                "attributes": [_otlp_attr(k, v) for k, v in s.attributes.items()],
+            }
+            if s.parent_id:
+                item["parentSpanId"] = s.parent_id
+            spans.append(item)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": "llm_server.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+def _otlp_attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        v: Dict[str, Any] = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+
+class TraceStore:
+    """Bounded ring buffer of recent traces keyed by request ID."""
+
+    def __init__(self, capacity: int = 512) -> None:
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Trace]" = OrderedDict()
+
+    def put(self, trace: Trace) -> None:
+        with self._lock:
+            self._items[trace.request_id] = trace
+            self._items.move_to_end(trace.request_id)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._items.get(request_id)
+
+    def ids(self) -> List[str]:
+        with self._lock:
+            return list(reversed(self._items.keys()))
+
+
+store = TraceStore(_env_int("TRACE_BUFFER_SIZE", 512))
+_export_lock = threading.Lock()
+_exporter: Optional[Any] = None  # (path, AsyncLogHandler)
+
+
+class _OtlpFormatter(logging.Formatter):
+    """Serializes the trace attached to a record (runs on the writer thread)."""
+
+    def format(self, record: logging.LogRecord) -> str:  # type: ignore[override]
+        return json.dumps(record.trace.to_otlp(), ensure_ascii=False)  # type: ignore[attr-defined]
+
+
+def _export_handler(path: str) -> Any:
+    """Batched background writer for `path` (replaced when `TRACE_FILE` changes)."""
+    global _exporter
+    with _export_lock:
+        if _exporter is not None and _exporter[0] == path:
+            return _exporter[1]
+        from .logging_utils import AsyncLogHandler, _RotatingFile
+
+        handler = AsyncLogHandler(file=_RotatingFile(path, max_bytes=0), to_stream=False)
+        handler.setFormatter(_OtlpFormatter())
+        old, _exporter = _exporter, (path, handler)
+    if old is not None:
+        old[1].close()
+    return handler
+
+
+def flush_exports(timeout: float = 5.0) -> None:
+    """Block until queued trace exports are written (tests, shutdown)."""
+    exp = _exporter
+    if exp is not None:
+        exp[1].flush(timeout)
+
+_TRACE: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_SPAN: ContextVar[Optional[str]] = ContextVar("span", default=None)
+
+
+def start_trace(request_id: str, **attributes: Any) -> Optional[Trace]:
+    """Bind a new trace for `request_id` with an open root `http` span."""
+    if not enabled():
+        _TRACE.set(None)
+        _SPAN.set(None)
+        return None
+    tr = Trace(request_id)
+    root = Span("http", None, attributes)
+    tr.add(root)
+    _TRACE.set(tr)
+    _SPAN.set(root.span_id)
+    return tr
+
+
+def current_trace() -> Optional[Trace]:
+    return _TRACE.get()
+
+
+def finish_trace(trace: Optional[Trace], **attributes: Any) -> None:
+    """End the root span, store `trace`, export it if configured, and unbind it."""
+    _TRACE.set(None)
+    _SPAN.set(None)
+    if trace is None:
+        return
+    if trace.spans:
+        root = trace.spans[0]
+        root.attributes.update(attributes)
+        end_span(root)
+    store.put(trace)
+    path = os.getenv("TRACE_FILE")
+    if path:
+        try:
+            record = logging.LogRecord("tracing.export", logging.INFO, __file__, 0, "", None, None)
+            record.trace = trace  # type: ignore[attr-defined]
+            _export_handler(path).emit(record)
+        except Exception:
+            pass
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a span named `name` in the current trace (no-op without one)."""
+    tr = _TRACE.get()
+    if tr is None:
+        yield None
+        return
+    sp = Span(name, _SPAN.get(), attributes)
+    tr.add(sp)
+    token = _SPAN.set(sp.span_id)
+    try:
+        yield sp
+    finally:
+        sp.end_ns = time.time_ns()
+        _SPAN.reset(token)
+
+
+def begin_span(name: str, **attributes: Any) -> Optional[Span]:
+    """Start a span that is ended explicitly with `end_span` (e.g. across awaits)."""
+    tr = _TRACE.get()
+    if tr is None:
+        return None
+    sp = Span(name, _SPAN.get(), attributes)
+    tr.add(sp)
+    return sp
+
+
+def end_span(sp: Optional[Span]) -> None:
+    if sp is not None and not sp.end_ns:
+        sp.end_ns = time.time_ns()
+
+
+def server_timing(trace: Optional[Trace], total_ms: Optional[float] = None) -> str:
+    """Build a `Server-Timing` header value (durations summed per span name)."""
+    if trace is None:
+        return ""
+    agg: "OrderedDict[str, float]" = OrderedDict()
+    for s in trace.finished():
+        if s.parent_id is None:
+            continue
+        key = "".join(c if c.isalnum() or c in "_-" else "_" for c in s.name)
+        agg[key] = agg.get(key, 0.0) + s.duration_ms
+    parts = [f"{k};dur={v:.2f}" for k, v in agg.items()]
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
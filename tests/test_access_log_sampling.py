@@ -0,0 +1,74 @@
+class _Clock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_sampler_keeps_errors_and_slow_and_samples_fast_successes():
+    from llm_server.logging_utils import AccessLogSampler
+
+    clk = _Clock()
+    s = AccessLogSampler(base_rate=0.1, min_samples=20, clock=clk)
+    # warm-up: everything is logged
+    for i in range(20):
+        assert s.decide("/v1/x", 200, 10.0, f"w{i}")[1] == "warmup"
+    clk.t += 1.1
+    kept = 0
+    n = 2000
+    for i in range(n):
+        keep, reason, rate = s.decide("/v1/x", 200, 10.0, f"r{i}")
+        if keep:
+            kept += 1
+            assert reason == "sampled" and rate == 0.1
+    assert 0.05 * n < kept < 0.15 * n
+    assert s.decide("/v1/x", 503, 10.0, "e")[:2] == (True, "error")
+    assert s.decide("/v1/x", 200, 10.0, "t", trace_sampled=True)[:2] == (True, "trace")
+    clk.t += 1.1
+    assert s.decide("/v1/x", 200, 500.0, "slow")[:2] == (True, "slow")
+    assert s.route_rates()["/v1/x"] == 0.1
+
+
+def test_sampler_adapts_rate_to_target_lines_per_second():
+    from llm_server.logging_utils import AccessLogSampler
+
+    clk = _Clock()
+    s = AccessLogSampler(base_rate=1.0, target_per_s=10.0, min_samples=1, clock=clk)
+    for _sec in range(3):
+        clk.t += 1.0
+        for i in range(200):
+            s.decide("/hot", 200, 1.0, f"{_sec}-{i}")
+    assert 0.03 < s.route_rates()["/hot"] < 0.1
+
+
+def test_rate_limit_events_are_summarized():
+    from llm_server.logging_utils import AccessLogSampler
+
+    clk = _Clock()
+    s = AccessLogSampler(summary_s=10.0, clock=clk)
+    firsts = [s.rate_limited("1.2.3.4", "/v1/x")[0] for _ in range(50)]
+    assert firsts[0] is True and not any(firsts[1:])
+    assert s.rate_limited("5.6.7.8", "/v1/x")[0] is True
+    assert s.flush_rate_limited() is None
+    clk.t += 11
+    summary = s.flush_rate_limited()
+    assert summary["count"] == 51 and summary["clients"] == 2
+    assert summary["top"][0] == {"client": "1.2.3.4", "route": "/v1/x", "count": 50}
+    assert summary["overflow"] == 0
+    assert s.flush_rate_limited() is None
+
+
+def test_rate_limit_flood_from_many_clients_is_bounded():
+    from llm_server.logging_utils import AccessLogSampler
+
+    clk = _Clock()
+    s = AccessLogSampler(summary_s=10.0, max_clients=4, clock=clk)
+    firsts = [s.rate_limited(f"10.0.0.{i}", "/v1/x")[0] for i in range(100)]
+    assert sum(firsts) == 4  # only tracked clients get an individual line
+    assert s.rate_limited("10.0.0.1", "/v1/x")[0] is False
+    clk.t += 11
+    summary = s.flush_rate_limited()
+    assert summary["count"] == 101 and summary["clients"] == 4 and summary["overflow"] == 96
+    # a new window tracks clients again
+    assert s.rate_limited("10.0.0.99", "/v1/x")[0] is True
@@ -0,0 +1,99 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from llm_server.admission import AdmissionController, AdmissionRejected, context_tokens, kv_bytes_per_token
+
+GB = 1024 ** 3
+
+
+class _Spec:
+    name = "deepseek-r1-qwen-32b-q4_k_m"
+    path = Path(__file__)
+    context_max = 65536
+    est_ram_gb = 20.0
+    n_layers = 64
+    n_kv_heads = 8
+    head_dim = 128
+
+
+def _ctl(capacity_gb, **cfg):
+    c = AdmissionController(measure=lambda: capacity_gb * GB)
+    c.configure({"admission": {"queue_timeout_s": 0.2, "retry_after_s": 7, **cfg}})
+    return c
+
+
+def test_kv_cost_from_model_dims():
+    # 2 (K,V) x 64 layers x 8 kv heads x 128 head_dim x 2 bytes = 256 KiB per token
+    assert kv_bytes_per_token(_Spec()) == 262144
+    assert context_tokens(1000, 1024, 65536) == 2560  # 1250 + 1024 + 64 -> 256-aligned
+    assert context_tokens(60000, 8000, 65536) == 65536
+    est = _ctl(100).estimate(_Spec(), 60000, 8000)
+    assert est["kv_bytes"] == 16 * GB  # a full 64k window on the 32B model
+    assert est["weights_bytes"] == 20 * GB and est["total_bytes"] == est["kv_bytes"] + est["overhead_bytes"] + est["weights_bytes"]
+
+
+def test_reserve_rejects_oversized_and_times_out():
+    c = _ctl(10)
+    with pytest.raises(AdmissionRejected) as ei:
+        c.check(11 * GB, "m")
+    assert ei.value.retry_after_s == 7
+    with c.reserve(6 * GB, "m"):
+        assert c.reserved == 6 * GB
+        with pytest.raises(AdmissionRejected):
+            with c.reserve(6 * GB, "m"):
+                pass
+    assert c.reserved == 0
+
+
+def test_queued_reservation_admitted_after_release():
+    c = _ctl(10, queue_timeout_s=5)
+    done = []
+    with c.reserve(6 * GB, "m"):
+        def worker():
+            with c.reserve(6 * GB, "m"):
+                done.append(True)
+        t = threading.Thread(target=worker)
+        t.start()
+        time.sleep(0.1)
+        assert c.waiting == 1 and not done
+    t.join(timeout=5)
+    assert done and c.reserved == 0
+
+
+def test_generation_returns_503_payload(monkeypatch):
+    import llm_server.generation as gen
+
+    class _Registry:
+        cfg = {"gen_defaults": {}}
+
+        def get(self, name):
+            return _Spec()
+
+    c = _ctl(1)
+    monkeypatch.setattr(gen, "admission", c)
+    called = []
+    monkeypatch.setattr(gen.subprocess, "check_output", lambda *a, **k: called.append(a) or b"")
+    res = gen.generate_with_llama_cli(_Registry(), _Spec.name, "hi", overrides={"max_tokens": 64})
+    assert res["status"] == 503 and res["retry_after"] == 7 and not called
+    # with room, -c matches the reserved context
+    monkeypatch.setattr(gen, "admission", _ctl(100))
+    gen.generate_with_llama_cli(_Registry(), _Spec.name, "hi", overrides={"max_tokens": 64})
+    args = called[-1][0]
+    assert args[args.index("-c") + 1] == "256"
+
+
+def test_api_maps_rejection_to_503(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+        import llm_server.api as api
+    except Exception:
+        return
+    monkeypatch.setattr(api, "generate_with_llama_cli", lambda *a, **k: {"error": "insufficient memory", "status": 503, "retry_after": 9})
+    client = TestClient(create_app())
+    r = client.post("/v1/chat/completions", headers={"X-Tenant-Id": "t1"}, json={"model": "m", "messages": [{"role": "user", "content": "hi"}]})
+    assert r.status_code == 503 and r.headers["retry-after"] == "9"
+    assert r.json()["error"]["code"] == 503
@@ -0,0 +1,69 @@
+from llm_server.backpressure import BackpressureGate, exempt, parse_priority
+
+POLICY = {"actions_enabled": True, "backpressure": {"enable_soft": True, "enable_hard": True, "cooldown_s": 5, "hot_max_delay_s": 0.1, "poll_s": 0.05}}
+
+
+def test_priority_and_exempt_paths():
+    assert parse_priority("LOW") == "low" and parse_priority("2") == "low" and parse_priority("9") == "high"
+    assert parse_priority(None, "1") == "batch" and parse_priority("bogus") == "normal"
+    assert exempt("/healthz") and exempt("/admin/cache") and exempt("/v1/embeddings/ready")
+    assert not exempt("/v1/chat/completions")
+
+
+def test_levels_follow_beacon_with_cooldown():
+    t = [0.0]
+    g = BackpressureGate(clock=lambda: t[0])
+    assert g.update("critical", POLICY) == "critical"
+    t[0] = 1.0
+    assert g.update("ok", POLICY) == "critical"  # held during cooldown
+    t[0] = 6.5
+    assert g.update("ok", POLICY) == "ok"
+    assert g.beacon_from({"ram": {"beacon": "warn"}, "ssd": {"beacon": "hot"}}) == "hot"
+    assert g.beacon_from(None) == "ok"
+
+
+def test_decisions_per_level_and_flags():
+    g = BackpressureGate()
+    g.update("hot", POLICY)
+    assert g.decide("/v1/chat/completions", "batch", POLICY)[0] == "delay"
+    assert g.decide("/v1/chat/completions", "normal", POLICY)[0] == "admit"
+    soft_off = {"actions_enabled": True, "backpressure": {"enable_soft": False}}
+    assert g.decide("/v1/chat/completions", "low", soft_off)[0] == "admit"
+    g.update("critical", POLICY)
+    assert g.decide("/v1/chat/completions", "high", POLICY) == ("reject", 5.0)
+    assert g.decide("/healthz", "normal", POLICY)[0] == "admit"
+    assert g.decide("/v1/models", "normal", POLICY)[0] == "admit"  # discovery stays up
+    assert g.decide("/v1/completions", "normal", {"actions_enabled": True, "backpressure": {"enable_hard": False}})[0] == "admit"
+    # actions off (the shipped default): nothing is shed or delayed at any level
+    off = dict(POLICY, actions_enabled=False)
+    assert g.decide("/v1/chat/completions", "batch", off) == ("admit", 0.0)
+    assert g.decide("/v1/chat/completions", "batch", {"backpressure": POLICY["backpressure"]}) == ("admit", 0.0)
+
+
+def test_middleware_sheds_and_delays():
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+        from llm_server.metrics import metrics
+    except Exception:
+        return
+    app = create_app()
+    client = TestClient(app)
+    app.state.housekeeper_policy = POLICY
+    app.state.housekeeper_snapshot = {"ram": {"beacon": "critical"}, "ssd": {"beacon": "ok"}}
+    before = metrics.snapshot().get("backpressure_events_total", 0)
+    r = client.post("/v1/chat/completions", json={})
+    assert r.status_code == 503 and r.headers["retry-after"] == "5"
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/v1/models").status_code == 200
+    assert metrics.snapshot()["backpressure_events_total"] == before + 1
+    # with actions disabled a critical beacon sheds nothing
+    app.state.housekeeper_policy = dict(POLICY, actions_enabled=False)
+    assert client.post("/v1/chat/completions", json={}).status_code != 503
+    assert metrics.snapshot()["backpressure_events_total"] == before + 1
+    app.state.housekeeper_policy = POLICY
+    # hot: batch traffic is delayed, then shed when the beacon does not recover
+    app.state.backpressure.level = "ok"
+    app.state.housekeeper_snapshot = {"ram": {"beacon": "hot"}, "ssd": {"beacon": "ok"}}
+    assert client.get("/v1/models", headers={"X-Priority": "batch"}).status_code == 503
+    assert client.get("/v1/models", headers={"X-Priority": "high"}).status_code == 200
@@ -0,0 +1,83 @@
+def test_count_min_sketch_estimates_and_ages():
+    from llm_server.cache import CountMinSketch, _digest
+
+    cms = CountMinSketch(width=1024, sample_size=10**9)
+    hot, cold = _digest("hot"), _digest("cold")
+    for _ in range(12):
+        cms.increment(hot)
+    cms.increment(cold)
+    assert cms.estimate(hot) >= 12 and cms.estimate(cold) >= 1
+    assert cms.estimate(_digest("never")) <= 1
+    cms._age()
+    assert 5 <= cms.estimate(hot) <= 7
+
+
+def test_tinylfu_admission_protects_frequent_entries():
+    from llm_server.cache import TieredCache
+
+    c = TieredCache("t", ram_bytes=100 * 100)  # ~100 entries of 100 B
+    val = b"v" * 100
+    for i in range(90):
+        c.put(f"hot{i}", val)
+    for _ in range(5):
+        for i in range(90):
+            assert c.get(f"hot{i}") is not None
+    # a scan of one-hit wonders must not flush the frequently used set
+    for i in range(2000):
+        c.put(f"scan{i}", val)
+    kept = sum(c.get(f"hot{i}") is not None for i in range(90))
+    assert kept >= 80
+    st = c.stats()
+    assert st["ram_bytes"] <= st["ram_budget"] and st["evictions_ram"] > 0
+
+
+def test_ram_evictions_spill_to_disk_and_promote(tmp_path):
+    from llm_server.cache import TieredCache
+
+    c = TieredCache("t", ram_bytes=1000, disk_bytes=10_000, disk_dir=str(tmp_path))
+    for i in range(50):
+        c.put(f"k{i}", bytes([i]) * 100)
+    st = c.stats()
+    assert st["ram_bytes"] <= 1000 and st["disk_entries"] > 0 and st["disk_bytes"] <= 10_000
+    # every entry fits in RAM + disk: the ones not in RAM are served from disk
+    assert all(c.get(f"k{i}") == bytes([i]) * 100 for i in range(50))
+    assert c.stats()["hits_disk"] > 0
+    # disk contents survive a restart
+    c2 = TieredCache("t", ram_bytes=1000, disk_bytes=10_000, disk_dir=str(tmp_path))
+    assert c2.stats()["disk_entries"] == c.stats()["disk_entries"]
+
+
+def test_manager_budgets_follow_policy_and_shrink_on_hot(tmp_path):
+    from llm_server.cache import CacheManager
+
+    m = CacheManager()
+    pol = {"cache": {"dir": str(tmp_path), "namespaces": {"embeddings": {"ram_mb": 1, "ssd_gb": 0}}, "shrink": {"hot": 0.5}}}
+    m.apply_policy(pol)
+    e = m.get("embeddings")
+    assert e.ram.capacity == 1024 ** 2
+    for i in range(200):
+        e.put(f"x{i}", b"z" * 4096)
+    m.apply_policy(pol, ram_beacon="hot")
+    assert e.ram.capacity == 1024 ** 2 // 2 and e.ram.bytes <= e.ram.capacity
+    assert m.stats()["factors"]["ram"] == 0.5
+    assert m.drop_ram() > 0 and e.ram.bytes == 0
+
+
+def test_embeddings_endpoint_uses_cache():
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+        from llm_server.cache import caches
+    except Exception:
+        return
+    app = create_app()
+    client = TestClient(app)
+    body = {"input": ["alpha", "beta"], "dimensions": 8}
+    r1 = client.post("/v1/embeddings", json=body)
+    before = caches.get("embeddings").stats()["hits_ram"]
+    r2 = client.post("/v1/embeddings", json=body)
+    assert r1.status_code == r2.status_code == 200
+    assert r1.json()["data"] == r2.json()["data"]
+    assert caches.get("embeddings").stats()["hits_ram"] == before + 2
+    r = client.get("/admin/cache")
+    assert r.status_code == 200 and "embeddings" in r.json()["namespaces"]
@@ -0,0 +1,107 @@
+from llm_server import cgroup
+
+GB = 1024 ** 3
+
+
+def _v2(tmp_path, mem_max="max", parent_max=str(16 * GB), cpu_max="200000 100000"):
+    root = tmp_path / "cg"
+    own = root / "system.slice" / "llm.service"
+    own.mkdir(parents=True)
+    (root / "cgroup.controllers").write_text("cpu memory io\n")
+    (root / "system.slice" / "memory.max").write_text(parent_max + "\n")
+    (own / "memory.max").write_text(mem_max + "\n")
+    (own / "memory.high").write_text("max\n")
+    (own / "memory.current").write_text(str(12 * GB) + "\n")
+    (own / "memory.events").write_text("low 0\nhigh 3\nmax 1\noom 0\noom_kill 2\n")
+    (own / "memory.stat").write_text(f"anon {6 * GB}\nfile {6 * GB}\nactive_file {2 * GB}\ninactive_file {4 * GB}\nshmem 0\n")
+    (own / "cpu.max").write_text(cpu_max + "\n")
+    proc = tmp_path / "self_cgroup"
+    proc.write_text("0::/system.slice/llm.service\n")
+    return str(root), str(proc)
+
+
+def test_v2_effective_limits_from_ancestors(tmp_path):
+    root, proc = _v2(tmp_path)
+    info = cgroup.read(root, proc)
+    assert info["version"] == 2
+    assert info["memory"]["max_bytes"] == 16 * GB  # parent limit binds
+    assert info["memory"]["events"]["oom_kill"] == 2
+    assert info["cpu"]["quota_cpus"] == 2.0
+    view = cgroup.memory_view(info, host_total=64 * GB, host_avail=40 * GB)
+    # working set = current - inactive_file = 8 GB, available = 16 - 8
+    assert view["total"] == 16 * GB and view["available"] == 8 * GB
+    s = cgroup.summary(info)
+    assert s["memory_max_gb"] == 16.0 and s["page_cache_gb"] == 6.0
+    info["cpu"]["cpuset_cpus"] = 8
+    assert cgroup.cpu_limit(info) == 2
+    info["cpu"]["quota_cpus"] = 1.5
+    assert cgroup.cpu_limit(info) == 2  # quota rounds up
+
+
+def test_unlimited_and_missing(tmp_path):
+    root, proc = _v2(tmp_path, parent_max="max", cpu_max="max 100000")
+    info = cgroup.read(root, proc)
+    assert info["memory"]["max_bytes"] is None and info["cpu"]["quota_cpus"] is None
+    assert cgroup.memory_view(info, 64 * GB, 40 * GB) is None
+    none = cgroup.read(str(tmp_path / "nope"), str(tmp_path / "nope2"))
+    assert none["version"] is None and cgroup.memory_view(none, 64 * GB, 40 * GB) is None
+
+
+def test_v1_fallback(tmp_path):
+    root = tmp_path / "cg"
+    mem = root / "memory" / "docker" / "abc"
+    mem.mkdir(parents=True)
+    (mem / "memory.limit_in_bytes").write_text(str(4 * GB))
+    (mem / "memory.usage_in_bytes").write_text(str(3 * GB))
+    (mem / "memory.stat").write_text(f"total_cache {GB}\ntotal_rss {2 * GB}\ntotal_inactive_file {GB}\n")
+    cpu = root / "cpu" / "docker" / "abc"
+    cpu.mkdir(parents=True)
+    (cpu / "cpu.cfs_quota_us").write_text("150000")
+    (cpu / "cpu.cfs_period_us").write_text("100000")
+    proc = tmp_path / "self_cgroup"
+    proc.write_text("4:memory:/docker/abc\n2:cpu,cpuacct:/docker/abc\n")
+    info = cgroup.read(str(root), str(proc))
+    assert info["version"] == 1 and info["memory"]["max_bytes"] == 4 * GB
+    assert info["cpu"]["quota_cpus"] == 1.5
+    assert cgroup.memory_view(info, 64 * GB, 40 * GB)["available"] == 2 * GB
+
+
+def test_mem_stats_and_reserve_use_cgroup(tmp_path, monkeypatch):
+    root, proc = _v2(tmp_path)
+    monkeypatch.setenv("CGROUP_ROOT", root)
+    monkeypatch.setenv("CGROUP_PROC_SELF", proc)
+    import types
+
+    import llm_server.housekeeper as hk
+    from llm_server.housekeeper import _free_reserve_gb, _mem_stats
+
+    host = types.SimpleNamespace(virtual_memory=lambda: types.SimpleNamespace(total=64 * GB, available=40 * GB))
+    monkeypatch.setattr(hk, "psutil", host)
+
+    mem = _mem_stats()
+    assert mem["cgroup_limited"] == 1.0 and abs(mem["total_gb"] - 16.0) < 1e-6
+    assert abs(mem["free_gb"] - 8.0) < 1e-6
+    # host-sized min_gb would exceed a small limit; reserve a share of the limit instead
+    assert abs(_free_reserve_gb(mem, {"free_reserve": {"min_gb": 15}}) - 0.8) < 1e-6
+    assert _free_reserve_gb({"total_gb": 64.0}, {"free_reserve": {"min_gb": 15, "pct": 0.0}}) == 15.0
+
+
+def test_info_reports_live_cgroup_usage(tmp_path, monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+    except Exception:
+        return
+    root, proc = _v2(tmp_path)
+    monkeypatch.setenv("CGROUP_ROOT", root)
+    monkeypatch.setenv("CGROUP_PROC_SELF", proc)
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    monkeypatch.setattr(cgroup, "_cached", None)  # restored afterwards
+    client = TestClient(create_app())
+    first = client.get("/info").json()["housekeeper"]["cgroup"]
+    assert first["memory_current_gb"] == 12.0 and first["events"]["oom_kill"] == 2
+    own = tmp_path / "cg" / "system.slice" / "llm.service"
+    (own / "memory.current").write_text(str(14 * GB) + "\n")
+    (own / "memory.events").write_text("low 0\nhigh 3\nmax 1\noom 1\noom_kill 3\n")
+    later = client.get("/info").json()["housekeeper"]["cgroup"]
+    assert later["memory_current_gb"] == 14.0 and later["events"]["oom_kill"] == 3
@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from llm_server.concurrency import ConcurrencyManager, QueueShed, _RoleGate
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _until(pred, timeout=3.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _waiter(gate, priority, results, name):
+    def run():
+        try:
+            gate.acquire(priority)
+            results.append((name, "ok"))
+        except QueueShed as e:
+            results.append((name, e))
+
+    th = threading.Thread(target=run, daemon=True)
+    th.start()
+    return th
+
+
+def test_sheds_lowest_priority_after_interval():
+    clock = FakeClock()
+    gate = _RoleGate(1, role="t", queue_cfg={"target_ms": 100, "interval_ms": 1000, "retry_after_s": 3, "status": 429}, clock=clock)
+    gate.acquire()  # hold the only slot
+    results = []
+    _waiter(gate, "normal", results, "a")
+    assert _until(lambda: gate.waiting == 1)
+    _waiter(gate, "batch", results, "b")
+    assert _until(lambda: gate.waiting == 2)
+    clock.t += 0.2  # head above target: interval starts
+    time.sleep(0.1)
+    assert not gate.dropping and results == []
+    clock.t += 1.1  # above target for a whole interval
+    assert _until(lambda: results)
+    name, err = results[0]
+    assert name == "b" and isinstance(err, QueueShed)
+    assert err.status == 429 and err.retry_after_s == 3 and err.role == "t"
+    assert gate.dropping and gate.shed_total == 1
+    # the next shed is spaced by interval/sqrt(count); the remaining head is not shed on release
+    gate.release()
+    assert _until(lambda: ("a", "ok") in results)
+    assert gate.active == 1 and gate.waiting == 0
+
+
+def test_high_priority_served_first():
+    gate = _RoleGate(1, role="t")
+    gate.acquire()
+    results = []
+    _waiter(gate, "low", results, "low")
+    assert _until(lambda: gate.waiting == 1)
+    _waiter(gate, "high", results, "high")
+    assert _until(lambda: gate.waiting == 2)
+    gate.release()
+    assert _until(lambda: results)
+    assert results == [("high", "ok")]
+    gate.release()
+    assert _until(lambda: len(results) == 2)
+    assert results[1] == ("low", "ok")
+
+
+def test_no_shedding_without_target():
+    clock = FakeClock()
+    gate = _RoleGate(1, role="t", queue_cfg={}, clock=clock)
+    gate.acquire()
+    results = []
+    _waiter(gate, "batch", results, "b")
+    assert _until(lambda: gate.waiting == 1)
+    clock.t += 3600
+    time.sleep(0.1)
+    assert results == [] and not gate.dropping
+    gate.release()
+    assert _until(lambda: results == [("b", "ok")])
+
+
+def test_short_sojourn_leaves_dropping_state():
+    clock = FakeClock()
+    gate = _RoleGate(2, role="t", queue_cfg={"target_ms": 100, "interval_ms": 1000}, clock=clock)
+    gate._codel(clock.t, 0.5)
+    clock.t += 1.5
+    gate._codel(clock.t, 0.5)
+    assert gate.dropping
+    assert gate.acquire() == pytest.approx(0.0)  # immediate slot: below target
+    assert not gate.dropping and gate.last_sojourn_ms == 0.0
+
+
+def test_manager_queue_config_and_priority_context(monkeypatch):
+    cm = ConcurrencyManager()
+    cm._queue_cfg = {"default": {"target_ms": 500, "interval_ms": 5000}, "router": {"target_ms": 50}}
+    assert cm.queue_config("router") == {"target_ms": 50, "interval_ms": 5000}
+    assert cm.queue_config("coder") == {"target_ms": 500, "interval_ms": 5000}
+
+    from llm_server import backpressure
+
+    seen = {}
+    gate = _RoleGate(0, role="x")
+    monkeypatch.setattr(gate, "acquire", lambda priority="normal", model="": seen.update(priority=priority, model=model) or 0.0)
+    cm._locks["x"] = gate
+    backpressure.set_priority("batch")
+    try:
+        with cm.acquire("x", model="m"):
+            pass
+    finally:
+        backpressure.set_priority("normal")
+    assert seen == {"priority": "batch", "model": "m"}
+    stats = cm.stats()["x"]
+    assert stats["shedding"] is False and stats["shed_total"] == 0
+
+
+def test_default_limits_define_queue_targets():
+    cm = ConcurrencyManager()
+    assert cm.queue_config("router")["target_ms"] == 2000
+    assert cm.queue_config("coder")["target_ms"] == 10000
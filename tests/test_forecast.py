@@ -0,0 +1,59 @@
+from llm_server.forecast import DiskForecaster
+
+GB = 1024 ** 3
+
+
+def test_write_rate_and_time_to_watermarks():
+    fc = DiskForecaster(window_s=300)
+    assert fc.estimate(0.75, 0.85)["write_rate_mb_s"] is None
+    # 100 GB disk, free shrinking by 0.1 GB/s from 40 GB
+    for i in range(10):
+        fc.add(40.0 - 0.1 * i * 5, 100.0, ts=i * 5.0)
+    est = fc.estimate(0.75, 0.85)
+    assert abs(est["write_rate_mb_s"] - 102.4) < 0.01
+    # free is 35.5 GB; soft at 25 GB free -> 105 s, hard at 15 GB -> 205 s
+    assert abs(est["time_to_soft_s"] - 105.0) < 0.5
+    assert abs(est["time_to_hard_s"] - 205.0) < 0.5
+    assert est["r2"] > 0.99
+
+
+def test_proactive_bytes_rate_matched_and_capped():
+    fc = DiskForecaster()
+    for i in range(10):
+        fc.add(40.0 - 0.1 * i * 5, 100.0, ts=i * 5.0)
+    fc.estimate(0.75, 0.85)
+    pol = {"max_evict_per_tick_gb": 1.0}
+    want = fc.proactive_bytes(5.0, pol)
+    assert abs(want - 0.1 * 5 * 1.2 * GB) < 0.01 * GB
+    assert fc.proactive_bytes(5.0, {"forecast_lead_s": 60}) == 0  # soft still 105 s away
+    assert fc.proactive_bytes(5.0, {"forecast_max_evict_per_tick_gb": 0.25}) == int(0.25 * GB)
+    # an early (PSI-triggered) tick only covers what was written since the last one
+    assert abs(fc.proactive_bytes(2.0, pol) - want * 2.0 / 5.0) < 0.01 * GB
+
+
+def test_own_eviction_excluded_from_rate():
+    fc = DiskForecaster()
+    free = 40.0
+    for i in range(10):
+        fc.add(free, 100.0, ts=i * 5.0)
+        # writers add 0.5 GB per tick, eviction frees exactly that
+        fc.note_evicted(int(0.5 * GB))
+    est = fc.estimate(0.75, 0.85)
+    assert abs(est["write_rate_mb_s"] - 102.4) < 0.01
+    # idle disk: no forecast action
+    idle = DiskForecaster()
+    for i in range(10):
+        idle.add(40.0, 100.0, ts=i * 5.0)
+    assert idle.estimate(0.75, 0.85)["time_to_soft_s"] is None
+    assert idle.proactive_bytes(5.0, {}) == 0
+
+
+def test_noisy_samples_do_not_trigger_proactive_eviction():
+    fc = DiskForecaster()
+    # free space oscillates near the soft watermark (25 GB free) with one final burst
+    for i, free in enumerate([27.0, 26.0, 27.0, 26.0, 27.0, 26.0, 27.0, 26.0, 27.0, 25.2]):
+        fc.add(free, 100.0, ts=i * 5.0)
+    est = fc.estimate(0.75, 0.85)
+    assert est["write_rate_mb_s"] > 0 and est["time_to_soft_s"] < 600 and est["r2"] < 0.6
+    assert fc.proactive_bytes(5.0, {"max_evict_per_tick_gb": 1.0}) == 0
+    assert fc.proactive_bytes(5.0, {"max_evict_per_tick_gb": 1.0, "forecast_min_r2": 0.0}) > 0
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+LLAMA_OUT = b"""hello world
+llama_perf_context_print:        load time =     500.00 ms
+llama_perf_context_print: prompt eval time =     200.00 ms /    20 tokens (   10.00 ms per token,   100.00 tokens per second)
+llama_perf_context_print:        eval time =    1000.00 ms /    40 runs   (   25.00 ms per token,    40.00 tokens per second)
+llama_perf_context_print:       total time =    1700.00 ms /    60 tokens
+"""
+
+
+class _Spec:
+    name = "fake-model"
+    path = Path(__file__)
+    context_max = 4096
+
+
+class _Registry:
+    cfg = {"gen_defaults": {}}
+
+    def get(self, name):
+        return _Spec()
+
+
+def test_generation_timings_recorded(monkeypatch):
+    import llm_server.generation as gen
+    from llm_server.metrics import metrics
+
+    monkeypatch.setattr(gen.subprocess, "check_output", lambda *a, **k: LLAMA_OUT)
+    monkeypatch.setattr(gen.admission, "enabled", False)  # host headroom is not under test here
+    res = gen.generate_with_llama_cli(_Registry(), "fake-model", "hi", role="router")
+    t = res["timings"]
+    assert t["load_ms"] == 500.0 and t["prompt_tokens"] == 20
+    assert t["prompt_tps"] == 100.0 and t["decode_tps"] == 40.0
+    # ttft = queue wait + load + prompt eval + one decode step
+    assert abs(t["ttft_ms"] - (t["queue_wait_ms"] + 500.0 + 200.0 + 25.0)) < 1e-6
+    snap = metrics.snapshot()
+    assert snap["gen_ttft:fake-model router_count"] >= 1
+    assert snap["timing_gen_decode_tps:fake-model router"] == 40.0
+
+
+def test_result_payload_includes_timings():
+    from llm_server.api import _result_payload
+
+    res = {"output": "ok", "timings": {"ttft_ms": 12.0, "prompt_tokens": 3, "completion_tokens": 4}}
+    p = _result_payload("rid-1", "main", "m", res, 50)
+    assert p["status"] == "ok" and p["request_id"] == "rid-1"
+    assert p["usage"]["total_tokens"] == 7
+    assert p["timings"]["ttft_ms"] == 12.0
+    assert _result_payload(None, "main", "m", {"error": "generation timeout"}, 1)["status"] == "timeout"
@@ -0,0 +1,84 @@
+import gzip
+import io
+import json
+import logging
+import os
+
+
+def _record(msg, **extra):
+    rec = logging.LogRecord("t", logging.INFO, __file__, 1, msg, None, None)
+    for k, v in extra.items():
+        setattr(rec, k, v)
+    return rec
+
+
+def test_formatter_includes_extra_fields_and_request_id():
+    from llm_server.logging_utils import JsonFormatter, set_request_id
+
+    set_request_id("abc123")
+    try:
+        line = JsonFormatter().format(_record("request", status=200, route="/v1/x"))
+    finally:
+        set_request_id(None)
+    d = json.loads(line)
+    assert d["message"] == "request" and d["status"] == 200 and d["route"] == "/v1/x"
+    assert d["request_id"] == "abc123"
+
+
+def test_async_handler_batches_and_keeps_request_id():
+    from llm_server.logging_utils import AsyncLogHandler, JsonFormatter, set_request_id
+
+    buf = io.StringIO()
+    h = AsyncLogHandler(stream=buf, batch_size=64, flush_interval_s=0.05)
+    h.setFormatter(JsonFormatter())
+    try:
+        set_request_id("rid-1")
+        for i in range(100):
+            h.emit(_record("m %s", n=i))
+        set_request_id(None)
+        h.flush()
+    finally:
+        h.close()
+    lines = [json.loads(x) for x in buf.getvalue().splitlines()]
+    assert len(lines) == 100 and h.written == 100 and h.dropped == 0
+    assert lines[0]["request_id"] == "rid-1" and lines[-1]["n"] == 99
+
+
+def test_async_handler_drops_when_queue_full():
+    from llm_server.logging_utils import AsyncLogHandler
+
+    class Blocked(io.StringIO):
+        def __init__(self):
+            super().__init__()
+            import threading
+
+            self.gate = threading.Event()
+
+        def write(self, s):
+            self.gate.wait(5)
+            return super().write(s)
+
+    out = Blocked()
+    h = AsyncLogHandler(stream=out, maxsize=10, batch_size=1, flush_interval_s=0.01)
+    try:
+        for i in range(50):
+            h.emit(_record("x"))
+        assert h.dropped >= 30
+    finally:
+        out.gate.set()
+        h.close()
+
+
+def test_rotating_file_compresses_rotated_logs(tmp_path):
+    from llm_server.logging_utils import _RotatingFile
+
+    path = tmp_path / "app.jsonl"
+    f = _RotatingFile(str(path), max_bytes=100, backup_count=2, compress=True)
+    for i in range(10):
+        f.write((json.dumps({"i": i, "pad": "x" * 40}) + "\n").encode())
+    f.close()
+    assert os.path.exists(str(path) + ".1.gz") and os.path.exists(str(path) + ".2.gz")
+    assert not os.path.exists(str(path) + ".3.gz")
+    with gzip.open(str(path) + ".1.gz", "rt") as fh:
+        assert '"i"' in fh.read()
+    assert os.path.getsize(path) <= 100
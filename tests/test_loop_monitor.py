@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+
+def test_loop_monitor_measures_lag_and_dumps_stack_on_stall():
+    from llm_server.loop_monitor import LoopMonitor
+    from llm_server.metrics import metrics
+
+    stalls = []
+
+    def blocking_handler():
+        time.sleep(0.4)  # blocks the event loop
+
+    async def main():
+        mon = LoopMonitor(interval_s=0.02, stall_ms=100, on_stall=lambda lag, st: stalls.append((lag, st)))
+        mon.start()
+        await asyncio.sleep(0.1)
+        blocking_handler()
+        await asyncio.sleep(0.1)
+        await mon.stop()
+        return mon
+
+    mon = asyncio.run(main())
+    assert mon.lag_max_ms >= 200
+    assert stalls and "blocking_handler" in stalls[0][1]
+    snap = metrics.snapshot()
+    assert "timing_event_loop_lag_ms" in snap and "timing_threadpool_size" in snap
+    assert snap.get("event_loop_stalls_total", 0) >= 1
+
+
+def test_inflight_and_sse_gauges(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '0')
+    seen = {}
+
+    def fake_gen(*args, **kwargs):
+        from llm_server.openmetrics import registry
+        seen.setdefault('text', registry.render())
+        seen['sse'] = api.metrics.snapshot().get('timing_sse_streams_open')
+        return {"output": "x"}
+
+    monkeypatch.setattr(api, "generate_with_llama_cli", fake_gen)
+    app = create_app()
+    if not hasattr(app, 'state'):
+        return
+    client = TestClient(app)
+    req = {"model": "phi-4-mini-instruct", "messages": [{"role": "user", "content": "s"}]}
+    assert client.post("/v1/chat/completions", json=req).status_code == 200
+    req["stream"] = True
+    with client.stream("POST", "/v1/chat/completions", json=req) as resp:
+        list(resp.iter_lines())
+    assert 'http_inflight_requests{route="/v1/chat/completions"} 1' in seen['text']
+    assert seen['sse'] >= 1
+    assert api.metrics.snapshot()['timing_sse_streams_open'] == 0
@@ -0,0 +1,52 @@
+import os
+import time
+
+
+def test_series_rollups_and_tier_selection():
+    from llm_server.timeseries import Series, parse_range
+
+    s = Series("ram_headroom_gb", "gauge", tiers=((5, 60), (60, 3600)))
+    t0 = 1_000_000.0
+    for i in range(24):  # two minutes of 5 s samples
+        s.add(t0 + i * 5, float(i))
+    fine = s.query(60, now=t0 + 115)
+    assert fine["step"] == 5 and len(fine["avg"]) == 12
+    assert fine["avg"][-1] == 23.0
+    coarse = s.query(600, now=t0 + 115)
+    assert coarse["step"] == 60 and len(coarse["avg"]) == 10
+    vals = [v for v in coarse["avg"] if v is not None]
+    assert vals and min(v for v in coarse["min"] if v is not None) == 0.0
+    assert parse_range("15m") == 900 and parse_range("24h") == 86400 and parse_range("30") == 30
+
+
+def test_counter_series_reports_deltas():
+    from llm_server.timeseries import Series
+
+    s = Series("requests_total", "counter", tiers=((10, 100),))
+    t0 = 2_000_000.0
+    for i, v in enumerate([5, 8, 8, 20]):
+        s.add(t0 + i * 10, v)
+    q = s.query(40, now=t0 + 30)
+    assert q["delta"] == [None, 3.0, 0.0, 12.0]
+    assert q["rate"][-1] == 1.2
+
+
+def test_history_endpoint_fed_by_housekeeper():
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+    except Exception:
+        return
+    os.environ['HOUSEKEEPER_INTERVAL_S'] = '0.05'
+    app = create_app()
+    if not hasattr(app, 'state'):
+        return
+    with TestClient(app) as client:
+        time.sleep(0.2)
+        names = client.get('/metrics/history').json()['names']
+        assert 'ram_headroom_gb' in names
+        r = client.get('/metrics/history', params={'name': 'housekeeper_ticks_total', 'range': '5m'})
+        assert r.status_code == 200 and r.json()['step'] == 5
+        r = client.get('/metrics/history', params={'name': 'ram_headroom_gb', 'range': '1h'})
+        assert any(v is not None for v in r.json()['avg'])
+        assert client.get('/metrics/history', params={'name': 'nope'}).status_code == 404
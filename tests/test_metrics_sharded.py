@@ -0,0 +1,35 @@
+import threading
+
+
+def test_sharded_metrics_aggregates_across_threads():
+    from llm_server.metrics import ShardedMetrics
+
+    m = ShardedMetrics()
+
+    def work():
+        for i in range(1000):
+            m.inc("requests_total")
+            m.inc("requests_total:GET /x")
+            m.observe_duration("http_request", float(i % 100 + 1))
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    m.inc("requests_total")  # live shard on the main thread
+    snap = m.snapshot()
+    assert snap["requests_total"] == 8001
+    assert snap["requests_total:GET /x"] == 8000
+    assert snap["http_request_count"] == 8000
+    assert 45 <= snap["http_request_p50_ms"] <= 55
+    # dead-thread shards were folded, totals survive another scrape
+    assert not [th for th, _ in m._shards if not th.is_alive()]
+    assert m.snapshot()["requests_total"] == 8001
+
+
+def test_make_metrics_backend_selection():
+    from llm_server.metrics import Metrics, ShardedMetrics, make_metrics
+
+    assert type(make_metrics("locked")) is Metrics
+    assert isinstance(make_metrics("sharded"), ShardedMetrics)
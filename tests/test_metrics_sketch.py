@@ -0,0 +1,58 @@
+import random
+
+
+def test_ddsketch_relative_accuracy_and_merge():
+    from llm_server.sketch import DDSketch
+
+    rnd = random.Random(7)
+    xs = [rnd.lognormvariate(3.0, 1.2) for _ in range(20000)]
+    a, b = DDSketch(alpha=0.01), DDSketch(alpha=0.01)
+    for i, x in enumerate(xs):
+        (a if i % 2 else b).add(x)
+    a.merge(b)
+    assert a.count == len(xs)
+    ys = sorted(xs)
+    for q in (0.5, 0.95, 0.99):
+        exact = ys[int(round(q * (len(ys) - 1)))]
+        est = a.quantile(q)
+        assert abs(est - exact) / exact <= 0.02
+
+
+def test_ddsketch_bounded_bins():
+    from llm_server.sketch import DDSketch
+
+    sk = DDSketch(alpha=0.01, max_bins=64)
+    for i in range(1, 100000, 7):
+        sk.add(float(i))
+    assert len(sk._bins) <= 64
+    # high tail remains accurate after collapsing the low buckets
+    assert abs(sk.quantile(0.99) - 99000) / 99000 <= 0.02
+
+
+def test_windowed_sketch_expires_old_slices():
+    from llm_server.sketch import WindowedSketch
+
+    now = [1000.0]
+    ws = WindowedSketch(window_s=10.0, slices=5, clock=lambda: now[0])
+    for _ in range(100):
+        ws.add(500.0)
+    now[0] += 4.0
+    ws.add(5.0)
+    assert ws.window().count == 101
+    now[0] += 9.0  # first batch falls out of the window
+    assert ws.window().count == 1
+    assert abs(ws.window().quantile(0.5) - 5.0) / 5.0 <= 0.02
+    assert ws.total.count == 101
+
+
+def test_metrics_snapshot_exports_window_and_cumulative():
+    from llm_server.metrics import Metrics
+
+    m = Metrics()
+    for v in range(1, 101):
+        m.observe_duration("http_request", float(v))
+    snap = m.snapshot()
+    assert 45 <= snap["http_request_p50_ms"] <= 55
+    assert 95 <= snap["http_request_p99_ms"] <= 101
+    assert snap["http_request_count"] == 100
+    assert "http_request_cum_p95_ms" in snap
@@ -0,0 +1,55 @@
+def test_registry_cardinality_cap_and_exemplars():
+    from llm_server.openmetrics import Registry, OVERFLOW
+
+    reg = Registry()
+    c = reg.counter("demo_requests_total", "demo", ("route",), max_series=3)
+    for i in range(10):
+        c.inc(route=f"/r{i}")
+    for _ in range(5):
+        c.inc(route="/r9")  # repeated lookups of a folded label set count once
+    h = reg.histogram("demo_latency_seconds", "demo", ("route",), buckets=(0.1, 1.0))
+    h.observe(2.5, exemplar="req-slow", route="/a")
+    h.observe(0.05, route="/a")
+    text = reg.render()
+    assert text.endswith("# EOF\n")
+    assert "# TYPE demo_requests counter" in text
+    assert f'demo_requests_total{{route="{OVERFLOW}"}} 12' in text
+    assert 'metrics_label_overflow_total{metric="demo_requests"} 7' in text
+    assert 'demo_latency_seconds_bucket{route="/a",le="+Inf"} 2 # {trace_id="req-slow"} 2.5' in text
+    assert 'demo_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 'demo_latency_seconds_bucket{route="/a",le="1.0"} 1' in text
+
+
+def test_exemplar_truncated_to_openmetrics_limit():
+    from llm_server.openmetrics import Registry
+
+    reg = Registry()
+    h = reg.histogram("demo_seconds", "demo", buckets=(1.0,))
+    h.observe(0.5, exemplar="x" * 500)
+    line = next(l for l in reg.render().splitlines() if 'le="1.0"' in l)
+    value = line.split('trace_id="')[1].split('"')[0]
+    assert len("trace_id") + len(value) == 128
+
+
+def test_metrics_endpoint_openmetrics_negotiation(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '0')
+    app = create_app()
+    if not hasattr(app, 'state'):
+        return
+    client = TestClient(app)
+    client.get('/healthz', headers={'X-Request-Id': 'om-test-1'})
+    client.get('/no/such/path/12345')
+    r = client.get('/metrics', headers={'Accept': 'application/openmetrics-text; version=1.0.0'})
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('application/openmetrics-text')
+    body = r.text
+    assert 'http_requests_total{method="GET",route="/healthz",status="200"}' in body
+    assert 'route="__unmatched__"' in body and '/no/such/path' not in body
+    assert 'trace_id="om-test-1"' in body
+    # JSON stays the default
+    assert isinstance(client.get('/metrics').json(), dict)
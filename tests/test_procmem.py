@@ -0,0 +1,59 @@
+import os
+
+from llm_server.procmem import ProcMemSampler, model_from_cmdline, read_smaps_rollup
+
+
+def _proc(root, pid, ppid, start, argv, rss_kb, pss_kb, anon_kb, file_kb, children=None):
+    d = root / str(pid)
+    (d / "task" / str(pid)).mkdir(parents=True)
+    (d / "stat").write_text(f"{pid} (llama cli) S {ppid} 1 1 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 {start} 0 0\n")
+    (d / "cmdline").write_bytes(b"\0".join(a.encode() for a in argv) + b"\0")
+    (d / "smaps_rollup").write_text(
+        "00400000-7ffd [rollup]\n"
+        f"Rss:            {rss_kb} kB\nPss:            {pss_kb} kB\n"
+        f"Pss_Anon:       {anon_kb} kB\nPss_File:       {file_kb} kB\nPss_Shmem:         0 kB\n"
+        "Swap:              0 kB\nSwapPss:           0 kB\n"
+    )
+    if children is not None:
+        (d / "task" / str(pid) / "children").write_text(" ".join(str(c) for c in children))
+
+
+def test_parse_rollup_and_cmdline(tmp_path):
+    _proc(tmp_path, 10, 1, 100, ["python"], 2048, 1024, 512, 512)
+    m = read_smaps_rollup(10, str(tmp_path))
+    assert m["rss"] == 2048 * 1024 and m["pss_anon"] == 512 * 1024
+    assert read_smaps_rollup(99, str(tmp_path)) is None
+    assert model_from_cmdline(["llama-cli", "-m", "/m/a.gguf", "-p", "x"]) == "/m/a.gguf"
+    assert model_from_cmdline(["llama-cli", "--model=/m/b.gguf"]) == "/m/b.gguf"
+    assert model_from_cmdline(["bash"]) is None
+
+
+def test_per_model_pss_and_cached_attribution(tmp_path):
+    _proc(tmp_path, 10, 1, 100, ["python", "-m", "uvicorn"], 1000, 1000, 800, 200, children=[11, 12])
+    # Two workers share the same weights: RSS counts them twice, PSS splits them
+    _proc(tmp_path, 11, 10, 200, ["llama-cli", "-m", "/models/qwen.gguf"], 9000, 5000, 1000, 4000, children=[])
+    _proc(tmp_path, 12, 10, 201, ["llama-cli", "-m", "/models/phi.gguf"], 9000, 5000, 1000, 4000, children=[])
+    s = ProcMemSampler(root_pid=10, proc_root=str(tmp_path), model_names=lambda: {"/models/qwen.gguf": "qwen-14b"})
+    out = s.sample()
+    assert set(out) == {"server", "qwen-14b", "phi"}
+    assert out["qwen-14b"]["pss"] == 5000 * 1024 and out["qwen-14b"]["kv"] == 1000 * 1024
+    tot = s.totals(out)
+    assert tot["pss"] < tot["rss"] and tot["procs"] == 3
+    reads = s.cmdline_reads
+    s.sample()
+    assert s.cmdline_reads == reads  # no cmdline re-reads for known pids
+    s.publish(out)
+
+
+def test_fallback_scan_without_children_files(tmp_path):
+    _proc(tmp_path, 10, 1, 100, ["python"], 100, 100, 50, 50)
+    _proc(tmp_path, 11, 10, 200, ["llama-cli", "-m", "/m/x.gguf"], 100, 100, 50, 50)
+    _proc(tmp_path, 12, 1, 300, ["other"], 100, 100, 50, 50)
+    t = [0.0]
+    s = ProcMemSampler(root_pid=10, proc_root=str(tmp_path), rescan_s=30, clock=lambda: t[0])
+    assert sorted(s.descendants()) == [10, 11]
+    assert set(s.sample()) == {"server", "x"}
+    # pid reuse: a new start time triggers re-attribution
+    (tmp_path / "11" / "stat").write_text("11 (llama-cli) S 10 1 1 0 -1 0 0 0 0 0 0 0 0 0 20 0 1 0 999 0 0\n")
+    (tmp_path / "11" / "cmdline").write_bytes(b"llama-cli\0-m\0/m/y.gguf\0")
+    assert set(s.sample()) == {"server", "y"}
@@ -0,0 +1,75 @@
+import threading
+import time
+
+
+def _busy_worker(stop):
+    while not stop.is_set():
+        sum(range(200))
+
+
+def test_sampler_collects_named_threads_with_bounded_overhead():
+    from llm_server.profiler import SamplingProfiler, collapsed, flamegraph_svg
+
+    stop = threading.Event()
+    t = threading.Thread(target=_busy_worker, args=(stop,), name="busy-worker", daemon=True)
+    t.start()
+    try:
+        prof = SamplingProfiler(interval_s=0.002)
+        stacks = prof.run(0.3)
+    finally:
+        stop.set()
+        t.join()
+    text = collapsed(stacks)
+    assert any(line.startswith("busy-worker;") and "_busy_worker" in line for line in text.splitlines())
+    st = prof.stats()
+    assert st["samples"] > 0 and st["overhead"] <= 0.05
+    svg = flamegraph_svg(stacks)
+    assert svg.startswith("<svg") and "_busy_worker" in svg
+
+
+def _deep(n, stop):
+    if n:
+        return _deep(n - 1, stop)
+    while not stop.is_set():
+        _deep_leaf()
+
+
+def _deep_leaf():
+    sum(range(200))
+
+
+def test_deep_stacks_keep_leaf_frames():
+    from llm_server.profiler import TRUNCATED, SamplingProfiler
+
+    stop = threading.Event()
+    t = threading.Thread(target=_deep, args=(40, stop), name="deep-worker", daemon=True)
+    t.start()
+    try:
+        stacks = SamplingProfiler(interval_s=0.002, max_depth=8).run(0.2)
+    finally:
+        stop.set()
+        t.join()
+    deep = [k.split(";") for k in stacks if k.startswith("deep-worker;")]
+    assert deep
+    for parts in deep:
+        assert parts[1] == TRUNCATED and len(parts) == 1 + 1 + 8
+    assert any("_deep_leaf" in parts[-1] for parts in deep)
+
+
+def test_profile_endpoint_formats(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '0')
+    app = create_app()
+    if not hasattr(app, 'state'):
+        return
+    client = TestClient(app)
+    r = client.get('/admin/profile', params={'seconds': 0.1})
+    assert r.status_code == 200
+    j = r.json()
+    assert 'collapsed' in j and j['svg'].startswith('<svg') and j['stats']['samples'] > 0
+    r = client.get('/admin/profile', params={'seconds': 0.1, 'format': 'svg'})
+    assert r.status_code == 200 and r.headers['content-type'].startswith('image/svg+xml')
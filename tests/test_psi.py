@@ -0,0 +1,50 @@
+from llm_server.psi import PsiMonitor, PsiTrigger, level_for, read_pressure, worst
+
+
+def _write(root, resource, some_avg10, some_total, full_avg10=0.0, full_total=0):
+    (root / resource).write_text(
+        f"some avg10={some_avg10:.2f} avg60=0.00 avg300=0.00 total={some_total}\n"
+        f"full avg10={full_avg10:.2f} avg60=0.00 avg300=0.00 total={full_total}\n"
+    )
+
+
+def test_parse_and_levels(tmp_path):
+    _write(tmp_path, "memory", 3.5, 1000, 1.0, 500)
+    v = read_pressure("memory", str(tmp_path))
+    assert v["some"]["avg10"] == 3.5 and v["full"]["total"] == 500
+    assert read_pressure("cpu", str(tmp_path)) is None
+    assert level_for(4, [5, 10, 25]) == "ok"
+    assert level_for(12, [5, 10, 25]) == "hot"
+    assert level_for(99, None) == "ok"
+    assert worst("ok", "critical", "warn") == "critical"
+
+
+def test_tick_stall_rate_drives_beacon_and_admission(tmp_path):
+    t = [0.0]
+    mon = PsiMonitor(root=str(tmp_path), clock=lambda: t[0])
+    for r in ("memory", "io", "cpu"):
+        _write(tmp_path, r, 0.0, 0)
+    mon.sample()
+    assert mon.evaluate({}) == "ok" and mon.admission_factor({}) == 1.0
+    # 1.5 s of "full" memory stall over 5 s: 30% > critical (15%) before avg10 catches up
+    t[0] = 5.0
+    _write(tmp_path, "memory", 0.0, 2_000_000, 0.0, 1_500_000)
+    mon.sample()
+    assert abs(mon.stall_pct["memory_full"] - 30.0) < 1e-6
+    assert mon.evaluate({}) == "critical"
+    assert mon.beacons["memory"] == "critical" and mon.beacons["cpu"] == "ok"
+    assert mon.admission_factor({}) == 0.25
+    assert mon.admission_factor({"admission_factors": {"critical": 0.5}}) == 0.5
+    mon.publish()
+    assert mon.snapshot()["beacon"] == "critical"
+    # disabled via policy
+    assert mon.evaluate({"enabled": False}) == "ok"
+
+
+def test_unavailable_falls_back(tmp_path):
+    mon = PsiMonitor(root=str(tmp_path / "missing"))
+    mon.sample()
+    assert mon.available is False
+    assert mon.evaluate({}) == "ok" and mon.admission_factor() == 1.0
+    trig = PsiTrigger("memory", "some", 150000, 1000000, on_event=lambda r: None, root=str(tmp_path / "missing"))
+    assert trig.start() is False and trig.error
@@ -0,0 +1,146 @@
+import threading
+import time
+
+
+class _Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+class _Conc:
+    def __init__(self):
+        self.factors = {}
+
+    @property
+    def factor(self):
+        return self.factors.get("ram", 1.0)
+
+    def scale(self, f, source="ram"):
+        self.factors[source] = f
+
+
+class _Caches:
+    drops = 0
+
+    def drop_ram(self):
+        self.drops += 1
+        return 7
+
+
+class _Registry:
+    def __init__(self):
+        self.resident = ["old", "new"]
+        self.unloaded = []
+
+    def lru_idle(self):
+        return self.resident[0] if self.resident else None
+
+    def unload(self, name):
+        self.resident.remove(name)
+        self.unloaded.append(name)
+        return True
+
+
+POLICY = {
+    "actions_enabled": True,
+    "ram": {"soft_pct": 0.80, "hard_pct": 0.90},
+    "backpressure": {"enable_soft": True, "enable_hard": True, "cooldown_s": 5},
+}
+
+
+def test_soft_then_hard_then_recover_with_hysteresis_and_cooldown():
+    from llm_server.ram_actions import RamPressureController
+
+    clk = _Clock()
+    ctl = RamPressureController(clock=clk)
+    conc, caches, reg = _Conc(), _Caches(), _Registry()
+
+    acts = ctl.step(0.82, "warn", POLICY, conc, reg, caches)
+    assert ctl.level == "soft" and conc.factor == 0.5 and caches.drops == 1
+    assert {a["action"] for a in acts} == {"cache_drop", "concurrency_scale"}
+
+    # hard within the cooldown is deferred
+    clk.t = 2
+    ctl.step(0.95, "critical", POLICY, conc, reg, caches)
+    assert ctl.level == "soft"
+    clk.t = 6
+    acts = ctl.step(0.95, "critical", POLICY, conc, reg, caches)
+    assert ctl.level == "hard" and conc.factor == 0.25 and reg.unloaded == ["old"]
+    # one unload per cooldown
+    clk.t = 7
+    ctl.step(0.95, "critical", POLICY, conc, reg, caches)
+    assert reg.unloaded == ["old"]
+
+    # just under the hard watermark stays hard (hysteresis)
+    clk.t = 20
+    ctl.step(0.885, "hot", POLICY, conc, reg, caches)
+    assert ctl.level == "hard"
+    clk.t = 30
+    ctl.step(0.80, "warn", POLICY, conc, reg, caches)
+    assert ctl.level == "soft" and conc.factor == 0.5
+    clk.t = 40
+    ctl.step(0.78, "ok", POLICY, conc, reg, caches)
+    assert ctl.level == "soft"  # within soft - hysteresis
+    clk.t = 50
+    ctl.step(0.70, "ok", POLICY, conc, reg, caches)
+    assert ctl.level == "normal" and conc.factor == 1.0
+    snap = ctl.snapshot()
+    assert snap["last_action"]["action"] == "concurrency_scale" and snap["recent"]
+
+
+def test_actions_are_only_planned_when_disabled():
+    from llm_server.ram_actions import RamPressureController
+
+    ctl = RamPressureController(clock=_Clock())
+    conc, caches, reg = _Conc(), _Caches(), _Registry()
+    pol = dict(POLICY, actions_enabled=False)
+    acts = ctl.step(0.95, "critical", pol, conc, reg, caches)
+    assert ctl.level == "hard" and conc.factor == 1.0 and caches.drops == 0 and reg.unloaded == []
+    assert acts and not any(a["executed"] for a in acts)
+
+
+def test_concurrency_limits_shrink_without_interrupting_holders():
+    from llm_server.concurrency import ConcurrencyManager
+
+    cm = ConcurrencyManager()
+    cm._limits["t"] = 4
+    cm._locks.pop("t", None)
+    assert cm.effective_limit("t") == 4
+    cm.scale(0.25)
+    assert cm.effective_limit("t") == 1
+    entered = []
+
+    def worker(i):
+        with cm.acquire("t"):
+            entered.append(i)
+            time.sleep(0.05)
+
+    with cm.acquire("t"):
+        t = threading.Thread(target=worker, args=(1,))
+        t.start()
+        time.sleep(0.05)
+        assert entered == [] and cm.stats()["t"]["waiting"] == 1
+    t.join(2)
+    assert entered == [1]
+    cm.scale(0.5, source="thermal")
+    cm.scale(1.0)
+    assert cm.effective_limit("t") == 2  # thermal reduction still applies
+    cm.scale(1.0, source="thermal")
+    assert cm.effective_limit("t") == 4
+
+
+def test_registry_tracks_lru_idle_models():
+    from llm_server.registry import ModelRegistry
+
+    reg = ModelRegistry()
+    with reg.in_use("a"):
+        pass
+    time.sleep(0.01)
+    with reg.in_use("b"):
+        assert reg.lru_idle() == "a"
+        assert reg.unload("b") is False  # active
+    assert reg.unload("a") is True
+    assert set(reg.residency()) == {"b"}
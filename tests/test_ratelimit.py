@@ -0,0 +1,136 @@
+import multiprocessing as mp
+import os
+
+from llm_server import ratelimit
+from llm_server.metrics import metrics
+from llm_server.ratelimit import LocalBuckets, SharedBuckets, client_key
+
+
+def _evictions():
+    return metrics.snapshot().get("rate_limit_evictions_total", 0)
+
+
+def test_local_bucket_refill_and_retry_after():
+    rl = LocalBuckets(rps=2.0, burst=3)
+    now = 100.0
+    assert [rl.allow("a", now) for _ in range(4)] == [True, True, True, False]
+    allowed, tokens, retry = rl.take("a", now)
+    assert not allowed and retry == 0.5
+    assert rl.allow("b", now)  # independent key
+    assert rl.allow("a", now + 0.5)
+
+
+def test_local_bucket_table_is_bounded_and_swept():
+    rl = LocalBuckets(rps=10.0, burst=10, max_keys=4)
+    for i in range(10):
+        rl.take(f"k{i}", 100.0)
+    assert rl.stats(100.0)["keys"] == 4
+    rl._sweep(200.0)  # all refilled long ago
+    assert rl.stats(200.0)["keys"] == 0
+
+
+def test_shared_buckets_shared_between_instances(tmp_path):
+    path = str(tmp_path / "rl.bin")
+    a = SharedBuckets(path, rps=1.0, burst=5, slots=64)
+    b = SharedBuckets(path, rps=1.0, burst=5, slots=64)
+    now = 50.0
+    results = [(a if i % 2 else b).allow("client", now) for i in range(8)]
+    assert results.count(True) == 5
+    assert a.stats(now)["keys"] == 1
+    a.close()
+    b.close()
+
+
+def _worker(path, n, q):
+    rl = SharedBuckets(path, rps=0.001, burst=10, slots=64)
+    q.put(sum(rl.allow("client", 1000.0) for _ in range(n)))
+
+
+def test_shared_buckets_across_processes(tmp_path):
+    path = str(tmp_path / "rl.bin")
+    SharedBuckets(path, rps=0.001, burst=10, slots=64).close()
+    ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+    q = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(path, 20, q)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(20)
+    assert sum(q.get(timeout=5) for _ in procs) == 10
+
+
+def test_shared_idle_slots_reused_then_lru_evicted(tmp_path):
+    rl = SharedBuckets(str(tmp_path / "rl.bin"), rps=1.0, burst=10, slots=16, probe=16)
+    for i in range(16):
+        rl.take(f"k{i}", 100.0 + i * 0.01)
+    assert rl.stats(100.2)["keys"] == 16
+    before = _evictions()
+    # all buckets refilled: a new key takes an idle slot without eviction
+    assert rl.allow("new", 200.0)
+    assert _evictions() == before
+    # idle slots are reused first; once every slot is live the LRU bucket is taken over
+    for i in range(17):
+        rl.take(f"j{i}", 300.0 + i * 0.01)
+    assert _evictions() > before
+    assert rl.stats(300.2)["keys"] == 16
+    rl.close()
+
+
+def test_shared_settings_change_resets_table(tmp_path):
+    path = str(tmp_path / "rl.bin")
+    a = SharedBuckets(path, rps=1.0, burst=1, slots=16)
+    assert a.allow("c", 10.0) and not a.allow("c", 10.0)
+    a.close()
+    b = SharedBuckets(path, rps=1.0, burst=2, slots=16)
+    assert b.stats(10.0)["keys"] == 0
+    b.close()
+
+
+def test_client_key_modes():
+    h = {"authorization": "Bearer sk-secret", "x-user": "alice"}
+    assert client_key("ip", "1.2.3.4", h) == "ip:1.2.3.4"
+    k = client_key("api_key", "1.2.3.4", h)
+    assert k.startswith("key:") and "sk-secret" not in k
+    assert client_key("api_key", "1.2.3.4", {"x-api-key": "sk-secret"}) == k
+    assert client_key("user", "1.2.3.4", h) == "user:alice"
+    assert client_key("user", "1.2.3.4", {}) == "ip:1.2.3.4"
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    assert ratelimit.from_env() is None
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.delenv("RATE_LIMIT_BACKEND", raising=False)
+    monkeypatch.delenv("RATE_LIMIT_SHM", raising=False)
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    assert isinstance(ratelimit.from_env(), LocalBuckets)  # single worker
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("RATE_LIMIT_SHM", str(tmp_path / "rl.bin"))
+    rl = ratelimit.from_env()
+    assert isinstance(rl, SharedBuckets) and os.path.exists(rl.path)
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "local")
+    assert isinstance(ratelimit.from_env(), LocalBuckets)
+    monkeypatch.setenv("RATE_LIMIT_KEY", "API-Key")
+    assert ratelimit.key_mode() == "api_key"
+
+
+def test_app_429_carries_retry_after(monkeypatch, tmp_path):
+    try:
+        from fastapi.testclient import TestClient
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_RPS", "0.5")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "2")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "shared")
+    monkeypatch.setenv("RATE_LIMIT_SHM", str(tmp_path / "rl.bin"))
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    # settings are read once at startup
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    client = TestClient(app)
+    codes = [client.get("/healthz") for _ in range(3)]
+    assert [r.status_code for r in codes] == [200, 200, 429]
+    assert int(codes[-1].headers["Retry-After"]) >= 1
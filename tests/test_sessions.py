@@ -0,0 +1,219 @@
+import os
+
+import pytest
+
+from llm_server.generation import build_llama_cli_args
+from llm_server.sessions import SessionError, SessionStore
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def _store(tmp_path, **kw):
+    clock = FakeClock()
+    return SessionStore(str(tmp_path / "sessions"), clock=clock, **kw), clock
+
+
+def _kv(store, sid, size):
+    with open(store.kv_path(sid), "wb") as f:
+        f.write(b"\0" * size)
+
+
+def test_turns_append_history_and_prefix_is_stable(tmp_path):
+    store, clock = _store(tmp_path)
+    sid = store.create("m")["id"]
+    rec = store.begin(sid, "m")
+    p1 = store.prompt(rec, ["hello"])
+    assert p1 == "hello"
+    with pytest.raises(SessionError) as ei:
+        store.begin(sid, "m")
+    assert ei.value.status == 409
+    store.finish(rec, p1, " hi there", kv_saved=True)
+    rec = store.begin(sid, "m")
+    p2 = store.prompt(rec, ["next", "more"])
+    # the saved state holds prompt + generated reply: turn N+1 extends it exactly
+    assert p2.startswith(p1 + " hi there") and p2 == "hello hi there\nnext\nmore"
+    store.finish(rec, p2, None)  # failed turn leaves the history alone
+    assert store.describe(store.get(sid))["turns"] == 1
+    rec = store.begin(sid, "m")
+    p3 = store.prompt(rec, ["again"])
+    store.finish(rec, p3, "!")
+    rec4 = store.begin(sid, "m")
+    assert store.prompt(rec4, ["x"]).startswith(p3 + "!")
+    store.finish(rec, p3, "late")  # a finished turn cannot release a newer one
+    with pytest.raises(SessionError):
+        store.begin(sid, "m")
+    store.finish(rec4, None)
+    with pytest.raises(SessionError) as ei:
+        store.begin(sid, "other-model")
+    assert ei.value.status == 400
+    # a fresh store finds the session on disk
+    again = SessionStore(store.root, clock=clock)
+    assert "".join(again.get(sid)["parts"]) == "hello hi there\nagain!"
+    assert store.delete(sid) and not os.path.exists(os.path.join(store.root, sid))
+    with pytest.raises(SessionError):
+        store.get(sid)
+    with pytest.raises(SessionError):
+        store.get("../etc")
+
+
+def test_ttl_and_max_sessions(tmp_path):
+    store, clock = _store(tmp_path, ttl_s=60, max_sessions=2)
+    a = store.create("m")["id"]
+    clock.t += 10
+    b = store.create("m")["id"]
+    rec = store.begin(a, "m")
+    c = store.create("m")["id"]  # a is busy, so b (idle LRU) goes
+    store.finish(rec, None)
+    assert {s["id"] for s in store.list()} == {a, c}
+    clock.t += 61
+    assert store.sweep()["expired"] == 2
+    assert store.list() == [] and b not in os.listdir(store.root)
+
+
+def test_kv_quota_and_ssd_shrink(tmp_path):
+    store, clock = _store(tmp_path)
+    policy = {"sessions": {"max_session_gb": 1, "max_total_gb": 250 / 1024 ** 3}}
+    store.apply_policy(policy)
+    assert store.kv_allowed(10) and not store.kv_allowed(2 * 1024 ** 3)
+    ids = []
+    for i in range(3):
+        sid = store.create("m")["id"]
+        rec = store.begin(sid, "m")
+        _kv(store, sid, 100)
+        clock.t += 1
+        store.finish(rec, "q", "a", kv_saved=True)
+        ids.append(sid)
+    # 300 bytes over a 250 budget: the oldest KV file is dropped, history stays
+    assert [store.describe(store.get(s))["kv_bytes"] for s in ids] == [0, 100, 100]
+    assert store.get(ids[0])["parts"] == ["q", "a"]
+    store.apply_policy(policy, ssd_beacon="hot")  # budget 125
+    assert store.stats()["kv_bytes"] == 100
+    store.apply_policy(policy, ssd_beacon="critical")
+    assert store.stats()["kv_bytes"] == 0 and not store.kv_allowed(1)
+    # a turn that ran without the cache drops its stale state
+    store.apply_policy(policy)
+    rec = store.begin(ids[2], "m")
+    _kv(store, ids[2], 10)
+    store.finish(rec, store.prompt(rec, ["q2"]), "a2", kv_saved=False)
+    assert store.describe(store.get(ids[2]))["kv_bytes"] == 0
+
+
+def test_prompt_cache_args():
+    args = build_llama_cli_args("m.gguf", "p", {"prompt_cache": "/tmp/s/kv.bin"})
+    i = args.index("--prompt-cache")
+    assert args[i + 1] == "/tmp/s/kv.bin" and "--prompt-cache-all" in args and "--no-display-prompt" in args
+    assert "--prompt-cache" not in build_llama_cli_args("m.gguf", "p", {})
+
+
+def test_api_session_turns(monkeypatch, tmp_path):
+    try:
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    monkeypatch.setenv("SESSIONS_DIR", str(tmp_path / "sessions"))
+    seen = []
+
+    def fake_gen(registry, model, prompt, overrides=None, **kw):
+        seen.append((prompt, dict(overrides or {})))
+        return {"output": f"reply{len(seen)}"}
+
+    monkeypatch.setattr(api, "generate_with_llama_cli", fake_gen)
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    client = TestClient(app)
+    sess = client.post("/v1/sessions", json={"model": "m"}).json()
+    sid = sess["id"]
+    body = {"model": "m", "session_id": sid, "messages": [{"role": "user", "content": "first"}]}
+    r = client.post("/v1/chat/completions", json=body)
+    assert r.status_code == 200 and r.json()["session_id"] == sid
+    assert seen[-1][0] == "first"
+    assert seen[-1][1]["prompt_cache"].endswith(os.path.join(sid, "kv.bin"))
+    body["messages"] = [{"role": "user", "content": "second"}]
+    client.post("/v1/chat/completions", json=body)
+    assert seen[-1][0] == "first" + "reply1" + "\nsecond"
+    info = client.get(f"/v1/sessions/{sid}").json()
+    assert info["turns"] == 2
+    assert client.get("/v1/sessions").json()["data"][0]["id"] == sid
+    assert client.post("/v1/chat/completions", json=dict(body, model="x")).json()["error"]["code"] == 400
+    assert client.delete(f"/v1/sessions/{sid}").json()["deleted"] is True
+    r = client.post("/v1/chat/completions", json=body)
+    assert r.status_code == 404 and r.json()["error"]["code"] == 404
+
+
+def test_api_unstarted_stream_releases_session(monkeypatch, tmp_path):
+    try:
+        import asyncio
+
+        from starlette.requests import Request
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    monkeypatch.setenv("SESSIONS_DIR", str(tmp_path / "sessions"))
+    monkeypatch.setattr(api, "generate_with_llama_cli", lambda *a, **k: {"output": "never"})
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    sid = api.sessions.create("m")["id"]
+    scope = {"type": "http", "app": app, "method": "POST", "path": "/v1/chat/completions", "headers": [], "query_string": b"", "client": ("10.0.0.1", 1)}
+    body = api.ChatRequest(model="m", session_id=sid, stream=True, messages=[{"role": "user", "content": "hi"}])
+    resp = api.chat_completions(body, Request(scope), x_tenant_id=None)
+    with pytest.raises(SessionError):
+        api.sessions.begin(sid, "m")  # turn in progress
+    # the client disconnected before the first chunk; the body is never iterated
+    asyncio.run(resp.background())
+    rec = api.sessions.begin(sid, "m")
+    assert rec["parts"] == []
+    api.sessions.finish(rec, None)
+
+
+def test_api_session_over_context_window_asks_for_new_session(monkeypatch, tmp_path):
+    try:
+        from pathlib import Path
+
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+
+    class _Spec:
+        name = "m"
+        path = Path(__file__)
+        context_max = 64  # ~240 chars of prompt
+
+    class _Registry:
+        cfg = {"gen_defaults": {}}
+
+        def get(self, name):
+            return _Spec() if name == "m" else None
+
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    monkeypatch.setenv("SESSIONS_DIR", str(tmp_path / "sessions"))
+    monkeypatch.setattr(api, "generate_with_llama_cli", lambda *a, **k: {"text": "y" * 150})
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    app.state.registry = _Registry()
+    client = TestClient(app)
+    sid = client.post("/v1/sessions", json={"model": "m"}).json()["id"]
+    body = {"model": "m", "session_id": sid, "messages": [{"role": "user", "content": "x" * 40}]}
+    assert client.post("/v1/chat/completions", json=body).status_code == 200
+    r = client.post("/v1/chat/completions", json=body)
+    assert r.status_code == 400 and "start a new session" in r.json()["error"]["message"]
+    # the turn was released and the history kept; a new session works again
+    assert client.get(f"/v1/sessions/{sid}").json()["turns"] == 1
+    assert client.post("/v1/chat/completions", json=body).status_code == 400
+    fresh = client.post("/v1/sessions", json={"model": "m"}).json()["id"]
+    assert client.post("/v1/chat/completions", json=dict(body, session_id=fresh)).status_code == 200
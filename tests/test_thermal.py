@@ -0,0 +1,66 @@
+import os
+
+
+def _sysfs(tmp_path, zone_c=None, hwmon_c=None):
+    if zone_c is not None:
+        z = tmp_path / "sys" / "class" / "thermal" / "thermal_zone0"
+        z.mkdir(parents=True, exist_ok=True)
+        (z / "type").write_text("x86_pkg_temp\n")
+        (z / "temp").write_text(f"{int(zone_c * 1000)}\n")
+    if hwmon_c is not None:
+        h = tmp_path / "sys" / "class" / "hwmon" / "hwmon1"
+        h.mkdir(parents=True, exist_ok=True)
+        (h / "name").write_text("nvme\n")
+        (h / "temp1_input").write_text(f"{int(hwmon_c * 1000)}\n")
+        (h / "temp1_label").write_text("Composite\n")
+    return str(tmp_path)
+
+
+def test_read_temps_from_injected_sysfs(tmp_path):
+    from llm_server.thermal import cpu_temp, read_temps
+
+    root = _sysfs(tmp_path, zone_c=71.5, hwmon_c=80.0)
+    temps = read_temps(root)
+    assert temps == {"zone0:x86_pkg_temp": 71.5, "nvme:Composite": 80.0}
+    # CPU sensor preferred over a hotter NVMe sensor
+    assert cpu_temp(temps) == 71.5
+    assert read_temps(str(tmp_path / "missing")) == {}
+
+
+def test_governor_ramps_smoothly_and_recovers(tmp_path):
+    from llm_server.thermal import ThermalGovernor
+
+    t = [0.0]
+    cfg = {"target_c": 85, "ramp_full_seconds": 4, "band_c": 10, "min_factor": 0.25}
+    root = _sysfs(tmp_path, zone_c=90)
+    g = ThermalGovernor(root=root, clock=lambda: t[0])
+    assert g.update(cfg) == 1.0 and g.target_factor == 0.25  # first sample: no jump
+    t[0] = 1.0
+    assert abs(g.update(cfg) - 0.75) < 1e-9  # 1/4 per second
+    t[0] = 10.0
+    assert g.update(cfg) == 0.25
+    # halfway into the band → target 0.625, ramp back up gradually
+    _sysfs(tmp_path, zone_c=80)
+    t[0] = 11.0
+    assert abs(g.update(cfg) - 0.5) < 1e-9
+    t[0] = 20.0
+    assert abs(g.update(cfg) - 0.625) < 1e-9
+    assert g.snapshot()["temp_c"] == 80.0
+
+
+def test_decode_threads_follow_factor(monkeypatch):
+    import llm_server.thermal as thermal
+
+    monkeypatch.setattr(thermal.governor, "factor", 1.0)
+    monkeypatch.delenv("LLAMA_THREADS", raising=False)
+    monkeypatch.setattr(thermal, "_cpu_capped", lambda: False)
+    assert thermal.decode_threads() is None  # llama.cpp default
+    monkeypatch.setenv("LLAMA_THREADS", "8")
+    assert thermal.decode_threads() == 8
+    monkeypatch.setattr(thermal.governor, "factor", 0.5)
+    assert thermal.decode_threads() == 4
+    from llm_server.generation import build_llama_cli_args
+    from pathlib import Path
+
+    args = build_llama_cli_args(Path("m.gguf"), "hi", {"threads": 4})
+    assert args[args.index("-t") + 1] == "4"
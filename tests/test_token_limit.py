@@ -0,0 +1,202 @@
+import threading
+
+import pytest
+
+from llm_server import ratelimit
+from llm_server.ratelimit import LocalBuckets, TokenLimiter, TokenLimitExceeded
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.t = 1000.0
+        self.slept = []
+
+    def __call__(self) -> float:
+        return self.t
+
+    def sleep(self, s: float) -> None:
+        self.slept.append(s)
+        self.t += s
+
+
+def _limiter(clock, **kw):
+    tpm = kw.pop("tpm", 600.0)
+    return TokenLimiter(tpm, engine=LocalBuckets(tpm / 60.0, int(kw.get("burst") or tpm)), clock=clock, sleep=clock.sleep, **kw)
+
+
+def test_prompt_charged_then_completion_reconciled():
+    clock = FakeClock()
+    tl = _limiter(clock)  # 600 tokens/min = 10/s, burst 600
+    lease = tl.admit("c", 400)
+    assert lease.headers["x-ratelimit-remaining-tokens"] == "200"
+    tl.settle(lease, 300)  # completion may overdraw the budget
+    assert lease.headers["x-ratelimit-remaining-tokens"] == "0"
+    with pytest.raises(TokenLimitExceeded) as ei:
+        tl.admit("c", 50)
+    # balance is -100: 150 tokens at 10/s
+    assert ei.value.reason == "tokens" and ei.value.retry_after_s == pytest.approx(15.0)
+    assert ei.value.headers["x-ratelimit-limit-tokens"] == "600"
+    clock.t += 15.0
+    tl.settle(tl.admit("c", 50), 0)
+
+
+def test_refund_when_generation_did_not_run():
+    clock = FakeClock()
+    tl = _limiter(clock)
+    lease = tl.admit("c", 500)
+    tl.settle(lease, 0, refund_prompt=True)
+    assert lease.headers["x-ratelimit-remaining-tokens"] == "600"
+
+
+def test_queue_for_budget_within_max_wait():
+    clock = FakeClock()
+    tl = _limiter(clock, max_wait_s=10.0)
+    tl.settle(tl.admit("c", 580), 0)
+    lease = tl.admit("c", 60)  # needs 40 more tokens: 4 s
+    assert clock.slept == [pytest.approx(4.0)]
+    tl.settle(lease, 0)
+    with pytest.raises(TokenLimitExceeded):
+        tl.admit("c", 600 + 1)  # never fits
+
+
+def test_prompt_larger_than_budget_rejected():
+    clock = FakeClock()
+    tl = _limiter(clock)
+    with pytest.raises(TokenLimitExceeded) as ei:
+        tl.admit("c", 10_000)
+    assert ei.value.reason == "prompt_too_large" and ei.value.retry_after_s == 0
+
+
+def test_concurrent_generation_cap(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    clock = FakeClock()
+    tl = _limiter(clock, tpm=0, max_concurrent=2)
+    a, b = tl.admit("c", 10), tl.admit("c", 10)
+    assert b.headers["x-ratelimit-remaining-concurrent"] == "0"
+    with pytest.raises(TokenLimitExceeded) as ei:
+        tl.admit("c", 10)
+    assert ei.value.reason == "concurrency"
+    tl.admit("other", 10)  # per client
+    tl.settle(a, 5)
+    tl.settle(a, 5)  # idempotent
+    c = tl.admit("c", 10)
+    tl.settle(b, 0)
+    tl.settle(c, 0)
+    assert tl._inflight == {"other": 1}
+
+
+def test_concurrency_waits_for_release(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    tl = TokenLimiter(0, max_concurrent=1, max_wait_s=5.0)
+    lease = tl.admit("c", 1)
+    got = []
+    th = threading.Thread(target=lambda: got.append(tl.admit("c", 1)))
+    th.start()
+    tl.settle(lease, 0)
+    th.join(5)
+    assert len(got) == 1
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.delenv("RATE_LIMIT_TPM", raising=False)
+    monkeypatch.delenv("RATE_LIMIT_CONCURRENT", raising=False)
+    assert ratelimit.token_limiter_from_env() is None
+    monkeypatch.setenv("RATE_LIMIT_TPM", "6000")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "local")
+    tl = ratelimit.token_limiter_from_env()
+    assert tl.tpm == 6000 and tl.burst == 6000 and tl.rate == 100.0
+
+
+def test_api_headers_and_429(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_RPS", "1000")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "1000")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "local")
+    monkeypatch.setenv("RATE_LIMIT_TPM", "600")
+    monkeypatch.setenv("RATE_LIMIT_KEY", "user")
+    monkeypatch.setattr(api, "generate_with_llama_cli", lambda *a, **k: {"output": "ok", "timings": {"completion_tokens": 500}})
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    client = TestClient(app)
+    body = {"model": "m", "messages": [{"role": "user", "content": "x" * 400}], "user": "alice"}
+    r = client.post("/v1/chat/completions", json=body)
+    assert r.status_code == 200
+    assert r.headers["x-ratelimit-limit-tokens"] == "600"
+    assert int(r.headers["x-ratelimit-remaining-tokens"]) < 100
+    assert r.headers["x-ratelimit-limit-requests"] == "1000"
+    r = client.post("/v1/chat/completions", json=body)
+    assert r.status_code == 429 and int(r.headers["retry-after"]) >= 1
+    assert r.json()["error"]["code"] == 429
+    # another user has their own budget
+    r = client.post("/v1/chat/completions", json=dict(body, user="bob"))
+    assert r.status_code == 200
+
+
+def test_api_prompt_too_large_is_413_without_retry_after(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "1")
+    monkeypatch.setenv("RATE_LIMIT_RPS", "1000")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "1000")
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "local")
+    monkeypatch.setenv("RATE_LIMIT_TPM", "600")
+    monkeypatch.setattr(api, "generate_with_llama_cli", lambda *a, **k: {"output": "ok"})
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    client = TestClient(app)
+    r = client.post("/v1/completions", json={"model": "m", "prompt": "x" * 8000})
+    assert r.status_code == 413 and "retry-after" not in r.headers
+    assert r.json()["error"]["code"] == 413
+
+
+def test_unstarted_stream_releases_lease(monkeypatch):
+    try:
+        import asyncio
+        import gc
+
+        import llm_server.api as api
+    except Exception:
+        return
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    tl = TokenLimiter(600, max_concurrent=1, engine=LocalBuckets(10.0, 600))
+    settled = []
+
+    def release(res):
+        settled.append(res)
+        tl.settle(lease, 0, refund_prompt="output" not in res)
+
+    # client gone before the first chunk: the body is never iterated
+    lease = tl.admit("c", 100)
+    guard = api._StreamGuard(release)
+    resp = api._sse_response(iter(()), guard)
+    asyncio.run(resp.background())
+    assert tl._inflight == {} and settled == [{}]
+    assert lease.headers["x-ratelimit-remaining-tokens"] == "600"  # prompt refunded
+
+    # sending aborted before the background task: the response finalizer releases
+    lease = tl.admit("c", 100)
+    resp = api._sse_response(iter(()), api._StreamGuard(release))
+    del resp
+    gc.collect()
+    assert tl._inflight == {} and len(settled) == 2
+
+    # a started body releases itself; abandon afterwards is a no-op
+    lease = tl.admit("c", 100)
+    guard = api._StreamGuard(release)
+    assert guard.start()
+    release({"output": "x"})
+    guard.abandon()
+    assert len(settled) == 3 and tl._inflight == {}
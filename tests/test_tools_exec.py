@@ -0,0 +1,126 @@
+import json
+import time
+
+from llm_server import openmetrics
+from llm_server.metrics import metrics
+from llm_server.tools_exec import ToolExecutor, default_handlers, render_result, results_prompt
+
+
+def _call(cid, name, **args):
+    return {"id": cid, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+
+
+def test_runs_calls_in_parallel_in_order():
+    def slow(args):
+        time.sleep(0.3)
+        return {"echo": args["x"]}
+
+    ex = ToolExecutor({"a": slow, "b": slow, "c": slow})
+    t0 = time.perf_counter()
+    out = ex.run([_call("1", "a", x=1), _call("2", "b", x=2), _call("3", "c", x=3)])
+    elapsed = time.perf_counter() - t0
+    assert elapsed < 0.8  # concurrent, not 0.9 s sequential
+    assert [r["tool_call_id"] for r in out] == ["1", "2", "3"]
+    assert all(r["ok"] for r in out)
+    assert json.loads(out[1]["content"]) == {"echo": 2}
+    assert out[0]["latency_ms"] >= 290
+
+
+def test_timeout_error_and_unknown_tool():
+    def hang(args):
+        time.sleep(1.0)
+
+    def boom(args):
+        raise RuntimeError("backend down")
+
+    ex = ToolExecutor({"hang": hang, "boom": boom}, timeouts_s={"hang": 0.1})
+    out = ex.run([_call("1", "hang"), _call("2", "boom"), _call("3", "nope"), {"id": "4", "function": {"name": "boom", "arguments": "{bad"}}])
+    assert not any(r["ok"] for r in out)
+    assert "timed out" in out[0]["content"] and out[0]["latency_ms"] < 800
+    assert "backend down" in out[1]["content"]
+    assert "unknown tool" in out[2]["content"]
+    assert out[3]["content"].startswith("error:")
+    snap = metrics.snapshot()
+    assert snap.get("tool_errors_total:hang", 0) >= 1
+    assert snap.get("tool_calls_total:boom", 0) >= 2
+    assert snap.get("tool_errors_total:unknown", 0) >= 1 and "tool_calls_total:nope" not in snap
+
+
+def test_unknown_tool_names_share_one_metric_label():
+    before = metrics.snapshot()
+    ToolExecutor({"a": lambda args: 1}).run([_call(str(i), f"x{i}") for i in range(3)] + [_call("4", "")])
+    snap = metrics.snapshot()
+    assert snap["tool_calls_total:unknown"] == before.get("tool_calls_total:unknown", 0) + 4
+    assert not any(k.split(":", 1)[-1] in ("x0", "x1", "x2") for k in snap)
+    text = openmetrics.registry.render()
+    assert 'tool="unknown"' in text and 'tool="x0"' not in text
+
+
+def test_config_timeouts_and_rendering():
+    ex = ToolExecutor.from_config({"limits": {"tools": {"timeouts_s": {"default": 3, "vision.analyze": 90}, "max_result_chars": 120}}}, {})
+    assert ex.timeout_for("vision.analyze") == 90 and ex.timeout_for("x") == 3
+    assert ex.timeout_for("memory.search") == 5  # built-in default
+    assert len(render_result("t", {"s": "x" * 1000}, 120)) == 120
+    emb = render_result("embeddings.generate", {"data": [{"embedding": [0.1] * 8}] * 2})
+    assert json.loads(emb) == {"vectors": 2, "dimensions": 8}
+    assert results_prompt([{"name": "t", "tool_call_id": "1", "content": "{}"}]).startswith("Tool results:")
+
+
+def test_default_handlers():
+    class Mem:
+        def search(self, q, k=5, filters=None):
+            return [{"id": "m1", "score": 1.0, "text": q}]
+
+    ex = ToolExecutor(default_handlers(Mem()))
+    out = ex.run([
+        _call("1", "memory.search", query="foo"),
+        _call("2", "research.search", query="bar", top_k=2),
+        _call("3", "embeddings.generate", input=["a", "b"], dimensions=32),
+    ])
+    assert all(r["ok"] for r in out), out
+    assert json.loads(out[0]["content"])["results"][0]["text"] == "foo"
+    assert len(json.loads(out[1]["content"])["results"]) == 2
+    assert json.loads(out[2]["content"]) == {"vectors": 2, "dimensions": 32}
+
+
+def test_chat_closed_loop_runs_assistant_tool_calls(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv("RATE_LIMIT_ENABLED", "0")
+    seen = {}
+
+    def fake_gen(registry, model, prompt, **kw):
+        seen["prompt"] = prompt
+        return {"output": "final answer"}
+
+    monkeypatch.setattr(api, "generate_with_llama_cli", fake_gen)
+    app = create_app()
+    if not hasattr(app, "state"):
+        return
+    client = TestClient(app)
+    body = {
+        "model": "m",
+        "server_tools_execute": True,
+        "messages": [
+            {"role": "user", "content": "look things up"},
+            {"role": "assistant", "content": None, "tool_calls": [
+                _call("c1", "research.search", query="alpha", top_k=1),
+                _call("c2", "embeddings.generate", input="beta"),
+            ]},
+        ],
+    }
+    r = client.post("/v1/chat/completions", json=body)
+    assert r.status_code == 200
+    assert r.json()["choices"][0]["message"]["content"] == "final answer"
+    assert "[research.search c1]" in seen["prompt"] and "[embeddings.generate c2]" in seen["prompt"]
+    assert "alpha" in seen["prompt"]
+
+    # answered calls are not executed again
+    body["messages"].append({"role": "tool", "tool_call_id": "c1", "content": "done"})
+    body["messages"].append({"role": "tool", "tool_call_id": "c2", "content": "done"})
+    client.post("/v1/chat/completions", json=body)
+    assert "Tool results:" not in seen["prompt"] and "[tool c1] done" in seen["prompt"]
@@ -0,0 +1,68 @@
+def test_trace_spans_server_timing_and_admin_query(monkeypatch):
+    try:
+        from fastapi.testclient import TestClient
+        import llm_server.api as api
+        from llm_server.app import create_app
+    except Exception:
+        return
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', '1')
+    monkeypatch.setenv('RATE_LIMIT_RPS', '1000')
+    monkeypatch.setenv('RATE_LIMIT_BURST', '1000')
+
+    def fake_gen(*args, **kwargs):
+        from llm_server import tracing
+        with tracing.span("backend"):
+            pass
+        return {"output": "traced"}
+
+    monkeypatch.setattr(api, "generate_with_llama_cli", fake_gen)
+    app = create_app()
+    if not hasattr(app, 'state'):
+        return
+    client = TestClient(app)
+    req = {"model": "phi-4-mini-instruct", "messages": [{"role": "user", "content": "hi"}]}
+    r = client.post('/v1/chat/completions', json=req, headers={'X-Request-Id': 'abc123def4567890'})
+    assert r.status_code == 200
+    st = r.headers.get('server-timing', '')
+    for name in ('rate_limit;dur=', 'prompt_build;dur=', 'backend;dur=', 'serialize;dur=', 'total;dur='):
+        assert name in st
+
+    t = client.get('/admin/traces/abc123def4567890')
+    assert t.status_code == 200
+    spans = t.json()['resourceSpans'][0]['scopeSpans'][0]['spans']
+    names = {s['name'] for s in spans}
+    assert {'http', 'rate_limit', 'prompt_build', 'backend', 'serialize'} <= names
+    root = next(s for s in spans if s['name'] == 'http')
+    assert all(s['traceId'] == '0000000000000000abc123def4567890' for s in spans)
+    assert all(s.get('parentSpanId') == root['spanId'] for s in spans if s['name'] != 'http')
+    assert 'abc123def4567890' in client.get('/admin/traces').json()['request_ids']
+    assert client.get('/admin/traces/nope').status_code == 404
+
+
+def test_trace_file_export_is_written_off_thread(monkeypatch, tmp_path):
+    import json
+    import threading
+
+    from llm_server import tracing
+
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("TRACE_FILE", str(path))
+    writers = []
+    orig = tracing._OtlpFormatter.format
+
+    def spy(self, record):
+        writers.append(threading.current_thread().name)
+        return orig(self, record)
+
+    monkeypatch.setattr(tracing._OtlpFormatter, "format", spy)
+    for rid in ("export-1", "export-2"):
+        tr = tracing.start_trace(rid)
+        with tracing.span("work"):
+            pass
+        tracing.finish_trace(tr, status=200)
+    tracing.flush_exports()
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    spans = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert {s["name"] for s in spans} == {"http", "work"}
+    assert writers and threading.current_thread().name not in writers
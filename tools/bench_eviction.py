@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Benchmark SSD eviction planning: full walk per tick vs `EvictionIndex`.
+
+Creates `--files` empty-ish files spread over `--dirs` directories in a
+temporary tree (or reuses `--root`), then measures:
+
+- the previous planner (os.walk + stat + sort of everything, every tick),
+- the index initial build,
+- an idle refresh (directory stats only),
+- a refresh after touching `--churn` directories,
+- planning the oldest `--target-mb` worth of files.
+
+Usage:
+    python3 tools/bench_eviction.py [--files 1000000] [--dirs 1000] [--keep]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Ensure repository root is on sys.path when running from tools/
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def build_tree(root: str, files: int, dirs: int, size: int) -> None:
+    rnd = random.Random(0)
+    base = time.time() - 86400
+    payload = b"x" * size
+    per_dir = max(1, files // dirs)
+    n = 0
+    for d in range(dirs):
+        dp = os.path.join(root, f"shard{d // 100:03d}", f"d{d:05d}")
+        os.makedirs(dp, exist_ok=True)
+        for i in range(per_dir if d < dirs - 1 else files - n):
+            fp = os.path.join(dp, f"f{i:06d}.bin")
+            with open(fp, "wb") as fh:
+                fh.write(payload)
+            t = base + rnd.random() * 86400
+            os.utime(fp, (t, t))
+            n += 1
+
+
+def legacy_plan(root: str, target_bytes: int):
+    """The planner the housekeeper used before `EvictionIndex` (baseline)."""
+    files = []
+    for dp, dirs, names in os.walk(root, topdown=True):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for fn in names:
+            try:
+                st = os.stat(os.path.join(dp, fn))
+                files.append((os.path.join(dp, fn), st.st_size, st.st_mtime))
+            except OSError:
+                continue
+    files.sort(key=lambda x: x[2])
+    chosen, total = [], 0
+    for fp, sz, _ in files:
+        chosen.append(fp)
+        total += sz
+        if total >= target_bytes:
+            break
+    return chosen, total
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--files", type=int, default=1_000_000)
+    ap.add_argument("--dirs", type=int, default=1000)
+    ap.add_argument("--size", type=int, default=16, help="bytes per file")
+    ap.add_argument("--target-mb", type=float, default=0.0625, help="megabytes to plan for (4096 files at 16 B)")
+    ap.add_argument("--churn", type=int, default=10, help="directories modified before the incremental refresh")
+    ap.add_argument("--root", default="", help="existing tree to reuse (skips creation)")
+    ap.add_argument("--keep", action="store_true", help="keep the generated tree")
+    ap.add_argument("--mem", action="store_true", help="measure index memory with tracemalloc (slower)")
+    args = ap.parse_args()
+
+    from llm_server.evict_index import EvictionIndex
+
+    root = args.root or tempfile.mkdtemp(prefix="bench-evict-")
+    try:
+        if not args.root:
+            dt, _ = timed(lambda: build_tree(root, args.files, args.dirs, args.size))
+            print(f"created {args.files} files in {args.dirs} dirs: {dt:.1f}s")
+        target = int(args.target_mb * 1024 * 1024)
+
+        dt, (chosen, _) = timed(lambda: legacy_plan(root, target))
+        print(f"legacy walk+sort plan        : {dt * 1000:10.1f} ms  ({len(chosen)} files)")
+
+        if args.mem:
+            tracemalloc.start()
+        idx = EvictionIndex([root])
+        dt, _ = timed(lambda: idx.refresh(float("inf")))
+        mem = ""
+        if args.mem:
+            cur, _peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            mem = f", {cur / max(1, idx.file_count):.0f} B/file"
+        print(f"index initial build          : {dt * 1000:10.1f} ms  ({idx.file_count} files{mem})")
+
+        dt, _ = timed(lambda: idx.refresh(float("inf")))
+        print(f"index idle refresh           : {dt * 1000:10.1f} ms  ({idx.stats()['dirs']} dirs stat'ed)")
+
+        dirs = sorted(str(p) for p in Path(root).glob("shard*/d*"))
+        for dp in random.Random(1).sample(dirs, min(args.churn, len(dirs))):
+            with open(os.path.join(dp, "new.bin"), "wb") as fh:
+                fh.write(b"y" * args.size)
+        dt, _ = timed(lambda: idx.refresh(float("inf")))
+        print(f"index refresh ({args.churn:>4d} changed) : {dt * 1000:10.1f} ms")
+
+        dt, (paths, _) = timed(lambda: idx.plan(target))
+        print(f"index plan                   : {dt * 1000:10.1f} ms  ({len(paths)} files)")
+    finally:
+        if not args.root and not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+        elif not args.root:
+            print(f"tree kept at {root}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
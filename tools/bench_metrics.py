@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for the embedded metrics.
+
+Measures the cost of a single `observe_duration` call and of a full
+`snapshot()` scrape as the number of duration keys (route cardinality) grows.
+
+Usage:
+    python3 tools/bench_metrics.py [--obs 200000] [--keys 1,10,100,1000]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Ensure repository root is on sys.path when running from tools/
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def bench_observe(n: int) -> float:
+    from llm_server.metrics import Metrics
+    m = Metrics()
+    rnd = random.Random(0)
+    values = [rnd.lognormvariate(3.0, 1.0) for _ in range(4096)]
+    t0 = time.perf_counter()
+    for i in range(n):
+        m.observe_duration("http_request", values[i & 4095])
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+def bench_snapshot(keys: int, per_key: int, rounds: int) -> float:
+    from llm_server.metrics import Metrics
+    m = Metrics()
+    rnd = random.Random(1)
+    for k in range(keys):
+        name = f"http_request:GET /r{k}"
+        for _ in range(per_key):
+            m.observe_duration(name, rnd.lognormvariate(3.0, 1.0))
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        m.snapshot()
+    return (time.perf_counter() - t0) / rounds * 1e6
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--obs", type=int, default=200_000, help="observations for the insert benchmark")
+    ap.add_argument("--keys", default="1,10,100,1000", help="comma-separated key counts for the scrape benchmark")
+    ap.add_argument("--per-key", type=int, default=2000, help="observations recorded per key before scraping")
+    ap.add_argument("--rounds", type=int, default=20, help="snapshot calls per key count")
+    args = ap.parse_args()
+
+    print(f"observe_duration: {bench_observe(args.obs):8.0f} ns/op  ({args.obs} ops)")
+    for k in [int(x) for x in args.keys.split(",") if x.strip()]:
+        us = bench_snapshot(k, args.per_key, args.rounds)
+        print(f"snapshot keys={k:<5d}: {us:10.0f} us/scrape  ({us / max(1, k):6.1f} us/key)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark the metrics work done by the request middleware per request.
+
+Runs the same per-request recording (`app._record_request`: request and
+error counters, overall/route durations, labeled series) from N concurrent
+client threads against the single-lock `Metrics` and the per-thread
+`ShardedMetrics` backends.
+
+Usage:
+    python3 tools/bench_middleware.py [--clients 1,8,64] [--requests 200000]
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Ensure repository root is on sys.path when running from tools/
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def run(backend_name: str, clients: int, total: int) -> float:
+    from llm_server.app import _record_request
+    from llm_server.metrics import make_metrics
+
+    m = make_metrics(backend_name)
+    per_client = max(1, total // clients)
+    routes = ["/v1/chat/completions", "/v1/completions", "/healthz", "/v1/embeddings"]
+    barrier = threading.Barrier(clients + 1)
+
+    def client(idx: int) -> None:
+        route = routes[idx % len(routes)]
+        barrier.wait()
+        for i in range(per_client):
+            status = 500 if i % 50 == 0 else 200
+            _record_request(m, "POST", route, status, 3.0 + (i % 100), "rid")
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    # include one scrape so the sharded aggregation cost is visible
+    s0 = time.perf_counter()
+    m.snapshot()
+    scrape_ms = (time.perf_counter() - s0) * 1000.0
+    ns = elapsed / (per_client * clients) * 1e9
+    print(f"{backend_name:<8s} clients={clients:<3d} {ns:8.0f} ns/request  {per_client * clients / elapsed:10.0f} req/s  scrape={scrape_ms:6.2f} ms")
+    return ns
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--clients", default="1,8,64", help="comma-separated concurrent client counts")
+    ap.add_argument("--requests", type=int, default=200_000, help="total requests per run")
+    args = ap.parse_args()
+    for c in [int(x) for x in args.clients.split(",") if x.strip()]:
+        locked = run("locked", c, args.requests)
+        sharded = run("sharded", c, args.requests)
+        print(f"  speedup x{locked / sharded:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Benchmark the per-request cost of the rate-limit engines.
+
+Compares the previous per-process dict limiter (unbounded, one lock) with
+`ratelimit.LocalBuckets` (bounded, idle-collected) and
+`ratelimit.SharedBuckets` (mmap table + flock, shared across workers), from
+N concurrent client threads over a pool of distinct client keys.
+
+Usage:
+    python3 tools/bench_ratelimit.py [--clients 1,8] [--requests 200000] [--keys 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Ensure repository root is on sys.path when running from tools/
+ROOT = str(Path(__file__).resolve().parents[1])
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+class LegacyLimiter:
+    """The limiter `app.py` used before `ratelimit` (baseline)."""
+
+    def __init__(self, rps: float, burst: int) -> None:
+        self.rps = rps
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def allow(self, key: str, now: float) -> bool:
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + max(0.0, now - last) * self.rps)
+            if tokens < 1.0:
+                self._buckets[key] = (tokens, now)
+                return False
+            self._buckets[key] = (tokens - 1.0, now)
+            return True
+
+
+def run(name: str, limiter, clients: int, total: int, keys: int) -> float:
+    per_client = max(1, total // clients)
+    barrier = threading.Barrier(clients + 1)
+    pool = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(keys)]
+
+    def client(idx: int) -> None:
+        barrier.wait()
+        for i in range(per_client):
+            limiter.allow(pool[(idx * 7919 + i) % keys], time.time())
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    ns = elapsed / (per_client * clients) * 1e9
+    print(f"{name:<8s} clients={clients:<3d} {ns:8.0f} ns/request  {per_client * clients / elapsed:10.0f} req/s")
+    return ns
+
+
+def main() -> int:
+    from llm_server.ratelimit import LocalBuckets, SharedBuckets
+
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--clients", default="1,8", help="comma-separated concurrent client counts")
+    ap.add_argument("--requests", type=int, default=200_000, help="total requests per run")
+    ap.add_argument("--keys", type=int, default=1000, help="distinct client keys")
+    args = ap.parse_args()
+    rps, burst = 1e6, 1_000_000  # measure the bookkeeping, not rejections
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-rl-"), "rl.bin")
+    for c in [int(x) for x in args.clients.split(",") if x.strip()]:
+        legacy = run("legacy", LegacyLimiter(rps, burst), c, args.requests, args.keys)
+        run("local", LocalBuckets(rps, burst), c, args.requests, args.keys)
+        shared = SharedBuckets(path, rps, burst)
+        ns = run("shared", shared, c, args.requests, args.keys)
+        shared.close()
+        print(f"  shared overhead vs legacy: {ns - legacy:+.0f} ns/request")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())